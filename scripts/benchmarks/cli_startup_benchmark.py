@@ -0,0 +1,57 @@
+"""Benchmark the startup time of the invest CLI.
+
+Times ``invest --version``, ``invest list`` and ``invest list --json`` in
+fresh processes, and the time to import every model for comparison.
+Run it once on each revision to compare them, e.g.::
+
+    python scripts/benchmarks/cli_startup_benchmark.py --repeat 5
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+IMPORT_ALL_MODELS = (
+    'from natcap.invest import models; '
+    '[models.pyname_to_module[p] for p in models.pyname_to_module]')
+
+COMMANDS = [
+    ('invest --version', ['-m', 'natcap.invest', '--version']),
+    ('invest list', ['-m', 'natcap.invest', 'list']),
+    ('invest list --json', ['-m', 'natcap.invest', 'list', '--json']),
+    ('import all models', ['-c', IMPORT_ALL_MODELS]),
+]
+
+
+def _time_command(python_args):
+    """Run the python interpreter with ``python_args`` and time it.
+
+    Returns:
+        elapsed seconds
+    """
+    start_time = time.perf_counter()
+    subprocess.run(
+        [sys.executable] + python_args, check=True,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start_time
+
+
+def main(user_args=None):
+    """Time each command and print the median of several runs."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument(
+        '--repeat', type=int, default=5,
+        help='number of times to run each command')
+    args = parser.parse_args(user_args)
+
+    # warm up the filesystem cache so the first command isn't penalized
+    _time_command(['-c', IMPORT_ALL_MODELS])
+    for label, python_args in COMMANDS:
+        times = [_time_command(python_args) for _ in range(args.repeat)]
+        print(f'{label:<20} median {statistics.median(times):.2f} s, '
+              f'min {min(times):.2f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Benchmark ``natcap.invest.utils.read_csv_to_dataframe``.
+
+Reads every CSV under a directory, such as the InVEST sample data, with
+``read_csv_to_dataframe`` and with the 'python' engine that it always used
+to parse CSVs with, and reports the time each takes and whether their
+results are equal. Fetch the sample data with ``make fetch``, then e.g.::
+
+    python scripts/benchmarks/csv_reader_benchmark.py \\
+        data/invest-sample-data --repeat 3
+
+Pass ``--rows`` to also time a synthetic table of that many rows, which is
+closer in size to a large recreation predictor table than the sample data.
+"""
+import argparse
+import glob
+import os
+import statistics
+import tempfile
+import time
+
+import numpy
+import pandas
+from natcap.invest import utils
+
+
+def _time_read(path, repeat, **kwargs):
+    """Read a CSV ``repeat`` times.
+
+    Returns:
+        tuple of the dataframe that was read and the median elapsed seconds
+    """
+    times = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        df = utils.read_csv_to_dataframe(path, **kwargs)
+        times.append(time.perf_counter() - start_time)
+    return df, statistics.median(times)
+
+
+def _write_synthetic_table(target_path, n_rows):
+    """Write a CSV of numbers and text with ``n_rows`` rows."""
+    rng = numpy.random.default_rng(0)
+    pandas.DataFrame({
+        'id': numpy.arange(n_rows),
+        'type': rng.choice(['raster_mean', 'point_count', 'line_intersect'],
+                           n_rows),
+        'path': [f'predictors/predictor_{i}.tif' for i in range(n_rows)],
+        'value': rng.random(n_rows),
+    }).to_csv(target_path, index=False)
+
+
+def main(user_args=None):
+    """Time reading each CSV with both parsers and print a summary."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument(
+        'csv_dir', help='directory to search for CSVs, recursively')
+    parser.add_argument(
+        '--repeat', type=int, default=3,
+        help='number of times to read each CSV')
+    parser.add_argument(
+        '--rows', type=int, default=0,
+        help='also time a synthetic table with this many rows')
+    args = parser.parse_args(user_args)
+
+    csv_paths = sorted(glob.glob(
+        os.path.join(args.csv_dir, '**', '*.csv'), recursive=True))
+    with tempfile.TemporaryDirectory() as workspace:
+        if args.rows:
+            synthetic_path = os.path.join(workspace, 'synthetic.csv')
+            _write_synthetic_table(synthetic_path, args.rows)
+            csv_paths.append(synthetic_path)
+
+        total_python_time = total_time = 0
+        for path in csv_paths:
+            try:
+                python_df, python_time = _time_read(
+                    path, args.repeat, engine='python')
+            except Exception as error:
+                print(f'skipped {path}: {error}')
+                continue
+            df, elapsed_time = _time_read(path, args.repeat)
+            total_python_time += python_time
+            total_time += elapsed_time
+            print(f'{os.path.relpath(path, args.csv_dir):<70} '
+                  f'{len(df):>8} rows  python {python_time * 1000:8.1f} ms  '
+                  f'now {elapsed_time * 1000:8.1f} ms  '
+                  f'{"equal" if df.equals(python_df) else "DIFFERENT"}')
+
+    print(f'total: python engine {total_python_time:.2f} s, '
+          f'read_csv_to_dataframe {total_time:.2f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+// Microbenchmark of the ManagedRaster block caches.
+//
+// Replays a synthetic block access trace shaped like the sediment deposition
+// kernel (a raster-order sweep that reads each pixel's 8 neighbors, plus
+// downslope walks from each local high point) against LRUCache, looked up
+// with `exist` followed by `get` as ManagedRaster used to do, and against
+// FlatLRUCache, looked up through its most-recently-used fast path and
+// `find` as ManagedRaster does now.
+//
+// Build and run from the repository root:
+//
+//   g++ -std=c++20 -O2 -I src/natcap/invest/managed_raster \
+//       scripts/benchmarks/lru_cache_benchmark.cpp -o lru_cache_benchmark
+//   ./lru_cache_benchmark [n_rows] [n_cols] [block_size] [cache_blocks]
+#include <algorithm>
+#include <chrono>
+#include <cstdio>
+#include <cstdlib>
+#include <list>
+#include <utility>
+#include <vector>
+
+#include "LRUCache.h"
+#include "FlatLRUCache.h"
+
+const int ROW_OFFSETS[8] = {0, -1, -1, -1,  0,  1, 1, 1};
+const int COL_OFFSETS[8] = {1,  1,  0, -1, -1, -1, 0, 1};
+
+// Build the sequence of block indices visited by the access pattern.
+std::vector<int> make_trace(long n_rows, long n_cols, int block_size) {
+  long block_nx = (n_cols + block_size - 1) / block_size;
+  std::vector<int> trace;
+  unsigned int seed = 1;
+  auto block_of = [&](long row, long col) {
+    return static_cast<int>((row / block_size) * block_nx + col / block_size);
+  };
+  for (long row = 0; row < n_rows; row++) {
+    for (long col = 0; col < n_cols; col++) {
+      trace.push_back(block_of(row, col));
+      for (int i = 0; i < 8; i++) {
+        long nrow = row + ROW_OFFSETS[i];
+        long ncol = col + COL_OFFSETS[i];
+        if (nrow >= 0 and nrow < n_rows and ncol >= 0 and ncol < n_cols) {
+          trace.push_back(block_of(nrow, ncol));
+        }
+      }
+      // about one pixel in 64 starts a walk down to the edge of the raster,
+      // drifting sideways like a flow path over a bumpy surface
+      seed = seed * 1103515245 + 12345;
+      if ((seed >> 16) % 64 == 0) {
+        long wrow = row;
+        long wcol = col;
+        while (wrow < n_rows - 1) {
+          seed = seed * 1103515245 + 12345;
+          int drift = static_cast<int>((seed >> 16) % 3) - 1;
+          wrow++;
+          wcol = std::min(std::max(wcol + drift, 0L), n_cols - 1);
+          trace.push_back(block_of(wrow, wcol));
+        }
+      }
+    }
+  }
+  return trace;
+}
+
+int main(int argc, char** argv) {
+  long n_rows = argc > 1 ? atol(argv[1]) : 2048;
+  long n_cols = argc > 2 ? atol(argv[2]) : 2048;
+  int block_size = argc > 3 ? atoi(argv[3]) : 256;
+  int cache_blocks = argc > 4 ? atoi(argv[4]) : 16;
+  int n_blocks = static_cast<int>(
+    ((n_rows + block_size - 1) / block_size) *
+    ((n_cols + block_size - 1) / block_size));
+
+  std::vector<int> trace = make_trace(n_rows, n_cols, block_size);
+  // stand-in block buffers; only the pointers are cached
+  std::vector<double> buffers(n_blocks);
+
+  long long checksum_lru = 0;
+  unsigned long long misses_lru = 0;
+  auto start = std::chrono::steady_clock::now();
+  {
+    LRUCache<int, double*> cache(cache_blocks);
+    std::list<std::pair<int, double*>> removed;
+    for (int block_index: trace) {
+      if (not cache.exist(block_index)) {
+        misses_lru++;
+        cache.put(block_index, &buffers[block_index], removed);
+        removed.clear();
+      }
+      checksum_lru += cache.get(block_index) - buffers.data();
+    }
+  }
+  double seconds_lru = std::chrono::duration<double>(
+    std::chrono::steady_clock::now() - start).count();
+
+  long long checksum_flat = 0;
+  start = std::chrono::steady_clock::now();
+  FlatLRUCache<double*> cache(n_blocks, cache_blocks);
+  {
+    std::list<std::pair<int, double*>> removed;
+    for (int block_index: trace) {
+      double* block;
+      if (cache.last_key == block_index) {
+        cache.hits++;
+        block = cache.last_val;
+      } else {
+        double** cached_block = cache.find(block_index);
+        if (cached_block != nullptr) {
+          block = *cached_block;
+        } else {
+          cache.put(block_index, &buffers[block_index], removed);
+          removed.clear();
+          block = cache.last_val;
+        }
+      }
+      checksum_flat += block - buffers.data();
+    }
+  }
+  double seconds_flat = std::chrono::duration<double>(
+    std::chrono::steady_clock::now() - start).count();
+
+  if (checksum_lru != checksum_flat or misses_lru != cache.misses) {
+    fprintf(stderr, "caches disagree\n");
+    return 1;
+  }
+  printf("%zu block accesses, %d blocks, %d cached, %llu misses\n",
+         trace.size(), n_blocks, cache_blocks, cache.misses);
+  printf("LRUCache     %8.3f s  %6.2f ns/access\n",
+         seconds_lru, 1e9 * seconds_lru / trace.size());
+  printf("FlatLRUCache %8.3f s  %6.2f ns/access  (%.1fx)\n",
+         seconds_flat, 1e9 * seconds_flat / trace.size(),
+         seconds_lru / seconds_flat);
+  return 0;
+}
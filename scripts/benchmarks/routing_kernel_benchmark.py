@@ -0,0 +1,194 @@
+"""Benchmark the per-pixel cost and peak memory of a flow routing kernel.
+
+Builds a synthetic DEM, its flow direction raster and the other inputs to
+``sdr_core.calculate_sediment_deposition`` in a workspace, then times the
+kernel in a fresh process and reports its wall time per pixel and its peak
+resident set size. Run it once on each revision to compare them, e.g.::
+
+    python scripts/benchmarks/routing_kernel_benchmark.py \\
+        --size 20000 --algorithm mfd --workspace /tmp/routing_benchmark
+
+Pass ``--kernel-threads`` to time the tiled kernel on that many threads,
+as with the hidden ``kernel_threads`` arg of SDR. A kernel that doesn't
+take ``n_workers``, like the one before the tiled kernel was added, is run
+serially.
+
+Inputs already in the workspace are reused, since building a 20000 x 20000
+flow direction raster takes much longer than routing over it.
+"""
+import argparse
+import concurrent.futures
+import inspect
+import os
+import resource
+import sys
+import time
+
+import numpy
+import pygeoprocessing
+import pygeoprocessing.routing
+from osgeo import gdal
+from osgeo import osr
+
+gdal.UseExceptions()
+
+BLOCK_SIZE = 256
+CREATION_OPTIONS = (
+    'TILED=YES', 'BIGTIFF=YES', 'COMPRESS=LZW',
+    f'BLOCKXSIZE={BLOCK_SIZE}', f'BLOCKYSIZE={BLOCK_SIZE}')
+
+
+def _write_synthetic_raster(target_path, size, pixel_func):
+    """Write a float32 raster one strip of blocks at a time.
+
+    Args:
+        target_path (str): path to the raster to create.
+        size (int): number of rows and columns.
+        pixel_func (callable): called with the row and column index arrays
+            of a strip, returns the pixel values of the strip.
+
+    Returns:
+        None
+    """
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(26910)  # UTM Zone 10N
+    driver = gdal.GetDriverByName('GTiff')
+    raster = driver.Create(
+        target_path, size, size, 1, gdal.GDT_Float32,
+        options=CREATION_OPTIONS)
+    raster.SetProjection(srs.ExportToWkt())
+    raster.SetGeoTransform([463250, 30, 0, 4929700, 0, -30])
+    band = raster.GetRasterBand(1)
+    band.SetNoDataValue(-1)
+    for row_offset in range(0, size, BLOCK_SIZE):
+        n_rows = min(BLOCK_SIZE, size - row_offset)
+        yy, xx = numpy.mgrid[row_offset:row_offset + n_rows, 0:size]
+        band.WriteArray(
+            pixel_func(yy, xx).astype(numpy.float32), yoff=row_offset)
+    band = None
+    raster = None
+
+
+def build_inputs(workspace_dir, size, algorithm):
+    """Create the kernel inputs in ``workspace_dir`` if they don't exist.
+
+    Args:
+        workspace_dir (str): directory to hold the inputs.
+        size (int): number of rows and columns of each raster.
+        algorithm (str): flow direction algorithm, 'mfd' or 'd8'.
+
+    Returns:
+        tuple of (flow_dir_path, e_prime_path, sdr_path)
+    """
+    os.makedirs(workspace_dir, exist_ok=True)
+    dem_path = os.path.join(workspace_dir, f'dem_{size}.tif')
+    e_prime_path = os.path.join(workspace_dir, f'e_prime_{size}.tif')
+    sdr_path = os.path.join(workspace_dir, f'sdr_{size}.tif')
+    flow_dir_path = os.path.join(
+        workspace_dir, f'flow_dir_{algorithm}_{size}.tif')
+
+    # a bumpy surface gives many local high points and long flow paths
+    for path, pixel_func in [
+            (dem_path, lambda yy, xx: (
+                numpy.sin(xx / 7) * numpy.cos(yy / 11) * 10 +
+                (xx + yy) / 5)),
+            (e_prime_path, lambda yy, xx: numpy.full(xx.shape, 0.5)),
+            (sdr_path, lambda yy, xx: 0.1 + 0.6 * (xx + yy) / (2 * size))]:
+        if not os.path.exists(path):
+            _write_synthetic_raster(path, size, pixel_func)
+
+    if not os.path.exists(flow_dir_path):
+        if algorithm == 'mfd':
+            flow_dir_func = pygeoprocessing.routing.flow_dir_mfd
+        else:
+            flow_dir_func = pygeoprocessing.routing.flow_dir_d8
+        flow_dir_func(
+            (dem_path, 1), flow_dir_path, working_dir=workspace_dir,
+            raster_driver_creation_tuple=('GTIFF', CREATION_OPTIONS))
+    return flow_dir_path, e_prime_path, sdr_path
+
+
+def _accepts_keyword(func, name):
+    """Check whether a function takes a keyword argument.
+
+    Returns:
+        True if ``func`` has a parameter called ``name``. False if it
+        doesn't, or if its signature can't be inspected.
+    """
+    try:
+        return name in inspect.signature(func).parameters
+    except (TypeError, ValueError):
+        # e.g. a Cython function compiled without a signature
+        return False
+
+
+def _run_kernel(flow_dir_path, e_prime_path, sdr_path, workspace_dir,
+                algorithm, kernel_threads):
+    """Run the sediment deposition kernel and measure it.
+
+    Meant to run in its own process so that the peak RSS is the kernel's.
+    ``kernel_threads`` is passed to the kernel as SDR passes its
+    ``kernel_threads`` arg.
+
+    Returns:
+        tuple of (elapsed seconds, peak RSS in bytes, whether the kernel
+        took ``n_workers``)
+    """
+    from natcap.invest.sdr import sdr_core
+
+    f_path = os.path.join(workspace_dir, 'f.tif')
+    deposition_path = os.path.join(workspace_dir, 'deposition.tif')
+    kwargs = {}
+    if _accepts_keyword(sdr_core.calculate_sediment_deposition, 'n_workers'):
+        kwargs['n_workers'] = kernel_threads or 1
+    start_time = time.perf_counter()
+    sdr_core.calculate_sediment_deposition(
+        flow_dir_path, e_prime_path, f_path, sdr_path, deposition_path,
+        algorithm, **kwargs)
+    elapsed = time.perf_counter() - start_time
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != 'darwin':  # linux reports kilobytes, mac bytes
+        max_rss *= 1024
+    return elapsed, max_rss, bool(kwargs)
+
+
+def main(user_args=None):
+    """Build the inputs, run the kernel and print its cost."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument(
+        '--size', type=int, default=20000,
+        help='number of rows and columns of the synthetic rasters')
+    parser.add_argument(
+        '--algorithm', choices=['mfd', 'd8'], default='mfd',
+        help='flow direction algorithm')
+    parser.add_argument(
+        '--kernel-threads', type=int, default=None,
+        help=('number of threads to route on, as with the kernel_threads '
+              'arg of SDR. If not given, the kernel runs on one thread'))
+    parser.add_argument(
+        '--workspace', required=True,
+        help='directory to hold the inputs and outputs')
+    args = parser.parse_args(user_args)
+
+    flow_dir_path, e_prime_path, sdr_path = build_inputs(
+        args.workspace, args.size, args.algorithm)
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=1) as executor:
+        elapsed, max_rss, took_threads = executor.submit(
+            _run_kernel, flow_dir_path, e_prime_path, sdr_path,
+            args.workspace, args.algorithm, args.kernel_threads).result()
+
+    n_pixels = args.size * args.size
+    workers_description = (
+        f'kernel_threads={args.kernel_threads or 1}' if took_threads
+        else 'serial kernel without n_workers')
+    print(f'sediment deposition, {args.algorithm}, '
+          f'{args.size} x {args.size} pixels, {workers_description}')
+    print(f'  total time:     {elapsed:.1f} s')
+    print(f'  time per pixel: {elapsed / n_pixels * 1e9:.1f} ns')
+    print(f'  peak RSS:       {max_rss / 2**20:.1f} MiB')
+
+
+if __name__ == '__main__':
+    main()
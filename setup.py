@@ -74,6 +74,7 @@ setup(
             define_macros=[("NPY_NO_DEPRECATED_API", "NPY_1_7_API_VERSION")]
         ) for package, module, package_compiler_args in [
             ('delineateit', 'delineateit_core', []),
+            ('managed_raster', 'cache', []),
             ('recreation', 'out_of_core_quadtree', []),
             # clang-14 defaults to -ffp-contract=on, which causes the
             # arithmetic of A*B+C to be implemented using a contraction, which
@@ -1,4 +1,7 @@
 """init module for natcap.invest."""
+import contextlib
+import contextvars
+import functools
 import importlib.metadata
 import logging
 import os
@@ -41,6 +44,9 @@ LOCALE_NAME_MAP = {
 # this can be changed during runtime by the set_locale function
 # the gettext function below uses this to set the translation language
 LOCALE_CODE = 'en'
+# the locale set by the use_locale function in the current context, which
+# the gettext function uses in place of LOCALE_CODE if it is set
+_context_locale_code = contextvars.ContextVar('locale_code', default=None)
 
 
 def set_locale(locale_code):
@@ -48,8 +54,10 @@ def set_locale(locale_code):
 
     This is the locale that will be used for translation. The `gettext`
     function returned by `install_locale` will translate to this locale.
-    To change the language of a natcap.invest module, call this function
-    with the desired language code, then reload the module.
+    Messages that are translated when they are used, such as validation
+    messages and the text of ``ModelSpec.to_json``, follow this setting
+    immediately. To change the language of strings that a module translates
+    when it is imported, call this function, then reload the module.
 
     Args:
         locale_code (str): ISO 639-1 locale code for a language supported
@@ -61,12 +69,56 @@ def set_locale(locale_code):
     Raises:
         ValueError if the given locale code is not supported by invest
     """
+    _check_locale(locale_code)
+    this_module = sys.modules[__name__]
+    setattr(this_module, 'LOCALE_CODE', locale_code)
+
+
+@contextlib.contextmanager
+def use_locale(locale_code):
+    """Translate to a locale within a block, in the current context only.
+
+    Unlike ``set_locale``, this doesn't change the locale of other threads,
+    so threads serving different requests can each translate to their own
+    locale. A thread started within the block translates to this locale
+    only if it runs in a copy of the context, as from
+    ``contextvars.copy_context().run``.
+
+    Args:
+        locale_code (str): ISO 639-1 locale code for a language supported
+            by invest
+
+    Yields:
+        None
+
+    Raises:
+        ValueError if the given locale code is not supported by invest
+    """
+    _check_locale(locale_code)
+    token = _context_locale_code.set(locale_code)
+    try:
+        yield
+    finally:
+        _context_locale_code.reset(token)
+
+
+def get_locale():
+    """Get the locale that ``gettext`` translates to.
+
+    Returns:
+        the locale code set by ``use_locale`` in the current context, if
+        any, otherwise the one set by ``set_locale``
+    """
+    locale_code = _context_locale_code.get()
+    return LOCALE_CODE if locale_code is None else locale_code
+
+
+def _check_locale(locale_code):
+    """Raise a ValueError if a locale is not supported by invest."""
     if locale_code not in LOCALES:
         raise ValueError(
             f"Locale '{locale_code}' is not supported by InVEST. "
             f"Supported locale codes are: {LOCALES}")
-    this_module = sys.modules[__name__]
-    setattr(this_module, 'LOCALE_CODE', locale_code)
 
 
 def gettext(msg):
@@ -78,12 +130,29 @@ def gettext(msg):
     Args:
         msg (string): message string to translate
     """
+    return _get_translation(get_locale(), LOCALE_DIR).gettext(msg)
+
+
+@functools.cache
+def _get_translation(locale_code, locale_dir):
+    """Load the message catalog for a locale.
+
+    This is cached so that looking up a message doesn't search the
+    filesystem for the catalog each time.
+
+    Args:
+        locale_code (str): ISO 639-1 locale code
+        locale_dir (str): path to the message catalog directory
+
+    Returns:
+        gettext.NullTranslations
+    """
     return translation(
         'messages',
-        languages=[LOCALE_CODE],
-        localedir=LOCALE_DIR,
+        languages=[locale_code],
+        localedir=locale_dir,
         # fall back to a NullTranslation, which returns the English messages
-        fallback=True).gettext(msg)
+        fallback=True)
 
 
 def local_dir(source_file):
@@ -49,23 +49,23 @@ def build_model_list_table(locale_code):
         # fall back to a NullTranslation, which returns the English messages
         fallback=True)
     max_model_id_length = max(
-        len(_id) for _id in models.model_id_to_spec.keys())
+        len(_id) for _id in models.model_id_to_info.keys())
 
     # Adding 3 to max alias name length for the parentheses plus some padding.
     max_alias_name_length = max(len(', '.join(
-        model_spec.aliases)) for model_spec in models.model_id_to_spec.values()) + 3
+        model_info.aliases)) for model_info in models.model_id_to_info.values()) + 3
     template_string = '    {model_id} {aliases} {model_title}'
     strings = [translation.gettext('Available models:')]
-    for model_id, model_spec in models.model_id_to_spec.items():
+    for model_id, model_info in models.model_id_to_info.items():
 
-        alias_string = ', '.join(model_spec.aliases)
+        alias_string = ', '.join(model_info.aliases)
         if alias_string:
             alias_string = f'({alias_string})'
 
         strings.append(template_string.format(
             model_id=model_id.ljust(max_model_id_length),
             aliases=alias_string.ljust(max_alias_name_length),
-            model_title=translation.gettext(model_spec.model_title)))
+            model_title=translation.gettext(model_info.model_title)))
     return '\n'.join(strings) + '\n'
 
 
@@ -93,10 +93,10 @@ def build_model_list_json(locale_code):
         fallback=True)
 
     json_object = {}
-    for model_id, model_spec in models.model_id_to_spec.items():
+    for model_id, model_info in models.model_id_to_info.items():
         json_object[model_id] = {
-            'model_title': translation.gettext(model_spec.model_title),
-            'aliases': list(model_spec.aliases)
+            'model_title': translation.gettext(model_info.model_title),
+            'aliases': list(model_info.aliases)
         }
 
     return json.dumps(json_object)
@@ -194,7 +194,7 @@ class SelectModelAction(argparse.Action):
 
         Overridden from argparse.Action.__call__.
         """
-        known_models = sorted(list(models.model_id_to_spec.keys()))
+        known_models = sorted(list(models.model_id_to_pyname.keys()))
 
         matching_models = [model for model in known_models if
                            model.startswith(values)]
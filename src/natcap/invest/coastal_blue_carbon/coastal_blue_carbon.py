@@ -2048,14 +2048,14 @@ def validate(args, limit_to=None):
         snapshot_years = set(snapshots.keys())
         if len(snapshot_years) == 1 and "analysis_year" not in sufficient_keys:
             validation_warnings.append(
-                (['analysis_year'], MISSING_ANALYSIS_YEAR_MSG))
+                (['analysis_year'], gettext(MISSING_ANALYSIS_YEAR_MSG)))
 
         if ("analysis_year" not in invalid_keys
                 and "analysis_year" in sufficient_keys):
             if max(snapshot_years) >= int(args['analysis_year']):
                 validation_warnings.append((
                     ['analysis_year'],
-                    INVALID_ANALYSIS_YEAR_MSG.format(
+                    gettext(INVALID_ANALYSIS_YEAR_MSG).format(
                         analysis_year=args['analysis_year'],
                         latest_year=max(snapshots.keys()))))
 
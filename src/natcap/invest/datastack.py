@@ -20,7 +20,11 @@ run.
 import ast
 import codecs
 import collections
+import concurrent.futures
+import gzip
+import hashlib
 import importlib
+import io
 import json
 import logging
 import math
@@ -28,9 +32,11 @@ import os
 import pprint
 import re
 import shutil
+import struct
 import tarfile
 import tempfile
 import warnings
+import zlib
 
 from osgeo import gdal
 
@@ -43,6 +49,23 @@ LOGGER = logging.getLogger(__name__)
 DATASTACK_EXTENSION = '.invest.tar.gz'
 PARAMETER_SET_EXTENSION = '.invest.json'
 DATASTACK_PARAMETER_FILENAME = 'parameters' + PARAMETER_SET_EXTENSION
+DATASTACK_MANIFEST_FILENAME = 'manifest.json'
+
+# Data files are stored in an archive in a directory named for a hash of their
+# contents (a "blob"), so that each is stored once, however many args or
+# table rows refer to it. The directory name is this many hex digits of the
+# sha256 hash.
+BLOB_ID_LENGTH = 32
+# The compression level that archives were written with by shutil
+ARCHIVE_COMPRESSION_LEVEL = 9
+# Archives are compressed in chunks of this many bytes, which may be
+# compressed concurrently.
+ARCHIVE_CHUNK_SIZE = 4 * 2**20
+# ID of the gzip extra header subfield recording where the manifest starts
+_MANIFEST_OFFSET_SUBFIELD_ID = b'IV'
+# offset of that subfield's value from the start of the archive: after the
+# fixed 10-byte header, XLEN, and the subfield's ID and length
+_MANIFEST_OFFSET_POSITION = 16
 
 
 ParameterSet = collections.namedtuple('ParameterSet',
@@ -84,7 +107,282 @@ def _tarfile_safe_extract(archive_path, dest_dir_path):
         safe_extract(tar, dest_dir_path)
 
 
-def get_datastack_info(filepath, extract_path=None):
+class _GzipMemberWriter:
+    """Write a gzip file as a series of separately compressed members.
+
+    A concatenation of gzip members is itself a gzip file, which ``tarfile``,
+    ``gzip`` and other tools read as usual. Compressing chunks of the data
+    separately lets them be compressed on several threads (zlib releases the
+    GIL), and lets the members holding a blob be copied from one archive
+    into another without decompressing them.
+
+    The first member is empty, and has an extra header field holding the
+    offset given to ``close``. Datastack archives use this to find their
+    manifest without reading the rest of the archive.
+
+    Args:
+        fileobj (file): binary file to write to, opened for writing and
+            positioned at its start.
+        n_workers (int): number of threads to compress on. Chunks are
+            compressed on the calling thread if this is less than 2.
+    """
+
+    def __init__(self, fileobj, n_workers=1):
+        self._fileobj = fileobj
+        self._buffer = bytearray()
+        self._uncompressed_size = 0
+        self._pending = collections.deque()
+        self._max_pending = 2 * n_workers
+        self._executor = None
+        if n_workers > 1:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                n_workers, thread_name_prefix='datastack_compression')
+
+        # an empty member with an extra field: 'IV', 8 bytes of offset
+        extra = (_MANIFEST_OFFSET_SUBFIELD_ID + struct.pack('<H', 8) +
+                 struct.pack('<Q', 0))
+        self._fileobj.write(
+            b'\x1f\x8b\x08\x04' + struct.pack('<I', 0) + b'\x00\xff' +
+            struct.pack('<H', len(extra)) + extra +
+            zlib.compressobj(
+                ARCHIVE_COMPRESSION_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS
+            ).flush() + struct.pack('<II', 0, 0))
+
+    def write(self, data):
+        """Write bytes, compressing them once a chunk is buffered."""
+        self._buffer += data
+        self._uncompressed_size += len(data)
+        while len(self._buffer) >= ARCHIVE_CHUNK_SIZE:
+            self._submit(bytes(self._buffer[:ARCHIVE_CHUNK_SIZE]))
+            del self._buffer[:ARCHIVE_CHUNK_SIZE]
+        return len(data)
+
+    def tell(self):
+        """Get the number of uncompressed bytes written."""
+        return self._uncompressed_size
+
+    def _submit(self, chunk):
+        """Compress a chunk into a gzip member, in order."""
+        if self._executor is None:
+            self._fileobj.write(gzip.compress(
+                chunk, ARCHIVE_COMPRESSION_LEVEL, mtime=0))
+            return
+        self._pending.append(self._executor.submit(
+            gzip.compress, chunk, ARCHIVE_COMPRESSION_LEVEL, mtime=0))
+        # limit the memory used by chunks waiting to be written
+        while len(self._pending) > self._max_pending:
+            self._fileobj.write(self._pending.popleft().result())
+
+    def end_member(self):
+        """End the current member and write all the data so far.
+
+        Returns:
+            The offset in the file where the next member will start.
+        """
+        if self._buffer:
+            self._submit(bytes(self._buffer))
+            self._buffer.clear()
+        while self._pending:
+            self._fileobj.write(self._pending.popleft().result())
+        return self._fileobj.tell()
+
+    def copy_members(self, source_file, offset, length, uncompressed_size):
+        """Copy whole gzip members from another file made by this class.
+
+        Args:
+            source_file (file): binary file to copy from
+            offset (int): where the members start in ``source_file``
+            length (int): number of bytes to copy
+            uncompressed_size (int): the size of the data in the members
+
+        Returns:
+            ``None``
+        """
+        self.end_member()
+        source_file.seek(offset)
+        while length > 0:
+            data = source_file.read(min(length, ARCHIVE_CHUNK_SIZE))
+            if not data:
+                raise ValueError('Unexpected end of the archive being copied')
+            self._fileobj.write(data)
+            length -= len(data)
+        self._uncompressed_size += uncompressed_size
+
+    def close(self, manifest_offset):
+        """Write the remaining data and record the manifest offset.
+
+        Args:
+            manifest_offset (int): offset to record in the first member
+
+        Returns:
+            ``None``
+        """
+        self.end_member()
+        if self._executor is not None:
+            self._executor.shutdown()
+        end = self._fileobj.tell()
+        self._fileobj.seek(_MANIFEST_OFFSET_POSITION)
+        self._fileobj.write(struct.pack('<Q', manifest_offset))
+        self._fileobj.seek(end)
+
+
+def _read_manifest(datastack_path):
+    """Read the manifest of a datastack archive.
+
+    Args:
+        datastack_path (string): path to a datastack archive
+
+    Returns:
+        The manifest dict, or ``None`` if the archive has no manifest, like
+        archives made by older versions of InVEST.
+    """
+    with open(datastack_path, 'rb') as archive_file:
+        header = archive_file.read(_MANIFEST_OFFSET_POSITION + 8)
+        if (len(header) < _MANIFEST_OFFSET_POSITION + 8 or
+                header[:4] != b'\x1f\x8b\x08\x04' or
+                header[12:14] != _MANIFEST_OFFSET_SUBFIELD_ID):
+            return None
+        manifest_offset = struct.unpack(
+            '<Q', header[_MANIFEST_OFFSET_POSITION:])[0]
+        archive_file.seek(manifest_offset)
+        with gzip.GzipFile(fileobj=archive_file) as manifest_stream, \
+                tarfile.open(fileobj=manifest_stream, mode='r|') as tar:
+            for member in tar:
+                if member.name == DATASTACK_MANIFEST_FILENAME:
+                    return json.load(tar.extractfile(member))
+    return None
+
+
+def _file_sha256(filepath, known_hashes):
+    """Get the sha256 hash of a file's contents.
+
+    Args:
+        filepath (string): path to the file
+        known_hashes (dict): maps (path, size, modification time) of files
+            to their known hashes, so they don't have to be read again
+
+    Returns:
+        The hex digest of the file's hash.
+    """
+    stat_result = os.stat(filepath)
+    key = (os.path.abspath(filepath), stat_result.st_size,
+           stat_result.st_mtime_ns)
+    if key not in known_hashes:
+        file_hash = hashlib.sha256()
+        with open(filepath, 'rb') as file:
+            for block in iter(lambda: file.read(2**20), b''):
+                file_hash.update(block)
+        known_hashes[key] = file_hash.hexdigest()
+    return known_hashes[key]
+
+
+def _list_dataset_files(source_path, spatial=False):
+    """List the files of a dataset.
+
+    Args:
+        source_path (string): path to a file or directory
+        spatial (bool): if True, ``source_path`` is a GDAL dataset and its
+            sidecar files are included
+
+    Returns:
+        A tuple of the dataset's name and a list of (name, path) tuples, one
+        for each of its files and directories. Names are relative to the
+        directory that the dataset will be stored in.
+    """
+    source_path = os.path.normpath(source_path)
+    basename = os.path.basename(source_path)
+    if os.path.isdir(source_path):
+        # e.g. a directory input, or an ArcGIS Binary/Grid raster
+        members = [(basename, source_path)]
+        for dirpath, dirnames, filenames in os.walk(source_path):
+            dirnames.sort()
+            for name in dirnames + sorted(filenames):
+                path = os.path.join(dirpath, name)
+                members.append((
+                    os.path.relpath(path, os.path.dirname(source_path)).replace(
+                        '\\', '/'), path))
+        return basename, members
+
+    member_paths = [source_path]
+    if spatial:
+        dataset = gdal.OpenEx(source_path)
+        member_paths = [
+            path for path in (dataset.GetFileList() or [source_path])
+            if not os.path.isdir(path)]
+        dataset = None
+        # I can't conceive of a case where the basename of the source file
+        # is not one of the member files, but just in case there's a weird
+        # GDAL driver that does this, use the last member file as is done in
+        # ``utils.copy_spatial_files``.
+        if basename not in [os.path.basename(p) for p in member_paths]:
+            basename = os.path.basename(member_paths[-1])
+    return basename, [(os.path.basename(p), p) for p in member_paths]
+
+
+def _relative_source(source_path, start):
+    """Get the path to a source file to record in a manifest.
+
+    Sources are recorded relative to the archive, so that an archive
+    doesn't reveal where it was built.
+
+    Args:
+        source_path (string): absolute path to the source file
+        start (string): path to the directory of the archive
+
+    Returns:
+        The relative path, with forward slashes, or ``None`` if there is
+        no relative path from ``start``, like on another Windows drive.
+    """
+    try:
+        return os.path.relpath(source_path, start).replace('\\', '/')
+    except ValueError:
+        return None
+
+
+def _add_blob(blobs, source_path, known_hashes, spatial=False):
+    """Add a dataset to the blobs of an archive.
+
+    A blob is identified by the hash of its files' names and contents, so
+    a dataset that is referred to more than once, even from different
+    paths, is stored once.
+
+    Args:
+        blobs (dict): maps the ids of the blobs found so far to their
+            manifest entries. Modified in place.
+        source_path (string): path to a file or directory
+        known_hashes (dict): see ``_file_sha256``
+        spatial (bool): see ``_list_dataset_files``
+
+    Returns:
+        The path to the dataset in the archive, relative to the data
+        directory of the archive.
+    """
+    name, members = _list_dataset_files(source_path, spatial)
+    files = []
+    blob_hash = hashlib.sha256()
+    for member_name, member_path in members:
+        if os.path.isdir(member_path):
+            files.append({
+                'path': member_name, 'source': os.path.abspath(member_path)})
+            member_hash = ''
+        else:
+            member_hash = _file_sha256(member_path, known_hashes)
+            stat_result = os.stat(member_path)
+            files.append({
+                'path': member_name,
+                'source': os.path.abspath(member_path),
+                'sha256': member_hash,
+                'size': stat_result.st_size,
+                'mtime_ns': stat_result.st_mtime_ns})
+        blob_hash.update(f'{member_name}\0{member_hash}\0'.encode('utf-8'))
+    blob_id = blob_hash.hexdigest()[:BLOB_ID_LENGTH]
+    if blob_id not in blobs:
+        LOGGER.debug(f'Storing {source_path} as blob {blob_id}')
+        blobs[blob_id] = {'files': files}
+    return f'{blob_id}/{name}'
+
+
+def get_datastack_info(filepath, extract_path=None, lazy=False):
     """Get information about a datastack.
 
     Args:
@@ -93,6 +391,8 @@ def get_datastack_info(filepath, extract_path=None):
         extract_path (str): Path to a directory to extract the datastack, if
             provided as an archive. Will be overwritten if it already exists,
             or created if it does not already exist.
+        lazy (bool): Whether to leave the rasters and vectors of an archive
+            in the archive. See ``extract_datastack_archive``.
 
     Returns:
         A 2-tuple.  The first item of the tuple is one of:
@@ -114,9 +414,16 @@ def get_datastack_info(filepath, extract_path=None):
         os.mkdir(extract_path)
         # If it's a tarfile, we need to extract the parameters file to be able
         # to inspect the parameters and model details.
-        extract_datastack_archive(filepath, extract_path)
-        return 'archive', extract_parameter_set(
+        archive_args = extract_datastack_archive(
+            filepath, extract_path, lazy=lazy)
+        parameter_set = extract_parameter_set(
             os.path.join(extract_path, DATASTACK_PARAMETER_FILENAME))
+        if lazy:
+            # args left in the archive are only known to the extracted args
+            parameter_set.args.update(
+                (key, value) for key, value in archive_args.items()
+                if isinstance(value, str) and value.startswith('tar://'))
+        return 'archive', parameter_set
 
     try:
         return 'json', extract_parameter_set(filepath)
@@ -127,15 +434,29 @@ def get_datastack_info(filepath, extract_path=None):
     return 'logfile', extract_parameters_from_logfile(filepath)
 
 
-def build_datastack_archive(args, model_id, datastack_path):
+def build_datastack_archive(args, model_id, datastack_path, n_workers=1,
+                            previous_datastack_path=None):
     """Build an InVEST datastack from an arguments dict.
 
+    Files referred to by the args, and by the spatial columns of CSVs, are
+    stored in the archive under ``data/<hash>/``, where ``<hash>`` is
+    derived from the names and contents of the dataset's files. A dataset
+    is stored once, however many times it is referred to. The archive's
+    ``manifest.json`` lists the files of each of these blobs.
+
     Args:
         args (dict): The arguments dictionary to include in the datastack.
         model_id (string): The id the model these args are for. For core models,
             this is the regular id. For plugins, this has the format model_id@version
         datastack_path (string): The path to where the datastack archive
             should be written.
+        n_workers (int): The number of threads to compress the archive on.
+        previous_datastack_path (string): The path to a datastack archive
+            built by an earlier call to this function, such as a previous
+            version of ``datastack_path``. Blobs that it already has are
+            copied from it without being compressed again, and files it
+            lists with the same path, size and modification time are
+            assumed to be unchanged instead of being hashed again.
 
     Returns:
         ``None``
@@ -144,6 +465,27 @@ def build_datastack_archive(args, model_id, datastack_path):
         # For plugins, use the model id before the '@'
         name=models.model_id_to_pyname[model_id.split('@')[0]])
 
+    previous_manifest = None
+    if previous_datastack_path:
+        previous_manifest = _read_manifest(previous_datastack_path)
+        if previous_manifest is None:
+            LOGGER.warning(
+                f'{previous_datastack_path} has no manifest, so none of its '
+                'data will be reused')
+    known_hashes = {}
+    if previous_manifest:
+        previous_dir = os.path.dirname(
+            os.path.abspath(previous_datastack_path))
+        for blob in previous_manifest['blobs'].values():
+            for file_info in blob['files']:
+                if 'sha256' in file_info and 'source' in file_info:
+                    source_path = os.path.normpath(
+                        os.path.join(previous_dir, file_info['source']))
+                    known_hashes[(source_path, file_info['size'],
+                                  file_info['mtime_ns'])] = file_info['sha256']
+    # blob ids mapped to their entries in the manifest, in the order found
+    blobs = {}
+
     args = args.copy()
     temp_workspace = tempfile.mkdtemp(prefix='datastack_')
     data_dir = os.path.join(temp_workspace, 'data')
@@ -195,6 +537,12 @@ def build_datastack_archive(args, model_id, datastack_path):
                 f"Skipping workspace directory: {args['workspace_dir']}")
             continue
 
+        # Nor the cache of intermediate results or the hydrology directory
+        # shared between workspaces.
+        if key in ('intermediate_cache_dir', 'hydrology_dir'):
+            LOGGER.debug(f"Skipping shared directory: {args[key]}")
+            continue
+
         LOGGER.info(f'Starting to archive arg "{key}": {args[key]}')
         # Possible that a user might pass an args key that doesn't belong to
         # this model.  Skip if so.
@@ -234,16 +582,16 @@ def build_datastack_archive(args, model_id, datastack_path):
 
             LOGGER.debug(f'Detected spatial columns: {spatial_columns}')
 
-            target_csv_path = os.path.join(
-                data_dir, f'{key}_csv.csv')
             if not spatial_columns:
+                target_csv_path = 'data/' + _add_blob(
+                    blobs, source_path, known_hashes)
                 LOGGER.debug(
-                    f'No spatial columns, copying to {target_csv_path}')
-                shutil.copyfile(source_path, target_csv_path)
+                    f'No spatial columns, archiving as {target_csv_path}')
             else:
-                contained_files_dir = os.path.join(
-                    data_dir, f'{key}_csv_data')
-
+                # The paths in the CSV are rewritten, so it is stored as a
+                # new file rather than as a blob.
+                target_csv_path = os.path.join(
+                    data_dir, f'{key}_csv.csv')
                 dataframe = input_spec.get_validated_dataframe(source_path)
                 csv_source_dir = os.path.abspath(os.path.dirname(source_path))
                 for spatial_column_name in spatial_columns:
@@ -280,18 +628,12 @@ def build_datastack_archive(args, model_id, datastack_path):
                             # directory
                             target_filepath = files_found[source_filepath]
                         except KeyError:
-                            basename = os.path.splitext(
-                                os.path.basename(source_filepath))[0]
-                            target_dir = os.path.join(
-                                contained_files_dir,
-                                f'{row_index}_{basename}')
-                            target_filepath = utils.copy_spatial_files(
-                                source_filepath, target_dir)
-                            target_filepath = os.path.relpath(
-                                target_filepath, data_dir)
+                            target_filepath = _add_blob(
+                                blobs, source_filepath, known_hashes,
+                                spatial=True)
 
                         LOGGER.debug(
-                            'Spatial file in CSV copied from '
+                            'Spatial file in CSV archived from '
                             f'{source_filepath} --> {target_filepath}')
                         dataframe.at[
                             row_index, spatial_column_name] = target_filepath
@@ -304,39 +646,17 @@ def build_datastack_archive(args, model_id, datastack_path):
             target_arg_value = target_csv_path
             files_found[source_path] = target_arg_value
 
-        elif type(input_spec) is spec.FileInput:
-            target_filepath = os.path.join(
-                data_dir, f'{key}_file')
-            shutil.copyfile(source_path, target_filepath)
-            target_arg_value = target_filepath
-            files_found[source_path] = target_arg_value
-
-        elif type(input_spec)is spec.DirectoryInput:
-            # copy the whole folder
-            target_directory = os.path.join(data_dir, f'{key}_directory')
-            os.makedirs(target_directory)
-
-            # We want to copy the directory contents into the directory
-            # directly, not copy the parent folder into the directory.
-            for filename in os.listdir(source_path):
-                src_path = os.path.join(source_path, filename)
-                dest_path = os.path.join(target_directory, filename)
-                if os.path.isdir(src_path):
-                    shutil.copytree(src_path, dest_path)
-                else:
-                    shutil.copyfile(src_path, dest_path)
-
-            LOGGER.debug(
-                f'Directory copied from {source_path} --> {target_directory}')
-            target_arg_value = target_directory
+        elif type(input_spec) in {spec.FileInput, spec.DirectoryInput}:
+            # a directory is stored along with all of its contents
+            target_arg_value = 'data/' + _add_blob(
+                blobs, source_path, known_hashes)
+            LOGGER.debug(f'Archived {source_path} --> {target_arg_value}')
             files_found[source_path] = target_arg_value
 
         elif type(input_spec) in spatial_types:
-            # Create a directory with a readable name, something like
-            # "aoi_path_vector" or "lulc_cur_path_raster".
-            spatial_dir = os.path.join(data_dir, f'{key}_{input_spec.type}')
-            target_arg_value = utils.copy_spatial_files(
-                source_path, spatial_dir)
+            target_arg_value = 'data/' + _add_blob(
+                blobs, source_path, known_hashes, spatial=True)
+            LOGGER.debug(f'Archived {source_path} --> {target_arg_value}')
             files_found[source_path] = target_arg_value
 
         else:
@@ -366,6 +686,7 @@ def build_datastack_archive(args, model_id, datastack_path):
             # write metadata file to target location (in temp dir)
             subdir = os.path.dirname(parameter_set['args'][k])
             target_location = os.path.join(temp_workspace, subdir)
+            os.makedirs(target_location, exist_ok=True)
             spec.write_metadata_file(v, this_arg_spec, keywords,
                                            out_workspace=target_location)
 
@@ -373,16 +694,80 @@ def build_datastack_archive(args, model_id, datastack_path):
     archive_filehandler.close()
     logging.getLogger().removeHandler(archive_filehandler)
 
-    # archive the workspace.
+    # Archive the workspace, with the parameters first so that they can be
+    # read without reading the data, then the blobs and the manifest.
+    # Each blob's files are compressed separately from the rest of the
+    # archive, so that a later archive can copy them from this one.
     with tempfile.TemporaryDirectory() as temp_dir:
-        temp_archive = os.path.join(temp_dir, 'invest_archive')
-        archive_name = shutil.make_archive(
-            temp_archive, 'gztar', root_dir=temp_workspace,
-            logger=LOGGER, verbose=True)
-        shutil.move(archive_name, datastack_path)
-
-
-def extract_datastack_archive(datastack_path, dest_dir_path):
+        temp_archive = os.path.join(temp_dir, 'invest_archive.tar.gz')
+        previous_archive_file = None
+        if previous_manifest:
+            previous_archive_file = open(previous_datastack_path, 'rb')
+        try:
+            with open(temp_archive, 'wb') as archive_file:
+                writer = _GzipMemberWriter(archive_file, n_workers)
+                with tarfile.open(fileobj=writer, mode='w') as tar:
+                    tar.add(param_file_uri, arcname=DATASTACK_PARAMETER_FILENAME)
+                    for name in sorted(os.listdir(temp_workspace)):
+                        if name != DATASTACK_PARAMETER_FILENAME:
+                            tar.add(os.path.join(temp_workspace, name),
+                                    arcname=name)
+
+                    for blob_id, blob in blobs.items():
+                        blob['offset'] = writer.end_member()
+                        if previous_manifest and 'offset' in (
+                                previous_manifest['blobs'].get(blob_id, {})):
+                            LOGGER.info(f'Reusing blob {blob_id}')
+                            previous_blob = previous_manifest['blobs'][blob_id]
+                            blob['tar_size'] = previous_blob['tar_size']
+                            writer.copy_members(
+                                previous_archive_file,
+                                previous_blob['offset'],
+                                previous_blob['length'],
+                                previous_blob['tar_size'])
+                            # the tar file tracks its size to pad its end
+                            tar.offset += previous_blob['tar_size']
+                        else:
+                            LOGGER.info(f'Compressing blob {blob_id}')
+                            start = tar.offset
+                            for file_info in blob['files']:
+                                tar.add(
+                                    file_info['source'],
+                                    arcname=f"data/{blob_id}/{file_info['path']}",
+                                    recursive=False)
+                            blob['tar_size'] = tar.offset - start
+                        blob['length'] = writer.end_member() - blob['offset']
+
+                    manifest_offset = writer.end_member()
+                    # record sources relative to the archive, not where
+                    # they are on this computer
+                    datastack_dir = os.path.dirname(
+                        os.path.abspath(datastack_path))
+                    manifest_blobs = {}
+                    for blob_id, blob in blobs.items():
+                        files = []
+                        for file_info in blob['files']:
+                            file_info = file_info.copy()
+                            source = _relative_source(
+                                file_info.pop('source'), datastack_dir)
+                            if source is not None:
+                                file_info['source'] = source
+                            files.append(file_info)
+                        manifest_blobs[blob_id] = dict(blob, files=files)
+                    manifest_bytes = json.dumps(
+                        {'blobs': manifest_blobs}, indent=4).encode('utf-8')
+                    manifest_info = tarfile.TarInfo(DATASTACK_MANIFEST_FILENAME)
+                    manifest_info.size = len(manifest_bytes)
+                    tar.addfile(manifest_info, io.BytesIO(manifest_bytes))
+                writer.close(manifest_offset)
+        finally:
+            if previous_archive_file is not None:
+                previous_archive_file.close()
+        shutil.move(temp_archive, datastack_path)
+    shutil.rmtree(temp_workspace, ignore_errors=True)
+
+
+def extract_datastack_archive(datastack_path, dest_dir_path, lazy=False):
     """Extract a datastack to a given folder.
 
     Args:
@@ -390,6 +775,13 @@ def extract_datastack_archive(datastack_path, dest_dir_path):
         dest_dir_path (string): The path to a directory.  The contents of the
             demonstration datastack archive will be extracted into this
             directory. If the directory does not exist, it will be created.
+        lazy (bool): Whether to leave the rasters and vectors that args refer
+            to in the archive. If ``True``, their args are ``tar://`` paths
+            to them within the archive (see ``utils._GDALPath``), which GDAL
+            reads from the archive as they are used, and only the rest of
+            the data is extracted. This needs the archive's manifest: for
+            archives made by older versions of InVEST, everything is
+            extracted.
 
     Returns:
         ``args`` (dict): A dictionary of arguments from the extracted
@@ -397,8 +789,16 @@ def extract_datastack_archive(datastack_path, dest_dir_path):
     """
     LOGGER.info('Extracting archive %s to %s', datastack_path, dest_dir_path)
     dest_dir_path = os.path.abspath(dest_dir_path)
-    # extract the archive to the workspace
-    _tarfile_safe_extract(datastack_path, dest_dir_path)
+    manifest = _read_manifest(datastack_path) if lazy else None
+    if lazy and manifest is None:
+        LOGGER.info(f'{datastack_path} has no manifest, extracting all of it')
+    if manifest is None:
+        # extract the archive to the workspace
+        _tarfile_safe_extract(datastack_path, dest_dir_path)
+        archive_args = {}
+    else:
+        archive_args = _extract_datastack_lazily(
+            datastack_path, dest_dir_path, manifest)
 
     # get the arguments dictionary
     with open(os.path.join(
@@ -429,10 +829,108 @@ def extract_datastack_archive(datastack_path, dest_dir_path):
         return args_param
 
     new_args = _rewrite_paths(arguments_dict)
+    new_args.update(archive_args)
     LOGGER.debug('Expanded parameters as \n%s', pprint.pformat(new_args))
     return new_args
 
 
+def _extract_member(tar, member, dest_dir_path):
+    """Extract the current member of a streamed tarfile, if it is safe to.
+
+    Raises:
+        ValueError if the member's path is outside of ``dest_dir_path``
+    """
+    target_path = os.path.abspath(os.path.join(dest_dir_path, member.name))
+    if os.path.commonpath([dest_dir_path, target_path]) != dest_dir_path:
+        raise ValueError('Attempted Path Traversal in Tar File')
+    tar.extract(member, dest_dir_path)
+
+
+def _extract_datastack_lazily(datastack_path, dest_dir_path, manifest):
+    """Extract the parameters and the data that can't be read in place.
+
+    The parameters, logfile and rewritten tables are at the start of the
+    archive, and each blob is located with the manifest, so the rasters and
+    vectors that are left in the archive are never decompressed.
+
+    Args:
+        datastack_path (string): path to a datastack archive
+        dest_dir_path (string): absolute path to extract to
+        manifest (dict): the archive's manifest
+
+    Returns:
+        dict mapping the args keys whose data was left in the archive to
+        ``tar://`` paths to their data in the archive
+    """
+    blob_members = {
+        f"data/{blob_id}/{file_info['path']}": blob_id
+        for blob_id, blob in manifest['blobs'].items()
+        for file_info in blob['files']}
+    with open(datastack_path, 'rb') as archive_file:
+        # extract everything before the first blob
+        with gzip.GzipFile(fileobj=archive_file) as stream, \
+                tarfile.open(fileobj=stream, mode='r|') as tar:
+            for member in tar:
+                if member.name in blob_members:
+                    break
+                _extract_member(tar, member, dest_dir_path)
+
+        with open(os.path.join(dest_dir_path, DATASTACK_PARAMETER_FILENAME),
+                  encoding='UTF-8') as parameters_file:
+            parameters = json.load(parameters_file)
+        spatial_types = (spec.SingleBandRasterInput, spec.VectorInput,
+                         spec.RasterOrVectorInput)
+        try:
+            model_spec = models.model_id_to_spec[
+                parameters['model_id'].split('@')[0]]
+        except KeyError:
+            LOGGER.info(f"Unknown model {parameters['model_id']}, extracting "
+                        "all of the data")
+            model_spec = None
+
+        # Data that an arg refers to directly as a raster or vector is left
+        # in the archive, unless it's also referred to from a table or other
+        # file in the data directory, which would need it on disk.
+        referenced_blob_ids = set()
+        for dirpath, _, filenames in os.walk(
+                os.path.join(dest_dir_path, 'data')):
+            for filename in filenames:
+                if filename.endswith('.yml'):
+                    continue  # metadata describes a blob, never refers to one
+                with open(os.path.join(dirpath, filename), 'rb') as file:
+                    text = file.read().decode('utf-8', 'replace')
+                referenced_blob_ids.update(
+                    blob_id for blob_id in manifest['blobs']
+                    if blob_id in text)
+        lazy_args = {}
+        for key, value in parameters['args'].items():
+            if (model_spec is None or not isinstance(value, str) or
+                    value not in blob_members):
+                continue
+            try:
+                input_spec = model_spec.get_input(key)
+            except KeyError:
+                continue
+            if (isinstance(input_spec, spatial_types) and
+                    blob_members[value] not in referenced_blob_ids):
+                lazy_args[key] = value
+        lazy_blob_ids = {blob_members[value] for value in lazy_args.values()}
+
+        for blob_id, blob in manifest['blobs'].items():
+            if blob_id in lazy_blob_ids:
+                continue
+            archive_file.seek(blob['offset'])
+            n_members = len(blob['files'])
+            with gzip.GzipFile(fileobj=archive_file) as stream, \
+                    tarfile.open(fileobj=stream, mode='r|') as tar:
+                # stop before reading into the next blob
+                for _, member in zip(range(n_members), tar):
+                    _extract_member(tar, member, dest_dir_path)
+
+    archive_uri = 'tar://' + os.path.abspath(datastack_path).replace('\\', '/')
+    return {key: f'{archive_uri}!{value}' for key, value in lazy_args.items()}
+
+
 def build_parameter_set(args, model_id, paramset_path, relative=False):
     """Record a parameter set to a file on disk.
 
@@ -1263,7 +1263,7 @@ def validate(args, limit_to=None):
         if missing_sens_header_set:
             validation_warnings.append(
                 (['sensitivity_table_path'],
-                 MISSING_SENSITIVITY_TABLE_THREATS_MSG.format(
+                 gettext(MISSING_SENSITIVITY_TABLE_THREATS_MSG).format(
                     threats=missing_sens_header_set,
                     column_names=sens_header_set)))
 
@@ -1300,14 +1300,14 @@ def validate(args, limit_to=None):
         if bad_threat_paths:
             validation_warnings.append((
                 ['threats_table_path'],
-                MISSING_THREAT_RASTER_MSG.format(threat_list=bad_threat_paths)
+                gettext(MISSING_THREAT_RASTER_MSG).format(threat_list=bad_threat_paths)
             ))
             invalid_keys.add('threats_table_path')
 
         if duplicate_paths:
             validation_warnings.append((
                 ['threats_table_path'],
-                DUPLICATE_PATHS_MSG + str(duplicate_paths)))
+                gettext(DUPLICATE_PATHS_MSG) + str(duplicate_paths)))
             invalid_keys.add('threats_table_path')
 
     return validation_warnings
@@ -0,0 +1,302 @@
+"""Hydrological routing shared by SDR, NDR, Seasonal Water Yield and RouteDEM.
+
+Each of these models fills the pits of a DEM, calculates flow direction and
+flow accumulation from it and, except in some RouteDEM runs, thresholds
+flow accumulation into streams. ``add_routing_tasks`` adds these steps to a
+model's TaskGraph.
+
+The routing of a DEM may also be stored as a product set in a hydrology
+directory, so that a multi-model run on one basin does it once. The
+directory has one folder per DEM, named for a hash of the DEM's contents::
+
+    <hash>/
+        hydrology.json      # the DEM and versions the products were made with
+        filled_dem.tif
+        d8/
+            flow_direction.tif
+            flow_accumulation.tif
+            stream_<threshold>.tif
+        mfd/
+            flow_direction.tif
+            flow_accumulation.tif
+            stream_<threshold>_<trace threshold proportion>.tif
+    digests/                # digests of the DEMs, so each is read once
+
+A model looks up the products for the DEM it routes, which is usually the
+DEM after it was aligned and masked, and copies them into its workspace,
+making the ones that aren't there yet. The hydrology directory is given
+with the hidden ``hydrology_dir`` model argument. If it isn't, but there is
+an intermediate cache (see ``natcap.invest.intermediate_cache``), its
+``hydrology`` folder is used.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import uuid
+
+import natcap.invest
+import pygeoprocessing
+import pygeoprocessing.routing
+
+from . import intermediate_cache
+
+LOGGER = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = 'hydrology.json'
+# each product is made from the one before it
+PRODUCTS = ['filled_dem', 'flow_direction', 'flow_accumulation', 'stream']
+
+_ROUTING_FUNCS = {
+    'd8': {
+        'flow_direction': pygeoprocessing.routing.flow_dir_d8,
+        'flow_accumulation': pygeoprocessing.routing.flow_accumulation_d8,
+    },
+    'mfd': {
+        'flow_direction': pygeoprocessing.routing.flow_dir_mfd,
+        'flow_accumulation': pygeoprocessing.routing.flow_accumulation_mfd,
+    },
+}
+
+
+def get_hydrology_dir(hydrology_dir=None, cache_dir=None):
+    """Get the hydrology directory to use.
+
+    Args:
+        hydrology_dir (string): the hydrology directory given to a model,
+            if any
+        cache_dir (string): the intermediate cache directory given to a
+            model, if any
+
+    Returns:
+        ``hydrology_dir`` if it was given, otherwise the ``hydrology`` folder
+        of the intermediate cache, or ``None`` if there is no cache either.
+    """
+    if hydrology_dir:
+        return hydrology_dir
+    cache_dir = intermediate_cache.get_cache_dir(cache_dir)
+    if cache_dir:
+        return os.path.join(cache_dir, 'hydrology')
+    return None
+
+
+def add_routing_tasks(task_graph, dem_path_band, algorithm, target_paths,
+                      threshold_flow_accumulation=None,
+                      trace_threshold_proportion=1.0, working_dir=None,
+                      hydrology_dir=None, cache_dir=None,
+                      dependent_task_list=None):
+    """Add the tasks that fill pits, route flow and extract streams.
+
+    Args:
+        task_graph (taskgraph.TaskGraph): the graph to add the tasks to
+        dem_path_band (tuple): path to the DEM and the band index to route
+        algorithm (string): flow direction algorithm, ``'d8'`` or ``'mfd'``.
+            May be ``None`` if only ``'filled_dem'`` is in ``target_paths``.
+        target_paths (dict): maps the products to make to their target
+            paths. ``'filled_dem'`` is required. ``'flow_direction'``,
+            ``'flow_accumulation'`` and ``'stream'`` are optional, but each
+            requires the one before it.
+        threshold_flow_accumulation (number): the flow accumulation above
+            which a pixel is a stream. Required if ``'stream'`` is in
+            ``target_paths``.
+        trace_threshold_proportion (float): passed to
+            ``pygeoprocessing.routing.extract_streams_mfd``. Ignored for D8.
+        working_dir (string): directory for temporary files of the routing
+            functions
+        hydrology_dir (string): the hydrology directory given to the model,
+            if any. See ``get_hydrology_dir``.
+        cache_dir (string): the intermediate cache directory given to the
+            model, if any
+        dependent_task_list (list): tasks that must finish before the DEM
+            can be routed
+
+    Returns:
+        dict mapping each key of ``target_paths`` to the task that makes it
+    """
+    algorithm = algorithm.lower() if algorithm else None
+    hydrology_dir = get_hydrology_dir(hydrology_dir, cache_dir)
+    if hydrology_dir:
+        task = task_graph.add_task(
+            func=prepare_routing_products,
+            args=(dem_path_band, algorithm, target_paths, hydrology_dir),
+            kwargs={
+                'threshold_flow_accumulation': threshold_flow_accumulation,
+                'trace_threshold_proportion': trace_threshold_proportion,
+            },
+            target_path_list=list(target_paths.values()),
+            dependent_task_list=dependent_task_list,
+            task_name='route DEM')
+        return {key: task for key in target_paths}
+
+    tasks = {}
+    tasks['filled_dem'] = intermediate_cache.add_task(
+        task_graph, cache_dir,
+        func=pygeoprocessing.routing.fill_pits,
+        args=(dem_path_band, target_paths['filled_dem']),
+        kwargs={'working_dir': working_dir},
+        target_path_list=[target_paths['filled_dem']],
+        dependent_task_list=dependent_task_list,
+        task_name='fill pits')
+    if 'flow_direction' in target_paths:
+        tasks['flow_direction'] = intermediate_cache.add_task(
+            task_graph, cache_dir,
+            func=_ROUTING_FUNCS[algorithm]['flow_direction'],
+            args=((target_paths['filled_dem'], 1),
+                  target_paths['flow_direction']),
+            kwargs={'working_dir': working_dir},
+            target_path_list=[target_paths['flow_direction']],
+            dependent_task_list=[tasks['filled_dem']],
+            task_name=f'flow direction ({algorithm})')
+    if 'flow_accumulation' in target_paths:
+        tasks['flow_accumulation'] = intermediate_cache.add_task(
+            task_graph, cache_dir,
+            func=_ROUTING_FUNCS[algorithm]['flow_accumulation'],
+            args=((target_paths['flow_direction'], 1),
+                  target_paths['flow_accumulation']),
+            target_path_list=[target_paths['flow_accumulation']],
+            dependent_task_list=[tasks['flow_direction']],
+            task_name=f'flow accumulation ({algorithm})')
+    if 'stream' in target_paths:
+        tasks['stream'] = task_graph.add_task(
+            func=extract_streams,
+            args=(target_paths['flow_accumulation'],
+                  target_paths['flow_direction'], algorithm,
+                  threshold_flow_accumulation, target_paths['stream']),
+            kwargs={'trace_threshold_proportion': trace_threshold_proportion},
+            target_path_list=[target_paths['stream']],
+            dependent_task_list=[tasks['flow_accumulation']],
+            task_name=f'extract streams ({algorithm})')
+    return tasks
+
+
+def extract_streams(flow_accumulation_path, flow_direction_path, algorithm,
+                    threshold_flow_accumulation, target_stream_path,
+                    trace_threshold_proportion=1.0):
+    """Threshold flow accumulation into streams.
+
+    Args:
+        flow_accumulation_path (string): path to a flow accumulation raster
+        flow_direction_path (string): path to the flow direction raster that
+            flow accumulation was calculated from
+        algorithm (string): flow direction algorithm, ``'d8'`` or ``'mfd'``
+        threshold_flow_accumulation (number): the flow accumulation above
+            which a pixel is a stream
+        target_stream_path (string): path to write the stream raster to
+        trace_threshold_proportion (float): passed to
+            ``pygeoprocessing.routing.extract_streams_mfd``. Ignored for D8.
+
+    Returns:
+        None
+    """
+    if algorithm == 'mfd':
+        pygeoprocessing.routing.extract_streams_mfd(
+            (flow_accumulation_path, 1), (flow_direction_path, 1),
+            float(threshold_flow_accumulation), target_stream_path,
+            trace_threshold_proportion=trace_threshold_proportion)
+    else:
+        pygeoprocessing.routing.extract_streams_d8(
+            flow_accum_raster_path_band=(flow_accumulation_path, 1),
+            flow_threshold=float(threshold_flow_accumulation),
+            target_stream_raster_path=target_stream_path)
+
+
+def prepare_routing_products(dem_path_band, algorithm, target_paths,
+                             hydrology_dir, threshold_flow_accumulation=None,
+                             trace_threshold_proportion=1.0):
+    """Copy the routing products of a DEM from a hydrology directory.
+
+    Products that aren't in the hydrology directory yet are made there
+    first.
+
+    Args:
+        dem_path_band (tuple): path to the DEM and the band index to route
+        algorithm (string): flow direction algorithm, ``'d8'`` or ``'mfd'``.
+            May be ``None`` if only ``'filled_dem'`` is in ``target_paths``.
+        target_paths (dict): maps the products to copy to their target
+            paths. Keys may be any of ``PRODUCTS``.
+        hydrology_dir (string): path to the hydrology directory
+        threshold_flow_accumulation (number): the flow accumulation above
+            which a pixel is a stream. Required if ``'stream'`` is in
+            ``target_paths``.
+        trace_threshold_proportion (float): passed to
+            ``pygeoprocessing.routing.extract_streams_mfd``. Ignored for D8.
+
+    Returns:
+        None
+    """
+    manifest = {
+        'dem': os.path.abspath(dem_path_band[0]),
+        'dem_digest': intermediate_cache.file_digest(
+            dem_path_band[0], hydrology_dir),
+        'band': dem_path_band[1],
+        'versions': [natcap.invest.__version__, pygeoprocessing.__version__],
+    }
+    key = hashlib.sha256(json.dumps(
+        {k: v for k, v in manifest.items() if k != 'dem'},
+        sort_keys=True).encode('utf-8')).hexdigest()
+    product_dir = os.path.join(hydrology_dir, key)
+    os.makedirs(product_dir, exist_ok=True)
+    manifest_path = os.path.join(product_dir, MANIFEST_FILENAME)
+    if not os.path.exists(manifest_path):
+        temp_path = _temp_path(manifest_path)
+        with open(temp_path, 'w') as file:
+            json.dump(manifest, file, indent=4)
+        os.replace(temp_path, manifest_path)
+
+    product_paths = {'filled_dem': os.path.join(product_dir, 'filled_dem.tif')}
+    if algorithm:
+        product_paths['flow_direction'] = os.path.join(
+            product_dir, algorithm, 'flow_direction.tif')
+        product_paths['flow_accumulation'] = os.path.join(
+            product_dir, algorithm, 'flow_accumulation.tif')
+    if 'stream' in target_paths:
+        # the parameters are written in full so that streams extracted
+        # with different values never share a file
+        stream_filename = f'stream_{float(threshold_flow_accumulation)!r}'
+        if algorithm == 'mfd':
+            stream_filename += f'_{float(trace_threshold_proportion)!r}'
+        product_paths['stream'] = os.path.join(
+            product_dir, algorithm, f'{stream_filename}.tif')
+
+    # Make each missing product, and the ones it's made from, in a
+    # temporary file first, so that other runs never see a partial product.
+    last_index = max(PRODUCTS.index(product) for product in target_paths)
+    for product in PRODUCTS[:last_index + 1]:
+        product_path = product_paths[product]
+        if os.path.exists(product_path):
+            LOGGER.info(f'Using {product_path}')
+            continue
+        LOGGER.info(f'Making {product_path} from {dem_path_band[0]}')
+        os.makedirs(os.path.dirname(product_path), exist_ok=True)
+        temp_path = _temp_path(product_path)
+        if product == 'filled_dem':
+            pygeoprocessing.routing.fill_pits(
+                dem_path_band, temp_path, working_dir=product_dir)
+        elif product == 'flow_direction':
+            _ROUTING_FUNCS[algorithm]['flow_direction'](
+                (product_paths['filled_dem'], 1), temp_path,
+                working_dir=product_dir)
+        elif product == 'flow_accumulation':
+            _ROUTING_FUNCS[algorithm]['flow_accumulation'](
+                (product_paths['flow_direction'], 1), temp_path)
+        else:
+            extract_streams(
+                product_paths['flow_accumulation'],
+                product_paths['flow_direction'], algorithm,
+                threshold_flow_accumulation, temp_path,
+                trace_threshold_proportion=trace_threshold_proportion)
+        os.replace(temp_path, product_path)
+
+    for product, target_path in target_paths.items():
+        os.makedirs(os.path.dirname(os.path.abspath(target_path)),
+                    exist_ok=True)
+        temp_path = _temp_path(target_path)
+        shutil.copyfile(product_paths[product], temp_path)
+        os.replace(temp_path, target_path)
+
+
+def _temp_path(path):
+    """Get a unique path to write to before moving the file to ``path``."""
+    stem, extension = os.path.splitext(path)
+    return f'{stem}.{uuid.uuid4().hex}.tmp{extension}'
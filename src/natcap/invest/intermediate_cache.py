@@ -0,0 +1,299 @@
+"""A cache of intermediate model results that is shared between workspaces.
+
+Each model run has its own TaskGraph database in its workspace, so two runs
+on the same data, such as SDR and NDR on the same watershed or a sweep of
+runs with different ``results_suffix`` values, each calculate the same
+intermediate rasters from scratch. Tasks added with ``add_task`` instead
+look up their results in a cache directory, keyed on the task's function,
+the contents of its input files and its other arguments. If the results
+are there, they're copied to the task's targets. Otherwise the task runs,
+and its results are copied into the cache.
+
+The cache is off unless a directory is given, with the hidden
+``intermediate_cache_dir`` model argument or the
+``NATCAP_INVEST_INTERMEDIATE_CACHE_DIR`` environment variable. Only
+deterministic tasks whose targets are single files, like the filled DEM,
+flow direction and flow accumulation rasters, should be cached. Nothing is
+ever removed from the cache, but the directory may be deleted at any time
+that no model is running.
+"""
+import hashlib
+import inspect
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+
+import natcap.invest
+import pygeoprocessing
+
+LOGGER = logging.getLogger(__name__)
+
+CACHE_DIR_ENV_VARIABLE = 'NATCAP_INVEST_INTERMEDIATE_CACHE_DIR'
+HASH_BLOCK_SIZE = 2**20
+
+# Files that are part of a dataset along with the file that is named
+_SIDECAR_EXTENSIONS = {
+    '.shp': ('.shx', '.dbf', '.prj', '.cpg'),
+}
+# A file modified more recently than this may be modified again without its
+# modification time changing, so digests of it are not recorded.
+_RECENTLY_MODIFIED_NS = 2 * 10**9
+
+
+def get_cache_dir(cache_dir=None):
+    """Get the intermediate cache directory to use.
+
+    Args:
+        cache_dir (string): the cache directory given to a model, if any
+
+    Returns:
+        ``cache_dir`` if it was given, otherwise the value of the
+        ``NATCAP_INVEST_INTERMEDIATE_CACHE_DIR`` environment variable, or
+        ``None`` if that isn't set either, in which case nothing is cached.
+    """
+    return cache_dir or os.environ.get(CACHE_DIR_ENV_VARIABLE) or None
+
+
+def add_task(task_graph, cache_dir, func, args=None, kwargs=None,
+             task_name=None, target_path_list=None, dependent_task_list=None):
+    """Add a task to a TaskGraph, with its results cached between runs.
+
+    Args:
+        task_graph (taskgraph.TaskGraph): the graph to add the task to
+        cache_dir (string): path to the intermediate cache directory. If
+            falsy, the cache directory is looked up with ``get_cache_dir``.
+            If there is none, the task is added as usual.
+        func (callable): the function to run. It must be deterministic and
+            must not write any files but the ones in ``target_path_list``.
+        args (list): positional arguments to ``func``
+        kwargs (dict): keyword arguments to ``func``
+        task_name (string): name of the task
+        target_path_list (list): paths to the files that ``func`` creates
+        dependent_task_list (list): tasks that must finish before this one
+
+    Returns:
+        the ``taskgraph.Task`` that was added
+    """
+    cache_dir = get_cache_dir(cache_dir)
+    if not cache_dir:
+        return task_graph.add_task(
+            func=func, args=args, kwargs=kwargs, task_name=task_name,
+            target_path_list=target_path_list,
+            dependent_task_list=dependent_task_list)
+    return task_graph.add_task(
+        func=_cached_call,
+        args=(cache_dir, func, args or [], kwargs or {},
+              target_path_list or []),
+        task_name=task_name,
+        target_path_list=target_path_list,
+        dependent_task_list=dependent_task_list)
+
+
+def _cached_call(cache_dir, func, args, kwargs, target_path_list):
+    """Copy the results of a call from the cache, or call it and cache them.
+
+    Args:
+        cache_dir (string): path to the intermediate cache directory
+        func (callable): the function to call
+        args (list): positional arguments to ``func``
+        kwargs (dict): keyword arguments to ``func``
+        target_path_list (list): paths to the files that ``func`` creates
+
+    Returns:
+        None
+    """
+    target_path_list = [os.path.abspath(path) for path in target_path_list]
+    description = {
+        'function': _function_id(func),
+        'versions': [natcap.invest.__version__, pygeoprocessing.__version__],
+        'args': _describe(args, target_path_list, cache_dir),
+        'kwargs': _describe(kwargs, target_path_list, cache_dir),
+    }
+    key = hashlib.sha256(
+        json.dumps(description, sort_keys=True).encode('utf-8')).hexdigest()
+    entry_dir = os.path.join(cache_dir, 'entries', key[:2], key)
+    entry_paths = [
+        os.path.join(entry_dir, f'{index}{os.path.splitext(path)[1]}')
+        for index, path in enumerate(target_path_list)]
+
+    if all(os.path.exists(path) for path in entry_paths):
+        LOGGER.info(
+            f'Copying results of {description["function"]} from the '
+            f'intermediate cache {entry_dir}')
+        for entry_path, target_path in zip(entry_paths, target_path_list):
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            # copy to a temporary file first, so that an interrupted copy
+            # is never mistaken for a result
+            temp_path = f'{target_path}.{uuid.uuid4().hex}.tmp'
+            shutil.copyfile(entry_path, temp_path)
+            os.replace(temp_path, target_path)
+    else:
+        func(*args, **kwargs)
+        temp_dir = os.path.join(cache_dir, 'tmp', uuid.uuid4().hex)
+        os.makedirs(temp_dir)
+        for entry_path, target_path in zip(entry_paths, target_path_list):
+            shutil.copyfile(target_path, os.path.join(
+                temp_dir, os.path.basename(entry_path)))
+        with open(os.path.join(temp_dir, 'description.json'), 'w') as file:
+            json.dump(description, file, indent=4)
+        os.makedirs(os.path.dirname(entry_dir), exist_ok=True)
+        try:
+            os.rename(temp_dir, entry_dir)
+        except OSError:
+            # another run cached the same results first
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    # Identify the targets by the key of the call that created them, so
+    # that the tasks that use them don't have to hash their contents. The
+    # targets were just written, so these are recorded apart from the
+    # digests of contents, which aren't recorded for new files.
+    for index, target_path in enumerate(target_path_list):
+        target_id, _ = _file_id(target_path)
+        _record_file_digest(
+            _record_path(cache_dir, 'targets', target_id),
+            hashlib.sha256(f'{key}:{index}'.encode('utf-8')).hexdigest())
+
+
+def _function_id(func):
+    """Identify a function by its name and, if available, its source code."""
+    name = (f'{getattr(func, "__module__", None)}.'
+            f'{getattr(func, "__qualname__", repr(func))}')
+    try:
+        source = inspect.getsource(func)
+    except (OSError, TypeError):
+        # e.g. a compiled function
+        return name
+    return f'{name}:{hashlib.sha256(source.encode("utf-8")).hexdigest()}'
+
+
+def _describe(value, target_path_list, cache_dir):
+    """Describe an argument of a cached call as JSON-serializable data.
+
+    Files are described by their contents, and targets by their position in
+    the list of targets, so that the description of a call doesn't depend
+    on where the call's workspace is. Directories, like working directories,
+    are left out, since they shouldn't change the results.
+
+    Args:
+        value: the argument to describe
+        target_path_list (list): absolute paths to the call's targets
+        cache_dir (string): path to the intermediate cache directory
+
+    Returns:
+        a description of ``value``
+    """
+    if isinstance(value, str):
+        path = os.path.abspath(value)
+        if path in target_path_list:
+            return ['target', target_path_list.index(path)]
+        if os.path.isfile(value):
+            return ['file', file_digest(value, cache_dir)]
+        if os.path.isdir(value):
+            return ['directory']
+        return value
+    if isinstance(value, (list, tuple)):
+        return [_describe(item, target_path_list, cache_dir)
+                for item in value]
+    if isinstance(value, dict):
+        return {str(key): _describe(item, target_path_list, cache_dir)
+                for key, item in value.items()}
+    if callable(value):
+        return ['function', _function_id(value)]
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    return repr(value)
+
+
+def _dataset_paths(filepath):
+    """Get the paths to a file and its sidecar files that exist."""
+    stem, extension = os.path.splitext(filepath)
+    return [filepath] + [
+        stem + sidecar_extension for sidecar_extension
+        in _SIDECAR_EXTENSIONS.get(extension.lower(), ())
+        if os.path.exists(stem + sidecar_extension)]
+
+
+def _file_id(filepath):
+    """Identify a file as it is now.
+
+    Args:
+        filepath (string): path to the file
+
+    Returns:
+        a ``(file_id, mtime_ns)`` tuple, where ``file_id`` is a string of the
+        path, size and modification time of the file and its sidecar files,
+        and ``mtime_ns`` is the latest modification time of them.
+    """
+    file_id = os.path.abspath(filepath)
+    mtime_ns = 0
+    for path in _dataset_paths(filepath):
+        stat_result = os.stat(path)
+        file_id += f':{stat_result.st_size}:{stat_result.st_mtime_ns}'
+        mtime_ns = max(mtime_ns, stat_result.st_mtime_ns)
+    return file_id, mtime_ns
+
+
+def _record_path(cache_dir, record_type, file_id):
+    """Get the path to a record about a file in the cache directory."""
+    return os.path.join(
+        cache_dir, record_type,
+        hashlib.sha256(file_id.encode('utf-8')).hexdigest())
+
+
+def _record_file_digest(record_path, digest):
+    """Record the digest that identifies a file, until it is modified."""
+    os.makedirs(os.path.dirname(record_path), exist_ok=True)
+    temp_path = f'{record_path}.{uuid.uuid4().hex}.tmp'
+    with open(temp_path, 'w') as file:
+        file.write(digest)
+    os.replace(temp_path, record_path)
+
+
+def file_digest(filepath, cache_dir):
+    """Get a digest of the contents of a file and its sidecar files.
+
+    Digests are recorded in the cache directory, keyed on the path, size
+    and modification time of the file and its sidecar files, so a file is
+    only read once. Files modified in the last couple of seconds are read
+    each time, since they may change again within the resolution of the
+    modification time. A target of a cached call is instead identified by
+    the key of the call, which is recorded however recently it was written.
+
+    Args:
+        filepath (string): path to the file
+        cache_dir (string): path to the intermediate cache directory, or
+            another directory to record digests in
+
+    Returns:
+        the hex digest of the file
+    """
+    file_id, mtime_ns = _file_id(filepath)
+    try:
+        with open(_record_path(cache_dir, 'targets', file_id)) as file:
+            return file.read()
+    except FileNotFoundError:
+        pass
+
+    if time.time_ns() - mtime_ns < _RECENTLY_MODIFIED_NS:
+        record_path = None
+    else:
+        record_path = _record_path(cache_dir, 'digests', file_id)
+        try:
+            with open(record_path) as file:
+                return file.read()
+        except FileNotFoundError:
+            pass
+
+    sha256 = hashlib.sha256()
+    for path in _dataset_paths(filepath):
+        sha256.update(os.path.splitext(path)[1].encode('utf-8'))
+        with open(path, 'rb') as file:
+            for block in iter(lambda: file.read(HASH_BLOCK_SIZE), b''):
+                sha256.update(block)
+    digest = sha256.hexdigest()
+    if record_path is not None:
+        _record_file_digest(record_path, digest)
+    return digest
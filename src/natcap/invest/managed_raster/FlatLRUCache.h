@@ -0,0 +1,186 @@
+#ifndef __FLATLRUCACHE_H_INCLUDED__
+#define __FLATLRUCACHE_H_INCLUDED__
+
+#include <list>
+#include <utility>
+#include <vector>
+
+using namespace std;
+
+// A least recently used cache for keys that are small non-negative integers,
+// such as the flat index of a block in a raster.
+//
+// Unlike LRUCache, which pairs a std::map with a std::list, every operation
+// here is O(1) and allocation-free: the slot holding each key is found by
+// indexing a flat array with the key, and the recency order is a doubly
+// linked list threaded through the slot arrays by index.
+template <class VAL_T> class FlatLRUCache {
+ private:
+  // slot_of_key[key] is the slot holding `key`, or -1 if it isn't cached
+  vector<int> slot_of_key;
+  // per-slot storage. prev/next link the slots from the most recently used
+  // (head) to the least recently used (tail)
+  vector<int> slot_key;
+  vector<VAL_T> slot_val;
+  vector<int> slot_prev;
+  vector<int> slot_next;
+  // slots that were used and then evicted, ready to be reused
+  vector<int> free_slots;
+  int head;
+  int tail;
+  size_t n_items;
+  size_t cache_size;
+
+ public:
+  // The most recently used key and its value, kept in public members so
+  // that callers can check for a repeated access to the same key inline,
+  // before calling `find`. `last_key` is -1 when the cache is empty.
+  int last_key;
+  VAL_T last_val;
+
+  // Access counters, for tuning the cache size. A hit is an access to a
+  // key that was already cached, a miss is a `put` of a new key.
+  unsigned long long hits;
+  unsigned long long misses;
+  unsigned long long evictions;
+
+ private:
+
+  void unlink(int slot) {
+    if (slot_prev[slot] != -1) {
+      slot_next[slot_prev[slot]] = slot_next[slot];
+    } else {
+      head = slot_next[slot];
+    }
+    if (slot_next[slot] != -1) {
+      slot_prev[slot_next[slot]] = slot_prev[slot];
+    } else {
+      tail = slot_prev[slot];
+    }
+  }
+
+  void push_front(int slot) {
+    slot_prev[slot] = -1;
+    slot_next[slot] = head;
+    if (head != -1) {
+      slot_prev[head] = slot;
+    }
+    head = slot;
+    if (tail == -1) {
+      tail = slot;
+    }
+  }
+
+  void clean(list<pair<int, VAL_T>> &removed_value_list) {
+    while (n_items > cache_size) {
+      int slot = tail;
+      removed_value_list.push_back(make_pair(slot_key[slot], slot_val[slot]));
+      unlink(slot);
+      slot_of_key[slot_key[slot]] = -1;
+      free_slots.push_back(slot);
+      n_items--;
+      evictions++;
+    }
+    if (head == -1) {
+      last_key = -1;
+    }
+  }
+
+ public:
+  FlatLRUCache() {}
+
+  // Args:
+  //   n_keys: keys must be in the range [0, n_keys)
+  //   cache_size_: the maximum number of items to hold
+  FlatLRUCache(int n_keys, int cache_size_)
+    : slot_of_key(n_keys, -1)
+    , head(-1)
+    , tail(-1)
+    , n_items(0)
+    , cache_size(cache_size_)
+    , last_key(-1)
+    , hits(0)
+    , misses(0)
+    , evictions(0) {}
+
+  // Change the maximum number of items held by the cache. Items beyond the
+  // new size are evicted, least recently used first, on the next `put`.
+  void set_cache_size(size_t cache_size_) {
+    cache_size = cache_size_;
+  }
+
+  size_t size() {
+    return n_items;
+  }
+
+  // Insert a new key-value pair into the cache as the most recently used
+  // item. Any items evicted to make room are appended to
+  // `removed_value_list`.
+  void put(
+      const int &key, const VAL_T &val,
+      list<pair<int, VAL_T>> &removed_value_list) {
+    int slot = slot_of_key[key];
+    if (slot != -1) {
+      unlink(slot);
+    } else {
+      misses++;
+      n_items++;
+      if (not free_slots.empty()) {
+        slot = free_slots.back();
+        free_slots.pop_back();
+      } else {
+        slot = static_cast<int>(slot_key.size());
+        slot_key.push_back(key);
+        slot_val.push_back(val);
+        slot_prev.push_back(-1);
+        slot_next.push_back(-1);
+      }
+    }
+    slot_key[slot] = key;
+    slot_val[slot] = val;
+    slot_of_key[key] = slot;
+    push_front(slot);
+    last_key = key;
+    last_val = val;
+    return clean(removed_value_list);
+  }
+
+  // Return whether a key exists in the cache.
+  bool exist(const int &key) {
+    return slot_of_key[key] != -1;
+  }
+
+  // Return a pointer to the cached value associated with a key and mark it
+  // most recently used, or nullptr if the key isn't cached. This is the
+  // single-lookup equivalent of `exist` followed by `get`.
+  VAL_T* find(const int &key) {
+    int slot = slot_of_key[key];
+    if (slot == -1) {
+      return nullptr;
+    }
+    hits++;
+    if (slot != head) {
+      unlink(slot);
+      push_front(slot);
+      last_key = key;
+      last_val = slot_val[slot];
+    }
+    return &slot_val[slot];
+  }
+
+  // Return the cached value associated with a key. The key must exist.
+  VAL_T& get(const int &key) {
+    return *find(key);
+  }
+
+  // Return all cached key-value pairs, most recently used first.
+  vector<pair<int, VAL_T>> items() {
+    vector<pair<int, VAL_T>> result;
+    result.reserve(n_items);
+    for (int slot = head; slot != -1; slot = slot_next[slot]) {
+      result.push_back(make_pair(slot_key[slot], slot_val[slot]));
+    }
+    return result;
+  }
+};
+#endif
@@ -35,6 +35,12 @@ template <class KEY_T, class VAL_T,
       ;
   };
 
+  // Change the maximum number of items held by the cache. Items beyond the
+  // new size are evicted, least recently used first, on the next `put`.
+  void set_cache_size(size_t cache_size_) {
+    cache_size = cache_size_;
+  }
+
   ListIter begin() {
     return item_list.begin();
   }
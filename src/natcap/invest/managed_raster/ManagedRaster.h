@@ -5,12 +5,38 @@
 #include "gdal_priv.h"
 #include <Python.h>
 
+#include <algorithm>
+#include <atomic>
+#include <bit>
+#include <condition_variable>
+#include <cstdlib>
+#include <cmath>
+#include <deque>
 #include <iostream>
+#include <limits>
+#include <mutex>
 #include <string>
-
-#include "LRUCache.h"
-
-int MANAGED_RASTER_N_BLOCKS = static_cast<int>(pow(2, 6));
+#include <thread>
+
+#include "FlatLRUCache.h"
+
+// Default number of bytes of block cache shared by all of the ManagedRasters
+// open in a process. Can be overridden with the environment variable named
+// below, or at runtime with natcap.invest.managed_raster.cache.
+long long MANAGED_RASTER_DEFAULT_CACHE_BYTES = 2LL << 30;  // 2 GiB
+const char* MANAGED_RASTER_CACHE_BYTES_ENV = "NATCAP_INVEST_CACHE_BUDGET_BYTES";
+// Each raster keeps at least this many blocks in its cache, however small
+// its share of the budget, so that a 3x3 pixel neighborhood straddling
+// block corners never thrashes.
+int MANAGED_RASTER_MIN_BLOCKS = 16;
+// If this environment variable is set to anything but 0, each ManagedRaster
+// reads ahead and writes behind on a background thread. See BlockIOWorker.
+const char* MANAGED_RASTER_ASYNC_IO_ENV = "NATCAP_INVEST_ASYNC_IO";
+// The most blocks a BlockIOWorker holds read ahead of use, and the most
+// evicted blocks it holds waiting to be written, per raster. Enough for a
+// block of seed pixels and its eight neighboring blocks, twice over.
+int MANAGED_RASTER_MAX_PREFETCH_BLOCKS = 18;
+int MANAGED_RASTER_MAX_PENDING_WRITES = 18;
 // given the pixel neighbor numbering system
 //  3 2 1
 //  4 x 0
@@ -25,7 +51,45 @@ int FLOW_DIR_REVERSE_DIRECTION[8] = {4, 5, 6, 7, 0, 1, 2, 3};
 // is the original pixel `x`
 int INFLOW_OFFSETS[8] = {4, 5, 6, 7, 0, 1, 2, 3};
 
-typedef std::pair<int, double*> BlockBufferPair;
+typedef std::pair<int, void*> BlockBufferPair;
+
+// Returns the type in which a ManagedRaster holds the blocks of `band` in
+// its cache. Rasters keep the band's own type, so that a byte mask takes an
+// eighth of the memory of a float64 block, and so that a value set by a
+// kernel reads back the same whether or not its block was written out and
+// read in again in between. Bands of a type that a double can't hold
+// exactly use float64.
+GDALDataType managed_raster_block_type(GDALRasterBand* band) {
+  GDALDataType band_type = band->GetRasterDataType();
+  switch (band_type) {
+    case GDT_Byte:
+    case GDT_UInt16:
+    case GDT_Int16:
+    case GDT_UInt32:
+    case GDT_Int32:
+    case GDT_Float32:
+      return band_type;
+    default:
+      return GDT_Float64;
+  }
+}
+
+// Converts `value` to the integer type T the way GDAL does when writing
+// a double to an integer band: rounded to the nearest integer and clamped
+// to the range of T, with NaN becoming 0.
+template <typename T>
+inline T round_and_clamp(double value) {
+  if (std::isnan(value)) {
+    return 0;
+  }
+  if (value <= static_cast<double>(std::numeric_limits<T>::min())) {
+    return std::numeric_limits<T>::min();
+  }
+  if (value >= static_cast<double>(std::numeric_limits<T>::max())) {
+    return std::numeric_limits<T>::max();
+  }
+  return static_cast<T>(std::round(value));
+}
 
 class D8 {};
 class MFD {};
@@ -73,6 +137,320 @@ static void log_msg(LogLevel level, string msg)
   Py_DECREF(pyString);
 }
 
+// Block cache budget and statistics shared by every ManagedRaster in the
+// process. Each open raster may cache an equal share of `budget_bytes`.
+// The hit/miss/eviction counters are accumulated from each raster when it
+// is closed. Rasters opened while `async_io` is set do their block I/O on
+// a background thread.
+class BlockCacheState {
+public:
+  std::atomic<long long> budget_bytes;
+  std::atomic<bool> async_io;
+  std::atomic<long> n_open_rasters;
+  std::atomic<unsigned long long> hits;
+  std::atomic<unsigned long long> misses;
+  std::atomic<unsigned long long> evictions;
+  std::atomic<unsigned long long> prefetch_hits;
+  std::atomic<unsigned long long> deferred_writes;
+
+  long long get_budget_bytes() { return budget_bytes; }
+  void set_budget_bytes(long long n_bytes) { budget_bytes = n_bytes; }
+  long get_n_open_rasters() { return n_open_rasters; }
+  unsigned long long get_hits() { return hits; }
+  unsigned long long get_misses() { return misses; }
+  unsigned long long get_evictions() { return evictions; }
+  bool get_async_io() { return async_io; }
+  void set_async_io(bool enabled) { async_io = enabled; }
+  unsigned long long get_prefetch_hits() { return prefetch_hits; }
+  unsigned long long get_deferred_writes() { return deferred_writes; }
+
+  void reset_stats() {
+    hits = 0;
+    misses = 0;
+    evictions = 0;
+    prefetch_hits = 0;
+    deferred_writes = 0;
+  }
+};
+
+// Returns the BlockCacheState instance compiled into this extension module,
+// initializing the budget from the environment on first use.
+static BlockCacheState* _local_block_cache_state() {
+  static BlockCacheState state;
+  static bool initialized = false;
+  if (not initialized) {
+    initialized = true;
+    long long budget = MANAGED_RASTER_DEFAULT_CACHE_BYTES;
+    const char* env_budget = getenv(MANAGED_RASTER_CACHE_BYTES_ENV);
+    if (env_budget != NULL and atoll(env_budget) > 0) {
+      budget = atoll(env_budget);
+    }
+    state.budget_bytes = budget;
+    const char* env_async_io = getenv(MANAGED_RASTER_ASYNC_IO_ENV);
+    state.async_io = (env_async_io != NULL and env_async_io[0] != '\0' and
+                      string(env_async_io) != "0");
+    state.n_open_rasters = 0;
+    state.reset_stats();
+  }
+  return &state;
+}
+
+// Returns the process-wide BlockCacheState.
+//
+// Every extension module that includes this header gets its own copy of
+// the globals above, so the shared instance is owned by the
+// natcap.invest.managed_raster.cache module and looked up through a
+// capsule. If that module can't be imported, fall back to the state local
+// to this extension module.
+static BlockCacheState* get_block_cache_state() {
+  static BlockCacheState* state = NULL;
+  if (state == NULL) {
+    state = (BlockCacheState*) PyCapsule_Import(
+      "natcap.invest.managed_raster.cache._block_cache_state", 0);
+    if (state == NULL) {
+      PyErr_Clear();
+      state = _local_block_cache_state();
+    }
+  }
+  return state;
+}
+
+// The window of a raster covered by one block, clipped to the raster.
+struct BlockWindow {
+  int xoff;
+  int yoff;
+  int win_xsize;
+  int win_ysize;
+};
+
+// Reads or writes `buffer` from or to a window of `n_bands` bands of
+// `dataset`, starting from `band`, which is band number `band_id`. A single
+// band is held as a row-major array of pixels; several bands are held
+// pixel-interleaved, with the values of all bands of a pixel next to each
+// other in band order.
+CPLErr block_raster_io(
+    GDALDataset* dataset, GDALRasterBand* band, int band_id, int n_bands,
+    GDALRWFlag rw_flag, BlockWindow window, void* buffer,
+    GDALDataType block_type) {
+  if (n_bands == 1) {
+    return band->RasterIO(
+      rw_flag, window.xoff, window.yoff, window.win_xsize, window.win_ysize,
+      buffer, window.win_xsize, window.win_ysize, block_type, 0, 0);
+  }
+  vector<int> band_map(n_bands);
+  for (int i = 0; i < n_bands; i++) {
+    band_map[i] = band_id + i;
+  }
+  long long pixel_space = static_cast<long long>(
+    GDALGetDataTypeSizeBytes(block_type)) * n_bands;
+  return dataset->RasterIO(
+    rw_flag, window.xoff, window.yoff, window.win_xsize, window.win_ysize,
+    buffer, window.win_xsize, window.win_ysize, block_type, n_bands,
+    band_map.data(), pixel_space, pixel_space * window.win_xsize,
+    GDALGetDataTypeSizeBytes(block_type), nullptr);
+}
+
+// Reads blocks ahead of use and writes evicted blocks behind on a
+// background thread, for the bands of a ManagedRaster, so that disk latency
+// overlaps with the routing kernel's computation.
+//
+// GDAL datasets are not safe to use from two threads at once, so every
+// RasterIO call on the band, from the kernel's thread or the worker's, is
+// made while holding `io_mutex`. The kernel's thread hands work to the
+// worker with `request_read` and `queue_write`, and before reading a block
+// itself it must `take` the block from the worker, which returns a buffer
+// read ahead or still waiting to be written if there is one.
+class BlockIOWorker {
+public:
+  std::mutex io_mutex;
+
+  // Args:
+  //   dataset, band, band_id, n_bands: the bands to read and write, see
+  //     block_raster_io. Only used while holding io_mutex.
+  //   block_type: the type of the block buffers, see ManagedRaster
+  //   block_bytes: the size of a full block buffer
+  BlockIOWorker(GDALDataset* dataset, GDALRasterBand* band, int band_id,
+                int n_bands, GDALDataType block_type, long block_bytes)
+    : dataset(dataset)
+    , band(band)
+    , band_id(band_id)
+    , n_bands(n_bands)
+    , block_type(block_type)
+    , block_bytes(block_bytes)
+    , in_flight_block(-1)
+    , stopping(false)
+  {
+    thread = std::thread(&BlockIOWorker::run, this);
+  }
+
+  // Queues a read of a block that the caller doesn't have cached. Does
+  // nothing if the block is already read ahead, queued or waiting to be
+  // written, or if as many reads as may be are already queued.
+  void request_read(int block_index, BlockWindow window) {
+    std::lock_guard<std::mutex> lock(mutex);
+    if (block_index == in_flight_block or _find_ready(block_index) != ready.end()) {
+      return;
+    }
+    int n_reads = 0;
+    for (auto& job: jobs) {
+      if (job.block_index == block_index) {
+        return;
+      }
+      n_reads += (job.buffer == nullptr);
+    }
+    if (n_reads >= MANAGED_RASTER_MAX_PREFETCH_BLOCKS) {
+      return;
+    }
+    jobs.push_back(Job{block_index, window, nullptr});
+    work_available.notify_one();
+  }
+
+  // Queues a write of an evicted dirty block, taking ownership of its
+  // buffer. Returns false, without taking the buffer, if too many writes
+  // are already waiting, in which case the caller should write it itself.
+  bool queue_write(int block_index, BlockWindow window, void* buffer) {
+    std::lock_guard<std::mutex> lock(mutex);
+    if (n_pending_writes >= MANAGED_RASTER_MAX_PENDING_WRITES) {
+      return false;
+    }
+    n_pending_writes++;
+    jobs.push_back(Job{block_index, window, buffer});
+    work_available.notify_one();
+    return true;
+  }
+
+  // Returns the buffer of a block that was read ahead or is waiting to be
+  // written, handing ownership of it to the caller, or nullptr if the
+  // caller must read the block itself. `dirty` is set if the buffer holds
+  // changes that have not been written yet. Any queued read of the block
+  // is cancelled, and any read or write of it in progress is waited for.
+  void* take(int block_index, bool& dirty) {
+    std::unique_lock<std::mutex> lock(mutex);
+    job_done.wait(lock, [&]{ return in_flight_block != block_index; });
+    dirty = false;
+    auto ready_itr = _find_ready(block_index);
+    if (ready_itr != ready.end()) {
+      void* buffer = ready_itr->second;
+      ready.erase(ready_itr);
+      return buffer;
+    }
+    for (auto job_itr = jobs.begin(); job_itr != jobs.end(); job_itr++) {
+      if (job_itr->block_index == block_index) {
+        void* buffer = job_itr->buffer;
+        if (buffer != nullptr) {
+          dirty = true;
+          n_pending_writes--;
+        }
+        jobs.erase(job_itr);
+        return buffer;
+      }
+    }
+    return nullptr;
+  }
+
+  // Finishes all queued writes, stops the thread and frees any blocks
+  // that were read ahead and never used.
+  void stop() {
+    {
+      std::lock_guard<std::mutex> lock(mutex);
+      stopping = true;
+    }
+    work_available.notify_one();
+    thread.join();
+    for (auto& item: ready) {
+      CPLFree(item.second);
+    }
+    ready.clear();
+  }
+
+private:
+  // A read if `buffer` is nullptr, otherwise a write of `buffer`
+  struct Job {
+    int block_index;
+    BlockWindow window;
+    void* buffer;
+  };
+
+  GDALDataset* dataset;
+  GDALRasterBand* band;
+  int band_id;
+  int n_bands;
+  GDALDataType block_type;
+  long block_bytes;
+  std::thread thread;
+  std::mutex mutex;
+  std::condition_variable work_available;
+  std::condition_variable job_done;
+  std::deque<Job> jobs;
+  std::deque<BlockBufferPair> ready;
+  int n_pending_writes = 0;
+  int in_flight_block;
+  bool stopping;
+
+  std::deque<BlockBufferPair>::iterator _find_ready(int block_index) {
+    return std::find_if(ready.begin(), ready.end(), [&](BlockBufferPair& item) {
+      return item.first == block_index;
+    });
+  }
+
+  void run() {
+    std::unique_lock<std::mutex> lock(mutex);
+    while (true) {
+      work_available.wait(lock, [&]{ return stopping or not jobs.empty(); });
+      if (jobs.empty()) {
+        return;
+      }
+      Job job = jobs.front();
+      jobs.pop_front();
+      // reads are only worth finishing while the kernel is running
+      if (stopping and job.buffer == nullptr) {
+        continue;
+      }
+      in_flight_block = job.block_index;
+      lock.unlock();
+
+      CPLErr err;
+      void* buffer = job.buffer;
+      {
+        std::lock_guard<std::mutex> io_lock(io_mutex);
+        if (job.buffer == nullptr) {
+          buffer = CPLMalloc(block_bytes);
+          err = block_raster_io(
+            dataset, band, band_id, n_bands, GF_Read, job.window, buffer,
+            block_type);
+        } else {
+          err = block_raster_io(
+            dataset, band, band_id, n_bands, GF_Write, job.window, buffer,
+            block_type);
+        }
+      }
+
+      lock.lock();
+      if (job.buffer == nullptr) {
+        if (err != CE_None) {
+          std::cerr << "Error reading block\n";
+          CPLFree(buffer);
+        } else {
+          ready.push_back(BlockBufferPair(job.block_index, buffer));
+          // drop the oldest blocks read ahead if the kernel never used them
+          while (ready.size() > static_cast<size_t>(MANAGED_RASTER_MAX_PREFETCH_BLOCKS)) {
+            CPLFree(ready.front().second);
+            ready.pop_front();
+          }
+        }
+      } else {
+        if (err != CE_None) {
+          std::cerr << "Error writing block\n";
+        }
+        CPLFree(buffer);
+        n_pending_writes--;
+      }
+      in_flight_block = -1;
+      job_done.notify_all();
+    }
+  }
+};
+
 class NeighborTuple {
 public:
   int direction, x, y;
@@ -91,8 +469,11 @@ public:
 
 class ManagedRaster {
   public:
-    LRUCache<int, double*>* lru_cache;
+    FlatLRUCache<void*>* lru_cache;
     std::set<int> dirty_blocks;
+    // the most recent block known to be in `dirty_blocks`, so that repeated
+    // writes to one block skip the set lookup
+    int last_dirty_block;
     int* actualBlockWidths;
     int block_xsize;
     int block_ysize;
@@ -106,6 +487,8 @@ class ManagedRaster {
     int block_ny;
     char* raster_path;
     int band_id;
+    // the number of bands cached together, from `band_id` on
+    int n_bands;
     GDALDataset* dataset;
     GDALRasterBand* band;
     int write_mode;
@@ -113,6 +496,13 @@ class ManagedRaster {
     double nodata;
     double* geotransform;
     int hasNodata;
+    BlockCacheState* cache_state;
+    // the type of the block buffers in the cache; see
+    // managed_raster_block_type
+    GDALDataType block_type;
+    long block_bytes;
+    // reads ahead and writes behind, if async I/O is on; otherwise nullptr
+    BlockIOWorker* io_worker;
 
     ManagedRaster() { }
 
@@ -128,8 +518,21 @@ class ManagedRaster {
     //     memory blocks will be written back to the raster as blocks
     //     are swapped out of the cache or when the object deconstructs.
     ManagedRaster(char* raster_path, int band_id, bool write_mode)
+      : ManagedRaster(raster_path, band_id, write_mode, 1) {}
+
+    // Creates a ManagedRaster of `n_bands` bands of a raster, from
+    // `band_id` on, cached together so that all of the bands of a pixel
+    // are read with one block lookup. Blocks hold the bands
+    // pixel-interleaved, so the raster should be created with
+    // INTERLEAVE=PIXEL for each block to be read from one place on disk.
+    // Every band is cached in the type of band `band_id`, so they should
+    // all have the same type. Use `get_bands` to read the
+    // pixels of a raster of more than one band; `get` and `set` only work
+    // with a single band.
+    ManagedRaster(char* raster_path, int band_id, bool write_mode, int n_bands)
       : raster_path { raster_path }
       , band_id { band_id }
+      , n_bands { n_bands }
       , write_mode { write_mode }
     {
       GDALAllRegister();
@@ -139,7 +542,8 @@ class ManagedRaster {
       raster_x_size = dataset->GetRasterXSize();
       raster_y_size = dataset->GetRasterYSize();
 
-      if (band_id < 1 or band_id > dataset->GetRasterCount()) {
+      if (band_id < 1 or n_bands < 1 or
+          band_id + n_bands - 1 > dataset->GetRasterCount()) {
         throw std::invalid_argument(
           "Error: band ID is not a valid band number. "
           "This error is happening in the ManagedRaster.h extension.");
@@ -180,131 +584,298 @@ class ManagedRaster {
         }
       }
 
-      lru_cache = new LRUCache<int, double*>(MANAGED_RASTER_N_BLOCKS);
+      block_type = managed_raster_block_type(band);
+      block_bytes = static_cast<long>(GDALGetDataTypeSizeBytes(block_type)) *
+        block_xsize * block_ysize * n_bands;
+      cache_state = get_block_cache_state();
+      cache_state->n_open_rasters++;
+
+      lru_cache = new FlatLRUCache<void*>(block_nx * block_ny, cache_capacity());
+      last_dirty_block = -1;
+      io_worker = nullptr;
+      if (cache_state->async_io) {
+        io_worker = new BlockIOWorker(
+          dataset, band, band_id, n_bands, block_type, block_bytes);
+      }
       closed = 0;
     }
 
+    // Returns the number of blocks this raster may hold in its cache: an
+    // equal share of the process-wide budget among all open rasters, no
+    // smaller than MANAGED_RASTER_MIN_BLOCKS and no larger than the raster.
+    int cache_capacity() {
+      long n_open = std::max(cache_state->get_n_open_rasters(), 1L);
+      long long n_blocks = cache_state->get_budget_bytes() / n_open / block_bytes;
+      n_blocks = std::min(n_blocks, static_cast<long long>(block_nx) * block_ny);
+      return static_cast<int>(
+        std::max(n_blocks, static_cast<long long>(MANAGED_RASTER_MIN_BLOCKS)));
+    }
+
+    // Returns the buffer of the block at `block_index`, loading it into the
+    // cache if needed.
+    inline void* _get_block(int block_index) {
+      // Neighboring pixels are usually in the same block as the last
+      // access, which is always the most recently used block in the cache.
+      // The cache is shared with any copies of this object, so the check
+      // goes through it rather than through a member of this object.
+      if (lru_cache->last_key == block_index) {
+        lru_cache->hits++;
+        return lru_cache->last_val;
+      }
+      void** cached_block = lru_cache->find(block_index);
+      if (cached_block != nullptr) {
+        return *cached_block;
+      }
+      _load_block(block_index);
+      return lru_cache->last_val;
+    }
+
     // Sets the pixel at `xi,yi` to `value`
     void inline set(long xi, long yi, double value) {
-      int block_xi = xi / block_xsize;
-      int block_yi = yi / block_ysize;
+      int block_xi = xi >> block_xbits;
+      int block_yi = yi >> block_ybits;
 
       // this is the flat index for the block
       int block_index = block_yi * block_nx + block_xi;
-
-      if (not lru_cache->exist(block_index)) {
-        _load_block(block_index);
-      }
+      void* block = _get_block(block_index);
 
       int idx = ((yi & block_ymod) * actualBlockWidths[block_index]) + (xi & block_xmod);
-      lru_cache->get(block_index)[idx] = value;
-      if (write_mode) {
-        std::set<int>::iterator dirty_itr = dirty_blocks.find(block_index);
-        if (dirty_itr == dirty_blocks.end()) {
-          dirty_blocks.insert(block_index);
-        }
+      switch (block_type) {
+        case GDT_Byte:
+          static_cast<GByte*>(block)[idx] = round_and_clamp<GByte>(value);
+          break;
+        case GDT_UInt16:
+          static_cast<GUInt16*>(block)[idx] = round_and_clamp<GUInt16>(value);
+          break;
+        case GDT_Int16:
+          static_cast<GInt16*>(block)[idx] = round_and_clamp<GInt16>(value);
+          break;
+        case GDT_UInt32:
+          static_cast<GUInt32*>(block)[idx] = round_and_clamp<GUInt32>(value);
+          break;
+        case GDT_Int32:
+          static_cast<GInt32*>(block)[idx] = round_and_clamp<GInt32>(value);
+          break;
+        case GDT_Float32:
+          static_cast<float*>(block)[idx] = static_cast<float>(value);
+          break;
+        default:
+          static_cast<double*>(block)[idx] = value;
+      }
+      if (write_mode and block_index != last_dirty_block) {
+        dirty_blocks.insert(block_index);
+        last_dirty_block = block_index;
       }
     }
 
     // Returns the value of the pixel at `xi,yi`.
     double inline get(long xi, long yi) {
-      int block_xi = xi / block_xsize;
-      int block_yi = yi / block_ysize;
+      int block_xi = xi >> block_xbits;
+      int block_yi = yi >> block_ybits;
 
       // this is the flat index for the block
       int block_index = block_yi * block_nx + block_xi;
+      void* block = _get_block(block_index);
+
+      // Using the property n % 2^i = n & (2^i - 1)
+      // to efficienty compute the modulo: yi % block_xsize
+      int idx = ((yi & block_ymod) * actualBlockWidths[block_index]) + (xi & block_xmod);
 
-      if (not lru_cache->exist(block_index)) {
-        _load_block(block_index);
+      switch (block_type) {
+        case GDT_Byte:
+          return static_cast<GByte*>(block)[idx];
+        case GDT_UInt16:
+          return static_cast<GUInt16*>(block)[idx];
+        case GDT_Int16:
+          return static_cast<GInt16*>(block)[idx];
+        case GDT_UInt32:
+          return static_cast<GUInt32*>(block)[idx];
+        case GDT_Int32:
+          return static_cast<GInt32*>(block)[idx];
+        case GDT_Float32:
+          return static_cast<float*>(block)[idx];
+        default:
+          return static_cast<double*>(block)[idx];
       }
-      double* block = lru_cache->get(block_index);
+    }
 
+    // Sets `values[i]` to the value of band i of the pixel at `xi,yi`, for
+    // each of the raster's `n_bands` bands.
+    void inline get_bands(long xi, long yi, double* values) {
+      int block_xi = xi >> block_xbits;
+      int block_yi = yi >> block_ybits;
 
+      // this is the flat index for the block
+      int block_index = block_yi * block_nx + block_xi;
+      void* block = _get_block(block_index);
+
+      long idx = (((yi & block_ymod) * actualBlockWidths[block_index]) +
+                  (xi & block_xmod)) * n_bands;
+      for (int i = 0; i < n_bands; i++) {
+        switch (block_type) {
+          case GDT_Byte:
+            values[i] = static_cast<GByte*>(block)[idx + i];
+            break;
+          case GDT_UInt16:
+            values[i] = static_cast<GUInt16*>(block)[idx + i];
+            break;
+          case GDT_Int16:
+            values[i] = static_cast<GInt16*>(block)[idx + i];
+            break;
+          case GDT_UInt32:
+            values[i] = static_cast<GUInt32*>(block)[idx + i];
+            break;
+          case GDT_Int32:
+            values[i] = static_cast<GInt32*>(block)[idx + i];
+            break;
+          case GDT_Float32:
+            values[i] = static_cast<float*>(block)[idx + i];
+            break;
+          default:
+            values[i] = static_cast<double*>(block)[idx + i];
+        }
+      }
+    }
 
-      // Using the property n % 2^i = n & (2^i - 1)
-      // to efficienty compute the modulo: yi % block_xsize
-      int idx = ((yi & block_ymod) * actualBlockWidths[block_index]) + (xi & block_xmod);
+    // Returns the window of the raster covered by the block at
+    // `block_index`, which is smaller than a block at the right and bottom
+    // edges of the raster.
+    BlockWindow _block_window(int block_index) {
+      BlockWindow window;
+      window.xoff = (block_index % block_nx) << block_xbits;
+      window.yoff = (block_index / block_nx) << block_ybits;
+      window.win_xsize = block_xsize;
+      window.win_ysize = block_ysize;
+      if (window.xoff + window.win_xsize > raster_x_size) {
+        window.win_xsize = raster_x_size - window.xoff;
+      }
+      if (window.yoff + window.win_ysize > raster_y_size) {
+        window.win_ysize = raster_y_size - window.yoff;
+      }
+      return window;
+    }
 
-      double value = block[idx];
-      return value;
+    // Reads or writes `buffer` from or to the window of the raster. Waits
+    // for the background I/O worker, if any, to be done with the band.
+    CPLErr _raster_io(GDALRWFlag rw_flag, BlockWindow window, void* buffer) {
+      std::unique_lock<std::mutex> io_lock;
+      if (io_worker != nullptr) {
+        io_lock = std::unique_lock<std::mutex>(io_worker->io_mutex);
+      }
+      return block_raster_io(
+        dataset, band, band_id, n_bands, rw_flag, window, buffer, block_type);
+    }
+
+    // Writes a dirty block back to the raster and frees its buffer, or
+    // hands it to the background I/O worker to do so.
+    void _write_block(int block_index, void* block_buffer) {
+      BlockWindow window = _block_window(block_index);
+      if (io_worker != nullptr and
+          io_worker->queue_write(block_index, window, block_buffer)) {
+        cache_state->deferred_writes++;
+        return;
+      }
+      if (_raster_io(GF_Write, window, block_buffer) != CE_None) {
+        std::cerr << "Error writing block\n";
+      }
+      CPLFree(block_buffer);
     }
 
     // Reads a block from the raster and saves it to the cache.
     // Args:
     //   block_index: Index of the block to read, counted from the top-left
     void _load_block(int block_index) {
-      int block_xi = block_index % block_nx;
-      int block_yi = block_index / block_nx;
-
-      // we need the offsets to subtract from global indexes for cached array
-      int xoff = block_xi << block_xbits;
-      int yoff = block_yi << block_ybits;
-
-      double *double_buffer;
+      void *block_buffer = nullptr;
       list<BlockBufferPair> removed_value_list;
 
-      // determine the block aligned xoffset for read as array
-
-      // initially the win size is the same as the block size unless
-      // we're at the edge of a raster
-      int win_xsize = block_xsize;
-      int win_ysize = block_ysize;
-
-      // load a new block
-      if ((xoff + win_xsize) > raster_x_size) {
-        win_xsize = win_xsize - (xoff + win_xsize - raster_x_size);
+      // the background I/O worker may have read the block already, or
+      // still be holding it to write
+      if (io_worker != nullptr) {
+        bool dirty;
+        block_buffer = io_worker->take(block_index, dirty);
+        if (dirty) {
+          // the buffer holds the values as they would be written, so it can
+          // go back in the cache as is, still to be written
+          dirty_blocks.insert(block_index);
+        } else if (block_buffer != nullptr) {
+          cache_state->prefetch_hits++;
+        }
       }
-      if ((yoff + win_ysize) > raster_y_size) {
-        win_ysize = win_ysize - (yoff + win_ysize - raster_y_size);
+      if (block_buffer == nullptr) {
+        BlockWindow window = _block_window(block_index);
+        block_buffer = CPLMalloc(
+          GDALGetDataTypeSizeBytes(block_type) * window.win_xsize *
+          window.win_ysize * n_bands);
+        if (_raster_io(GF_Read, window, block_buffer) != CE_None) {
+          std::cerr << "Error reading block\n";
+        }
       }
 
-      double *pafScanline = (double *) CPLMalloc(sizeof(double) * win_xsize * win_ysize);
-      CPLErr err = band->RasterIO(GF_Read, xoff, yoff, win_xsize, win_ysize,
-            pafScanline, win_xsize, win_ysize, GDT_Float64,
-            0, 0 );
-
-      if (err != CE_None) {
-        std::cerr << "Error reading block\n";
-      }
-      lru_cache->put(block_index, pafScanline, removed_value_list);
+      // the share of the budget changes as other rasters open and close
+      lru_cache->set_cache_size(cache_capacity());
+      lru_cache->put(block_index, block_buffer, removed_value_list);
       while (not removed_value_list.empty()) {
-        // write the changed value back if desired
-        double_buffer = removed_value_list.front().second;
+        int removed_index = removed_value_list.front().first;
+        void* removed_buffer = removed_value_list.front().second;
+        removed_value_list.pop_front();
 
+        // write back the block if it's dirty
         if (write_mode) {
-          block_index = removed_value_list.front().first;
-
-          // write back the block if it's dirty
-          std::set<int>::iterator dirty_itr = dirty_blocks.find(block_index);
+          std::set<int>::iterator dirty_itr = dirty_blocks.find(removed_index);
           if (dirty_itr != dirty_blocks.end()) {
             dirty_blocks.erase(dirty_itr);
-
-            block_xi = block_index % block_nx;
-            block_yi = block_index / block_nx;
-
-            xoff = block_xi << block_xbits;
-            yoff = block_yi << block_ybits;
-
-            win_xsize = block_xsize;
-            win_ysize = block_ysize;
-
-            if (xoff + win_xsize > raster_x_size) {
-              win_xsize = win_xsize - (xoff + win_xsize - raster_x_size);
-            }
-            if (yoff + win_ysize > raster_y_size) {
-              win_ysize = win_ysize - (yoff + win_ysize - raster_y_size);
-            }
-            err = band->RasterIO( GF_Write, xoff, yoff, win_xsize, win_ysize,
-              double_buffer, win_xsize, win_ysize, GDT_Float64, 0, 0 );
-            if (err != CE_None) {
-              std::cerr << "Error writing block\n";
+            if (removed_index == last_dirty_block) {
+              last_dirty_block = -1;
             }
+            _write_block(removed_index, removed_buffer);
+            continue;
           }
         }
+        CPLFree(removed_buffer);
+      }
+    }
 
-        CPLFree(double_buffer);
-        removed_value_list.pop_front();
+    // Queues background reads of the blocks of this raster that cover a
+    // window of pixels, grown by one pixel on each side to include the
+    // window's neighbors, and that aren't already cached. Does nothing
+    // unless the raster was opened with async I/O.
+    void prefetch(long xoff, long yoff, long win_xsize, long win_ysize) {
+      if (io_worker == nullptr) {
+        return;
+      }
+      long x_min = std::max(xoff - 1, 0L);
+      long y_min = std::max(yoff - 1, 0L);
+      long x_max = std::min(xoff + win_xsize, raster_x_size - 1);
+      long y_max = std::min(yoff + win_ysize, raster_y_size - 1);
+      for (long block_yi = y_min >> block_ybits; block_yi <= y_max >> block_ybits; block_yi++) {
+        for (long block_xi = x_min >> block_xbits; block_xi <= x_max >> block_xbits; block_xi++) {
+          int block_index = block_yi * block_nx + block_xi;
+          if (not lru_cache->exist(block_index)) {
+            io_worker->request_read(block_index, _block_window(block_index));
+          }
+        }
+      }
+    }
+
+    // The routing kernels look for seed pixels one block of `seed_raster`
+    // at a time, in row-major order. Given the offset of the block being
+    // searched, queues background reads of this raster's blocks around the
+    // next one, so that they are in memory by the time the kernel gets
+    // there. Does nothing unless the raster was opened with async I/O.
+    void prefetch_next_seed_block(ManagedRaster& seed_raster, long xoff, long yoff) {
+      if (io_worker == nullptr) {
+        return;
+      }
+      long next_xoff = xoff + seed_raster.block_xsize;
+      long next_yoff = yoff;
+      if (next_xoff >= seed_raster.raster_x_size) {
+        next_xoff = 0;
+        next_yoff += seed_raster.block_ysize;
+      }
+      if (next_yoff >= seed_raster.raster_y_size) {
+        return;
       }
+      prefetch(next_xoff, next_yoff, seed_raster.block_xsize, seed_raster.block_ysize);
     }
 
     // Closes the ManagedRaster and frees up resources.
@@ -318,23 +889,21 @@ class ManagedRaster {
       }
       closed = 1;
 
-      double *double_buffer;
-      int block_xi;
-      int block_yi;
-      int block_index;
-      // initially the win size is the same as the block size unless
-      // we're at the edge of a raster
-      int win_xsize;
-      int win_ysize;
+      cache_state->n_open_rasters--;
+      cache_state->hits += lru_cache->hits;
+      cache_state->misses += lru_cache->misses;
+      cache_state->evictions += lru_cache->evictions;
 
-      // we need the offsets to subtract from global indexes for cached array
-      int xoff;
-      int yoff;
+      // finish the writes behind before writing the blocks still cached
+      if (io_worker != nullptr) {
+        io_worker->stop();
+        delete io_worker;
+        io_worker = nullptr;
+      }
 
       if (not write_mode) {
-        for (auto it = lru_cache->begin(); it != lru_cache->end(); it++) {
-          // write the changed value back if desired
-          CPLFree(it->second);
+        for (auto item: lru_cache->items()) {
+          CPLFree(item.second);
         }
         GDALClose( (GDALDatasetH) dataset );
         return;
@@ -342,39 +911,15 @@ class ManagedRaster {
 
       // if we get here, we're in write_mode
       std::set<int>::iterator dirty_itr;
-      for (auto it = lru_cache->begin(); it != lru_cache->end(); it++) {
-        double_buffer = it->second;
-        block_index = it->first;
-
+      for (auto item: lru_cache->items()) {
         // write to disk if block is dirty
-        dirty_itr = dirty_blocks.find(block_index);
+        dirty_itr = dirty_blocks.find(item.first);
         if (dirty_itr != dirty_blocks.end()) {
           dirty_blocks.erase(dirty_itr);
-          block_xi = block_index % block_nx;
-          block_yi = block_index / block_nx;
-
-          // we need the offsets to subtract from global indexes for
-          // cached array
-          xoff = block_xi << block_xbits;
-          yoff = block_yi << block_ybits;
-
-          win_xsize = block_xsize;
-          win_ysize = block_ysize;
-
-          // clip window sizes if necessary
-          if (xoff + win_xsize > raster_x_size) {
-            win_xsize = win_xsize - (xoff + win_xsize - raster_x_size);
-          }
-          if (yoff + win_ysize > raster_y_size) {
-            win_ysize = win_ysize - (yoff + win_ysize - raster_y_size);
-          }
-          CPLErr err = band->RasterIO( GF_Write, xoff, yoff, win_xsize, win_ysize,
-            double_buffer, win_xsize, win_ysize, GDT_Float64, 0, 0 );
-          if (err != CE_None) {
-            std::cerr << "Error writing block\n";
-          }
+          _write_block(item.first, item.second);
+        } else {
+          CPLFree(item.second);
         }
-        CPLFree(double_buffer);
       }
       GDALClose( (GDALDatasetH) dataset );
       delete lru_cache;
@@ -446,409 +991,182 @@ public:
   }
 };
 
-// Represents a pixel in a ManagedFlowDirectionRaster
-template<class T>
-class Pixel {
-public:
-  ManagedFlowDirRaster<T> raster;
-  int x;
-  int y;
-  int val;
-
-  Pixel() {}
-
-  Pixel(ManagedFlowDirRaster<T> raster, int x, int y) : raster(raster), x(x), y(y) {
-    double v = raster.get(x, y);
-    val = static_cast<int>(v);
-  }
-};
+// Returns a mask with bit 4 * i set for each direction i whose 4-bit flow
+// weight in the MFD flow direction value `flow_dir` is nonzero. The number
+// of directions with flow is the popcount of the mask, and the directions
+// can be visited in order by repeatedly taking its lowest set bit.
+inline unsigned int mfd_direction_mask(unsigned int flow_dir) {
+  return (flow_dir | (flow_dir >> 1) | (flow_dir >> 2) | (flow_dir >> 3)) &
+    0x11111111;
+}
 
-// Returned by the `.end()` method of Neighbor iterable classes
-static inline NeighborTuple endVal = NeighborTuple(8, -1, -1, -1);
+// Returns the sum of the eight 4-bit flow weights in the MFD flow direction
+// value `flow_dir`, adding the nibbles pairwise into bytes and then adding
+// the bytes with a multiply.
+inline int mfd_flow_sum(unsigned int flow_dir) {
+  unsigned int byte_sums = (flow_dir & 0x0F0F0F0F) + ((flow_dir >> 4) & 0x0F0F0F0F);
+  return static_cast<int>((byte_sums * 0x01010101) >> 24);
+}
 
-// Iterates over all eight neighboring pixels of a given pixel
-// This and subsequent iterator classes were written with a lot of help from
-// https://internalpointers.com/post/writing-custom-iterators-modern-cpp
-template<class T>
-class NeighborIterator {
+// A fixed-size list of up to eight neighbors of a pixel, all decoded when
+// the list is constructed. Iterating over it with a range-based for loop
+// walks the array in place, so no memory is allocated per neighbor, and
+// the list can live on the stack.
+//
+// The list is filled in eagerly, so don't reassign a list while iterating
+// over it.
+class NeighborList {
 public:
-  using iterator_category = std::forward_iterator_tag;
-  using difference_type   = std::ptrdiff_t;
-  using value_type    = NeighborTuple;
-  using pointer       = NeighborTuple*;
-  using reference     = NeighborTuple&;
-
-  Pixel<T> pixel;
-  pointer m_ptr = nullptr;
-  int i = 0;
-
-  NeighborIterator() {}
-  NeighborIterator(NeighborTuple* n) { m_ptr = n; }
-  NeighborIterator(const Pixel<T> pixel) : pixel(pixel) { next(); }
-
-  reference operator*() const { return *m_ptr; }
-  pointer operator->() { return m_ptr; }
-
-  // Prefix increment
-  NeighborIterator<T>& operator++() { next(); return *this; }
-
-  // Postfix increment
-  NeighborIterator<T> operator++(int) { NeighborIterator<T> tmp = *this; ++(*this); return tmp; }
-
-  friend bool operator== (const NeighborIterator& a, const NeighborIterator& b) {
-    return a.m_ptr == b.m_ptr;
-  };
-  friend bool operator!= (const NeighborIterator& a, const NeighborIterator& b) {
-    return a.m_ptr != b.m_ptr;
-  };
+  NeighborTuple neighbors[8];
+  int n_neighbors = 0;
+
+  NeighborTuple* begin() { return neighbors; }
+  NeighborTuple* end() { return neighbors + n_neighbors; }
+  int size() { return n_neighbors; }
+
+protected:
+  inline void push(int direction, long x, long y, float flow_proportion) {
+    NeighborTuple& neighbor = neighbors[n_neighbors++];
+    neighbor.direction = direction;
+    neighbor.x = x;
+    neighbor.y = y;
+    neighbor.flow_proportion = flow_proportion;
+  }
 
-  // Increments the pointer to the next neighbor
-  virtual void next() {
-    long xj, yj, flow;
-    if (i == 8) {
-      m_ptr = &endVal;
-      return;
-    }
-    xj = pixel.x + COL_OFFSETS[i];
-    yj = pixel.y + ROW_OFFSETS[i];
-    flow = (pixel.val >> (i * 4)) & 0xF;
-    m_ptr = new NeighborTuple(i, xj, yj, static_cast<float>(flow));
-    i++;
+  template<class T>
+  inline bool in_bounds(ManagedFlowDirRaster<T>& raster, long x, long y) {
+    return not (x < 0 or x >= raster.raster_x_size or
+                y < 0 or y >= raster.raster_y_size);
   }
 };
 
-// Iterates over neighbor pixels that are downslope of a given pixel,
-// in either MFD or D8 mode
+// All eight neighbors of a given pixel, whether or not they are in the
+// raster, with the pixel's 4-bit MFD flow weight towards each
 template<class T>
-class DownslopeNeighborIterator: public NeighborIterator<T> {
+class Neighbors: public NeighborList {
 public:
-
-  DownslopeNeighborIterator(): NeighborIterator<T>() {}
-  DownslopeNeighborIterator(NeighborTuple* n): NeighborIterator<T>(n) {}
-  DownslopeNeighborIterator(const Pixel<T> p) {
-    this->pixel = p;
-    next();
-  }
-  DownslopeNeighborIterator<T>& operator++() { next(); return *this; }
-  DownslopeNeighborIterator<T> operator++(int) { DownslopeNeighborIterator<T> tmp = *this; ++(*this); return tmp; }
-
-  // Increments the pointer to the next downslope neighbor (MFD)
-  template<typename T_ = T, std::enable_if_t<std::is_same<T_, MFD>::value>* = nullptr>
-  void next() {
-    long xj, yj, flow;
-    delete this->m_ptr;
-    this->m_ptr = nullptr;
-    if (this->i == 8) {
-      this->m_ptr = &endVal;
-      return;
-    }
-    xj = this->pixel.x + COL_OFFSETS[this->i];
-    yj = this->pixel.y + ROW_OFFSETS[this->i];
-    if (xj < 0 or xj >= this->pixel.raster.raster_x_size or
-        yj < 0 or yj >= this->pixel.raster.raster_y_size) {
-      this->i++;
-      next();
-      return;
-    }
-    flow = (this->pixel.val >> (this->i * 4)) & 0xF;
-    if (flow) {
-      this->m_ptr = new NeighborTuple(this->i, xj, yj, static_cast<float>(flow));
-      this->i++;
-      return;
-    } else {
-      this->i++;
-      next();
-    }
-  }
-
-  // Increments the pointer to the next downslope neighbor (D8)
-  template<typename T_ = T, std::enable_if_t<std::is_same<T_, D8>::value>* = nullptr>
-  void next() {
-    long xj, yj;
-    delete this->m_ptr;
-    this->m_ptr = nullptr;
-
-    if (this->i == 8) {
-      this->m_ptr = &endVal;
-      return;
-    }
-    xj = this->pixel.x + COL_OFFSETS[this->pixel.val];
-    yj = this->pixel.y + ROW_OFFSETS[this->pixel.val];
-    if (xj < 0 or xj >= this->pixel.raster.raster_x_size or
-        yj < 0 or yj >= this->pixel.raster.raster_y_size) {
-      this->m_ptr = &endVal;
-      return;
+  Neighbors() {}
+  Neighbors(ManagedFlowDirRaster<T>& raster, int x, int y) {
+    int flow_dir = static_cast<int>(raster.get(x, y));
+    for (int i = 0; i < 8; i++) {
+      push(i, x + COL_OFFSETS[i], y + ROW_OFFSETS[i],
+           static_cast<float>((flow_dir >> (i * 4)) & 0xF));
     }
-    this->i = 8;
-    this->m_ptr = new NeighborTuple(this->pixel.val, xj, yj, 1);
-    return;
   }
 };
 
-// Iterates over neighbor pixels that are downslope of a given pixel,
-// without skipping pixels that are out-of-bounds of the raster,
-// in either MFD or D8 mode
+// Neighbor pixels that are downslope of a given pixel and inside the
+// raster, in either MFD or D8 mode. The flow proportion of each is the
+// pixel's 4-bit MFD flow weight towards it, or 1 for D8.
 template<class T>
-class DownslopeNeighborNoSkipIterator: public NeighborIterator<T> {
+class DownslopeNeighbors: public NeighborList {
 public:
-  DownslopeNeighborNoSkipIterator(): NeighborIterator<T>() {}
-  DownslopeNeighborNoSkipIterator(NeighborTuple* n): NeighborIterator<T>(n) {}
-  DownslopeNeighborNoSkipIterator(const Pixel<T> p) {
-    this->pixel = p;
-    next();
+  DownslopeNeighbors() {}
+  DownslopeNeighbors(ManagedFlowDirRaster<T>& raster, int x, int y) {
+    decode(raster, x, y, true);
   }
-  DownslopeNeighborNoSkipIterator<T>& operator++() { next(); return *this; }
-  DownslopeNeighborNoSkipIterator<T> operator++(int) { DownslopeNeighborNoSkipIterator<T> tmp = *this; ++(*this); return tmp; }
 
-  // Increments the pointer to the next downslope neighbor (MFD)
+protected:
   template<typename T_ = T, std::enable_if_t<std::is_same<T_, MFD>::value>* = nullptr>
-  void next() {
-    long xj, yj, flow;
-    delete this->m_ptr;
-    this->m_ptr = nullptr;
-    if (this->i == 8) {
-      this->m_ptr = &endVal;
-      return;
-    }
-    xj = this->pixel.x + COL_OFFSETS[this->i];
-    yj = this->pixel.y + ROW_OFFSETS[this->i];
-    flow = (this->pixel.val >> (this->i * 4)) & 0xF;
-    if (flow) {
-      this->m_ptr = new NeighborTuple(this->i, xj, yj, static_cast<float>(flow));
-      this->i++;
-      return;
-    } else {
-      this->i++;
-      next();
+  void decode(ManagedFlowDirRaster<T>& raster, int x, int y, bool skip_out_of_bounds) {
+    unsigned int flow_dir = static_cast<unsigned int>(
+      static_cast<int>(raster.get(x, y)));
+    unsigned int mask = mfd_direction_mask(flow_dir);
+    while (mask) {
+      int i = std::countr_zero(mask) >> 2;
+      mask &= mask - 1;
+      long xj = x + COL_OFFSETS[i];
+      long yj = y + ROW_OFFSETS[i];
+      if (skip_out_of_bounds and not in_bounds(raster, xj, yj)) {
+        continue;
+      }
+      push(i, xj, yj, static_cast<float>((flow_dir >> (i * 4)) & 0xF));
     }
   }
 
-  // Increments the pointer to the next downslope neighbor (D8)
   template<typename T_ = T, std::enable_if_t<std::is_same<T_, D8>::value>* = nullptr>
-  void next() {
-    long xj, yj;
-    delete this->m_ptr;
-    this->m_ptr = nullptr;
-
-    if (this->i == 8) {
-      this->m_ptr = &endVal;
+  void decode(ManagedFlowDirRaster<T>& raster, int x, int y, bool skip_out_of_bounds) {
+    int flow_dir = static_cast<int>(raster.get(x, y));
+    long xj = x + COL_OFFSETS[flow_dir];
+    long yj = y + ROW_OFFSETS[flow_dir];
+    if (skip_out_of_bounds and not in_bounds(raster, xj, yj)) {
       return;
     }
-    xj = this->pixel.x + COL_OFFSETS[this->pixel.val];
-    yj = this->pixel.y + ROW_OFFSETS[this->pixel.val];
-    this->i = 8;
-    this->m_ptr = new NeighborTuple(this->pixel.val, xj, yj, 1);
-    return;
+    push(flow_dir, xj, yj, 1);
   }
 };
 
-// Iterates over neighbor pixels that are upslope of a given pixel,
-// in either MFD or D8 mode
+// Neighbor pixels that are downslope of a given pixel, without skipping
+// pixels that are out-of-bounds of the raster, in either MFD or D8 mode
 template<class T>
-class UpslopeNeighborIterator: public NeighborIterator<T> {
+class DownslopeNeighborsNoSkip: public DownslopeNeighbors<T> {
 public:
-
-  UpslopeNeighborIterator(): NeighborIterator<T>() {}
-  UpslopeNeighborIterator(NeighborTuple* n): NeighborIterator<T>(n) {}
-  UpslopeNeighborIterator(const Pixel<T> p) {
-    this->pixel = p;
-    next();
-  }
-  UpslopeNeighborIterator<T>& operator++() { next(); return *this; }
-  UpslopeNeighborIterator<T> operator++(int) { UpslopeNeighborIterator<T> tmp = *this; ++(*this); return tmp; }
-
-  // Increments the pointer to the next upslope neighbor (MFD)
-  template<typename T_ = T, std::enable_if_t<std::is_same<T_, MFD>::value>* = nullptr>
-  void next() {
-    long xj, yj;
-    int flow_dir_j;
-    int flow_ji;
-    long flow_dir_j_sum;
-    delete this->m_ptr;
-    this->m_ptr = nullptr;
-    if (this->i == 8) {
-      this->m_ptr = &endVal;
-      return;
-    }
-    xj = this->pixel.x + COL_OFFSETS[this->i];
-    yj = this->pixel.y + ROW_OFFSETS[this->i];
-    if (xj < 0 or xj >= this->pixel.raster.raster_x_size or
-        yj < 0 or yj >= this->pixel.raster.raster_y_size) {
-      this->i++;
-      next();
-      return;
-    }
-
-    flow_dir_j = static_cast<int>(this->pixel.raster.get(xj, yj));
-    flow_ji = (0xF & (flow_dir_j >> (4 * FLOW_DIR_REVERSE_DIRECTION[this->i])));
-    if (flow_ji) {
-      flow_dir_j_sum = 0;
-      for (int idx = 0; idx < 8; idx++) {
-        flow_dir_j_sum += (flow_dir_j >> (idx * 4)) & 0xF;
-      }
-      this->m_ptr = new NeighborTuple(
-        this->i, xj, yj,
-        static_cast<float>(flow_ji) / static_cast<float>(flow_dir_j_sum));
-      this->i++;
-      return;
-    } else {
-      this->i++;
-      next();
-    }
-  }
-
-  // Increments the pointer to the next upslope neighbor (D8)
-  template<typename T_ = T, std::enable_if_t<std::is_same<T_, D8>::value>* = nullptr>
-  void next() {
-    long xj, yj;
-    int flow_dir_j;
-    delete this->m_ptr;
-    this->m_ptr = nullptr;
-    if (this->i == 8) {
-      this->m_ptr = &endVal;
-      return;
-    }
-    xj = this->pixel.x + COL_OFFSETS[this->i];
-    yj = this->pixel.y + ROW_OFFSETS[this->i];
-    if (xj < 0 or xj >= this->pixel.raster.raster_x_size or
-        yj < 0 or yj >= this->pixel.raster.raster_y_size) {
-      this->i++;
-      next();
-      return;
-    }
-
-    flow_dir_j = static_cast<int>(this->pixel.raster.get(xj, yj));
-    if (flow_dir_j == FLOW_DIR_REVERSE_DIRECTION[this->i]) {
-      this->m_ptr = new NeighborTuple(this->i, xj, yj, 1);
-      this->i++;
-      return;
-    } else {
-      this->i++;
-      next();
-    }
+  DownslopeNeighborsNoSkip() {}
+  DownslopeNeighborsNoSkip(ManagedFlowDirRaster<T>& raster, int x, int y) {
+    this->decode(raster, x, y, false);
   }
 };
 
-
-// Iterates over neighbor pixels that are upslope of a given pixel,
-// without dividing the flow_proportion, in either MFD or D8 mode
+// Neighbor pixels that are upslope of a given pixel, in either MFD or D8
+// mode. For MFD the flow proportion of each is the share of that
+// neighbor's flow that goes to the pixel; if `divide` is false, it is the
+// neighbor's 4-bit flow weight towards the pixel instead. For D8 it is 1.
 template<class T>
-class UpslopeNeighborNoDivideIterator: public NeighborIterator<T> {
+class UpslopeNeighbors: public NeighborList {
 public:
-
-  UpslopeNeighborNoDivideIterator(): NeighborIterator<T>() {}
-  UpslopeNeighborNoDivideIterator(NeighborTuple* n): NeighborIterator<T>(n) {}
-  UpslopeNeighborNoDivideIterator(const Pixel<T> p) {
-    this->pixel = p;
-    next();
+  UpslopeNeighbors() {}
+  UpslopeNeighbors(ManagedFlowDirRaster<T>& raster, int x, int y) {
+    decode(raster, x, y, true);
   }
-  UpslopeNeighborNoDivideIterator<T>& operator++() { next(); return *this; }
-  UpslopeNeighborNoDivideIterator<T> operator++(int) { UpslopeNeighborNoDivideIterator<T> tmp = *this; ++(*this); return tmp; }
 
-  // Increments the pointer to the next upslope neighbor (MFD)
+protected:
   template<typename T_ = T, std::enable_if_t<std::is_same<T_, MFD>::value>* = nullptr>
-  void next() {
-    long xj, yj;
-    int flow_dir_j;
-    int flow_ji;
-    delete this->m_ptr;
-    this->m_ptr = nullptr;
-    if (this->i == 8) {
-      this->m_ptr = &endVal;
-      return;
-    }
-    xj = this->pixel.x + COL_OFFSETS[this->i];
-    yj = this->pixel.y + ROW_OFFSETS[this->i];
-    if (xj < 0 or xj >= this->pixel.raster.raster_x_size or
-        yj < 0 or yj >= this->pixel.raster.raster_y_size) {
-      this->i++;
-      next();
-      return;
-    }
-    flow_dir_j = static_cast<int>(this->pixel.raster.get(xj, yj));
-    flow_ji = (0xF & (flow_dir_j >> (4 * FLOW_DIR_REVERSE_DIRECTION[this->i])));
-    if (flow_ji) {
-      this->m_ptr = new NeighborTuple(this->i, xj, yj, static_cast<float>(flow_ji));
-      this->i++;
-      return;
-    } else {
-      this->i++;
-      next();
+  void decode(ManagedFlowDirRaster<T>& raster, int x, int y, bool divide) {
+    for (int i = 0; i < 8; i++) {
+      long xj = x + COL_OFFSETS[i];
+      long yj = y + ROW_OFFSETS[i];
+      if (not in_bounds(raster, xj, yj)) {
+        continue;
+      }
+      int flow_dir_j = static_cast<int>(raster.get(xj, yj));
+      int flow_ji = (0xF & (flow_dir_j >> (4 * FLOW_DIR_REVERSE_DIRECTION[i])));
+      if (not flow_ji) {
+        continue;
+      }
+      if (divide) {
+        push(i, xj, yj, static_cast<float>(flow_ji) / static_cast<float>(
+          mfd_flow_sum(static_cast<unsigned int>(flow_dir_j))));
+      } else {
+        push(i, xj, yj, static_cast<float>(flow_ji));
+      }
     }
   }
 
-  // Increments the pointer to the next upslope neighbor (D8)
   template<typename T_ = T, std::enable_if_t<std::is_same<T_, D8>::value>* = nullptr>
-  void next() {
-    long xj, yj;
-    int flow_dir_j;
-    delete this->m_ptr;
-    this->m_ptr = nullptr;
-    if (this->i == 8) {
-      this->m_ptr = &endVal;
-      return;
-    }
-    xj = this->pixel.x + COL_OFFSETS[this->i];
-    yj = this->pixel.y + ROW_OFFSETS[this->i];
-    if (xj < 0 or xj >= this->pixel.raster.raster_x_size or
-        yj < 0 or yj >= this->pixel.raster.raster_y_size) {
-      this->i++;
-      next();
-      return;
-    }
-
-    flow_dir_j = static_cast<int>(this->pixel.raster.get(xj, yj));
-    if (flow_dir_j == FLOW_DIR_REVERSE_DIRECTION[this->i]) {
-      this->m_ptr = new NeighborTuple(this->i, xj, yj, 1);
-      this->i++;
-      return;
-    } else {
-      this->i++;
-      next();
+  void decode(ManagedFlowDirRaster<T>& raster, int x, int y, bool divide) {
+    for (int i = 0; i < 8; i++) {
+      long xj = x + COL_OFFSETS[i];
+      long yj = y + ROW_OFFSETS[i];
+      if (not in_bounds(raster, xj, yj)) {
+        continue;
+      }
+      int flow_dir_j = static_cast<int>(raster.get(xj, yj));
+      if (flow_dir_j == FLOW_DIR_REVERSE_DIRECTION[i]) {
+        push(i, xj, yj, 1);
+      }
     }
   }
 };
 
+// Neighbor pixels that are upslope of a given pixel, without dividing the
+// flow_proportion, in either MFD or D8 mode
 template<class T>
-class Neighbors {
+class UpslopeNeighborsNoDivide: public UpslopeNeighbors<T> {
 public:
-  Pixel<T> pixel;
-  Neighbors() {}
-  Neighbors(const Pixel<T> pixel): pixel(pixel) {}
-  NeighborIterator<T> begin() { return NeighborIterator<T>(pixel); }
-  NeighborIterator<T> end() { return NeighborIterator<T>(&endVal); }
-};
-
-template<class T>
-class DownslopeNeighbors: public Neighbors<T> {
-public:
-  using Neighbors<T>::Neighbors;
-  DownslopeNeighborIterator<T> begin() { return DownslopeNeighborIterator<T>(this->pixel); }
-  DownslopeNeighborIterator<T> end() { return DownslopeNeighborIterator<T>(&endVal); }
-};
-
-template<class T>
-class DownslopeNeighborsNoSkip: public Neighbors<T> {
-public:
-  using Neighbors<T>::Neighbors;
-  DownslopeNeighborNoSkipIterator<T> begin() { return DownslopeNeighborNoSkipIterator<T>(this->pixel); }
-  DownslopeNeighborNoSkipIterator<T> end() { return DownslopeNeighborNoSkipIterator<T>(&endVal); }
-};
-
-template<class T>
-class UpslopeNeighbors: public Neighbors<T> {
-public:
-  using Neighbors<T>::Neighbors;
-  UpslopeNeighborIterator<T> begin() { return UpslopeNeighborIterator<T>(this->pixel); }
-  UpslopeNeighborIterator<T> end() { return UpslopeNeighborIterator<T>(&endVal); }
-};
-
-template<class T>
-class UpslopeNeighborsNoDivide: public Neighbors<T> {
-public:
-  using Neighbors<T>::Neighbors;
-  UpslopeNeighborNoDivideIterator<T> begin() { return UpslopeNeighborNoDivideIterator<T>(this->pixel); }
-  UpslopeNeighborNoDivideIterator<T> end() { return UpslopeNeighborNoDivideIterator<T>(&endVal); }
+  UpslopeNeighborsNoDivide() {}
+  UpslopeNeighborsNoDivide(ManagedFlowDirRaster<T>& raster, int x, int y) {
+    this->decode(raster, x, y, false);
+  }
 };
 
 // Note: I was concerned that checking each value for nan would be too slow, but
@@ -0,0 +1,238 @@
+#ifndef NATCAP_INVEST_TILEDROUTING_H_
+#define NATCAP_INVEST_TILEDROUTING_H_
+
+#include <chrono>
+#include <exception>
+#include <string>
+#include <utility>
+#include <vector>
+
+#include "ManagedRaster.h"
+
+// Pixels per side of the tiles that TiledRouting divides a raster into,
+// rounded up to a whole number of blocks.
+int ROUTING_TILE_SIZE = 256;
+
+// A message from a pass over one tile to a pixel of another tile: the flat
+// index of the pixel, and a value whose meaning is up to the kernel.
+typedef pair<long, long> TileMessage;
+
+// A rectangle of pixels that TiledRouting processes in one or more passes.
+struct RoutingTile {
+  long xoff;
+  long yoff;
+  long win_xsize;
+  long win_ysize;
+  // messages to pixels of this tile sent since its last pass began
+  vector<TileMessage> messages;
+  // whether the tile is waiting in the queue, or being processed
+  bool queued;
+  bool running;
+  // whether a pass over the tile has begun
+  bool seeded;
+
+  bool contains(long x, long y) {
+    return (x >= xoff and x < xoff + win_xsize and
+            y >= yoff and y < yoff + win_ysize);
+  }
+
+  // Returns the index of the pixel at `x, y` in a row-major array of the
+  // tile's pixels.
+  long local_index(long x, long y) {
+    return (y - yoff) * win_xsize + (x - xoff);
+  }
+};
+
+// Runs a flow routing kernel on a pool of threads, each processing one tile
+// of the raster at a time.
+//
+// A pass over a tile follows the flow paths from the tile's seed pixels as
+// far as it can within the tile, and returns a message for each pixel of
+// another tile that is next along a flow path. Each message is delivered to
+// the tile holding its pixel and queues that tile for another pass, which
+// picks up the flow paths from there. The first pass over a tile is also
+// where the kernel finds the tile's seed pixels. A tile is processed by one
+// thread at a time, and tiles are processed until no messages are left.
+//
+// A kernel that computes each pixel once all of the pixels it depends on
+// are computed, from their values alone, gets the same results as it would
+// in a single thread whatever the order of the passes.
+//
+// The threads can't call into Python, so every ManagedRaster they use must
+// be opened before calling `run`. The output rasters are shared by all of
+// the threads and may only be used while holding `store_mutex`; each thread
+// should read the inputs through its own rasters, so that the block caches
+// aren't shared.
+class TiledRouting {
+public:
+  vector<RoutingTile> tiles;
+  std::mutex store_mutex;
+  // for logging progress; kernels add the number of pixels they compute
+  std::atomic<unsigned long> n_pixels_processed;
+
+  // Divides the raster into tiles of whole blocks of `raster` and queues
+  // them all for their first pass.
+  TiledRouting(ManagedRaster& raster)
+    : n_pixels_processed { 0 }
+    , raster_x_size { raster.raster_x_size }
+    , raster_y_size { raster.raster_y_size }
+    , n_running { 0 }
+    , n_workers_done { 0 }
+  {
+    tile_xsize = raster.block_xsize * (
+      (ROUTING_TILE_SIZE + raster.block_xsize - 1) / raster.block_xsize);
+    tile_ysize = raster.block_ysize * (
+      (ROUTING_TILE_SIZE + raster.block_ysize - 1) / raster.block_ysize);
+    n_col_tiles = (raster_x_size + tile_xsize - 1) / tile_xsize;
+
+    for (long yoff = 0; yoff < raster_y_size; yoff += tile_ysize) {
+      for (long xoff = 0; xoff < raster_x_size; xoff += tile_xsize) {
+        RoutingTile tile;
+        tile.xoff = xoff;
+        tile.yoff = yoff;
+        tile.win_xsize = std::min(tile_xsize, raster_x_size - xoff);
+        tile.win_ysize = std::min(tile_ysize, raster_y_size - yoff);
+        tile.queued = true;
+        tile.running = false;
+        tile.seeded = false;
+        ready.push_back(static_cast<int>(tiles.size()));
+        tiles.push_back(tile);
+      }
+    }
+  }
+
+  // Returns the index of the tile that holds the pixel at `flat_index`.
+  int tile_of(long flat_index) {
+    long row = flat_index / raster_x_size;
+    long col = flat_index % raster_x_size;
+    return static_cast<int>(
+      (row / tile_ysize) * n_col_tiles + col / tile_xsize);
+  }
+
+  // Processes the tiles on `n_workers` threads until no messages are left.
+  // Must be called from a thread holding the GIL, which it uses to log
+  // progress as `label`.
+  // Args:
+  //   n_workers: number of threads to start
+  //   process_tile: called as
+  //     process_tile(tile, first_pass, messages, worker_index) to run a
+  //     pass over `tile`, given the messages sent to it since its last
+  //     pass. Returns a vector of the TileMessages to send to other tiles.
+  //     `worker_index`, from 0 to n_workers - 1, identifies the thread.
+  //   label: name of the kernel in the progress messages
+  // If `process_tile` throws, the other threads stop after their current
+  // pass and the exception is rethrown here.
+  template<class PROCESS_T>
+  void run(int n_workers, PROCESS_T process_tile, string label) {
+    float total_n_pixels = raster_x_size * raster_y_size;
+    vector<std::thread> workers;
+    for (int i = 0; i < n_workers; i++) {
+      workers.push_back(std::thread(
+        [this, &process_tile, i] { run_worker(process_tile, i); }));
+    }
+    {
+      std::unique_lock<std::mutex> queue_lock(queue_mutex);
+      while (not done_cv.wait_for(
+          queue_lock, std::chrono::seconds(5),
+          [&] { return n_workers_done == n_workers; })) {
+        queue_lock.unlock();
+        log_msg(
+          LogLevel::info,
+          label + " " + std::to_string(
+            100 * n_pixels_processed / total_n_pixels
+          ) + " complete"
+        );
+        queue_lock.lock();
+      }
+    }
+    for (auto& worker: workers) {
+      worker.join();
+    }
+    if (error) {
+      std::rethrow_exception(error);
+    }
+  }
+
+private:
+  long raster_x_size;
+  long raster_y_size;
+  long tile_xsize;
+  long tile_ysize;
+  long n_col_tiles;
+
+  // the queue of tiles to process, the number being processed and the
+  // number of threads that have finished, guarded by `queue_mutex`
+  std::deque<int> ready;
+  int n_running;
+  int n_workers_done;
+  // the first exception thrown by `process_tile`, if any
+  std::exception_ptr error;
+  std::mutex queue_mutex;
+  std::condition_variable queue_cv;
+  std::condition_variable done_cv;
+
+  // Queues a tile unless it's already queued, or being processed, in which
+  // case it's queued again when its pass ends. Call holding `queue_mutex`.
+  void queue_tile(int tile_index) {
+    RoutingTile& tile = tiles[tile_index];
+    if (not tile.queued and not tile.running) {
+      tile.queued = true;
+      ready.push_back(tile_index);
+    }
+  }
+
+  template<class PROCESS_T>
+  void run_worker(PROCESS_T& process_tile, int worker_index) {
+    std::unique_lock<std::mutex> queue_lock(queue_mutex);
+    while (true) {
+      // once the queue is empty and no tile is being processed, no more
+      // messages can be sent
+      queue_cv.wait(queue_lock, [this] {
+        return not ready.empty() or n_running == 0 or error; });
+      if (error or ready.empty()) {
+        break;
+      }
+      int tile_index = ready.front();
+      ready.pop_front();
+      RoutingTile& tile = tiles[tile_index];
+      tile.queued = false;
+      tile.running = true;
+      n_running++;
+      bool first_pass = not tile.seeded;
+      tile.seeded = true;
+      vector<TileMessage> messages;
+      messages.swap(tile.messages);
+      queue_lock.unlock();
+
+      vector<TileMessage> sent;
+      try {
+        sent = process_tile(tile, first_pass, messages, worker_index);
+      } catch (...) {
+        queue_lock.lock();
+        if (not error) {
+          error = std::current_exception();
+        }
+        n_running--;
+        queue_cv.notify_all();
+        break;
+      }
+
+      queue_lock.lock();
+      tile.running = false;
+      n_running--;
+      for (auto message: sent) {
+        int target_index = tile_of(message.first);
+        tiles[target_index].messages.push_back(message);
+        queue_tile(target_index);
+      }
+      if (not tile.messages.empty()) {
+        queue_tile(tile_index);
+      }
+      queue_cv.notify_all();
+    }
+    n_workers_done++;
+    done_cv.notify_all();
+  }
+};
+
+#endif  // NATCAP_INVEST_TILEDROUTING_H_
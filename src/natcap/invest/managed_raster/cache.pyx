@@ -0,0 +1,118 @@
+# cython: language_level=3
+# distutils: language = c++
+"""Process-wide configuration and statistics of the ManagedRaster cache.
+
+Every ``ManagedRaster`` opened by the routing kernels (SDR, NDR, Seasonal
+Water Yield, Scenic Quality) caches blocks of its raster in memory. The
+caches of all rasters open at once share a single budget of bytes: each
+open raster may hold an equal share of it. The budget defaults to 2 GiB,
+or to the value of the ``NATCAP_INVEST_CACHE_BUDGET_BYTES`` environment
+variable if it is set when the first raster is opened.
+
+Rasters may also read blocks ahead of use and write evicted blocks behind
+on a background thread per raster, so that disk latency overlaps with the
+routing computation. This is off by default. Turn it on with
+``set_async_io``, or for every process, including TaskGraph workers, by
+setting the ``NATCAP_INVEST_ASYNC_IO`` environment variable to ``1``.
+"""
+from cpython.pycapsule cimport PyCapsule_New
+
+from .managed_raster cimport _local_block_cache_state
+from .managed_raster cimport BlockCacheState
+
+# This module owns the state shared by every ManagedRaster in the process.
+# ManagedRaster.h looks it up through this capsule.
+cdef BlockCacheState* _STATE = _local_block_cache_state()
+_block_cache_state = PyCapsule_New(
+    <void*>_STATE,
+    "natcap.invest.managed_raster.cache._block_cache_state", NULL)
+
+
+def set_cache_budget(n_bytes):
+    """Set the number of bytes shared by all ManagedRaster block caches.
+
+    Rasters that are already open adapt to the new budget the next time
+    they load a block.
+
+    Args:
+        n_bytes (int): the budget, in bytes. Must be positive.
+
+    Returns:
+        None
+
+    Raises:
+        ValueError if ``n_bytes`` is not positive.
+    """
+    n_bytes = int(n_bytes)
+    if n_bytes <= 0:
+        raise ValueError(
+            f'The cache budget must be a positive number of bytes, got {n_bytes}')
+    _STATE.set_budget_bytes(n_bytes)
+
+
+def get_cache_budget():
+    """Get the number of bytes shared by all ManagedRaster block caches.
+
+    Returns:
+        int
+    """
+    return _STATE.get_budget_bytes()
+
+
+def set_async_io(enabled):
+    """Turn background read-ahead and write-behind on or off.
+
+    Only rasters opened after the call are affected.
+
+    Args:
+        enabled (bool): whether rasters do their block I/O on a background
+            thread.
+
+    Returns:
+        None
+    """
+    _STATE.set_async_io(bool(enabled))
+
+
+def get_async_io():
+    """Get whether rasters do their block I/O on a background thread.
+
+    Returns:
+        bool
+    """
+    return _STATE.get_async_io()
+
+
+def get_cache_stats():
+    """Get statistics about the ManagedRaster block caches in this process.
+
+    Hits, misses and evictions are counted across all rasters since the
+    process started (or since ``reset_cache_stats`` was called), and are
+    added to the totals when each raster is closed. ``prefetch_hits``
+    counts the blocks that were read ahead in the background before they
+    were needed, and ``deferred_writes`` the evicted blocks written in the
+    background.
+
+    Returns:
+        dict with the keys ``budget_bytes``, ``open_rasters``, ``hits``,
+        ``misses``, ``evictions``, ``prefetch_hits`` and
+        ``deferred_writes``.
+    """
+    return {
+        'budget_bytes': _STATE.get_budget_bytes(),
+        'open_rasters': _STATE.get_n_open_rasters(),
+        'hits': _STATE.get_hits(),
+        'misses': _STATE.get_misses(),
+        'evictions': _STATE.get_evictions(),
+        'prefetch_hits': _STATE.get_prefetch_hits(),
+        'deferred_writes': _STATE.get_deferred_writes(),
+    }
+
+
+def reset_cache_stats():
+    """Reset the hit, miss, eviction, prefetch and write counters to zero.
+
+    Returns:
+        None
+    """
+    _STATE.reset_stats()
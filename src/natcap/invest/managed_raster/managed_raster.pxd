@@ -19,9 +19,41 @@ cdef extern from "LRUCache.h" nogil:
         bint exist(KEY_T &)
         VAL_T get(KEY_T &)
 
+# an O(1) least recently used cache for small integer keys, used by
+# ManagedRaster to hold blocks
+cdef extern from "FlatLRUCache.h" nogil:
+    cdef cppclass FlatLRUCache[VAL_T]:
+        FlatLRUCache(int, int)
+        int last_key
+        VAL_T last_val
+        unsigned long long hits
+        unsigned long long misses
+        unsigned long long evictions
+        void put(int&, VAL_T&, clist[pair[int,VAL_T]]&)
+        vector[pair[int,VAL_T]] items()
+        bint exist(int &)
+        VAL_T* find(int &)
+        VAL_T get(int &)
+
 cdef extern from "ManagedRaster.h":
+    cdef cppclass BlockCacheState:
+        long long get_budget_bytes()
+        void set_budget_bytes(long long)
+        long get_n_open_rasters()
+        unsigned long long get_hits()
+        unsigned long long get_misses()
+        unsigned long long get_evictions()
+        bint get_async_io()
+        void set_async_io(bint)
+        unsigned long long get_prefetch_hits()
+        unsigned long long get_deferred_writes()
+        void reset_stats()
+
+    BlockCacheState* _local_block_cache_state()
+    BlockCacheState* get_block_cache_state()
+
     cdef cppclass ManagedRaster:
-        LRUCache[int, double*]* lru_cache
+        FlatLRUCache[void*]* lru_cache
         cset[int] dirty_blocks
         int block_xsize
         int block_ysize
@@ -36,18 +68,24 @@ cdef extern from "ManagedRaster.h":
         int write_mode
         string raster_path
         int band_id
+        int n_bands
         int closed
         double nodata
 
         ManagedRaster() except +
         ManagedRaster(char*, int, bool) except +
+        ManagedRaster(char*, int, bool, int) except +
         void set(long xi, long yi, double value)
         double get(long xi, long yi)
+        void get_bands(long xi, long yi, double* values)
         void _load_block(int block_index) except *
+        void prefetch(long xoff, long yoff, long win_xsize, long win_ysize)
+        void prefetch_next_seed_block(ManagedRaster&, long xoff, long yoff)
+        int cache_capacity()
         void close()
 
     cdef cppclass ManagedFlowDirRaster[T]:
-        LRUCache[int, double*]* lru_cache
+        FlatLRUCache[void*]* lru_cache
         cset[int] dirty_blocks
         int block_xsize
         int block_ysize
@@ -82,51 +120,30 @@ cdef extern from "ManagedRaster.h":
         int direction, x, y
         float flow_proportion
 
-    cdef cppclass DownslopeNeighborIterator[T]:
-        ManagedFlowDirRaster[T] raster
-        int col
-        int row
-        int n_dir
-        int flow_dir
-        int flow_dir_sum
-
-        DownslopeNeighborIterator()
-        DownslopeNeighborIterator(ManagedFlowDirRaster[T], int, int)
-        void next()
-
-    cdef cppclass DownslopeNeighborNoSkipIterator[T]:
-        ManagedFlowDirRaster[T] raster
-        int col
-        int row
-        int n_dir
-        int flow_dir
-        int flow_dir_sum
-
-        DownslopeNeighborNoSkipIterator()
-        DownslopeNeighborNoSkipIterator(ManagedFlowDirRaster[T], int, int)
-        void next()
-
-    cdef cppclass UpslopeNeighborIterator[T]:
-        ManagedFlowDirRaster[T] raster
-        int col
-        int row
-        int n_dir
-        int flow_dir
-
-        UpslopeNeighborIterator()
-        UpslopeNeighborIterator(ManagedFlowDirRaster[T], int, int)
-        void next()
-
-    cdef cppclass UpslopeNeighborNoDivideIterator[T]:
-        ManagedFlowDirRaster[T] raster
-        int col
-        int row
-        int n_dir
-        int flow_dir
-
-        UpslopeNeighborNoDivideIterator()
-        UpslopeNeighborNoDivideIterator(ManagedFlowDirRaster[T], int, int)
-        void next()
+    cdef cppclass NeighborList:
+        NeighborTuple* begin()
+        NeighborTuple* end()
+        int size()
+
+    cdef cppclass Neighbors[T](NeighborList):
+        Neighbors()
+        Neighbors(ManagedFlowDirRaster[T]&, int, int)
+
+    cdef cppclass DownslopeNeighbors[T](NeighborList):
+        DownslopeNeighbors()
+        DownslopeNeighbors(ManagedFlowDirRaster[T]&, int, int)
+
+    cdef cppclass DownslopeNeighborsNoSkip[T](NeighborList):
+        DownslopeNeighborsNoSkip()
+        DownslopeNeighborsNoSkip(ManagedFlowDirRaster[T]&, int, int)
+
+    cdef cppclass UpslopeNeighbors[T](NeighborList):
+        UpslopeNeighbors()
+        UpslopeNeighbors(ManagedFlowDirRaster[T]&, int, int)
+
+    cdef cppclass UpslopeNeighborsNoDivide[T](NeighborList):
+        UpslopeNeighborsNoDivide()
+        UpslopeNeighborsNoDivide(ManagedFlowDirRaster[T]&, int, int)
 
     bint is_close(double, double)
 
@@ -1,8 +1,9 @@
+import collections
+import collections.abc
+import functools
 import importlib
 import pkgutil
 
-import natcap.invest
-
 
 def is_invest_compliant_model(module):
     """Check if a python module is an invest model.
@@ -23,39 +24,189 @@ def is_invest_compliant_model(module):
 # pyname: importable name e.g. natcap.invest.carbon, natcap.invest.sdr.sdr
 # model id: identifier e.g. coastal_blue_carbon
 # model title: e.g. Coastal Blue Carbon
-pyname_to_module = {}
-
-# discover core invest models. we could maintain a list of these,
-# but this way it's one less thing to update
-for _, _name, _ispkg in pkgutil.iter_modules(natcap.invest.__path__):
-    # As of 3.18.0 all models are packages. Both the model package
-    # and it's model module are compliant invest models (they both
-    # have the necessary attributes).
-    if _ispkg:
-        _module = importlib.import_module(f'natcap.invest.{_name}')
-        for _, _sub_name, _ in pkgutil.iter_modules(_module.__path__):
-            _submodule = importlib.import_module(f'natcap.invest.{_name}.{_sub_name}')
-            if is_invest_compliant_model(_submodule):
-                pyname_to_module[f'natcap.invest.{_name}.{_sub_name}'] = _submodule
-
-# discover plugins: identify packages whose name starts with invest-
-# and meet the basic API criteria for an invest plugin
-for _, _name, _ispkg in pkgutil.iter_modules():
-    if _name.startswith('invest'):
-        try:
-            _module = importlib.import_module(_name)
-        except ImportError:
-            continue
-        if is_invest_compliant_model(_module):
-            pyname_to_module[_name] = _module
-
-model_id_to_pyname = {}
-pyname_to_model_id = {}
-model_id_to_spec = {}
-model_alias_to_id = {}
-for _pyname, _model in pyname_to_module.items():
-    model_id_to_pyname[_model.MODEL_SPEC.model_id] = _pyname
-    pyname_to_model_id[_pyname] = _model.MODEL_SPEC.model_id
-    model_id_to_spec[_model.MODEL_SPEC.model_id] = _model.MODEL_SPEC
-    for _alias in _model.MODEL_SPEC.aliases:
-        model_alias_to_id[_alias] = _model.MODEL_SPEC.model_id
+ModelInfo = collections.namedtuple(
+    'ModelInfo', ['model_id', 'pyname', 'model_title', 'aliases'])
+
+# The core invest models, so that they can be listed and looked up without
+# importing them. Importing every model takes seconds, which the CLI would
+# otherwise spend before doing anything. Keep this in sync with the
+# MODEL_SPEC of each model; tests/test_models.py checks that it is.
+CORE_MODELS = [
+    ModelInfo(
+        'annual_water_yield',
+        'natcap.invest.annual_water_yield.annual_water_yield',
+        'Annual Water Yield', ('hwy', 'awy')),
+    ModelInfo(
+        'carbon', 'natcap.invest.carbon.carbon',
+        'Carbon Storage and Sequestration', ()),
+    ModelInfo(
+        'coastal_blue_carbon',
+        'natcap.invest.coastal_blue_carbon.coastal_blue_carbon',
+        'Coastal Blue Carbon', ('cbc',)),
+    ModelInfo(
+        'coastal_blue_carbon_preprocessor',
+        'natcap.invest.coastal_blue_carbon.preprocessor',
+        'Coastal Blue Carbon Preprocessor', ('cbc_pre',)),
+    ModelInfo(
+        'coastal_vulnerability',
+        'natcap.invest.coastal_vulnerability.coastal_vulnerability',
+        'Coastal Vulnerability', ('cv',)),
+    ModelInfo(
+        'crop_production_percentile',
+        'natcap.invest.crop_production_percentile.crop_production_percentile',
+        'Crop Production: Percentile', ('cpp',)),
+    ModelInfo(
+        'crop_production_regression',
+        'natcap.invest.crop_production_regression.crop_production_regression',
+        'Crop Production: Regression', ('cpr',)),
+    ModelInfo(
+        'delineateit', 'natcap.invest.delineateit.delineateit',
+        'DelineateIt', ()),
+    ModelInfo(
+        'forest_carbon_edge_effect',
+        'natcap.invest.forest_carbon_edge_effect.forest_carbon_edge_effect',
+        'Forest Carbon Edge Effect', ('fc',)),
+    ModelInfo(
+        'habitat_quality', 'natcap.invest.habitat_quality.habitat_quality',
+        'Habitat Quality', ('hq',)),
+    ModelInfo(
+        'habitat_risk_assessment', 'natcap.invest.hra.hra',
+        'Habitat Risk Assessment', ('hra',)),
+    ModelInfo(
+        'ndr', 'natcap.invest.ndr.ndr', 'Nutrient Delivery Ratio', ()),
+    ModelInfo(
+        'pollination', 'natcap.invest.pollination.pollination',
+        'Crop Pollination', ()),
+    ModelInfo(
+        'recreation', 'natcap.invest.recreation.recmodel_client',
+        'Visitation: Recreation and Tourism', ()),
+    ModelInfo(
+        'routedem', 'natcap.invest.routedem.routedem', 'RouteDEM', ()),
+    ModelInfo(
+        'scenario_generator_proximity',
+        'natcap.invest.scenario_gen_proximity.scenario_gen_proximity',
+        'Scenario Generator: Proximity Based', ('sgp',)),
+    ModelInfo(
+        'scenic_quality', 'natcap.invest.scenic_quality.scenic_quality',
+        'Scenic Quality', ('sq',)),
+    ModelInfo(
+        'sdr', 'natcap.invest.sdr.sdr', 'Sediment Delivery Ratio', ()),
+    ModelInfo(
+        'seasonal_water_yield',
+        'natcap.invest.seasonal_water_yield.seasonal_water_yield',
+        'Seasonal Water Yield', ('swy',)),
+    ModelInfo(
+        'stormwater', 'natcap.invest.stormwater.stormwater',
+        'Urban Stormwater Retention', ()),
+    ModelInfo(
+        'urban_cooling_model',
+        'natcap.invest.urban_cooling_model.urban_cooling_model',
+        'Urban Cooling', ('ucm',)),
+    ModelInfo(
+        'urban_flood_risk_mitigation',
+        'natcap.invest.urban_flood_risk_mitigation.urban_flood_risk_mitigation',
+        'Urban Flood Risk Mitigation', ('ufrm',)),
+    ModelInfo(
+        'urban_nature_access',
+        'natcap.invest.urban_nature_access.urban_nature_access',
+        'Urban Nature Access', ('una',)),
+    ModelInfo(
+        'wave_energy', 'natcap.invest.wave_energy.wave_energy',
+        'Wave Energy Production', ()),
+    ModelInfo(
+        'wind_energy', 'natcap.invest.wind_energy.wind_energy',
+        'Wind Energy Production', ()),
+]
+
+
+@functools.cache
+def _plugin_modules():
+    """Import the installed invest plugins.
+
+    Plugins are the packages whose name starts with ``invest`` that meet
+    the basic API criteria for an invest plugin. They are imported the first
+    time they are needed, since their model ids are only known from their
+    MODEL_SPEC.
+
+    Returns:
+        dict mapping each plugin's pyname to its module
+    """
+    plugins = {}
+    for _, name, _ in pkgutil.iter_modules():
+        if name.startswith('invest'):
+            try:
+                module = importlib.import_module(name)
+            except ImportError:
+                continue
+            if is_invest_compliant_model(module):
+                plugins[name] = module
+    return plugins
+
+
+@functools.cache
+def _model_info():
+    """Get the ModelInfo of every core model and plugin.
+
+    Returns:
+        dict mapping each model id to its ModelInfo
+    """
+    model_info = {info.model_id: info for info in CORE_MODELS}
+    for pyname, module in _plugin_modules().items():
+        model_spec = module.MODEL_SPEC
+        model_info[model_spec.model_id] = ModelInfo(
+            model_spec.model_id, pyname, model_spec.model_title,
+            tuple(model_spec.aliases))
+    return model_info
+
+
+class _LazyMapping(collections.abc.Mapping):
+    """Read-only mapping whose values are only computed when looked up.
+
+    Args:
+        keys_func (callable): returns the keys of the mapping, in order
+        value_func (callable): called with a key, returns its value
+    """
+
+    def __init__(self, keys_func, value_func):
+        self._keys_func = keys_func
+        self._value_func = value_func
+
+    def __getitem__(self, key):
+        if key not in self._keys_func():
+            raise KeyError(key)
+        return self._value_func(key)
+
+    def __contains__(self, key):
+        return key in self._keys_func()
+
+    def __iter__(self):
+        return iter(self._keys_func())
+
+    def __len__(self):
+        return len(self._keys_func())
+
+
+@functools.cache
+def _pynames():
+    return {info.pyname: info for info in _model_info().values()}
+
+
+@functools.cache
+def _aliases():
+    return {alias: info.model_id for info in _model_info().values()
+            for alias in info.aliases}
+
+
+# Each model module is imported the first time its module or spec is
+# looked up. Listing model ids, titles, aliases and pynames imports nothing
+# but the plugins.
+model_id_to_info = _LazyMapping(_model_info, lambda key: _model_info()[key])
+model_id_to_pyname = _LazyMapping(
+    _model_info, lambda key: _model_info()[key].pyname)
+pyname_to_model_id = _LazyMapping(
+    _pynames, lambda key: _pynames()[key].model_id)
+model_alias_to_id = _LazyMapping(_aliases, lambda key: _aliases()[key])
+pyname_to_module = _LazyMapping(_pynames, importlib.import_module)
+model_id_to_spec = _LazyMapping(
+    _model_info,
+    lambda key: importlib.import_module(_model_info()[key].pyname).MODEL_SPEC)
@@ -11,6 +11,8 @@ from osgeo import gdal_array
 from osgeo import ogr
 
 from natcap.invest import gettext
+from natcap.invest import hydrology
+from natcap.invest import intermediate_cache
 from natcap.invest import spec
 from natcap.invest import validation
 from natcap.invest.sdr import sdr
@@ -58,6 +60,9 @@ MODEL_SPEC = spec.ModelSpec(
         spec.WORKSPACE,
         spec.SUFFIX,
         spec.N_WORKERS,
+        spec.CACHE_BUDGET,
+        spec.INTERMEDIATE_CACHE,
+        spec.HYDROLOGY_DIR,
         spec.PROJECTED_DEM,
         spec.SingleBandRasterInput(
             id="lulc_path",
@@ -756,6 +761,14 @@ def execute(args):
             processes should be used in parallel processing. -1 indicates
             single process mode, 0 is single process but non-blocking mode,
             and >= 1 is number of processes.
+        args['cache_budget_bytes'] (int): (optional) the number of bytes of
+            memory shared by the block caches of the flow routing kernels.
+        args['intermediate_cache_dir'] (string): (optional) path to a
+            directory of intermediate results shared between workspaces.
+            See ``natcap.invest.intermediate_cache``.
+        args['hydrology_dir'] (string): (optional) path to a directory of
+            routing products shared between models. See
+            ``natcap.invest.hydrology``.
 
     Returns:
         File registry dictionary mapping MODEL_SPEC output ids to absolute paths
@@ -861,16 +874,26 @@ def execute(args):
         task_name='mask lulc raster'
     )
 
-    fill_pits_task = task_graph.add_task(
-        func=pygeoprocessing.routing.fill_pits,
-        args=(
-            (f_reg['masked_dem'], 1), f_reg['filled_dem']),
-        kwargs={'working_dir': args['workspace_dir']},
-        dependent_task_list=[align_raster_task, mask_dem_task],
-        target_path_list=[f_reg['filled_dem']],
-        task_name='fill pits')
-
-    calculate_slope_task = task_graph.add_task(
+    routing_tasks = hydrology.add_routing_tasks(
+        task_graph, (f_reg['masked_dem'], 1), args['flow_dir_algorithm'],
+        target_paths={
+            'filled_dem': f_reg['filled_dem'],
+            'flow_direction': f_reg['flow_direction'],
+            'flow_accumulation': f_reg['flow_accumulation'],
+            'stream': f_reg['stream'],
+        },
+        threshold_flow_accumulation=args['threshold_flow_accumulation'],
+        working_dir=args['workspace_dir'],
+        hydrology_dir=args['hydrology_dir'],
+        cache_dir=args['intermediate_cache_dir'],
+        dependent_task_list=[align_raster_task, mask_dem_task])
+    fill_pits_task = routing_tasks['filled_dem']
+    flow_dir_task = routing_tasks['flow_direction']
+    flow_accum_task = routing_tasks['flow_accumulation']
+    stream_extraction_task = routing_tasks['stream']
+
+    calculate_slope_task = intermediate_cache.add_task(
+        task_graph, args['intermediate_cache_dir'],
         func=pygeoprocessing.calculate_slope,
         args=((f_reg['filled_dem'], 1), f_reg['slope']),
         target_path_list=[f_reg['slope']],
@@ -888,79 +911,17 @@ def execute(args):
         task_name='threshold slope')
 
     if args['flow_dir_algorithm'] == 'mfd':
-        flow_dir_task = task_graph.add_task(
-            func=pygeoprocessing.routing.flow_dir_mfd,
-            args=(
-                (f_reg['filled_dem'], 1), f_reg['flow_direction']),
-            kwargs={'working_dir': args['workspace_dir']},
-            dependent_task_list=[fill_pits_task],
-            target_path_list=[f_reg['flow_direction']],
-            task_name='flow dir')
-
-        flow_accum_task = task_graph.add_task(
-            func=pygeoprocessing.routing.flow_accumulation_mfd,
-            args=(
-                (f_reg['flow_direction'], 1),
-                f_reg['flow_accumulation']),
-            target_path_list=[f_reg['flow_accumulation']],
-            dependent_task_list=[flow_dir_task],
-            task_name='flow accum')
-
-        stream_extraction_task = task_graph.add_task(
-            func=pygeoprocessing.routing.extract_streams_mfd,
-            args=(
-                (f_reg['flow_accumulation'], 1),
-                (f_reg['flow_direction'], 1),
-                float(args['threshold_flow_accumulation']),
-                f_reg['stream']),
-            target_path_list=[f_reg['stream']],
-            dependent_task_list=[flow_accum_task],
-            task_name='stream extraction')
-        s_task = task_graph.add_task(
-            func=pygeoprocessing.routing.flow_accumulation_mfd,
-            args=((f_reg['flow_direction'], 1), f_reg['s_accumulation']),
-            kwargs={
-                'weight_raster_path_band': (f_reg['thresholded_slope'], 1)},
-            target_path_list=[f_reg['s_accumulation']],
-            dependent_task_list=[flow_dir_task, threshold_slope_task],
-            task_name='route s')
+        route_s_func = pygeoprocessing.routing.flow_accumulation_mfd
     else:  # D8
-        flow_dir_task = task_graph.add_task(
-            func=pygeoprocessing.routing.flow_dir_d8,
-            args=(
-                (f_reg['filled_dem'], 1), f_reg['flow_direction']),
-            kwargs={'working_dir': args['workspace_dir']},
-            dependent_task_list=[fill_pits_task],
-            target_path_list=[f_reg['flow_direction']],
-            task_name='flow dir')
-
-        flow_accum_task = task_graph.add_task(
-            func=pygeoprocessing.routing.flow_accumulation_d8,
-            args=(
-                (f_reg['flow_direction'], 1),
-                f_reg['flow_accumulation']),
-            target_path_list=[f_reg['flow_accumulation']],
-            dependent_task_list=[flow_dir_task],
-            task_name='flow accum')
-
-        stream_extraction_task = task_graph.add_task(
-            func=pygeoprocessing.routing.extract_streams_d8,
-            kwargs=dict(
-                flow_accum_raster_path_band=(f_reg['flow_accumulation'], 1),
-                flow_threshold=float(args['threshold_flow_accumulation']),
-                target_stream_raster_path=f_reg['stream']),
-            target_path_list=[f_reg['stream']],
-            dependent_task_list=[flow_accum_task],
-            task_name='stream extraction')
-
-        s_task = task_graph.add_task(
-            func=pygeoprocessing.routing.flow_accumulation_d8,
-            args=((f_reg['flow_direction'], 1), f_reg['s_accumulation']),
-            kwargs={
-                'weight_raster_path_band': (f_reg['thresholded_slope'], 1)},
-            target_path_list=[f_reg['s_accumulation']],
-            dependent_task_list=[flow_dir_task, threshold_slope_task],
-            task_name='route s')
+        route_s_func = pygeoprocessing.routing.flow_accumulation_d8
+    s_task = task_graph.add_task(
+        func=route_s_func,
+        args=((f_reg['flow_direction'], 1), f_reg['s_accumulation']),
+        kwargs={
+            'weight_raster_path_band': (f_reg['thresholded_slope'], 1)},
+        target_path_list=[f_reg['s_accumulation']],
+        dependent_task_list=[flow_dir_task, threshold_slope_task],
+        task_name='route s')
 
     runoff_proxy_index_task = task_graph.add_task(
         func=_normalize_raster,
@@ -1064,6 +1025,48 @@ def execute(args):
         dependent_task_list=[d_dn_task, d_up_task],
         task_name='calc ic')
 
+    # the effective retention of every nutrient is calculated in a single
+    # traversal of the flow directions
+    retention_inputs_task_list = []
+    for nutrient in nutrients_to_process:
+        retention_inputs_task_list.append(task_graph.add_task(
+            func=_map_lulc_to_val_mask_stream,
+            args=(
+                f_reg['masked_lulc'], f_reg['stream'],
+                biophysical_df[f'eff_{nutrient}'].to_dict(),
+                f_reg[f'eff_{nutrient}']),
+            target_path_list=[f_reg[f'eff_{nutrient}']],
+            dependent_task_list=[align_raster_task, stream_extraction_task],
+            task_name=f'ret eff {nutrient}'))
+
+        retention_inputs_task_list.append(task_graph.add_task(
+            func=_map_lulc_to_val_mask_stream,
+            args=(
+                f_reg['masked_lulc'], f_reg['stream'],
+                biophysical_df[f'crit_len_{nutrient}'].to_dict(),
+                f_reg[f'crit_len_{nutrient}']),
+            target_path_list=[f_reg[f'crit_len_{nutrient}']],
+            dependent_task_list=[align_raster_task, stream_extraction_task],
+            task_name=f'ret eff {nutrient}'))
+
+    effective_retention_path_list = [
+        f_reg[f'effective_retention_{nutrient}']
+        for nutrient in nutrients_to_process]
+    ndr_eff_task = task_graph.add_task(
+        func=ndr_core.ndr_eff_calculation,
+        args=(
+            f_reg['flow_direction'], f_reg['stream'],
+            [f_reg[f'eff_{nutrient}'] for nutrient in nutrients_to_process],
+            [f_reg[f'crit_len_{nutrient}']
+             for nutrient in nutrients_to_process],
+            effective_retention_path_list,
+            args['flow_dir_algorithm']),
+        kwargs={'cache_budget_bytes': args['cache_budget_bytes']},
+        target_path_list=effective_retention_path_list,
+        dependent_task_list=[
+            stream_extraction_task, *retention_inputs_task_list],
+        task_name='eff ret')
+
     for nutrient in nutrients_to_process:
         # Perrine says that 'n' is the only case where we could consider a
         # prop subsurface component.  So there's a special case for that.
@@ -1104,39 +1107,6 @@ def execute(args):
             dependent_task_list=[modified_load_task, align_raster_task],
             task_name=f'map surface load {nutrient}')
 
-        eff_task = task_graph.add_task(
-            func=_map_lulc_to_val_mask_stream,
-            args=(
-                f_reg['masked_lulc'], f_reg['stream'],
-                biophysical_df[f'eff_{nutrient}'].to_dict(),
-                f_reg[f'eff_{nutrient}']),
-            target_path_list=[f_reg[f'eff_{nutrient}']],
-            dependent_task_list=[align_raster_task, stream_extraction_task],
-            task_name=f'ret eff {nutrient}')
-
-        crit_len_task = task_graph.add_task(
-            func=_map_lulc_to_val_mask_stream,
-            args=(
-                f_reg['masked_lulc'], f_reg['stream'],
-                biophysical_df[f'crit_len_{nutrient}'].to_dict(),
-                f_reg[f'crit_len_{nutrient}']),
-            target_path_list=[f_reg[f'crit_len_{nutrient}']],
-            dependent_task_list=[align_raster_task, stream_extraction_task],
-            task_name=f'ret eff {nutrient}')
-
-        ndr_eff_task = task_graph.add_task(
-            func=ndr_core.ndr_eff_calculation,
-            args=(
-                f_reg['flow_direction'],
-                f_reg['stream'], f_reg[f'eff_{nutrient}'],
-                f_reg[f'crit_len_{nutrient}'],
-                f_reg[f'effective_retention_{nutrient}'],
-                args['flow_dir_algorithm']),
-            target_path_list=[f_reg[f'effective_retention_{nutrient}']],
-            dependent_task_list=[
-                stream_extraction_task, eff_task, crit_len_task],
-            task_name=f'eff ret {nutrient}')
-
         ndr_task = task_graph.add_task(
             func=_calculate_ndr,
             args=(
@@ -1441,7 +1411,7 @@ def validate(args, limit_to=None):
 
     if not nutrients_selected:
         validation_warnings.append(
-            (['calc_n', 'calc_p'], MISSING_NUTRIENT_MSG))
+            (['calc_n', 'calc_p'], gettext(MISSING_NUTRIENT_MSG)))
 
     return validation_warnings
 
@@ -6,8 +6,10 @@ import numpy
 import pygeoprocessing
 cimport numpy
 cimport cython
+from libcpp.vector cimport vector
 from osgeo import gdal
 
+from ..managed_raster import cache
 from ..managed_raster.managed_raster cimport D8
 from ..managed_raster.managed_raster cimport MFD
 from .retention cimport calculate_retention
@@ -22,37 +24,62 @@ LOGGER = logging.getLogger(__name__)
 cdef int STREAM_EFFECTIVE_RETENTION = 0
 
 def ndr_eff_calculation(
-        flow_direction_path, stream_path, retention_eff_lulc_path,
-        crit_len_path, effective_retention_path, algorithm):
+        flow_direction_path, stream_path, retention_eff_lulc_path_list,
+        crit_len_path_list, effective_retention_path_list, algorithm,
+        cache_budget_bytes=None):
     """Calculate flow downhill effective_retention to the channel.
 
+        The effective retention of every nutrient is calculated in a single
+        traversal of the flow directions.
+
         Args:
             flow_direction_path (string): a path to a raster with
                 pygeoprocessing.routing flow direction values (MFD or D8).
             stream_path (string): a path to a raster where 1 indicates a
                 stream all other values ignored must be same dimensions and
                 projection as flow_direction_path.
-            retention_eff_lulc_path (string): a path to a raster indicating
-                the maximum retention efficiency that the landcover on that
-                pixel can accumulate.
-            crit_len_path (string): a path to a raster indicating the critical
-                length of the retention efficiency that the landcover on this
-                pixel.
-            effective_retention_path (string): path to a raster that is
-                created by this call that contains a per-pixel effective
-                sediment retention to the stream.
+            retention_eff_lulc_path_list (list): for each nutrient, a path to
+                a raster indicating the maximum retention efficiency that the
+                landcover on that pixel can accumulate.
+            crit_len_path_list (list): for each nutrient, a path to a raster
+                indicating the critical length of the retention efficiency
+                that the landcover on this pixel.
+            effective_retention_path_list (list): for each nutrient, path to
+                a raster that is created by this call that contains a
+                per-pixel effective retention to the stream.
+            algorithm (string): MFD or D8
+            cache_budget_bytes (int): if provided, the number of bytes of
+                memory to share among all ManagedRaster block caches. See
+                ``natcap.invest.managed_raster.cache.set_cache_budget``.
 
         Returns:
             None.
 
     """
+    if cache_budget_bytes:
+        cache.set_cache_budget(cache_budget_bytes)
     cdef float effective_retention_nodata = -1.0
-    pygeoprocessing.new_raster_from_base(
-        flow_direction_path, effective_retention_path, gdal.GDT_Float32,
-        [effective_retention_nodata])
+    cdef vector[char*] retention_eff_lulc_paths
+    cdef vector[char*] crit_len_paths
+    cdef vector[char*] effective_retention_paths
+    encoded_retention_eff_lulc_paths = [
+        p.encode('utf-8') for p in retention_eff_lulc_path_list]
+    encoded_crit_len_paths = [p.encode('utf-8') for p in crit_len_path_list]
+    encoded_effective_retention_paths = [
+        p.encode('utf-8') for p in effective_retention_path_list]
+    for i in range(len(effective_retention_path_list)):
+        retention_eff_lulc_paths.push_back(encoded_retention_eff_lulc_paths[i])
+        crit_len_paths.push_back(encoded_crit_len_paths[i])
+        effective_retention_paths.push_back(
+            encoded_effective_retention_paths[i])
+
+    for effective_retention_path in effective_retention_path_list:
+        pygeoprocessing.new_raster_from_base(
+            flow_direction_path, effective_retention_path, gdal.GDT_Float32,
+            [effective_retention_nodata])
     fp, to_process_flow_directions_path = tempfile.mkstemp(
         suffix='.tif', prefix='flow_to_process',
-        dir=os.path.dirname(effective_retention_path))
+        dir=os.path.dirname(effective_retention_path_list[0]))
     os.close(fp)
     algorithm = algorithm.lower()
 
@@ -84,15 +111,15 @@ def ndr_eff_calculation(
         calculate_retention[MFD](
             flow_direction_path.encode('utf-8'),
             stream_path.encode('utf-8'),
-            retention_eff_lulc_path.encode('utf-8'),
-            crit_len_path.encode('utf-8'),
+            retention_eff_lulc_paths,
+            crit_len_paths,
             to_process_flow_directions_path.encode('utf-8'),
-            effective_retention_path.encode('utf-8'))
+            effective_retention_paths)
     else: # D8
         calculate_retention[D8](
             flow_direction_path.encode('utf-8'),
             stream_path.encode('utf-8'),
-            retention_eff_lulc_path.encode('utf-8'),
-            crit_len_path.encode('utf-8'),
+            retention_eff_lulc_paths,
+            crit_len_paths,
             to_process_flow_directions_path.encode('utf-8'),
-            effective_retention_path.encode('utf-8'))
+            effective_retention_paths)
@@ -2,71 +2,225 @@
 #include <cmath>
 #include <stack>
 #include <ctime>
+#include <vector>
+
+// Within a stream, the retention is 0
+int STREAM_RETENTION = 0;
+float RETENTION_NODATA = -1;
+
+// The input rasters of calculate_retention.
+template<class T>
+class RetentionInputs {
+public:
+  ManagedFlowDirRaster<T> flow_dir_raster;
+  ManagedRaster stream_raster;
+  vector<ManagedRaster> retention_efficiency_rasters;
+  vector<ManagedRaster> critical_length_rasters;
+  // cell sizes must be square, so no reason to test at this point.
+  double cell_size;
+
+  RetentionInputs(
+      char* flow_direction_path,
+      char* stream_path,
+      vector<char*>& retention_efficiency_paths,
+      vector<char*>& critical_length_paths)
+    : flow_dir_raster(flow_direction_path, 1, false)
+    , stream_raster(stream_path, 1, false)
+  {
+    for (size_t n = 0; n < retention_efficiency_paths.size(); n++) {
+      retention_efficiency_rasters.push_back(
+        ManagedRaster(retention_efficiency_paths[n], 1, false));
+      critical_length_rasters.push_back(
+        ManagedRaster(critical_length_paths[n], 1, false));
+    }
+    cell_size = stream_raster.geotransform[1];
+  }
+
+  void prefetch_next_seed_block(long xoff, long yoff) {
+    flow_dir_raster.prefetch_next_seed_block(flow_dir_raster, xoff, yoff);
+    stream_raster.prefetch_next_seed_block(flow_dir_raster, xoff, yoff);
+    for (size_t n = 0; n < retention_efficiency_rasters.size(); n++) {
+      retention_efficiency_rasters[n].prefetch_next_seed_block(
+        flow_dir_raster, xoff, yoff);
+      critical_length_rasters[n].prefetch_next_seed_block(
+        flow_dir_raster, xoff, yoff);
+    }
+  }
+
+  void close() {
+    flow_dir_raster.close();
+    stream_raster.close();
+    for (size_t n = 0; n < retention_efficiency_rasters.size(); n++) {
+      retention_efficiency_rasters[n].close();
+      critical_length_rasters[n].close();
+    }
+  }
+};
+
+// Calculates the retention of the pixel at `x_i, y_i` for each nutrient,
+// from the retention of its downslope neighbors calculated so far.
+// Args:
+//   inputs: the input rasters
+//   x_i, y_i: the pixel to calculate
+//   retention_rasters: the retention raster of each nutrient
+//   retention_i: set to the retention of the pixel for each nutrient
+template<class T>
+void calculate_pixel_retention(
+    RetentionInputs<T>& inputs,
+    long x_i,
+    long y_i,
+    vector<ManagedRaster>& retention_rasters,
+    vector<double>& retention_i) {
+  long n_cols = inputs.flow_dir_raster.raster_x_size;
+  long n_rows = inputs.flow_dir_raster.raster_y_size;
+  double step_factor, step_length, critical_length_i, retention_efficiency_i;
+  double retention_j, intermediate_retention;
+  long flow_dir_sum;
+
+  if (inputs.stream_raster.get(x_i, y_i) == 1) {
+    // if pixel i is a stream, retention is 0.
+    std::fill(retention_i.begin(), retention_i.end(), STREAM_RETENTION);
+    return;
+  }
+  int flow_dir_i = int(inputs.flow_dir_raster.get(x_i, y_i));
+  if (is_close(flow_dir_i, inputs.flow_dir_raster.nodata)) {
+    std::fill(retention_i.begin(), retention_i.end(), RETENTION_NODATA);
+    return;
+  }
+
+  // the downslope neighbors are the same for every nutrient
+  DownslopeNeighborsNoSkip<T> downslope_neighbors(
+    inputs.flow_dir_raster, x_i, y_i);
+  for (size_t n = 0; n < retention_i.size(); n++) {
+    ManagedRaster& critical_length_raster = inputs.critical_length_rasters[n];
+    ManagedRaster& retention_efficiency_raster = (
+      inputs.retention_efficiency_rasters[n]);
+    critical_length_i = critical_length_raster.get(x_i, y_i);
+    retention_efficiency_i = retention_efficiency_raster.get(x_i, y_i);
+    if (is_close(critical_length_i, critical_length_raster.nodata) or
+        is_close(retention_efficiency_i, retention_efficiency_raster.nodata)) {
+      // if inputs are nodata, retention is undefined.
+      retention_i[n] = RETENTION_NODATA;
+      continue;
+    }
+    if (downslope_neighbors.size() == 0) {
+      throw std::logic_error(
+        "got to a cell that has no outflow! This error is happening"
+        "in retention.h");
+    }
+
+    retention_i[n] = 0;
+    flow_dir_sum = 0;
+    // For each pixel j, a downslope neighbor of i
+    for (auto j: downslope_neighbors) {
+      flow_dir_sum += static_cast<long>(j.flow_proportion);
+      if (j.x < 0 or j.x >= n_cols or j.y < 0 or j.y >= n_rows) {
+        continue;
+      }
+      retention_j = retention_rasters[n].get(j.x, j.y);
+      if (is_close(retention_j, RETENTION_NODATA)) {
+        continue;
+      }
+
+      // step length:
+      // the distance between the centerpoints of pixel i and pixel j
+      if (j.direction % 2 == 1) {
+        step_length = inputs.cell_size * sqrt(2);
+      } else {
+        step_length = inputs.cell_size;
+      }
+      // guard against a critical length factor that's 0
+      if (critical_length_i > 0) {
+        step_factor = exp(-5 * step_length / critical_length_i);
+      } else {
+        step_factor = 0;
+      }
+
+      // Case 1: downslope neighbor is a stream pixel
+      if (retention_j == STREAM_RETENTION) {
+        intermediate_retention = retention_efficiency_i * (1 - step_factor);
+      // Case 2: the current LULC's retention exceeds the neighbor's retention.
+      } else if (retention_efficiency_i > retention_j) {
+        intermediate_retention = (
+          (retention_j * step_factor) +
+          (retention_efficiency_i * (1 - step_factor)));
+      // Case 3: the other 2 cases have not been hit.
+      } else {
+        intermediate_retention = retention_j;
+      }
+
+      retention_i[n] += intermediate_retention * j.flow_proportion;
+    }
+    retention_i[n] = retention_i[n] / flow_dir_sum;
+  }
+}
 
 // Calculate flow downhill retention to the channel.
+//
+// The retention of any number of nutrients is calculated in one pass over
+// the flow directions, with the downslope neighbors of each pixel decoded
+// once for all of them.
+//
+// The pass runs on one thread. A pixel that drains to the edge or to nodata
+// is processed as soon as it is found, and again once all of its other
+// downslope neighbors are, so the results depend on the order of the pass.
+// Drainage basins could follow that order on separate threads, but only
+// after a pass to label them, and their pixels share blocks of the
+// to-process and retention rasters, which would need a lock at every step.
+//
 // Args:
 //   flow_direction_path: a path to a flow direction raster (MFD or D8)
 //   stream_path: a path to a raster where 1 indicates a
 //     stream all other values ignored must be same dimensions and
 //     projection as flow_direction_path.
-//   retention_efficiency_path: a path to a raster indicating
-//     the maximum retention efficiency that the landcover on that
-//     pixel can accumulate.
-//   critical_length_path: a path to a raster indicating the critical
-//     length of the retention efficiency that the landcover on this
-//     pixel.
-//   retention_path: path to a raster that is
+//   retention_efficiency_paths: for each nutrient, a path to a raster
+//     indicating the maximum retention efficiency that the landcover on
+//     that pixel can accumulate.
+//   critical_length_paths: for each nutrient, a path to a raster
+//     indicating the critical length of the retention efficiency that the
+//     landcover on this pixel.
+//   to_process_flow_directions_path: a path to a byte raster where bit i
+//     of each pixel is set if the pixel drains in direction i. Modified by
+//     this call.
+//   retention_paths: for each nutrient, path to a raster that is
 //     created by this call that contains a per-pixel effective
-//     sediment retention to the stream.
+//     retention to the stream.
 template<class T>
 void calculate_retention(
     char* flow_direction_path,
     char* stream_path,
-    char* retention_efficiency_path,
-    char* critical_length_path,
+    vector<char*> retention_efficiency_paths,
+    vector<char*> critical_length_paths,
     char* to_process_flow_directions_path,
-    char* retention_path) {
-  // Within a stream, the retention is 0
-  int STREAM_RETENTION = 0;
-  float retention_nodata = -1;
+    vector<char*> retention_paths) {
   stack<long> processing_stack;
 
-  ManagedFlowDirRaster flow_dir_raster = ManagedFlowDirRaster<T>(
-    flow_direction_path, 1, false);
-  ManagedRaster stream_raster = ManagedRaster(stream_path, 1, false);
-  ManagedRaster retention_efficiency_raster = ManagedRaster(
-    retention_efficiency_path, 1, false);
-  ManagedRaster critical_length_raster = ManagedRaster(critical_length_path, 1, false);
+  RetentionInputs<T> inputs(
+    flow_direction_path, stream_path, retention_efficiency_paths,
+    critical_length_paths);
+  ManagedFlowDirRaster<T>& flow_dir_raster = inputs.flow_dir_raster;
   ManagedRaster to_process_flow_directions_raster = ManagedRaster(
     to_process_flow_directions_path, 1, true);
-  ManagedRaster retention_raster = ManagedRaster(retention_path, 1, true);
+  vector<ManagedRaster> retention_rasters;
+  for (char* retention_path: retention_paths) {
+    retention_rasters.push_back(ManagedRaster(retention_path, 1, true));
+  }
+  vector<double> retention_i(retention_paths.size());
 
   long n_cols = flow_dir_raster.raster_x_size;
   long n_rows = flow_dir_raster.raster_y_size;
-  // cell sizes must be square, so no reason to test at this point.
-  double cell_size = stream_raster.geotransform[1];
 
   long win_xsize, win_ysize, xoff, yoff;
   long x_i, y_i;
   unsigned long flat_index;
-  long flow_dir_i, neighbor_flow_dirs;
-  double step_factor, step_length, critical_length_i, retention_efficiency_i;
-  long neighbor_row, neighbor_col;
-  int outflow_dir, outflow_dir_mask, directions_to_process;
+  int outflow_dir_mask, directions_to_process;
   int outflow_dirs, dir_mask;
+  long neighbor_row, neighbor_col, neighbor_flow_dirs;
   bool should_seed;
-  double retention_i;
-  DownslopeNeighborsNoSkip<T> downslope_neighbors;
   UpslopeNeighbors<T> upslope_neighbors;
-  bool has_outflow;
-  double retention_j;
-  double intermediate_retention;
-  string s;
-  long flow_dir_sum;
   time_t last_log_time = time(NULL);
   unsigned long n_pixels_processed = 0;
   float total_n_pixels = flow_dir_raster.raster_x_size * flow_dir_raster.raster_y_size;
-  double sqrt_2 = sqrt(2);
 
   // efficient way to calculate ceiling division:
   // a divided by b rounded up = (a + (b - 1)) / b
@@ -88,6 +242,14 @@ void calculate_retention(
         win_xsize = flow_dir_raster.block_xsize;
       }
 
+      // with async I/O, read the blocks around the next block of seed
+      // pixels in the background while this one is processed
+      inputs.prefetch_next_seed_block(xoff, yoff);
+      to_process_flow_directions_raster.prefetch_next_seed_block(flow_dir_raster, xoff, yoff);
+      for (auto& retention_raster: retention_rasters) {
+        retention_raster.prefetch_next_seed_block(flow_dir_raster, xoff, yoff);
+      }
+
       if (time(NULL) - last_log_time > 5) {
         last_log_time = time(NULL);
         log_msg(
@@ -147,83 +309,17 @@ void calculate_retention(
         y_i = flat_index / n_cols;  // integer floor division
         x_i = flat_index % n_cols;
 
-        critical_length_i = critical_length_raster.get(x_i, y_i);
-        retention_efficiency_i = retention_efficiency_raster.get(x_i, y_i);
-        flow_dir_i = int(flow_dir_raster.get(x_i, y_i));
-        if (stream_raster.get(x_i, y_i) == 1) {
-          // if pixel i is a stream, retention is 0.
-          retention_raster.set(x_i, y_i, STREAM_RETENTION);
-        } else if (
-            is_close(critical_length_i, critical_length_raster.nodata) or
-            is_close(retention_efficiency_i, retention_efficiency_raster.nodata) or
-            is_close(flow_dir_i, flow_dir_raster.nodata)
-          ) {
-          // if inputs are nodata, retention is undefined.
-          retention_raster.set(x_i, y_i, retention_nodata);
-        } else {
-          retention_i = 0;
-
-          downslope_neighbors = DownslopeNeighborsNoSkip<T>(
-            Pixel<T>(flow_dir_raster, x_i, y_i));
-          has_outflow = false;
-          flow_dir_sum = 0;
-          // For each pixel j, a downslope neighbor of i
-          for (auto j: downslope_neighbors) {
-            has_outflow = true;
-            flow_dir_sum += static_cast<long>(j.flow_proportion);
-            if (j.x < 0 or j.x >= n_cols or j.y < 0 or j.y >= n_rows) {
-              continue;
-            }
-            retention_j = retention_raster.get(j.x, j.y);
-            if (is_close(retention_j, retention_nodata)) {
-              continue;
-            }
-
-            // step length:
-            // the distance between the centerpoints of pixel i and pixel j
-            if (j.direction % 2 == 1) {
-              step_length = cell_size * sqrt_2;
-            } else {
-              step_length = cell_size;
-            }
-            // guard against a critical length factor that's 0
-            if (critical_length_i > 0) {
-              step_factor = exp(-5 * step_length / critical_length_i);
-            } else {
-              step_factor = 0;
-            }
-
-            // Case 1: downslope neighbor is a stream pixel
-            if (retention_j == STREAM_RETENTION) {
-              intermediate_retention = retention_efficiency_i * (1 - step_factor);
-            // Case 2: the current LULC's retention exceeds the neighbor's retention.
-            } else if (retention_efficiency_i > retention_j) {
-              intermediate_retention = (
-                (retention_j * step_factor) +
-                (retention_efficiency_i * (1 - step_factor)));
-            // Case 3: the other 2 cases have not been hit.
-            } else {
-              intermediate_retention = retention_j;
-            }
-
-            retention_i += intermediate_retention * j.flow_proportion;
-          }
-
-          if (has_outflow) {
-            retention_i = retention_i / flow_dir_sum;
-            retention_raster.set(x_i, y_i, retention_i);
-          } else {
-            throw std::logic_error(
-              "got to a cell that has no outflow! This error is happening"
-              "in retention.h");
-          }
+        calculate_pixel_retention(
+          inputs, x_i, y_i, retention_rasters, retention_i);
+        for (size_t n = 0; n < retention_rasters.size(); n++) {
+          retention_rasters[n].set(x_i, y_i, retention_i[n]);
         }
+
         // for each pixel k that is an upslope neighbor of i,
         // check if we can push k onto the stack yet
-        upslope_neighbors = UpslopeNeighbors<T>(Pixel<T>(flow_dir_raster, x_i, y_i));
+        upslope_neighbors = UpslopeNeighbors<T>(flow_dir_raster, x_i, y_i);
         for (auto k: upslope_neighbors) {
-          outflow_dir = INFLOW_OFFSETS[k.direction];
-          outflow_dir_mask = 1 << outflow_dir;
+          outflow_dir_mask = 1 << INFLOW_OFFSETS[k.direction];
           directions_to_process = int(
             to_process_flow_directions_raster.get(k.x, k.y));
           if (directions_to_process == 0) {
@@ -248,11 +344,10 @@ void calculate_retention(
       n_pixels_processed += win_xsize * win_ysize;
     }
   }
-  stream_raster.close();
-  critical_length_raster.close();
-  retention_efficiency_raster.close();
-  retention_raster.close();
-  flow_dir_raster.close();
+  inputs.close();
+  for (auto& retention_raster: retention_rasters) {
+    retention_raster.close();
+  }
   to_process_flow_directions_raster.close();
   log_msg(LogLevel::info, "Retention 100% complete");
 }
@@ -1,8 +1,10 @@
+from libcpp.vector cimport vector
+
 cdef extern from "retention.h":
     void calculate_retention[T](
         char*,
         char*,
+        vector[char*],
+        vector[char*],
         char*,
-        char*,
-        char*,
-        char*) except +
+        vector[char*]) except +
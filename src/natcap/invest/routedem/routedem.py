@@ -5,6 +5,8 @@ import pygeoprocessing
 import pygeoprocessing.routing
 
 from natcap.invest import gettext
+from natcap.invest import hydrology
+from natcap.invest import intermediate_cache
 from natcap.invest import spec
 from natcap.invest import validation
 from natcap.invest.unit_registry import u
@@ -36,6 +38,8 @@ MODEL_SPEC = spec.ModelSpec(
         spec.WORKSPACE,
         spec.SUFFIX,
         spec.N_WORKERS,
+        spec.INTERMEDIATE_CACHE,
+        spec.HYDROLOGY_DIR,
         spec.DEM.model_copy(update=dict(id="dem_path")),
         spec.IntegerInput(
             id="dem_band_index",
@@ -293,17 +297,13 @@ MODEL_SPEC = spec.ModelSpec(
 )
 
 
+# Filling, flow direction, flow accumulation and streams are calculated by
+# natcap.invest.hydrology
 _ROUTING_FUNCS = {
     'd8': {
-        'flow_accumulation': pygeoprocessing.routing.flow_accumulation_d8,
-        'flow_direction': pygeoprocessing.routing.flow_dir_d8,
-        'threshold_flow': pygeoprocessing.routing.extract_streams_d8,
         'distance_to_channel': pygeoprocessing.routing.distance_to_channel_d8,
     },
     'mfd': {
-        'flow_accumulation': pygeoprocessing.routing.flow_accumulation_mfd,
-        'flow_direction': pygeoprocessing.routing.flow_dir_mfd,
-        'threshold_flow': pygeoprocessing.routing.extract_streams_mfd,
         'distance_to_channel': pygeoprocessing.routing.distance_to_channel_mfd,
     }
 }
@@ -357,6 +357,12 @@ def execute(args):
             vector of subwatersheds.
         args['n_workers'] (int): The ``n_workers`` parameter to pass to
             the task graph.  The default is ``-1`` if not provided.
+        args['intermediate_cache_dir'] (string): (optional) path to a
+            directory of intermediate results shared between workspaces.
+            See ``natcap.invest.intermediate_cache``.
+        args['hydrology_dir'] (string): (optional) path to a directory of
+            routing products shared between models. See
+            ``natcap.invest.hydrology``.
 
     Returns:
         File registry dictionary mapping MODEL_SPEC output ids to absolute paths
@@ -376,55 +382,39 @@ def execute(args):
     # on the pitfilled DEM.  If the user really wants the slop of the filled
     # DEM, they can pass it back through RouteDEM.
     if args['calculate_slope']:
-        graph.add_task(
+        intermediate_cache.add_task(
+            graph, args['intermediate_cache_dir'],
             pygeoprocessing.calculate_slope,
             args=(dem_raster_path_band, file_registry['slope']),
             task_name='calculate_slope',
             target_path_list=[file_registry['slope']])
 
-    filled_pits_task = graph.add_task(
-        pygeoprocessing.routing.fill_pits,
-        args=(dem_raster_path_band,
-              file_registry['filled'],
-              args['workspace_dir']),
-        task_name='fill_pits',
-        target_path_list=[file_registry['filled']])
+    target_paths = {'filled_dem': file_registry['filled']}
+    if args['calculate_flow_direction']:
+        target_paths['flow_direction'] = file_registry['flow_direction']
+        if args['calculate_flow_accumulation']:
+            target_paths['flow_accumulation'] = (
+                file_registry['flow_accumulation'])
+            if args['calculate_stream_threshold']:
+                target_paths['stream'] = file_registry['stream_mask']
+    routing_tasks = hydrology.add_routing_tasks(
+        graph, dem_raster_path_band,
+        args['algorithm'] if args['calculate_flow_direction'] else None,
+        target_paths,
+        threshold_flow_accumulation=args['threshold_flow_accumulation'],
+        working_dir=args['workspace_dir'],
+        hydrology_dir=args['hydrology_dir'],
+        cache_dir=args['intermediate_cache_dir'])
+    filled_pits_task = routing_tasks['filled_dem']
 
     if args['calculate_flow_direction']:
-        LOGGER.info("calculating flow direction")
-        flow_direction_task = graph.add_task(
-            routing_funcs['flow_direction'],
-            args=((file_registry['filled'], 1),  # PGP>1.9.0 creates 1-band fills
-                  file_registry['flow_direction'],
-                  args['workspace_dir']),
-            target_path_list=[file_registry['flow_direction']],
-            dependent_task_list=[filled_pits_task],
-            task_name=f'flow_dir_{args["algorithm"]}')
+        flow_direction_task = routing_tasks['flow_direction']
 
         if args['calculate_flow_accumulation']:
-            LOGGER.info("calculating flow accumulation")
-            flow_accum_task = graph.add_task(
-                routing_funcs['flow_accumulation'],
-                args=((file_registry['flow_direction'], 1), file_registry['flow_accumulation']),
-                target_path_list=[file_registry['flow_accumulation']],
-                task_name=f'flow_accumulation_{args["algorithm"]}',
-                dependent_task_list=[flow_direction_task])
+            flow_accum_task = routing_tasks['flow_accumulation']
 
             if args['calculate_stream_threshold']:
-                stream_extraction_kwargs = {
-                    'flow_accum_raster_path_band': (file_registry['flow_accumulation'], 1),
-                    'flow_threshold': args['threshold_flow_accumulation'],
-                    'target_stream_raster_path': file_registry['stream_mask'],
-                }
-                if args['algorithm'] == 'mfd':
-                    stream_extraction_kwargs['flow_dir_mfd_path_band'] = (
-                        file_registry['flow_direction'], 1)
-                stream_threshold_task = graph.add_task(
-                    routing_funcs['threshold_flow'],
-                    kwargs=stream_extraction_kwargs,
-                    target_path_list=[file_registry['stream_mask']],
-                    dependent_task_list=[flow_accum_task],
-                    task_name=f'stream_thresholding_{args["algorithm"]}')
+                stream_threshold_task = routing_tasks['stream']
 
                 if args['calculate_downslope_distance']:
                     graph.add_task(
@@ -512,6 +502,6 @@ def validate(args, limit_to=None):
         if int(args['dem_band_index']) > raster_info['n_bands']:
             validation_warnings.append((
                 ['dem_band_index'],
-                INVALID_BAND_INDEX_MSG.format(maximum=raster_info['n_bands'])))
+                gettext(INVALID_BAND_INDEX_MSG).format(maximum=raster_info['n_bands'])))
 
     return validation_warnings
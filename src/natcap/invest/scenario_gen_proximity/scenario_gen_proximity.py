@@ -1,18 +1,15 @@
 """Scenario Generation: Proximity Based."""
 import collections
-import heapq
 import logging
 import math
 import os
 import shutil
-import struct
 import tempfile
 import time
 
 import numpy
 import pygeoprocessing
 import pygeoprocessing.kernels
-import scipy
 from osgeo import gdal
 
 from natcap.invest import gettext
@@ -287,15 +284,18 @@ MODEL_SPEC = spec.ModelSpec(
 )
 
 
-# This sets the largest number of elements that will be packed at once and
-# addresses a memory leak issue that happens when many arguments are passed
-# to the function via the * operator
-_LARGEST_STRUCT_PACK = 1024
-
 # Max number of elements to read/cache at once.  Used throughout the code to
 # load arrays to and from disk
 _BLOCK_SIZE = 2**20
 
+# Fewest elements read at once from each sorted run when merging them, so
+# that a landscape of many runs is still read in large enough pieces
+_MIN_MERGE_CHUNK_SIZE = 2**12
+
+# Most pixels to convert that are selected in memory by
+# ``_select_best_pixels``. More are sorted on disk by ``_sort_to_disk``.
+_MAX_SELECT_PIXELS = 2**25
+
 
 def execute(args):
     """Scenario Generator: Proximity-Based.
@@ -615,7 +615,7 @@ def _convert_landscape(
         _convert_by_score(
             file_registry['tmp_convertible_distances'], pixels_to_convert,
             output_landscape_raster_path, replacement_lucode, stats_cache,
-            score_weight)
+            score_weight, temp_dir)
 
     _log_stats(stats_cache, replacement_lucode, pixel_area_ha, stats_path)
     try:
@@ -653,151 +653,245 @@ def _log_stats(stats_cache, replacement_lucode, pixel_area, stats_path):
                     stats_cache[lucode]))
 
 
-def _sort_to_disk(dataset_path, score_weight=1.0):
-    """Return an iterable of non-nodata pixels in sorted order.
+def _select_best_pixels(dataset_path, n_pixels, score_weight=1.0):
+    """Select the non-nodata pixels of the lowest scores.
+
+    The raster is read once. The candidates are the pixels no worse than
+    the running cutoff, the score of the ``n_pixels``th best candidate so
+    far. Whenever there are twice as many candidates as ``n_pixels``, only
+    the best ``n_pixels`` are kept and the cutoff is lowered, so memory is
+    bounded by ``n_pixels`` and a block.
 
     Args:
         dataset_path (string): a path to a floating point GDAL dataset
+        n_pixels (int): the number of pixels to select
         score_weight (float): a number to multiply all values by, which can be
-            used to reverse the order of the iteration if negative.
+            used to select the highest values if negative.
 
     Returns:
-        an iterable that produces (value * score_weight, flat_index) in
-        decreasing sorted order by value * score_weight
+        a 1D int64 array of the flat indexes of the ``n_pixels`` pixels of
+        the lowest ``value * score_weight``, or of every non-nodata pixel if
+        there are fewer. Pixels are in increasing order of score, and of
+        flat index for the same score, as with ``_sort_to_disk``.
 
     """
-    def _read_score_index_from_disk(
-            score_file_path, index_file_path):
-        """Create generator of float/int value from the given filenames.
-
-        Reads a buffer of `buffer_size` big before to avoid keeping the
-        file open between generations.
-
-        score_file_path (string): a path to a file that has 32 bit floats
-            packed consecutively
-        index_file_path (string): a path to a file that has 32 bit ints
-            packed consecutively
-
-        Yields:
-            next (score, index) tuple in the given score and index files.
-
-        """
-        try:
-            score_buffer = ''
-            index_buffer = ''
-            file_offset = 0
-            buffer_offset = 0  # initialize to 0 to trigger the first load
-
-            # ensure buffer size that is not a perfect multiple of 4
-            read_buffer_size = int(math.sqrt(_BLOCK_SIZE))
-            read_buffer_size = read_buffer_size - read_buffer_size % 4
-
-            while True:
-                if buffer_offset == len(score_buffer):
-                    score_file = open(score_file_path, 'rb')
-                    index_file = open(index_file_path, 'rb')
-                    score_file.seek(file_offset)
-                    index_file.seek(file_offset)
-
-                    score_buffer = score_file.read(read_buffer_size)
-                    index_buffer = index_file.read(read_buffer_size)
-                    score_file.close()
-                    index_file.close()
-
-                    file_offset += read_buffer_size
-                    buffer_offset = 0
-                packed_score = score_buffer[buffer_offset:buffer_offset+4]
-                packed_index = index_buffer[buffer_offset:buffer_offset+4]
-                buffer_offset += 4
-                if not packed_score:
-                    break
-                yield (struct.unpack('f', packed_score)[0],
-                       struct.unpack('i', packed_index)[0])
-        finally:
-            # deletes the files when generator goes out of scope or ends
-            os.remove(score_file_path)
-            os.remove(index_file_path)
-
-    def _sort_cache_to_iterator(
-            index_cache, score_cache):
-        """Flushe the current cache to a heap and return it.
-
-        Args:
-            index_cache (1d numpy.array): contains flat indexes to the
-                score pixels `score_cache`
-            score_cache (1d numpy.array): contains score pixels
-
-        Returns:
-            Iterable to visit scores/indexes in increasing score order.
-
-        """
-        # sort the whole bunch to disk
-        score_file = tempfile.NamedTemporaryFile(delete=False)
-        index_file = tempfile.NamedTemporaryFile(delete=False)
-
-        sort_index = score_cache.argsort()
-        score_cache = score_cache[sort_index]
-        index_cache = index_cache[sort_index]
-        for index in range(0, score_cache.size, _LARGEST_STRUCT_PACK):
-            score_block = score_cache[index:index+_LARGEST_STRUCT_PACK]
-            index_block = index_cache[index:index+_LARGEST_STRUCT_PACK]
-            score_file.write(
-                struct.pack('%sf' % score_block.size, *score_block))
-            index_file.write(
-                struct.pack('%si' % index_block.size, *index_block))
-
-        score_file_path = score_file.name
-        index_file_path = index_file.name
-        score_file.close()
-        index_file.close()
-
-        return _read_score_index_from_disk(score_file_path, index_file_path)
+    if n_pixels <= 0:
+        return numpy.empty((0,), dtype=numpy.int64)
 
     dataset_info = pygeoprocessing.get_raster_info(dataset_path)
     nodata = dataset_info['nodata'][0]
-    nodata *= score_weight  # scale the nodata so they can be filtered out
+    n_cols, n_rows = dataset_info['raster_size']
+    # no more pixels can be selected than the raster has
+    n_pixels = min(n_pixels, n_cols * n_rows)
+
+    # the candidates are appended to preallocated buffers, which are trimmed
+    # in place, rather than concatenated anew for every block. There are
+    # never more candidates than pixels in the raster.
+    buffer_size = min(2 * n_pixels + _BLOCK_SIZE, n_cols * n_rows)
+    best_scores = numpy.empty((buffer_size,), dtype=numpy.float32)
+    best_indexes = numpy.empty((buffer_size,), dtype=numpy.int64)
+    n_candidates = 0
+    cutoff = None
+    for scores_data, scores_block in pygeoprocessing.iterblocks(
+            (dataset_path, 1), largest_block=_BLOCK_SIZE):
+        valid_mask = scores_block != nodata
+        scores = (scores_block * score_weight).astype(numpy.float32)
+        if cutoff is not None:
+            # ties with the cutoff may still be selected by flat index
+            valid_mask &= scores <= cutoff
+        row_coords, col_coords = numpy.nonzero(valid_mask)
+        if row_coords.size == 0:
+            continue
+        next_n_candidates = n_candidates + row_coords.size
+        if next_n_candidates > best_scores.size:
+            # a native block of the raster may be larger than _BLOCK_SIZE
+            best_scores = numpy.resize(best_scores, next_n_candidates)
+            best_indexes = numpy.resize(best_indexes, next_n_candidates)
+        best_scores[n_candidates:next_n_candidates] = scores[valid_mask]
+        best_indexes[n_candidates:next_n_candidates] = (
+            (row_coords.astype(numpy.int64) + scores_data['yoff']) * n_cols +
+            col_coords + scores_data['xoff'])
+        n_candidates = next_n_candidates
+
+        if n_candidates >= 2 * n_pixels:
+            best_scores[:n_pixels], best_indexes[:n_pixels] = (
+                _keep_best_pixels(
+                    best_scores[:n_candidates], best_indexes[:n_candidates],
+                    n_pixels))
+            n_candidates = n_pixels
+            cutoff = best_scores[:n_pixels].max()
+
+    best_scores = best_scores[:n_candidates]
+    best_indexes = best_indexes[:n_candidates]
+    if n_candidates > n_pixels:
+        best_scores, best_indexes = _keep_best_pixels(
+            best_scores, best_indexes, n_pixels)
+    return best_indexes[numpy.lexsort((best_indexes, best_scores))]
+
+
+def _keep_best_pixels(scores, flat_indexes, n_pixels):
+    """Keep the ``n_pixels`` pixels of the lowest scores.
 
-    # This will be a list of file iterators we'll pass to heap.merge
-    iters = []
+    Args:
+        scores (numpy.ndarray): 1D array of pixel scores
+        flat_indexes (numpy.ndarray): 1D array of the flat index of each
+            pixel in ``scores``
+        n_pixels (int): the number of pixels to keep, no more than the
+            size of ``scores``
 
-    n_cols = dataset_info['raster_size'][0]
+    Returns:
+        a ``(scores, flat_indexes)`` tuple of the kept pixels, in no
+        particular order. Of the pixels that tie with the highest kept
+        score, the ones of the lowest flat indexes are kept.
 
-    for scores_data, scores_block in pygeoprocessing.iterblocks(
-            (dataset_path, 1), largest_block=_BLOCK_SIZE):
-        # flatten and scale the results
-        scores_block = scores_block.flatten() * score_weight
+    """
+    cutoff = numpy.partition(scores, n_pixels - 1)[n_pixels - 1]
+    below_mask = scores < cutoff
+    n_tied = n_pixels - numpy.count_nonzero(below_mask)
+    tied_indexes = flat_indexes[scores == cutoff]
+    if n_tied < tied_indexes.size:
+        tied_indexes = numpy.partition(tied_indexes, n_tied - 1)[:n_tied]
+    return (
+        numpy.concatenate((
+            scores[below_mask],
+            numpy.full((n_tied,), cutoff, dtype=scores.dtype))),
+        numpy.concatenate((flat_indexes[below_mask], tied_indexes)))
+
+
+def _sort_to_disk(dataset_path, working_dir, score_weight=1.0):
+    """Return an iterable of chunks of non-nodata pixels in sorted order.
+
+    Each block of the raster is sorted into a run of scores and flat indexes
+    stored as memory-mapped arrays in ``working_dir``. The runs are then
+    merged a chunk of each run at a time.
 
-        col_coords, row_coords = numpy.meshgrid(
-            range(scores_data['xoff'], scores_data['xoff'] +
-                  scores_data['win_xsize']),
-            range(scores_data['yoff'], scores_data['yoff'] +
-                  scores_data['win_ysize']))
+    Args:
+        dataset_path (string): a path to a floating point GDAL dataset
+        working_dir (string): a directory to hold the sorted runs. The run
+            files are deleted when the iterable is exhausted or closed.
+        score_weight (float): a number to multiply all values by, which can be
+            used to reverse the order of the iteration if negative.
 
-        flat_indexes = (col_coords + row_coords * n_cols).flatten()
+    Returns:
+        an iterable that produces ``(scores, flat_indexes)`` tuples of 1D
+        arrays, where the scores are ``value * score_weight``. Together the
+        chunks hold every non-nodata pixel in increasing order of score, and
+        pixels of the same score in increasing order of flat index.
 
-        sort_index = scores_block.argsort()
-        sorted_scores = scores_block[sort_index]
-        sorted_indexes = flat_indexes[sort_index]
+    """
+    dataset_info = pygeoprocessing.get_raster_info(dataset_path)
+    nodata = dataset_info['nodata'][0]
+    n_cols = dataset_info['raster_size'][0]
 
-        # search for nodata values are so we can splice them out
-        left_index = numpy.searchsorted(sorted_scores, nodata, side='left')
-        right_index = numpy.searchsorted(
-            sorted_scores, nodata, side='right')
+    run_list = []  # (score path, index path, size) of each sorted run
+    for scores_data, scores_block in pygeoprocessing.iterblocks(
+            (dataset_path, 1), largest_block=_BLOCK_SIZE):
+        valid_mask = scores_block != nodata
+        row_coords, col_coords = numpy.nonzero(valid_mask)
+        if row_coords.size == 0:
+            continue
+        flat_indexes = (
+            (row_coords.astype(numpy.int64) + scores_data['yoff']) * n_cols +
+            col_coords + scores_data['xoff'])
+        scores = (scores_block[valid_mask] * score_weight).astype(
+            numpy.float32)
+
+        sort_index = numpy.lexsort((flat_indexes, scores))
+        run_index = len(run_list)
+        score_path = os.path.join(working_dir, f'scores_{run_index}.dat')
+        index_path = os.path.join(working_dir, f'indexes_{run_index}.dat')
+        for path, dtype, array in [
+                (score_path, numpy.float32, scores),
+                (index_path, numpy.int64, flat_indexes)]:
+            run_array = numpy.memmap(
+                path, dtype=dtype, mode='w+', shape=(array.size,))
+            run_array[:] = array[sort_index]
+            run_array.flush()
+            del run_array
+        run_list.append((score_path, index_path, scores.size))
+
+    return _merge_sorted_runs(run_list)
+
+
+def _merge_sorted_runs(run_list):
+    """Merge runs of sorted scores and flat indexes in vectorized chunks.
+
+    Each step reads the next chunk of every run whose last chunk was used
+    up, and yields the loaded pixels that sort no later than the last
+    loaded pixel of any run that has more on disk, since no pixel still on
+    disk can sort before them.
 
-        # remove nodata values
-        score_cache = numpy.concatenate(
-            (sorted_scores[0:left_index], sorted_scores[right_index::]))
-        index_cache = numpy.concatenate(
-            (sorted_indexes[0:left_index], sorted_indexes[right_index::]))
+    Args:
+        run_list (list): a list of ``(score_path, index_path, size)`` tuples
+            of memory-mapped float32 scores and int64 flat indexes, each
+            sorted by score and then by flat index
 
-        iters.append(_sort_cache_to_iterator(index_cache, score_cache))
+    Yields:
+        ``(scores, flat_indexes)`` tuples of 1D arrays in sorted order
 
-    return heapq.merge(*iters)
+    """
+    chunk_size = max(
+        _MIN_MERGE_CHUNK_SIZE, _BLOCK_SIZE // max(len(run_list), 1))
+    # file offset, loaded scores and loaded indexes of each run
+    run_state = [[0, None, None] for _ in run_list]
+    try:
+        while True:
+            for (score_path, index_path, size), state in zip(
+                    run_list, run_state):
+                if (state[1] is None or state[1].size == 0) and (
+                        state[0] < size):
+                    n_read = min(chunk_size, size - state[0])
+                    # copy out of the memmaps so the files aren't held open
+                    state[1] = numpy.array(numpy.memmap(
+                        score_path, dtype=numpy.float32, mode='r',
+                        offset=state[0] * 4, shape=(n_read,)))
+                    state[2] = numpy.array(numpy.memmap(
+                        index_path, dtype=numpy.int64, mode='r',
+                        offset=state[0] * 8, shape=(n_read,)))
+                    state[0] += n_read
+            loaded_states = [
+                (state, size) for (_, _, size), state in zip(
+                    run_list, run_state)
+                if state[1] is not None and state[1].size > 0]
+            if not loaded_states:
+                break
+
+            # the last loaded pixel of each run with more on disk bounds
+            # the pixels that are safe to yield
+            bound_list = [
+                (state[1][-1], state[2][-1]) for state, size in loaded_states
+                if state[0] < size]
+            bound = min(bound_list) if bound_list else None
+
+            score_list = []
+            index_list = []
+            for state, _ in loaded_states:
+                scores, flat_indexes = state[1], state[2]
+                if bound is None:
+                    n_ready = scores.size
+                else:
+                    n_ready = numpy.searchsorted(scores, bound[0], side='left')
+                    n_tied = numpy.searchsorted(scores, bound[0], side='right')
+                    n_ready += numpy.searchsorted(
+                        flat_indexes[n_ready:n_tied], bound[1], side='right')
+                score_list.append(scores[:n_ready])
+                index_list.append(flat_indexes[:n_ready])
+                state[1], state[2] = scores[n_ready:], flat_indexes[n_ready:]
+
+            scores = numpy.concatenate(score_list)
+            flat_indexes = numpy.concatenate(index_list)
+            sort_index = numpy.lexsort((flat_indexes, scores))
+            yield scores[sort_index], flat_indexes[sort_index]
+    finally:
+        # deletes the files when generator goes out of scope or ends
+        for score_path, index_path, _ in run_list:
+            os.remove(score_path)
+            os.remove(index_path)
 
 
 def _convert_by_score(
         score_path, max_pixels_to_convert, out_raster_path, convert_value,
-        stats_cache, score_weight):
+        stats_cache, score_weight, working_dir):
     """Convert up to max pixels in ranked order of score.
 
     Args:
@@ -815,131 +909,90 @@ def _convert_by_score(
         convert_value (int/float): type is dependant on out_raster_path. Any
             pixels converted in `out_raster_path` are set to the value of this
             variable.
-        reverse_sort (boolean): If true, pixels are visited in descreasing
-            order of `score_path`, otherwise increasing.
         stats_cache (collections.defaultdict(int)): contains the number of
             pixels converted indexed by original pixel id.
+        score_weight (float): a number to multiply the scores by, which
+            reverses the order of conversion if negative.
+        working_dir (string): a directory to hold the sorted scores while
+            they are merged, if there are too many pixels to convert to
+            select them in memory.
 
     Returns:
         None.
 
     """
-    def _flush_cache_to_band(
-            data_array, row_array, col_array, valid_index, dirty_blocks,
-            out_band, stats_counter):
-        """Flush block cache to the output band.
-
-        Provided as an internal function because the exact operation needs
-        to be invoked inside the processing loop and again at the end to
-        finalize the scan.
-
-        Args:
-            data_array (numpy array): 1D array of valid data in buffer
-            row_array (numpy array): 1D array to indicate row indexes for
-                `data_array`
-            col_array (numpy array): 1D array to indicate col indexes for
-                `data_array`
-            valid_index (int): value indicates the non-inclusive left valid
-                entry in the parallel input arrays
-            dirty_blocks (set): contains tuples indicating the block row and
-                column indexes that will need to be set in `out_band`.  Allows
-                us to skip the examination of the entire sparse matrix.
-            out_band (gdal.Band): output band to write to
-            stats_counter (collections.defaultdict(int)): is updated so that
-                the key corresponds to ids in out_band that get set by the
-                sparse matrix, and the number of pixels converted is added
-                to the value of that entry.
-
-        Returns:
-            None
-
-        """
-        # construct sparse matrix so it can be indexed later
-        sparse_matrix = scipy.sparse.csc_matrix(
-            (data_array[:valid_index],
-             (row_array[:valid_index], col_array[:valid_index])),
-            shape=(n_rows, n_cols))
-
-        # classic memory block iteration
-        for block_row_index, block_col_index in dirty_blocks:
-            row_index = block_row_index * out_block_row_size
-            col_index = block_col_index * out_block_col_size
-            row_index_end = row_index + out_block_row_size
-            col_index_end = col_index + out_block_col_size
-            row_win = out_block_row_size
-            col_win = out_block_col_size
-            if row_index_end > n_rows:
-                row_index_end = n_rows
-                row_win = n_rows - row_index
-            if col_index_end > n_cols:
-                col_index_end = n_cols
-                col_win = n_cols - col_index
-
-            # slice out values, some must be non-zero because of set
-            mask_array = sparse_matrix[
-                row_index:row_index_end, col_index:col_index_end].toarray()
-
-            # read old array so we can write over the top
-            out_array = out_band.ReadAsArray(
-                xoff=col_index, yoff=row_index,
-                win_xsize=col_win, win_ysize=row_win)
-
-            # keep track of the stats of what ids changed
-            for unique_id in numpy.unique(out_array[mask_array]):
-                stats_counter[unique_id] += numpy.count_nonzero(
-                    out_array[mask_array] == unique_id)
-
-            out_array[mask_array] = convert_value
-            out_band.WriteArray(out_array, xoff=col_index, yoff=row_index)
-
     out_ds = gdal.OpenEx(out_raster_path, gdal.OF_RASTER | gdal.GA_Update)
     out_band = out_ds.GetRasterBand(1)
     out_block_col_size, out_block_row_size = out_band.GetBlockSize()
     n_rows = out_band.YSize
     n_cols = out_band.XSize
+    n_block_cols = (n_cols + out_block_col_size - 1) // out_block_col_size
+    # a fractional number of pixels rounds up to the next whole pixel
+    n_pixels_to_convert = max(0, int(math.ceil(max_pixels_to_convert)))
     pixels_converted = 0
 
-    row_array = numpy.empty((_BLOCK_SIZE,), dtype=numpy.uint32)
-    col_array = numpy.empty((_BLOCK_SIZE,), dtype=numpy.uint32)
-    data_array = numpy.empty((_BLOCK_SIZE,), dtype=bool)
-    next_index = 0
-    dirty_blocks = set()
-
     last_time = time.time()
-    for _, flatindex in _sort_to_disk(score_path, score_weight=score_weight):
-        if pixels_converted >= max_pixels_to_convert:
+    if n_pixels_to_convert <= _MAX_SELECT_PIXELS:
+        # the pixels to convert fit in memory, so select them in one pass
+        # instead of sorting every pixel
+        score_iterator = None
+        flat_index_chunks = [_select_best_pixels(
+            score_path, n_pixels_to_convert, score_weight=score_weight)]
+    else:
+        score_iterator = _sort_to_disk(
+            score_path, working_dir, score_weight=score_weight)
+        flat_index_chunks = (
+            flat_indexes for _, flat_indexes in score_iterator)
+    for flat_indexes in flat_index_chunks:
+        if pixels_converted >= n_pixels_to_convert:
             break
-        col_index = flatindex % n_cols
-        row_index = flatindex // n_cols
-        row_array[next_index] = row_index
-        col_array[next_index] = col_index
-        # data_array will only ever recieve True elements, necessary for the
-        # sparse matrix to function since it requires a data array as long
-        # as the row and column arrays
-        data_array[next_index] = True
-        next_index += 1
-        dirty_blocks.add(
-            (row_index // out_block_row_size, col_index // out_block_col_size))
-        pixels_converted += 1
+        flat_indexes = flat_indexes[
+            :n_pixels_to_convert - pixels_converted]
+        row_indexes, col_indexes = numpy.divmod(flat_indexes, n_cols)
+
+        # visit the blocks of the output band that have pixels to convert
+        block_ids = (
+            (row_indexes // out_block_row_size) * n_block_cols +
+            col_indexes // out_block_col_size)
+        block_order = numpy.argsort(block_ids, kind='stable')
+        unique_block_ids, block_starts = numpy.unique(
+            block_ids[block_order], return_index=True)
+        for block_id, pixel_order in zip(
+                unique_block_ids, numpy.split(block_order, block_starts[1:])):
+            row_index = (block_id // n_block_cols) * out_block_row_size
+            col_index = (block_id % n_block_cols) * out_block_col_size
+            row_win = min(out_block_row_size, n_rows - row_index)
+            col_win = min(out_block_col_size, n_cols - col_index)
+            block_rows = row_indexes[pixel_order] - row_index
+            block_cols = col_indexes[pixel_order] - col_index
 
+            # read old array so we can write over the top
+            out_array = out_band.ReadAsArray(
+                xoff=int(col_index), yoff=int(row_index),
+                win_xsize=int(col_win), win_ysize=int(row_win))
+
+            # keep track of the stats of what ids changed
+            unique_ids, id_counts = numpy.unique(
+                out_array[block_rows, block_cols], return_counts=True)
+            for unique_id, id_count in zip(unique_ids, id_counts):
+                stats_cache[unique_id] += id_count
+
+            out_array[block_rows, block_cols] = convert_value
+            out_band.WriteArray(
+                out_array, xoff=int(col_index), yoff=int(row_index))
+
+        pixels_converted += flat_indexes.size
         if time.time() - last_time > 5.0:
             LOGGER.info(
                 "converted %d of %d pixels", pixels_converted,
-                max_pixels_to_convert)
+                n_pixels_to_convert)
             last_time = time.time()
 
-        if next_index == _BLOCK_SIZE:
-            # next_index points beyond the end of the cache, flush and reset
-            _flush_cache_to_band(
-                data_array, row_array, col_array, next_index, dirty_blocks,
-                out_band, stats_cache)
-            dirty_blocks = set()
-            next_index = 0
-
-    # flush any remaining cache
-    _flush_cache_to_band(
-        data_array, row_array, col_array, next_index, dirty_blocks, out_band,
-        stats_cache)
+    if score_iterator is not None:
+        # delete the sorted runs, even if they weren't all read
+        score_iterator.close()
+    out_band = None
+    out_ds = None
 
 
 @validation.invest_validator
@@ -970,6 +1023,6 @@ def validate(args, limit_to=None):
                 not args['convert_farthest_from_edge']):
             validation_warnings.append((
                 ['convert_nearest_to_edge', 'convert_farthest_from_edge'],
-                MISSING_CONVERT_OPTION_MSG))
+                gettext(MISSING_CONVERT_OPTION_MSG)))
 
     return validation_warnings
@@ -0,0 +1,580 @@
+#ifndef NATCAP_INVEST_BATCH_VIEWSHED_H_
+#define NATCAP_INVEST_BATCH_VIEWSHED_H_
+
+#include <algorithm>
+#include <atomic>
+#include <cmath>
+#include <condition_variable>
+#include <deque>
+#include <exception>
+#include <map>
+#include <mutex>
+#include <queue>
+#include <thread>
+#include <vector>
+
+#include "ManagedRaster.h"
+
+// These match the constants of viewshed.pyx, which this file follows step
+// by step so that the results are the same as those of viewshed.viewshed.
+const unsigned char BATCH_VISIBILITY_NODATA = 255;
+const double BATCH_AUX_NOT_VISITED = -9999;
+const double BATCH_DIAM_EARTH_INV = 1.0 / 12740000;
+
+// Offsets of the neighbors of a pixel, in (row, col) order.
+const int BATCH_NEIGHBORS_INDEXES[16] = {
+  0, 1,
+  -1, 1,
+  -1, 0,
+  -1, -1,
+  0, -1,
+  1, -1,
+  1, 0,
+  1, 1
+};
+
+// For each sector, the (row, col) offsets of Neighbor 1 and Neighbor 2 of a
+// target, from which the reference plane is constructed.
+const int BATCH_SECTOR_TO_NEIGHBOR_1_INDEX[16] = {
+  0, -1,
+  1, 0,
+  1, 0,
+  0, 1,
+  0, 1,
+  -1, 0,
+  -1, 0,
+  0, -1
+};
+const int BATCH_SECTOR_TO_NEIGHBOR_2_INDEX[16] = {
+  1, -1,
+  1, -1,
+  1, 1,
+  1, 1,
+  -1, 1,
+  -1, 1,
+  -1, -1,
+  -1, -1
+};
+
+// For each sector, the (row, col) offsets of the two targets to visit after
+// a target.
+const int BATCH_SECTOR_NEXT_TARGET_INDEXES[32] = {
+  0, 1, -1, 1,
+  -1, 1, -1, 0,
+  -1, 0, -1, -1,
+  -1, -1, 0, -1,
+  0, -1, 1, -1,
+  1, -1, 1, 0,
+  1, 0, 1, 1,
+  1, 1, 0, 1
+};
+
+// For each sector, the (row, col) offset from the viewpoint of the pixel
+// that the sector is seeded with.
+const int BATCH_SECTOR_SEEDS[16] = {
+  -1, 2,
+  -2, 1,
+  -2, -1,
+  -1, -2,
+  1, -2,
+  2, -1,
+  2, 1,
+  1, 2
+};
+
+// A viewpoint of a batch, given by the indexes of its pixel in the DEM.
+struct BatchViewpoint {
+  long ix;
+  long iy;
+  // height of the structure above the DEM
+  double height;
+  // distance past which nothing is visible, or a negative number if there
+  // is no limit
+  double max_distance;
+  // weight of the viewpoint's visibility in the sum
+  double weight;
+};
+
+struct ViewshedTarget {
+  long ix;
+  long iy;
+  int ring_id;
+  int sector;
+  double distance_to_viewpoint;
+};
+
+// Orders targets by ring of blocks around the viewpoint, then by sector,
+// then by distance to the viewpoint, as viewshed.viewshed does.
+struct BlockwiseCloserViewshedTarget {
+  bool operator()(const ViewshedTarget& lhs, const ViewshedTarget& rhs) const {
+    if (lhs.ring_id < rhs.ring_id) {
+      return false;
+    }
+    if (lhs.ring_id == rhs.ring_id) {
+      if (lhs.sector < rhs.sector) {
+        return false;
+      }
+      if (lhs.sector == rhs.sector) {
+        if (lhs.distance_to_viewpoint < rhs.distance_to_viewpoint) {
+          return false;
+        }
+      }
+    }
+    return true;
+  }
+};
+
+typedef std::priority_queue<
+  ViewshedTarget, std::deque<ViewshedTarget>,
+  BlockwiseCloserViewshedTarget> ViewshedTargetQueue;
+
+// The parts of the DEM that every viewshed of a batch shares.
+struct BatchDEM {
+  // row-major elevations, and 1 where the elevation isn't nodata
+  double* elevation;
+  unsigned char* valid;
+  long x_size;
+  long y_size;
+  double nodata;
+  // mean pixel size in meters
+  double pixel_size;
+  // log2 of the DEM's block size, for the rings of blocks around viewpoints
+  int block_bits;
+  bool correct_for_curvature;
+  bool correct_for_refraction;
+  float refract_coeff;
+};
+
+// A window of the DEM that a viewshed is calculated in.
+struct ViewshedWindow {
+  long xoff;
+  long yoff;
+  long x_size;
+  long y_size;
+  // the distance past which nothing is visible
+  double max_visible_radius;
+};
+
+// Returns the window of the DEM that holds every pixel the viewshed of
+// `viewpoint` can visit: one pixel past its maximum distance, or the whole
+// DEM if its distance is not limited.
+inline ViewshedWindow viewshed_window(BatchDEM& dem,
+                                      BatchViewpoint& viewpoint) {
+  ViewshedWindow window;
+  if (viewpoint.max_distance < 0) {
+    window.xoff = 0;
+    window.yoff = 0;
+    window.x_size = dem.x_size;
+    window.y_size = dem.y_size;
+    window.max_visible_radius = std::hypot(
+      dem.x_size, dem.y_size) * dem.pixel_size;
+    return window;
+  }
+  long radius_in_pixels = static_cast<long>(
+    std::ceil(viewpoint.max_distance / dem.pixel_size)) + 1;
+  window.xoff = std::max(0L, viewpoint.ix - radius_in_pixels);
+  window.yoff = std::max(0L, viewpoint.iy - radius_in_pixels);
+  window.x_size = std::min(
+    dem.x_size, viewpoint.ix + radius_in_pixels + 1) - window.xoff;
+  window.y_size = std::min(
+    dem.y_size, viewpoint.iy + radius_in_pixels + 1) - window.yoff;
+  window.max_visible_radius = viewpoint.max_distance;
+  return window;
+}
+
+inline double batch_pixel_dist(long ix_source, long ix_target,
+                               long iy_source, long iy_target) {
+  return std::hypot(
+    std::max(ix_source, ix_target) - std::min(ix_source, ix_target),
+    std::max(iy_source, iy_target) - std::min(iy_source, iy_target));
+}
+
+// Calculates the viewshed of `viewpoint` within `window` of the DEM into
+// `visibility`, a row-major array of the window's pixels that are 1 where
+// visible, 0 where not and BATCH_VISIBILITY_NODATA where nodata or not
+// visited. `aux` and `queued` are working arrays of the same size.
+void window_viewshed(BatchDEM& dem, BatchViewpoint& viewpoint,
+                     ViewshedWindow& window, std::vector<double>& aux,
+                     std::vector<unsigned char>& visibility,
+                     std::vector<unsigned char>& queued) {
+  long raster_x_size = window.x_size;
+  long raster_y_size = window.y_size;
+  long n_pixels = raster_x_size * raster_y_size;
+  aux.assign(n_pixels, BATCH_AUX_NOT_VISITED);
+  visibility.assign(n_pixels, BATCH_VISIBILITY_NODATA);
+  queued.assign(n_pixels, 0);
+
+  auto elevation = [&](long x, long y) {
+    return dem.elevation[
+      (window.yoff + y) * dem.x_size + window.xoff + x];
+  };
+  double max_visible_radius = window.max_visible_radius;
+  double pixel_size = dem.pixel_size;
+  long ix_viewpoint = viewpoint.ix - window.xoff;
+  long iy_viewpoint = viewpoint.iy - window.yoff;
+
+  // As defined by Wang et al, the viewpoint and the immediate neighbors are
+  // all assumed to be visible.
+  for (long yi = iy_viewpoint - 1; yi < iy_viewpoint + 2; yi++) {
+    if (yi < 0 or yi >= raster_y_size) {
+      continue;
+    }
+    for (long xi = ix_viewpoint - 1; xi < ix_viewpoint + 2; xi++) {
+      if (xi < 0 or xi >= raster_x_size) {
+        continue;
+      }
+      aux[yi * raster_x_size + xi] = elevation(xi, yi);
+      visibility[yi * raster_x_size + xi] = 1;
+    }
+  }
+
+  long i = iy_viewpoint;
+  long j = ix_viewpoint;
+  double r_v = elevation(ix_viewpoint, iy_viewpoint) + viewpoint.height;
+
+  long ix_target, iy_target;
+  double target_dem_height, adjusted_dem_height;
+  double target_distance, slope_distance;
+  double previous_height;
+  double z = 0;
+  double adjustment, target_height_adjustment;
+  double sqrt2 = std::sqrt(2);
+
+  // Cardinal and intercardinal directions are constructed from only one
+  // previous pixel.
+  for (int i_n = 0; i_n < 8; i_n++) {
+    long ix_cardinal_target = BATCH_NEIGHBORS_INDEXES[2 * i_n];
+    long iy_cardinal_target = BATCH_NEIGHBORS_INDEXES[2 * i_n + 1];
+    int multiplier = 2;
+    while (true) {
+      iy_target = iy_viewpoint + iy_cardinal_target * multiplier;
+      if (iy_target < 0 or iy_target >= raster_y_size) {
+        break;
+      }
+      ix_target = ix_viewpoint + ix_cardinal_target * multiplier;
+      if (ix_target < 0 or ix_target >= raster_x_size) {
+        break;
+      }
+      long ix_prev_target = (
+        ix_viewpoint + ix_cardinal_target * (multiplier - 1));
+      long iy_prev_target = (
+        iy_viewpoint + iy_cardinal_target * (multiplier - 1));
+      previous_height = aux[iy_prev_target * raster_x_size + ix_prev_target];
+
+      if (std::max(ix_cardinal_target, iy_cardinal_target) == 0) {
+        slope_distance = std::labs(
+          std::min(ix_cardinal_target, iy_cardinal_target) * (multiplier - 1));
+        target_distance = std::labs(
+          std::min(ix_cardinal_target, iy_cardinal_target) * multiplier);
+      } else {
+        slope_distance = std::labs(
+          std::max(ix_cardinal_target, iy_cardinal_target) * (multiplier - 1));
+        target_distance = std::labs(
+          std::max(ix_cardinal_target, iy_cardinal_target) * multiplier);
+      }
+      if (ix_cardinal_target != 0 and iy_cardinal_target != 0) {
+        slope_distance *= sqrt2;
+        target_distance *= sqrt2;
+      }
+      target_distance *= pixel_size;
+      slope_distance *= pixel_size;
+
+      if (target_distance > max_visible_radius) {
+        break;
+      }
+
+      z = (((previous_height - r_v) / slope_distance) * target_distance) + r_v;
+
+      adjustment = 0.0;
+      if (dem.correct_for_curvature or dem.correct_for_refraction) {
+        target_height_adjustment = (
+          std::pow(target_distance, 2.0) * BATCH_DIAM_EARTH_INV);
+        if (dem.correct_for_curvature) {
+          adjustment += target_height_adjustment;
+        }
+        if (dem.correct_for_refraction) {
+          adjustment -= dem.refract_coeff * target_height_adjustment;
+        }
+      }
+
+      long target_index = iy_target * raster_x_size + ix_target;
+      target_dem_height = elevation(ix_target, iy_target);
+      adjusted_dem_height = target_dem_height - adjustment;
+      if (adjusted_dem_height >= z and
+          target_distance < max_visible_radius and
+          not is_close(target_dem_height, dem.nodata)) {
+        visibility[target_index] = 1;
+        aux[target_index] = adjusted_dem_height;
+      } else {
+        visibility[target_index] = 0;
+        aux[target_index] = z;
+      }
+      multiplier++;
+    }
+  }
+
+  // Seed each sector with a pixel in the same direction as the sector, if
+  // it's within the window.
+  ViewshedTargetQueue process_queue;
+  for (int sector = 0; sector < 8; sector++) {
+    long iy_seed = iy_viewpoint + BATCH_SECTOR_SEEDS[2 * sector];
+    if (iy_seed < 0 or iy_seed >= raster_y_size) {
+      continue;
+    }
+    long ix_seed = ix_viewpoint + BATCH_SECTOR_SEEDS[2 * sector + 1];
+    if (ix_seed < 0 or ix_seed >= raster_x_size) {
+      continue;
+    }
+    target_distance = batch_pixel_dist(
+      ix_viewpoint, ix_seed, iy_viewpoint, iy_seed) * pixel_size;
+    int ring_id = static_cast<int>(std::max(
+      std::labs((ix_viewpoint - ix_seed) >> dem.block_bits),
+      std::labs((iy_viewpoint - iy_seed) >> dem.block_bits)));
+    process_queue.push(
+      ViewshedTarget{ix_seed, iy_seed, ring_id, sector, target_distance});
+    queued[iy_seed * raster_x_size + ix_seed] = 1;
+  }
+
+  while (not process_queue.empty()) {
+    ViewshedTarget target_pixel = process_queue.top();
+    process_queue.pop();
+    long m = target_pixel.iy;
+    long n = target_pixel.ix;
+    queued[m * raster_x_size + n] = 0;
+
+    int sector = target_pixel.sector;
+    double r_n1 = aux[
+      (m + BATCH_SECTOR_TO_NEIGHBOR_1_INDEX[2 * sector]) * raster_x_size +
+      n + BATCH_SECTOR_TO_NEIGHBOR_1_INDEX[2 * sector + 1]];
+    double r_n2 = aux[
+      (m + BATCH_SECTOR_TO_NEIGHBOR_2_INDEX[2 * sector]) * raster_x_size +
+      n + BATCH_SECTOR_TO_NEIGHBOR_2_INDEX[2 * sector + 1]];
+
+    // The reference plane equations of Wang et al., as in viewshed.pyx.
+    switch (sector) {
+      case 0:
+        z = -(m-i)*(r_n1-r_n2)+(j-n)*((m-i)*(r_n1-r_n2)-r_v+r_n1)/(j+1-n)+r_v;
+        break;
+      case 1:
+        z = -(j-n)*(r_n1-r_n2)+(m-i)*((j-n)*(r_n1-r_n2)-r_v+r_n1)/(m+1-i)+r_v;
+        break;
+      case 2:
+        z = -(n-j)*(r_n1-r_n2)+(m-i)*((n-j)*(r_n1-r_n2)-r_v+r_n1)/(m+1-i)+r_v;
+        break;
+      case 3:
+        z = -(m-i)*(r_n1-r_n2)+(n-j)*((m-i)*(r_n1-r_n2)-r_v+r_n1)/(n+1-j)+r_v;
+        break;
+      case 4:
+        z = -(i-m)*(r_n1-r_n2)+(n-j)*((i-m)*(r_n1-r_n2)-r_v+r_n1)/(n+1-j)+r_v;
+        break;
+      case 5:
+        z = -(n-j)*(r_n1-r_n2)+(i-m)*((n-j)*(r_n1-r_n2)-r_v+r_n1)/(i+1-m)+r_v;
+        break;
+      case 6:
+        z = -(j-n)*(r_n1-r_n2)+(i-m)*((j-n)*(r_n1-r_n2)-r_v+r_n1)/(i+1-m)+r_v;
+        break;
+      case 7:
+        z = -(i-m)*(r_n1-r_n2)+(j-n)*((i-m)*(r_n1-r_n2)-r_v+r_n1)/(j+1-n)+r_v;
+        break;
+    }
+
+    adjustment = 0.0;
+    if (dem.correct_for_curvature or dem.correct_for_refraction) {
+      target_height_adjustment = (
+        std::pow(target_pixel.distance_to_viewpoint, 2.0) *
+        BATCH_DIAM_EARTH_INV);
+      if (dem.correct_for_curvature) {
+        adjustment += target_height_adjustment;
+      }
+      if (dem.correct_for_refraction) {
+        adjustment -= dem.refract_coeff * target_height_adjustment;
+      }
+    }
+
+    long target_index = m * raster_x_size + n;
+    target_dem_height = elevation(n, m);
+    adjusted_dem_height = target_dem_height - adjustment;
+    if (is_close(target_dem_height, dem.nodata)) {
+      visibility[target_index] = BATCH_VISIBILITY_NODATA;
+      aux[target_index] = z;
+    } else if (adjusted_dem_height >= z and
+               target_pixel.distance_to_viewpoint < max_visible_radius) {
+      visibility[target_index] = 1;
+      aux[target_index] = adjusted_dem_height;
+    } else {
+      visibility[target_index] = 0;
+      aux[target_index] = z;
+    }
+
+    // Queue the pixels that depend on this one.
+    for (int next_target_idx = sector * 4; next_target_idx < sector * 4 + 4;
+         next_target_idx += 2) {
+      long iy_next_target = (
+        m + BATCH_SECTOR_NEXT_TARGET_INDEXES[next_target_idx]);
+      long ix_next_target = (
+        n + BATCH_SECTOR_NEXT_TARGET_INDEXES[next_target_idx + 1]);
+      if (iy_next_target < 0 or iy_next_target >= raster_y_size) {
+        continue;
+      }
+      if (ix_next_target < 0 or ix_next_target >= raster_x_size) {
+        continue;
+      }
+      long next_index = iy_next_target * raster_x_size + ix_next_target;
+      if (queued[next_index]) {
+        continue;
+      }
+      target_distance = batch_pixel_dist(
+        ix_next_target, ix_viewpoint,
+        iy_next_target, iy_viewpoint) * pixel_size;
+      if (target_distance > max_visible_radius) {
+        continue;
+      }
+      int ring_id = static_cast<int>(std::max(
+        std::labs((ix_viewpoint - ix_next_target) >> dem.block_bits),
+        std::labs((iy_viewpoint - iy_next_target) >> dem.block_bits)));
+      process_queue.push(ViewshedTarget{
+        ix_next_target, iy_next_target, ring_id, sector, target_distance});
+      queued[next_index] = 1;
+    }
+  }
+}
+
+// The most bytes of finished viewsheds that sum_visibility holds while
+// they wait for the viewsheds before them to be added to the sum.
+const size_t BATCH_MAX_BUFFERED_BYTES = 1 << 28;
+
+// A viewshed that has been calculated but not yet added to the sum.
+struct FinishedViewshed {
+  ViewshedWindow window;
+  // as in window_viewshed
+  std::vector<unsigned char> visibility;
+};
+
+// Adds `weight` to `visibility_sum` where `viewshed` is visible and the DEM
+// is valid.
+inline void add_to_sum(BatchDEM& dem, FinishedViewshed& viewshed,
+                       double weight, float* visibility_sum) {
+  ViewshedWindow& window = viewshed.window;
+  for (long y = 0; y < window.y_size; y++) {
+    for (long x = 0; x < window.x_size; x++) {
+      long dem_index = (window.yoff + y) * dem.x_size + window.xoff + x;
+      if (viewshed.visibility[y * window.x_size + x] == 1 and
+          dem.valid[dem_index]) {
+        visibility_sum[dem_index] = static_cast<float>(
+          static_cast<double>(visibility_sum[dem_index]) + weight);
+      }
+    }
+  }
+}
+
+// Calculates the viewsheds of a batch of viewpoints on `n_workers` threads
+// and adds the weight of each viewpoint to `visibility_sum` where it is
+// visible and the DEM is valid.
+//
+// The threads share the DEM, which is held in memory, and each calculates
+// one viewshed at a time within the window of the DEM that it can reach.
+// Weights are added to the sum in the order of the viewpoints, so that the
+// sum is the same whatever the number of threads. A viewshed that finishes
+// before the ones ahead of it is held until they are added, and a thread
+// only waits once BATCH_MAX_BUFFERED_BYTES are held. Whichever thread
+// finishes the next viewshed to add adds it and any held ones that follow
+// it. The threads don't call into Python, so this may be called without
+// the GIL.
+// Args:
+//   dem: the DEM
+//   viewpoints: the viewpoints of the batch
+//   visibility_sum: row-major float32 array the size of the DEM to add to
+//   n_workers: number of threads to start. If less than 2, the viewsheds
+//     are calculated in the calling thread.
+// If a thread throws, the others stop after their current viewshed and the
+// exception is rethrown here.
+void sum_visibility(BatchDEM& dem, std::vector<BatchViewpoint>& viewpoints,
+                    float* visibility_sum, int n_workers) {
+  std::atomic<size_t> next_viewpoint { 0 };
+  // the finished viewsheds waiting to be added, by viewpoint index, the
+  // bytes they hold, the number of viewsheds added to the sum and whether a
+  // thread is adding them, all guarded by `sum_mutex`
+  std::map<size_t, FinishedViewshed> finished;
+  size_t buffered_bytes = 0;
+  size_t n_summed = 0;
+  bool summing = false;
+  std::mutex sum_mutex;
+  std::condition_variable sum_cv;
+  std::exception_ptr error;
+
+  auto run_worker = [&]() {
+    std::vector<double> aux;
+    std::vector<unsigned char> queued;
+    try {
+      while (true) {
+        size_t index = next_viewpoint++;
+        if (index >= viewpoints.size()) {
+          break;
+        }
+        FinishedViewshed viewshed;
+        viewshed.window = viewshed_window(dem, viewpoints[index]);
+        window_viewshed(dem, viewpoints[index], viewshed.window, aux,
+                        viewshed.visibility, queued);
+        size_t n_bytes = viewshed.visibility.size();
+
+        std::unique_lock<std::mutex> sum_lock(sum_mutex);
+        // the next viewshed to add never waits, so the held ones can
+        // always be added
+        sum_cv.wait(sum_lock, [&] {
+          return (index == n_summed or error or
+                  buffered_bytes + n_bytes <= BATCH_MAX_BUFFERED_BYTES);
+        });
+        if (error) {
+          break;
+        }
+        finished.emplace(index, std::move(viewshed));
+        buffered_bytes += n_bytes;
+        if (summing) {
+          // the thread that is adding viewsheds will add this one in turn
+          continue;
+        }
+        summing = true;
+        while (true) {
+          auto next = finished.find(n_summed);
+          if (next == finished.end()) {
+            break;
+          }
+          size_t summed_index = next->first;
+          FinishedViewshed next_viewshed = std::move(next->second);
+          finished.erase(next);
+          sum_lock.unlock();
+          add_to_sum(dem, next_viewshed, viewpoints[summed_index].weight,
+                     visibility_sum);
+          sum_lock.lock();
+          buffered_bytes -= next_viewshed.visibility.size();
+          n_summed++;
+          sum_cv.notify_all();
+        }
+        summing = false;
+      }
+    } catch (...) {
+      std::lock_guard<std::mutex> sum_lock(sum_mutex);
+      if (not error) {
+        error = std::current_exception();
+      }
+      sum_cv.notify_all();
+    }
+  };
+
+  if (n_workers < 2) {
+    run_worker();
+  } else {
+    std::vector<std::thread> workers;
+    for (int i = 0; i < n_workers; i++) {
+      workers.push_back(std::thread(run_worker));
+    }
+    for (auto& worker: workers) {
+      worker.join();
+    }
+  }
+  if (error) {
+    std::rethrow_exception(error);
+  }
+}
+
+#endif  // NATCAP_INVEST_BATCH_VIEWSHED_H_
@@ -0,0 +1,27 @@
+from libcpp.vector cimport vector
+
+cdef extern from "batch_viewshed.h" nogil:
+    cdef struct BatchViewpoint:
+        long ix
+        long iy
+        double height
+        double max_distance
+        double weight
+
+    cdef struct BatchDEM:
+        double* elevation
+        unsigned char* valid
+        long x_size
+        long y_size
+        double nodata
+        double pixel_size
+        int block_bits
+        bint correct_for_curvature
+        bint correct_for_refraction
+        float refract_coeff
+
+    void sum_visibility(
+        BatchDEM&,
+        vector[BatchViewpoint]&,
+        float*,
+        int) except +
@@ -11,6 +11,7 @@ import pygeoprocessing
 import rtree
 import shapely.geometry
 from natcap.invest.scenic_quality.viewshed import viewshed
+from natcap.invest.scenic_quality.viewshed import weighted_viewshed_sum
 from osgeo import gdal
 from osgeo import osr
 
@@ -28,6 +29,10 @@ BYTE_GTIFF_CREATION_OPTIONS = (
               'BLOCKXSIZE=256', 'BLOCKYSIZE=256'))
 FLOAT_GTIFF_CREATION_OPTIONS = (
     'GTIFF', ('PREDICTOR=3',) + BYTE_GTIFF_CREATION_OPTIONS[1])
+# The largest DEM, in pixels, whose viewsheds are summed in memory by
+# ``weighted_viewshed_sum``, which holds 13 bytes per pixel of the DEM.
+# Viewsheds of larger DEMs are written to disk and summed from there.
+_MAX_IN_MEMORY_SUM_PIXELS = 2**26
 
 MODEL_SPEC = spec.ModelSpec(
     model_id="scenic_quality",
@@ -47,6 +52,7 @@ MODEL_SPEC = spec.ModelSpec(
         spec.WORKSPACE,
         spec.SUFFIX,
         spec.N_WORKERS,
+        spec.KERNEL_THREADS,
         spec.AOI.model_copy(update=dict(id="aoi_path")),
         spec.VectorInput(
             id="structure_path",
@@ -236,7 +242,8 @@ MODEL_SPEC = spec.ModelSpec(
                 " the distances of pixels from the structure's viewpoint, the"
                 " weight of the viewpoint, the valuation function, and the a and"
                 " b coefficients. The viewshed’s value is only evaluated for"
-                " visible pixels."
+                " visible pixels. This raster covers the same part of the DEM"
+                " as the structure's visibility raster."
             ),
             created_if="do_valuation",
             data_type=float,
@@ -248,8 +255,11 @@ MODEL_SPEC = spec.ModelSpec(
             about=(
                 "Map of visibility for a given structure's viewpoint. This raster"
                 " has pixel values of 0 (not visible), 1 (visible), or nodata"
-                " (where the DEM is nodata)."
+                " (where the DEM is nodata). If the structure has a radius,"
+                " this raster only covers the part of the DEM within that"
+                " radius."
             ),
+            created_if="do_valuation",
             data_type=int,
             units=None
         ),
@@ -293,6 +303,8 @@ def execute(args):
         args['n_workers'] (int): (optional) The number of worker processes to
             use for processing this model. If omitted, computation will take
             place in the current process.
+        args['kernel_threads'] (int): (optional) The number of threads to
+            calculate the viewsheds summed in memory on. Defaults to 1.
 
     Returns:
         File registry dictionary mapping MODEL_SPEC output ids to absolute paths
@@ -363,63 +375,104 @@ def execute(args):
     # helps avoid unnecessary recomputation in taskgraph for when an ESRI
     # Shapefile, for example, returns a different order of points because
     # someone decided to repack it.
+    sorted_viewpoint_tuples = sorted(viewpoint_tuples, key=lambda x: x[0])
+
+    # The viewsheds are summed in memory, without writing a visibility
+    # raster for each viewpoint, unless the DEM is too large to hold in
+    # memory. Valuation needs the distance to each viewpoint from the pixels
+    # it is visible from, so the visibility rasters are also written for it.
+    # If they are only written to be summed, they're written to a temporary
+    # directory that is removed once they are.
+    dem_x_size, dem_y_size = pygeoprocessing.get_raster_info(
+        file_registry['dem_clipped'])['raster_size']
+    sum_in_memory = dem_x_size * dem_y_size <= _MAX_IN_MEMORY_SUM_PIXELS
     viewshed_files = []
     viewshed_tasks = []
     valuation_tasks = []
     valuation_filepaths = []
-    weights = []
-    feature_index = 0
-    for viewpoint, max_radius, weight, viewpoint_height in sorted(
-            viewpoint_tuples, key=lambda x: x[0]):
-        weights.append(weight)
-        viewshed_files.append(file_registry['visibility_[FEATURE_ID]', feature_index])
-        viewshed_task = graph.add_task(
-            viewshed,
-            args=((file_registry['dem_clipped'], 1),  # DEM
-                  viewpoint,
-                  file_registry['visibility_[FEATURE_ID]', feature_index]),
-            kwargs={'curved_earth': True,  # SQ model always assumes this.
-                    'refraction_coeff': args['refraction'],
-                    'max_distance': max_radius,
-                    'viewpoint_height': viewpoint_height,
-                    'aux_filepath': None},  # Remove aux filepath after run
-            target_path_list=[file_registry['visibility_[FEATURE_ID]', feature_index]],
-            dependent_task_list=[clipped_dem_task,
-                                 clipped_viewpoints_task],
-            task_name='calculate_visibility_%s' % feature_index)
-        viewshed_tasks.append(viewshed_task)
-
-        if args['do_valuation']:
-            # calculate valuation
-            viewshed_valuation_path = file_registry['value_[FEATURE_ID]', feature_index]
-            valuation_task = graph.add_task(
-                _calculate_valuation,
-                args=(file_registry['visibility_[FEATURE_ID]', feature_index],
+    visibility_dir = None
+    if not args['do_valuation'] and not sum_in_memory:
+        visibility_dir = tempfile.mkdtemp(
+            dir=args['workspace_dir'], prefix='visibility')
+    if args['do_valuation'] or not sum_in_memory:
+        for feature_index, (viewpoint, max_radius, weight,
+                            viewpoint_height) in enumerate(
+                                sorted_viewpoint_tuples):
+            if visibility_dir is None:
+                visibility_path = file_registry[
+                    'visibility_[FEATURE_ID]', feature_index]
+            else:
+                visibility_path = os.path.join(
+                    visibility_dir, f'visibility_{feature_index}.tif')
+            viewshed_task = graph.add_task(
+                _calculate_visibility,
+                args=(file_registry['dem_clipped'],
                       viewpoint,
-                      weight,  # user defined, from WEIGHT field in vector
-                      args['valuation_function'],
-                      args['a_coef'],
-                      args['b_coef'],
-                      args['max_valuation_radius'],
-                      viewshed_valuation_path),
-                target_path_list=[viewshed_valuation_path],
-                dependent_task_list=[viewshed_task],
-                task_name=f'calculate_valuation_for_viewshed_{feature_index}')
-            valuation_tasks.append(valuation_task)
-            valuation_filepaths.append(viewshed_valuation_path)
-
-        feature_index += 1
+                      max_radius,
+                      viewpoint_height,
+                      args['refraction'],
+                      visibility_path,
+                      args['workspace_dir']),
+                target_path_list=[visibility_path],
+                dependent_task_list=[clipped_dem_task,
+                                     clipped_viewpoints_task],
+                task_name='calculate_visibility_%s' % feature_index)
+            viewshed_files.append(visibility_path)
+            viewshed_tasks.append(viewshed_task)
+
+            if args['do_valuation']:
+                # calculate valuation
+                viewshed_valuation_path = file_registry[
+                    'value_[FEATURE_ID]', feature_index]
+                valuation_task = graph.add_task(
+                    _calculate_valuation,
+                    args=(visibility_path,
+                          viewpoint,
+                          weight,  # user defined, from WEIGHT field in vector
+                          args['valuation_function'],
+                          args['a_coef'],
+                          args['b_coef'],
+                          args['max_valuation_radius'],
+                          viewshed_valuation_path),
+                    target_path_list=[viewshed_valuation_path],
+                    dependent_task_list=[viewshed_task],
+                    task_name=(
+                        f'calculate_valuation_for_viewshed_{feature_index}'))
+                valuation_tasks.append(valuation_task)
+                valuation_filepaths.append(viewshed_valuation_path)
 
     # The weighted visible structures raster is a leaf node
-    weighted_visible_structures_task = graph.add_task(
-        _count_and_weight_visible_structures,
-        args=(viewshed_files,
-              weights,
-              file_registry['dem_clipped'],
-              file_registry['vshed']),
-        target_path_list=[file_registry['vshed']],
-        dependent_task_list=sorted(viewshed_tasks),
-        task_name='sum_visibility_for_all_structures')
+    if sum_in_memory:
+        weighted_visible_structures_task = graph.add_task(
+            weighted_viewshed_sum,
+            args=((file_registry['dem_clipped'], 1),
+                  sorted_viewpoint_tuples,
+                  file_registry['vshed']),
+            kwargs={
+                'curved_earth': True,  # SQ model always assumes this.
+                'refraction_coeff': args['refraction'],
+                'n_workers': args['kernel_threads'] or 1,
+            },
+            target_path_list=[file_registry['vshed']],
+            dependent_task_list=[clipped_dem_task, clipped_viewpoints_task],
+            task_name='sum_visibility_for_all_structures')
+    else:
+        weighted_visible_structures_task = graph.add_task(
+            _count_and_weight_visible_structures,
+            args=(viewshed_files,
+                  [weight for (_, _, weight, _) in sorted_viewpoint_tuples],
+                  file_registry['dem_clipped'],
+                  file_registry['vshed']),
+            target_path_list=[file_registry['vshed']],
+            dependent_task_list=sorted(viewshed_tasks),
+            task_name='sum_visibility_for_all_structures')
+        if visibility_dir is not None:
+            graph.add_task(
+                shutil.rmtree,
+                args=(visibility_dir,),
+                kwargs={'ignore_errors': True},
+                dependent_task_list=[weighted_visible_structures_task],
+                task_name='remove_visibility_rasters')
 
     # If we're not doing valuation, we can still compute visual quality,
     # we'll just use the weighted visible structures raster instead of the
@@ -442,7 +495,6 @@ def execute(args):
     graph.add_task(
         _calculate_visual_quality,
         args=(parent_visual_quality_raster_path,
-              args['workspace_dir'],
               file_registry['vshed_qual']),
         dependent_task_list=[parent_visual_quality_task],
         target_path_list=[file_registry['vshed_qual']],
@@ -693,15 +745,199 @@ def _clip_vector(shape_to_clip_path, binding_shape_path, output_path):
     binding_shape = None
 
 
+def _calculate_visibility(dem_path, viewpoint, max_radius, viewpoint_height,
+                          refraction_coeff, visibility_path, working_dir):
+    """Calculate the viewshed of a viewpoint in a window of the DEM.
+
+    Nothing beyond ``max_radius`` of the viewpoint is visible, so the
+    viewshed is calculated on a copy of the part of the DEM within that
+    radius, and the visibility raster covers only that window. Its
+    geotransform places it within the DEM.
+
+    Args:
+        dem_path (string): The path to the clipped DEM.
+        viewpoint (tuple): The viewpoint in projected coordinates (x, y).
+        max_radius (number): The maximum radius of the viewshed in meters,
+            or ``None`` if it is not limited. If ``None``, the visibility
+            raster covers the whole DEM.
+        viewpoint_height (number): The height of the structure at the
+            viewpoint.
+        refraction_coeff (number): The coefficient of atmospheric refraction.
+        visibility_path (string): The path to where the visibility raster
+            will be written.
+        working_dir (string): A directory where working files can be saved.
+            A new temporary directory will be created within and removed at
+            the end of the function.
+
+    Returns:
+        ``None``
+
+    """
+    viewshed_kwargs = {
+        'curved_earth': True,  # SQ model always assumes this.
+        'refraction_coeff': refraction_coeff,
+        'max_distance': max_radius,
+        'viewpoint_height': viewpoint_height,
+        'aux_filepath': None,  # Remove aux filepath after run
+    }
+    dem_raster_info = pygeoprocessing.get_raster_info(dem_path)
+    dem_gt = dem_raster_info['geotransform']
+    n_cols, n_rows = dem_raster_info['raster_size']
+    ix_viewpoint = int((viewpoint[0] - dem_gt[0]) / dem_gt[1])
+    iy_viewpoint = int((viewpoint[1] - dem_gt[3]) / dem_gt[5])
+
+    if max_radius is not None:
+        # The window reaches one pixel past the radius, as the viewshed
+        # does, so that it holds every pixel the viewshed can visit.
+        spatial_reference = osr.SpatialReference()
+        spatial_reference.ImportFromWkt(dem_raster_info['projection_wkt'])
+        pixel_size_in_m = utils.mean_pixel_size_and_area(
+            dem_raster_info['pixel_size'])[0] * (
+                spatial_reference.GetLinearUnits())
+        radius_in_pixels = int(math.ceil(max_radius / pixel_size_in_m)) + 1
+        xoff = max(0, ix_viewpoint - radius_in_pixels)
+        yoff = max(0, iy_viewpoint - radius_in_pixels)
+        win_xsize = min(n_cols, ix_viewpoint + radius_in_pixels + 1) - xoff
+        win_ysize = min(n_rows, iy_viewpoint + radius_in_pixels + 1) - yoff
+        if (win_xsize, win_ysize) != (n_cols, n_rows):
+            temp_dir = tempfile.mkdtemp(dir=working_dir, prefix='viewshed')
+            try:
+                window_dem_path = os.path.join(temp_dir, 'dem_window.tif')
+                gdal.Translate(
+                    window_dem_path, dem_path,
+                    format=FLOAT_GTIFF_CREATION_OPTIONS[0],
+                    srcWin=[xoff, yoff, win_xsize, win_ysize],
+                    creationOptions=list(FLOAT_GTIFF_CREATION_OPTIONS[1]))
+                # The center of the viewpoint's pixel identifies the same
+                # pixel in the window without any rounding error.
+                pixel_center = (
+                    dem_gt[0] + (ix_viewpoint + 0.5) * dem_gt[1],
+                    dem_gt[3] + (iy_viewpoint + 0.5) * dem_gt[5])
+                viewshed((window_dem_path, 1), pixel_center, visibility_path,
+                         **viewshed_kwargs)
+            finally:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+            return
+
+    viewshed((dem_path, 1), viewpoint, visibility_path, **viewshed_kwargs)
+
+
+def _sum_windowed_rasters(dem_path, raster_path_list, value_op, target_path,
+                          target_datatype, target_nodata):
+    """Sum rasters that each cover a window of the DEM.
+
+    Each raster in ``raster_path_list`` must be on the DEM's pixel grid and
+    within its bounds, like the visibility and valuation rasters of the
+    viewpoints. Only the pixels within each raster's window are read and
+    updated, so the cost of the sum scales with the sizes of the windows
+    rather than with the size of the DEM times the number of rasters.
+
+    Args:
+        dem_path (string): The path to the clipped DEM. The target raster
+            has the DEM's extent, and is nodata where the DEM is nodata.
+        raster_path_list (list of strings): Paths to the rasters to sum.
+        value_op (callable): A function taking a block of a raster and the
+            index of that raster in ``raster_path_list``, and returning the
+            values to add to the target for that block.
+        target_path (string): The path to where the output raster will be
+            written. If a file exists at this path, it will be overwritten.
+        target_datatype (int): The GDAL datatype of the target raster.
+        target_nodata (number): The nodata value of the target raster.
+
+    Returns:
+        ``None``
+
+    """
+    dem_raster_info = pygeoprocessing.get_raster_info(dem_path)
+    dem_nodata = dem_raster_info['nodata'][0]
+    dem_gt = dem_raster_info['geotransform']
+
+    def _init_op(dem):
+        target = numpy.full(dem.shape, target_nodata, dtype=numpy.float64)
+        target[~pygeoprocessing.array_equals_nodata(dem, dem_nodata)] = 0
+        return target
+
+    pygeoprocessing.raster_calculator(
+        [(dem_path, 1)], _init_op, target_path, target_datatype,
+        target_nodata,
+        raster_driver_creation_tuple=FLOAT_GTIFF_CREATION_OPTIONS)
+
+    target_raster = gdal.OpenEx(target_path, gdal.OF_RASTER | gdal.GA_Update)
+    target_band = target_raster.GetRasterBand(1)
+    dem_raster = gdal.OpenEx(dem_path, gdal.OF_RASTER)
+    dem_band = dem_raster.GetRasterBand(1)
+    last_log_time = time.time()
+    for raster_index, raster_path in enumerate(raster_path_list):
+        if time.time() - last_log_time > 5.0:
+            LOGGER.info('Summed %d of %d rasters', raster_index,
+                        len(raster_path_list))
+            last_log_time = time.time()
+
+        # offset of the raster's window in the DEM
+        raster_gt = pygeoprocessing.get_raster_info(
+            raster_path)['geotransform']
+        window_xoff = int(round((raster_gt[0] - dem_gt[0]) / dem_gt[1]))
+        window_yoff = int(round((raster_gt[3] - dem_gt[3]) / dem_gt[5]))
+
+        for block_info, block in pygeoprocessing.iterblocks((raster_path, 1)):
+            dem_block_info = {
+                'xoff': window_xoff + block_info['xoff'],
+                'yoff': window_yoff + block_info['yoff'],
+                'win_xsize': block_info['win_xsize'],
+                'win_ysize': block_info['win_ysize'],
+            }
+            valid_mask = ~pygeoprocessing.array_equals_nodata(
+                dem_band.ReadAsArray(**dem_block_info), dem_nodata)
+            target_block = target_band.ReadAsArray(**dem_block_info)
+            target_block[valid_mask] += value_op(
+                block, raster_index)[valid_mask]
+            target_band.WriteArray(
+                target_block, xoff=dem_block_info['xoff'],
+                yoff=dem_block_info['yoff'])
+
+    target_band.ComputeStatistics(0)
+    target_band = None
+    target_raster = None
+    dem_band = None
+    dem_raster = None
+
+
+def _count_and_weight_visible_structures(visibility_raster_path_list, weights,
+                                         clipped_dem_path, target_path):
+    """Count (and weight) the number of visible structures for each pixel.
+
+    Args:
+        visibility_raster_path_list (list of strings): A list of paths to
+            visibility rasters, each of which covers a window of the DEM.
+        weights (list of numbers): A list of numeric weights to apply to each
+            visibility raster. There must be the same number of weights in
+            this list as there are elements in visibility_rasters.
+        clipped_dem_path (string): String path to the DEM.
+        target_path (string): The path to where the output raster is stored.
+
+    Returns:
+        ``None``
+
+    """
+    LOGGER.info('Summing and weighting %d visibility rasters',
+                len(visibility_raster_path_list))
+
+    def _visibility_op(visibility_matrix, index):
+        return numpy.where(visibility_matrix == 1, weights[index], 0)
+
+    _sum_windowed_rasters(
+        clipped_dem_path, visibility_raster_path_list, _visibility_op,
+        target_path, gdal.GDT_Float32, -1)
+
+
 def _sum_valuation_rasters(dem_path, valuation_filepaths, target_path):
     """Sum up all valuation rasters.
 
     Args:
-        dem_path (string): A path to the DEM. Must perfectly overlap all of
-            the rasters in ``valuation_filepaths``.
+        dem_path (string): A path to the DEM. Each of the rasters in
+            ``valuation_filepaths`` must cover a window of it.
         valuation_filepaths (list of strings): A list of paths to individual
-            valuation rasters. All rasters in this list must overlap
-            perfectly.
+            valuation rasters.
         target_path (string): The path on disk where the output raster will be
             written. If a file exists at this path, it will be overwritten.
 
@@ -709,25 +945,15 @@ def _sum_valuation_rasters(dem_path, valuation_filepaths, target_path):
         ``None``
 
     """
-    dem_nodata = pygeoprocessing.get_raster_info(dem_path)['nodata'][0]
-
-    def _sum_rasters(dem, *valuation_rasters):
-        valid_dem_pixels = ~pygeoprocessing.array_equals_nodata(dem, dem_nodata)
-        raster_sum = numpy.empty(dem.shape, dtype=numpy.float64)
-        raster_sum[:] = _VALUATION_NODATA
-        raster_sum[valid_dem_pixels] = 0
+    def _valuation_op(valuation_matrix, index):
+        return numpy.where(
+            pygeoprocessing.array_equals_nodata(
+                valuation_matrix, _VALUATION_NODATA),
+            0, valuation_matrix)
 
-        for valuation_matrix in valuation_rasters:
-            valid_pixels = (
-                ~pygeoprocessing.array_equals_nodata(valuation_matrix, _VALUATION_NODATA)
-                & valid_dem_pixels)
-            raster_sum[valid_pixels] += valuation_matrix[valid_pixels]
-        return raster_sum
-
-    pygeoprocessing.raster_calculator(
-        [(dem_path, 1)] + [(path, 1) for path in valuation_filepaths],
-        _sum_rasters, target_path, gdal.GDT_Float64, _VALUATION_NODATA,
-        raster_driver_creation_tuple=FLOAT_GTIFF_CREATION_OPTIONS)
+    _sum_windowed_rasters(
+        dem_path, valuation_filepaths, _valuation_op, target_path,
+        gdal.GDT_Float64, _VALUATION_NODATA)
 
 
 def _calculate_valuation(visibility_path, viewpoint, weight,
@@ -929,90 +1155,7 @@ def _clip_and_mask_dem(dem_path, aoi_path, target_path, working_dir):
     shutil.rmtree(temp_dir, ignore_errors=True)
 
 
-def _count_and_weight_visible_structures(visibility_raster_path_list, weights,
-                                         clipped_dem_path, target_path):
-    """Count (and weight) the number of visible structures for each pixel.
-
-    Args:
-        visibility_raster_path_list (list of strings): A list of strings to
-            perfectly overlapping visibility rasters.
-        weights (list of numbers): A list of numeric weights to apply to each
-            visibility raster. There must be the same number of weights in
-            this list as there are elements in visibility_rasters.
-        clipped_dem_path (string): String path to the DEM.
-        target_path (string): The path to where the output raster is stored.
-
-    Returns:
-        ``None``
-
-    """
-    LOGGER.info('Summing and weighting %d visibility rasters',
-                len(visibility_raster_path_list))
-    target_nodata = -1
-    dem_raster_info = pygeoprocessing.get_raster_info(clipped_dem_path)
-    dem_nodata = dem_raster_info['nodata'][0]
-
-    pygeoprocessing.new_raster_from_base(
-        clipped_dem_path, target_path, gdal.GDT_Float32, [target_nodata],
-        raster_driver_creation_tuple=FLOAT_GTIFF_CREATION_OPTIONS)
-
-    weighted_sum_visibility_raster = gdal.OpenEx(
-        target_path, gdal.OF_RASTER | gdal.GA_Update)
-    weighted_sum_visibility_band = (
-        weighted_sum_visibility_raster.GetRasterBand(1))
-
-    dem_raster = gdal.OpenEx(clipped_dem_path, gdal.OF_RASTER)
-    dem_band = dem_raster.GetRasterBand(1)
-    last_log_time = time.time()
-    n_visibility_pixels = (
-        dem_raster_info['raster_size'][0] * dem_raster_info['raster_size'][1] *
-        len(visibility_raster_path_list))
-    n_visibility_pixels_touched = 0
-    for block_data in pygeoprocessing.iterblocks((clipped_dem_path, 1),
-                                                 offset_only=True):
-        dem_block = dem_band.ReadAsArray(**block_data)
-        valid_mask = ~pygeoprocessing.array_equals_nodata(dem_block, dem_nodata)
-
-        visibility_sum = numpy.empty(dem_block.shape, dtype=numpy.float32)
-        visibility_sum[:] = target_nodata
-        visibility_sum[valid_mask] = 0
-
-        # Weight and sum the outputs, only opening one raster at a time.
-        # Opening rasters one at a time avoids errors about having too many
-        # files open at once and also avoids possible out-of-memory errors
-        # relative to if we were to open all the incoming rasters at once.
-        for vis_raster_path, weight in zip(visibility_raster_path_list,
-                                           weights):
-            if time.time() - last_log_time > 5.0:
-                LOGGER.info(
-                    'Weighting and summing approx. %.2f%% complete.',
-                    100.0 * (n_visibility_pixels_touched / n_visibility_pixels))
-                last_log_time = time.time()
-
-            visibility_raster = gdal.OpenEx(vis_raster_path, gdal.OF_RASTER)
-            visibility_band = visibility_raster.GetRasterBand(1)
-            visibility_block = visibility_band.ReadAsArray(**block_data)
-
-            visible_mask = (valid_mask & (visibility_block == 1))
-            visibility_sum[visible_mask] += (
-                visibility_block[visible_mask] * weight)
-
-            visibility_band = None
-            visibility_raster = None
-            n_visibility_pixels_touched += dem_block.size
-
-        weighted_sum_visibility_band.WriteArray(
-            visibility_sum, xoff=block_data['xoff'], yoff=block_data['yoff'])
-
-    weighted_sum_visibility_band.ComputeStatistics(0)
-    weighted_sum_visibility_band = None
-    weighted_sum_visibility_raster = None
-
-    dem_band = None
-    dem_raster = None
-
-
-def _calculate_visual_quality(source_raster_path, working_dir, target_path):
+def _calculate_visual_quality(source_raster_path, target_path):
     """Calculate visual quality based on a raster.
 
     Visual quality is based on the nearest-rank method for breaking pixel
@@ -1022,9 +1165,6 @@ def _calculate_visual_quality(source_raster_path, working_dir, target_path):
         source_raster_path (string): The path to a raster from which
             percentiles should be calculated. Nodata values and pixel values
             of 0 are ignored.
-        working_dir (string): A directory where working files can be saved.
-            A new temporary directory will be created within. This new
-            temporary directory will be removed at the end of the function.
         target_path (string): The path to where the output raster will be
             written.
 
@@ -1035,41 +1175,12 @@ def _calculate_visual_quality(source_raster_path, working_dir, target_path):
     # Using the nearest-rank method.
     LOGGER.info('Calculating visual quality')
 
-    raster_info = pygeoprocessing.get_raster_info(source_raster_path)
-    raster_nodata = raster_info['nodata'][0]
-
-    temp_dir = os.path.normpath(
-        tempfile.mkdtemp(dir=working_dir, prefix='visual_quality'))
-
     # phase 1: calculate percentiles from the visible_structures raster
     LOGGER.info('Determining percentiles for %s',
                 os.path.basename(source_raster_path))
-
-    def _mask_zeros(valuation_matrix):
-        """Assign zeros to nodata, excluding them from percentile calc."""
-        valid_mask = ~numpy.isclose(valuation_matrix, 0.0)
-        if raster_nodata is not None:
-            valid_mask &= ~pygeoprocessing.array_equals_nodata(
-                valuation_matrix, raster_nodata)
-        visual_quality = numpy.empty(valuation_matrix.shape,
-                                     dtype=numpy.float64)
-        visual_quality[:] = _VALUATION_NODATA
-        visual_quality[valid_mask] = valuation_matrix[valid_mask]
-        return visual_quality
-
-    masked_raster_path = os.path.join(temp_dir, 'zeros_masked.tif')
-    pygeoprocessing.raster_calculator(
-        [(source_raster_path, 1)], _mask_zeros, masked_raster_path,
-        gdal.GDT_Float64, _VALUATION_NODATA,
-        raster_driver_creation_tuple=FLOAT_GTIFF_CREATION_OPTIONS)
-
-    # The directory passed to raster_band_percentile() is expected to not exist
-    # or be completely empty.
-    percentiles_working_dir = os.path.join(temp_dir, 'percentiles_working_dir')
-    percentile_values = pygeoprocessing.raster_band_percentile(
-        (masked_raster_path, 1), percentiles_working_dir, [0., 25., 50., 75.])
-
-    shutil.rmtree(temp_dir, ignore_errors=True)
+    percentile_values = utils.raster_band_percentiles(
+        (source_raster_path, 1), [0., 25., 50., 75.],
+        valid_op=lambda array: ~numpy.isclose(array, 0.0))
 
     # Phase 2: map values to their bins to indicate visual quality.
     percentile_bins = numpy.array(percentile_values)
@@ -36,11 +36,15 @@ from libcpp.set cimport set as cset
 from libcpp.deque cimport deque
 from libcpp.pair cimport pair
 from libcpp.queue cimport queue
+from libcpp.vector cimport vector
 from libc cimport math
 cimport numpy
 cimport cython
 from ..managed_raster.managed_raster cimport ManagedRaster
 from ..managed_raster.managed_raster cimport is_close
+from .batch_viewshed cimport BatchDEM
+from .batch_viewshed cimport BatchViewpoint
+from .batch_viewshed cimport sum_visibility
 
 LOGGER = logging.getLogger(__name__)
 LOGGER.addHandler(logging.NullHandler())
@@ -704,3 +708,143 @@ def viewshed(dem_raster_path_band,
             shutil.rmtree(temp_dir)
         except OSError:
             LOGGER.exception('Could not remove temporary folder %s', temp_dir)
+
+
+def weighted_viewshed_sum(dem_raster_path_band,
+                          viewpoints,
+                          target_path,
+                          curved_earth=True,
+                          refraction_coeff=0.13,
+                          n_workers=1):
+    """Sum the weighted viewsheds of a batch of viewpoints.
+
+    The result is the same as calculating the viewshed of each viewpoint
+    with ``viewshed`` and adding up the weights of the viewpoints that are
+    visible from each pixel, but no raster is written per viewpoint. The
+    DEM is read into memory once and shared by all of the viewsheds, which
+    are calculated on a pool of threads without the GIL, each within the
+    window of the DEM that its maximum distance allows.
+
+    Args:
+        dem_raster_path_band (tuple): A tuple of (path, band_index) where
+            ``path`` is a path to a GDAL-compatible raster on disk and
+            ``band_index`` is the 1-based band index.  The band is read into
+            memory as float64, and the sum is held in memory as float32.  If
+            the viewsheds are being adjusted for curvature of the earth
+            and/or refraction, the elevation units of the DEM must be in
+            meters.
+        viewpoints (list): A list of
+            ``(viewpoint, max_distance, weight, viewpoint_height)`` tuples,
+            where ``viewpoint`` is an ``(x, y)`` tuple in the coordinate
+            system of the DEM, ``max_distance`` is as in ``viewshed`` and may
+            be ``None``, ``weight`` is the number added to the sum where the
+            viewpoint is visible and ``viewpoint_height`` is as in
+            ``viewshed``.
+        target_path (string): A filepath on disk to where the float32 sum
+            will be written. Pixels where the DEM is nodata are nodata (-1).
+            If a raster exists in this location, it will be overwritten.
+        curved_earth=True (bool): Whether to adjust viewshed calculations for
+            the curvature of the earth.
+        refraction_coeff=0.13 (float):  The coefficient of atmospheric
+            refraction.  Set to ``0`` to ignore refraction calculations.
+        n_workers=1 (int): The number of threads to calculate viewsheds on.
+            The sum is the same whatever the number of threads.
+
+    Raises:
+        ValueError: When a viewpoint does not overlap with the DEM.
+
+        LookupError: When a viewpoint is over nodata.
+
+        AssertionError: When pixel dimensions are not square.
+
+    Returns:
+        ``None``
+    """
+    start_time = time.time()
+    dem_raster_info = pygeoprocessing.get_raster_info(dem_raster_path_band[0])
+    dem_gt = dem_raster_info['geotransform']
+    bbox_minx, bbox_miny, bbox_maxx, bbox_maxy = dem_raster_info['bounding_box']
+
+    pixel_xsize, pixel_ysize = dem_raster_info['pixel_size']
+    if not (abs(abs(pixel_xsize) - abs(pixel_ysize)) < 0.5e-7):
+        raise AssertionError(
+            'Pixel dimensions must match:\n X size:%s\n Y size:%s' %
+                             (pixel_xsize, pixel_ysize))
+
+    nodata_value = dem_raster_info['nodata'][dem_raster_path_band[1] - 1]
+    if nodata_value is None:
+        nodata_value = IMPROBABLE_NODATA
+
+    # Read the DEM once, for all of the viewsheds.
+    raster_x_size, raster_y_size = dem_raster_info['raster_size']
+    dem_array = numpy.empty((raster_y_size, raster_x_size),
+                            dtype=numpy.float64)
+    for block_info, dem_block in pygeoprocessing.iterblocks(
+            dem_raster_path_band):
+        dem_array[
+            block_info['yoff']:block_info['yoff'] + block_info['win_ysize'],
+            block_info['xoff']:block_info['xoff'] + block_info['win_xsize']
+        ] = dem_block
+    valid_array = (~pygeoprocessing.array_equals_nodata(
+        dem_array, nodata_value)).astype(numpy.uint8)
+    sum_array = numpy.where(valid_array, 0, -1).astype(numpy.float32)
+
+    cdef vector[BatchViewpoint] batch_viewpoints
+    cdef BatchViewpoint batch_viewpoint
+    for viewpoint, max_distance, weight, viewpoint_height in viewpoints:
+        if (not bbox_minx <= viewpoint[0] <= bbox_maxx or
+                not bbox_miny <= viewpoint[1] <= bbox_maxy):
+            raise ValueError(('Viewpoint (%s, %s) does not overlap with DEM with '
+                              'bounding box %s') % (viewpoint[0], viewpoint[1],
+                                                    dem_raster_info['bounding_box']))
+        batch_viewpoint.ix = int((viewpoint[0] - dem_gt[0]) / dem_gt[1])
+        batch_viewpoint.iy = int((viewpoint[1] - dem_gt[3]) / dem_gt[5])
+        if is_close(dem_array[batch_viewpoint.iy, batch_viewpoint.ix],
+                    nodata_value):
+            raise LookupError('Viewpoint %s is over nodata' % (viewpoint,))
+        batch_viewpoint.height = viewpoint_height
+        batch_viewpoint.max_distance = (
+            -1 if max_distance is None else max_distance)
+        batch_viewpoint.weight = weight
+        batch_viewpoints.push_back(batch_viewpoint)
+
+    # get the pixel size in terms of meters.
+    dem_srs = osr.SpatialReference()
+    dem_srs.ImportFromWkt(dem_raster_info['projection_wkt'])
+    linear_units = dem_srs.GetLinearUnits()
+
+    cdef double[:, ::1] elevation = dem_array
+    cdef unsigned char[:, ::1] valid = valid_array
+    cdef float[:, ::1] visibility_sum = sum_array
+    cdef BatchDEM dem
+    dem.elevation = &elevation[0, 0]
+    dem.valid = &valid[0, 0]
+    dem.x_size = raster_x_size
+    dem.y_size = raster_y_size
+    dem.nodata = nodata_value
+    dem.pixel_size = utils.mean_pixel_size_and_area(
+        dem_raster_info['pixel_size'])[0]*linear_units
+    dem.block_bits = numpy.log2(dem_raster_info['block_size'][0])
+    dem.correct_for_curvature = curved_earth
+    dem.correct_for_refraction = math.fabs(math.ceil(refraction_coeff) - 1.0) < 0.5e-7
+    dem.refract_coeff = refraction_coeff
+    cdef float* visibility_sum_ptr = &visibility_sum[0, 0]
+    cdef int n_threads = max(1, n_workers)
+
+    LOGGER.info('Starting %s viewsheds on DEM %s with %s threads',
+                batch_viewpoints.size(), dem_raster_path_band[0], n_threads)
+    with nogil:
+        sum_visibility(dem, batch_viewpoints, visibility_sum_ptr, n_threads)
+
+    pygeoprocessing.new_raster_from_base(
+        dem_raster_path_band[0], target_path, gdal.GDT_Float32, [-1],
+        raster_driver_creation_tuple=FLOAT_GTIFF_CREATION_OPTIONS)
+    target_raster = gdal.OpenEx(target_path, gdal.OF_RASTER | gdal.GA_Update)
+    target_band = target_raster.GetRasterBand(1)
+    target_band.WriteArray(sum_array)
+    # the 0 means approximate stats are not okay
+    target_band.ComputeStatistics(0)
+    target_band = None
+    target_raster = None
+    LOGGER.info('Summed %s viewsheds in %.2fs', batch_viewpoints.size(),
+                time.time() - start_time)
@@ -14,9 +14,12 @@ import numpy
 import pygeoprocessing
 import pygeoprocessing.routing
 from osgeo import gdal
+from osgeo import gdal_array
 from osgeo import ogr
 
 from natcap.invest import gettext
+from natcap.invest import hydrology
+from natcap.invest import intermediate_cache
 from natcap.invest import spec
 from natcap.invest.urban_nature_access import urban_nature_access
 from natcap.invest import utils
@@ -59,6 +62,10 @@ MODEL_SPEC = spec.ModelSpec(
         spec.WORKSPACE,
         spec.SUFFIX,
         spec.N_WORKERS,
+        spec.CACHE_BUDGET,
+        spec.KERNEL_THREADS,
+        spec.INTERMEDIATE_CACHE,
+        spec.HYDROLOGY_DIR,
         spec.PROJECTED_DEM,
         spec.SingleBandRasterInput(
             id="erosivity_path",
@@ -621,6 +628,16 @@ def execute(args):
             processes should be used in parallel processing. -1 indicates
             single process mode, 0 is single process but non-blocking mode,
             and >= 1 is number of processes.
+        args['cache_budget_bytes'] (int): (optional) the number of bytes of
+            memory shared by the block caches of the flow routing kernels.
+        args['kernel_threads'] (int): (optional) the number of threads to
+            route sediment deposition on. Defaults to 1.
+        args['intermediate_cache_dir'] (string): (optional) path to a
+            directory of intermediate results shared between workspaces.
+            See ``natcap.invest.intermediate_cache``.
+        args['hydrology_dir'] (string): (optional) path to a directory of
+            routing products shared between models. See
+            ``natcap.invest.hydrology``.
 
     Returns:
         File registry dictionary mapping MODEL_SPEC output ids to absolute paths
@@ -696,16 +713,26 @@ def execute(args):
             dependent_task_list=[mutual_mask_task, align_task],
             task_name=f'mask {key}')
 
-    pit_fill_task = task_graph.add_task(
-        func=pygeoprocessing.routing.fill_pits,
-        args=(
-            (f_reg['masked_dem'], 1),
-            f_reg['pit_filled_dem']),
-        target_path_list=[f_reg['pit_filled_dem']],
-        dependent_task_list=[mask_tasks['masked_dem']],
-        task_name='fill pits')
-
-    slope_task = task_graph.add_task(
+    routing_tasks = hydrology.add_routing_tasks(
+        task_graph, (f_reg['masked_dem'], 1), args['flow_dir_algorithm'],
+        target_paths={
+            'filled_dem': f_reg['pit_filled_dem'],
+            'flow_direction': f_reg['flow_direction'],
+            'flow_accumulation': f_reg['flow_accumulation'],
+            'stream': f_reg['stream'],
+        },
+        threshold_flow_accumulation=args['threshold_flow_accumulation'],
+        trace_threshold_proportion=0.7,
+        hydrology_dir=args['hydrology_dir'],
+        cache_dir=args['intermediate_cache_dir'],
+        dependent_task_list=[mask_tasks['masked_dem']])
+    pit_fill_task = routing_tasks['filled_dem']
+    flow_dir_task = routing_tasks['flow_direction']
+    flow_accumulation_task = routing_tasks['flow_accumulation']
+    stream_task = routing_tasks['stream']
+
+    slope_task = intermediate_cache.add_task(
+        task_graph, args['intermediate_cache_dir'],
         func=pygeoprocessing.calculate_slope,
         args=(
             (f_reg['pit_filled_dem'], 1),
@@ -725,66 +752,8 @@ def execute(args):
         task_name='threshold slope')
 
     if args['flow_dir_algorithm'] == 'mfd':
-        flow_dir_task = task_graph.add_task(
-            func=pygeoprocessing.routing.flow_dir_mfd,
-            args=(
-                (f_reg['pit_filled_dem'], 1),
-                f_reg['flow_direction']),
-            target_path_list=[f_reg['flow_direction']],
-            dependent_task_list=[pit_fill_task],
-            task_name='flow direction calculation')
-
-        flow_accumulation_task = task_graph.add_task(
-            func=pygeoprocessing.routing.flow_accumulation_mfd,
-            args=(
-                (f_reg['flow_direction'], 1),
-                f_reg['flow_accumulation']),
-            target_path_list=[f_reg['flow_accumulation']],
-            dependent_task_list=[flow_dir_task],
-            task_name='flow accumulation calculation')
-
-        stream_task = task_graph.add_task(
-            func=pygeoprocessing.routing.extract_streams_mfd,
-            args=(
-                (f_reg['flow_accumulation'], 1),
-                (f_reg['flow_direction'], 1),
-                args['threshold_flow_accumulation'],
-                f_reg['stream']),
-            kwargs={'trace_threshold_proportion': 0.7},
-            target_path_list=[f_reg['stream']],
-            dependent_task_list=[flow_accumulation_task],
-            task_name='extract streams')
-
         d_dn_func = pygeoprocessing.routing.distance_to_channel_mfd
     else:
-
-        flow_dir_task = task_graph.add_task(
-            func=pygeoprocessing.routing.flow_dir_d8,
-            args=(
-                (f_reg['pit_filled_dem'], 1),
-                f_reg['flow_direction']),
-            target_path_list=[f_reg['flow_direction']],
-            dependent_task_list=[pit_fill_task],
-            task_name='flow direction calculation')
-
-        flow_accumulation_task = task_graph.add_task(
-            func=pygeoprocessing.routing.flow_accumulation_d8,
-            args=(
-                (f_reg['flow_direction'], 1),
-                f_reg['flow_accumulation']),
-            target_path_list=[f_reg['flow_accumulation']],
-            dependent_task_list=[flow_dir_task],
-            task_name='flow accumulation calculation')
-
-        stream_task = task_graph.add_task(
-            func=pygeoprocessing.routing.extract_streams_d8,
-            kwargs=dict(
-                flow_accum_raster_path_band=(f_reg['flow_accumulation'], 1),
-                flow_threshold=args['threshold_flow_accumulation'],
-                target_stream_raster_path=f_reg['stream']),
-            target_path_list=[f_reg['stream']],
-            dependent_task_list=[flow_accumulation_task],
-            task_name='extract streams')
         d_dn_func = pygeoprocessing.routing.distance_to_channel_d8
 
     ls_factor_task = task_graph.add_task(
@@ -836,65 +805,50 @@ def execute(args):
         dependent_task_list=[mask_tasks['masked_lulc']],
         task_name='calculate CP')
 
-    rkls_task = task_graph.add_task(
-        func=_calculate_rkls,
+    usle_task = task_graph.add_task(
+        func=_calculate_usle,
         args=(
             f_reg['ls'],
             f_reg['masked_erosivity'],
             f_reg['masked_erodibility'],
             drainage_raster_path_task[0],
-            f_reg['rkls']),
-        target_path_list=[f_reg['rkls']],
+            f_reg['cp'],
+            f_reg['rkls'],
+            f_reg['usle'],
+            f_reg['avoided_erosion']),
+        target_path_list=[
+            f_reg['rkls'], f_reg['usle'], f_reg['avoided_erosion']],
         dependent_task_list=[
             mask_tasks['masked_erosivity'], mask_tasks['masked_erodibility'],
-            drainage_raster_path_task[1], ls_factor_task],
-        task_name='calculate RKLS')
+            drainage_raster_path_task[1], ls_factor_task, cp_task],
+        task_name='calculate RKLS, USLE and avoided erosion')
 
-    usle_task = task_graph.add_task(
-        func=pygeoprocessing.raster_map,
-        kwargs=dict(
-            op=usle_op,
-            rasters=[f_reg['rkls'], f_reg['cp']],
-            target_path=f_reg['usle']),
-        target_path_list=[f_reg['usle']],
-        dependent_task_list=[rkls_task, cp_task],
-        task_name='calculate USLE')
-
-    bar_task_map = {}
-    for factor_path, factor_task, accumulation_path, out_bar_path, bar_id in [
+    accumulation_task_list = []
+    for factor_path, factor_task, accumulation_path in [
             (f_reg['w_threshold'], threshold_w_task,
-             f_reg['w_accumulation'],
-             f_reg['w_bar'],
-             'w_bar'),
+             f_reg['w_accumulation']),
             (f_reg['slope_threshold'], threshold_slope_task,
-             f_reg['s_accumulation'],
-             f_reg['s_bar'],
-             's_bar')]:
-        bar_task = task_graph.add_task(
-            func=_calculate_bar_factor,
+             f_reg['s_accumulation'])]:
+        accumulation_task_list.append(task_graph.add_task(
+            func=_accumulate_factor,
             kwargs=dict(
                 flow_direction_path=f_reg['flow_direction'],
                 factor_path=factor_path,
-                flow_accumulation_path=f_reg['flow_accumulation'],
                 accumulation_path=accumulation_path,
-                out_bar_path=out_bar_path,
                 flow_dir_algorithm=args['flow_dir_algorithm']),
-            target_path_list=[accumulation_path, out_bar_path],
-            dependent_task_list=[
-                factor_task, flow_accumulation_task, flow_dir_task],
-            task_name=f'calculate {bar_id}')
-        bar_task_map[bar_id] = bar_task
+            target_path_list=[accumulation_path],
+            dependent_task_list=[factor_task, flow_dir_task],
+            task_name=f'accumulate {os.path.basename(factor_path)}'))
 
     d_up_task = task_graph.add_task(
         func=_calculate_d_up,
         args=(
-            f_reg['w_bar'], f_reg['s_bar'],
-            f_reg['flow_accumulation'], f_reg['d_up']),
-        target_path_list=[f_reg['d_up']],
-        dependent_task_list=[
-            bar_task_map['s_bar'], bar_task_map['w_bar'],
-            flow_accumulation_task],
-        task_name='calculate Dup')
+            f_reg['w_accumulation'], f_reg['s_accumulation'],
+            f_reg['flow_accumulation'], f_reg['w_bar'], f_reg['s_bar'],
+            f_reg['d_up']),
+        target_path_list=[f_reg['w_bar'], f_reg['s_bar'], f_reg['d_up']],
+        dependent_task_list=accumulation_task_list + [flow_accumulation_task],
+        task_name='calculate W bar, S bar and Dup')
 
     inverse_ws_factor_task = task_graph.add_task(
         func=pygeoprocessing.raster_map,
@@ -920,42 +874,19 @@ def execute(args):
             inverse_ws_factor_task],
         task_name='calculating d_dn')
 
-    ic_task = task_graph.add_task(
-        func=_calculate_ic,
-        args=(
-            f_reg['d_up'], f_reg['d_dn'], f_reg['ic']),
-        target_path_list=[f_reg['ic']],
-        dependent_task_list=[d_up_task, d_dn_task],
-        task_name='calculate ic')
-
     sdr_task = task_graph.add_task(
         func=_calculate_sdr,
         args=(
-            args['k_param'], args['ic_0_param'],
-            args['sdr_max'], f_reg['ic'],
-            drainage_raster_path_task[0], f_reg['sdr_factor']),
-        target_path_list=[f_reg['sdr_factor']],
-        dependent_task_list=[ic_task],
-        task_name='calculate sdr')
-
-    sed_export_task = task_graph.add_task(
-        func=pygeoprocessing.raster_map,
-        kwargs=dict(
-            op=numpy.multiply,  # export = USLE * SDR
-            rasters=[f_reg['usle'], f_reg['sdr_factor']],
-            target_path=f_reg['sed_export']),
-        target_path_list=[f_reg['sed_export']],
-        dependent_task_list=[usle_task, sdr_task],
-        task_name='calculate sed export')
-
-    e_prime_task = task_graph.add_task(
-        func=_calculate_e_prime,
-        args=(
-            f_reg['usle'], f_reg['sdr_factor'],
-            drainage_raster_path_task[0], f_reg['e_prime']),
-        target_path_list=[f_reg['e_prime']],
-        dependent_task_list=[usle_task, sdr_task],
-        task_name='calculate export prime')
+            args['k_param'], args['ic_0_param'], args['sdr_max'],
+            f_reg['d_up'], f_reg['d_dn'], drainage_raster_path_task[0],
+            f_reg['usle'], f_reg['ic'], f_reg['sdr_factor'],
+            f_reg['sed_export'], f_reg['e_prime']),
+        target_path_list=[
+            f_reg['ic'], f_reg['sdr_factor'], f_reg['sed_export'],
+            f_reg['e_prime']],
+        dependent_task_list=[
+            d_up_task, d_dn_task, drainage_raster_path_task[1], usle_task],
+        task_name='calculate ic, sdr, sed export and export prime')
 
     sed_deposition_task = task_graph.add_task(
         func=sdr_core.calculate_sediment_deposition,
@@ -965,21 +896,13 @@ def execute(args):
             f_path=f_reg['flux'],
             sdr_path=f_reg['sdr_factor'],
             target_sediment_deposition_path=f_reg['sed_deposition'],
-            algorithm=args['flow_dir_algorithm']),
-        dependent_task_list=[e_prime_task, sdr_task, flow_dir_task],
+            algorithm=args['flow_dir_algorithm'],
+            cache_budget_bytes=args['cache_budget_bytes'],
+            n_workers=args['kernel_threads'] or 1),
+        dependent_task_list=[sdr_task, flow_dir_task],
         target_path_list=[f_reg['sed_deposition'], f_reg['flux']],
         task_name='sediment deposition')
 
-    avoided_erosion_task = task_graph.add_task(
-        func=pygeoprocessing.raster_map,
-        kwargs=dict(
-            op=numpy.subtract,  # avoided erosion = rkls - usle
-            rasters=[f_reg['rkls'], f_reg['usle']],
-            target_path=f_reg['avoided_erosion']),
-        dependent_task_list=[rkls_task, usle_task],
-        target_path_list=[f_reg['avoided_erosion']],
-        task_name='calculate avoided erosion')
-
     avoided_export_task = task_graph.add_task(
         func=pygeoprocessing.raster_map,
         kwargs=dict(
@@ -988,8 +911,7 @@ def execute(args):
                      f_reg['sdr_factor'],
                      f_reg['sed_deposition']],
             target_path=f_reg['avoided_export']),
-        dependent_task_list=[avoided_erosion_task, sdr_task,
-                             sed_deposition_task],
+        dependent_task_list=[usle_task, sdr_task, sed_deposition_task],
         target_path_list=[f_reg['avoided_export']],
         task_name='calculate total retention')
 
@@ -1010,8 +932,7 @@ def execute(args):
             f_reg['watershed_results_sdr']),
         target_path_list=[f_reg['watershed_results_sdr']],
         dependent_task_list=[
-            usle_task, sed_export_task, avoided_export_task,
-            sed_deposition_task, avoided_erosion_task],
+            usle_task, sdr_task, avoided_export_task, sed_deposition_task],
         task_name='generate report')
 
     task_graph.close()
@@ -1067,6 +988,82 @@ def usle_op(rkls, cp_factor): return rkls * cp_factor
 def inverse_ws_op(w_factor, s_factor): return 1 / (w_factor * s_factor)
 
 
+def _map_valid_pixels(op, arrays, nodata_list, target_dtype, target_nodata):
+    """Apply ``op`` to the pixels of ``arrays`` where none is nodata.
+
+    Calculates a block of a chain of ``pygeoprocessing.raster_map``
+    operations in memory, with the same result as ``raster_map``.
+
+    Args:
+        op (callable): called with the valid values of each array.
+        arrays (list): arrays of the same shape.
+        nodata_list (list): the nodata value of each array, or None.
+        target_dtype (numpy.dtype): type of the array to return.
+        target_nodata (number): value of the pixels where any array is
+            nodata.
+
+    Returns:
+        numpy.ndarray
+    """
+    result = numpy.full(arrays[0].shape, target_nodata, dtype=target_dtype)
+    valid_mask = numpy.ones(arrays[0].shape, dtype=bool)
+    for array, nodata in zip(arrays, nodata_list):
+        if nodata is not None:
+            valid_mask &= ~pygeoprocessing.array_equals_nodata(array, nodata)
+    result[valid_mask] = op(*[array[valid_mask] for array in arrays])
+    return result
+
+
+def _fused_raster_calculator(
+        base_path_list, local_op, target_path_list, target_dtype_list,
+        target_nodata_list):
+    """Calculate several rasters in one pass over the blocks of the inputs.
+
+    Like ``pygeoprocessing.raster_calculator``, except that ``local_op``
+    returns an array for each target. A chain of block-local calculations
+    can then read each input and write each output once, rather than
+    writing each step to disk and reading it back for the next.
+
+    Args:
+        base_path_list (list): paths to aligned single-band rasters.
+        local_op (callable): called with a block of each base raster,
+            returns a block of each target raster.
+        target_path_list (list): paths to the rasters to create.
+        target_dtype_list (list): numpy type of each target raster.
+        target_nodata_list (list): nodata value of each target raster.
+
+    Returns:
+        None
+    """
+    for target_path, dtype, nodata in zip(
+            target_path_list, target_dtype_list, target_nodata_list):
+        pygeoprocessing.new_raster_from_base(
+            base_path_list[0], target_path,
+            gdal_array.NumericTypeCodeToGDALTypeCode(dtype), [nodata])
+    base_rasters = [
+        gdal.OpenEx(path, gdal.OF_RASTER) for path in base_path_list]
+    base_bands = [raster.GetRasterBand(1) for raster in base_rasters]
+    target_rasters = [
+        gdal.OpenEx(path, gdal.OF_RASTER | gdal.GA_Update)
+        for path in target_path_list]
+    target_bands = [raster.GetRasterBand(1) for raster in target_rasters]
+
+    for offsets in pygeoprocessing.iterblocks(
+            (base_path_list[0], 1), offset_only=True):
+        target_blocks = local_op(
+            *[band.ReadAsArray(**offsets) for band in base_bands])
+        for band, block in zip(target_bands, target_blocks):
+            band.WriteArray(
+                block, xoff=offsets['xoff'], yoff=offsets['yoff'])
+
+    for band in target_bands:
+        band.ComputeStatistics(0)
+    base_bands = None
+    base_rasters = None
+    target_bands = None
+    target_rasters = None
+
+
 def _calculate_what_drains_to_stream(
         flow_dir_path, dist_to_channel_path, target_mask_path):
     """Create a mask indicating regions that do or do not drain to a stream.
@@ -1266,12 +1263,14 @@ def _calculate_ls_factor(
         target_path=target_ls_factor_path)
 
 
-def _calculate_rkls(
+def _calculate_usle(
         ls_factor_path, erosivity_path, erodibility_path, stream_path,
-        rkls_path):
-    """Calculate potential soil loss (tons / (ha * year)) using RKLS.
+        cp_factor_path, rkls_path, usle_path, avoided_erosion_path):
+    """Calculate RKLS, USLE and avoided erosion in one pass.
 
-    (revised universal soil loss equation with no C or P).
+    RKLS is the potential soil loss (tons / (ha * year)) from the revised
+    universal soil loss equation with no C or P. USLE is RKLS * CP, and
+    avoided erosion is RKLS - USLE.
 
     Args:
         ls_factor_path (string): path to LS raster that has square pixels in
@@ -1282,7 +1281,10 @@ def _calculate_rkls(
             (t * ha * hr / (MJ * ha * mm))
         stream_path (string): path to drainage raster
             (1 is drainage, 0 is not)
+        cp_factor_path (string): path to CP factor raster
         rkls_path (string): path to RKLS raster
+        usle_path (string): path to USLE raster
+        avoided_erosion_path (string): path to avoided erosion raster
 
     Returns:
         None
@@ -1329,12 +1331,32 @@ def _calculate_rkls(
             erodibility[valid_mask])   # t * ha * hr / (MJ * ha * mm)
         return rkls
 
-    # aligning with index 3 that's the stream and the most likely to be
-    # aligned with LULCs
-    pygeoprocessing.raster_calculator(
-        [(path, 1) for path in [
-            ls_factor_path, erosivity_path, erodibility_path, stream_path]],
-        rkls_function, rkls_path, gdal.GDT_Float32, _TARGET_NODATA)
+    cp_nodata = pygeoprocessing.get_raster_info(cp_factor_path)['nodata'][0]
+    usle_dtype = numpy.result_type(
+        numpy.float32,
+        pygeoprocessing.get_raster_info(cp_factor_path)['numpy_type'])
+    usle_nodata = pygeoprocessing.choose_nodata(usle_dtype)
+    avoided_erosion_dtype = numpy.result_type(numpy.float32, usle_dtype)
+    avoided_erosion_nodata = pygeoprocessing.choose_nodata(
+        avoided_erosion_dtype)
+
+    def usle_chain_op(ls_factor, erosivity, erodibility, stream, cp_factor):
+        """Calculate RKLS, USLE and avoided erosion."""
+        rkls = rkls_function(ls_factor, erosivity, erodibility, stream)
+        usle = _map_valid_pixels(
+            usle_op, [rkls, cp_factor], [_TARGET_NODATA, cp_nodata],
+            usle_dtype, usle_nodata)
+        avoided_erosion = _map_valid_pixels(
+            numpy.subtract, [rkls, usle], [_TARGET_NODATA, usle_nodata],
+            avoided_erosion_dtype, avoided_erosion_nodata)
+        return rkls, usle, avoided_erosion
+
+    _fused_raster_calculator(
+        [ls_factor_path, erosivity_path, erodibility_path, stream_path,
+         cp_factor_path],
+        usle_chain_op, [rkls_path, usle_path, avoided_erosion_path],
+        [numpy.float32, usle_dtype, avoided_erosion_dtype],
+        [_TARGET_NODATA, usle_nodata, avoided_erosion_nodata])
 
 
 def threshold_slope_op(slope):
@@ -1415,23 +1437,18 @@ def _calculate_cp(lulc_to_cp, lulc_path, cp_factor_path):
         _TARGET_NODATA, reclass_error_details)
 
 
-def _calculate_bar_factor(
-        flow_direction_path, factor_path, flow_accumulation_path,
-        accumulation_path, out_bar_path, flow_dir_algorithm):
+def _accumulate_factor(
+        flow_direction_path, factor_path, accumulation_path,
+        flow_dir_algorithm):
     """Route user defined source across DEM.
 
     Used for calculating S and W bar in the SDR operation.
 
     Args:
-        dem_path (string): path to DEM raster
-        factor_path (string): path to arbitrary factor raster
-        flow_accumulation_path (string): path to flow accumulation raster
         flow_direction_path (string): path to flow direction path (in radians)
+        factor_path (string): path to arbitrary factor raster
         accumulation_path (string): path to a raster that can be used to
-            save the accumulation of the factor.  Temporary file.
-        out_bar_path (string): path to output raster that is the result of
-            the factor accumulation raster divided by the flow accumulation
-            raster.
+            save the accumulation of the factor.
         flow_dir_algorithm (string): flow direction algorithm, 'D8' or 'MFD'
 
     Returns:
@@ -1453,28 +1470,105 @@ def _calculate_bar_factor(
             'TILED=YES', 'BIGTIFF=YES', 'COMPRESS=DEFLATE',
             'PREDICTOR=3']))
 
-    pygeoprocessing.raster_map(
-        op=lambda base_accum, flow_accum: base_accum / flow_accum,
-        rasters=[accumulation_path, flow_accumulation_path],
-        target_path=out_bar_path)
-
 
 def _calculate_d_up(
-        w_bar_path, s_bar_path, flow_accumulation_path, out_d_up_path):
-    """Calculate w_bar * s_bar * sqrt(flow accumulation * cell area)."""
-    cell_area = abs(
-        pygeoprocessing.get_raster_info(w_bar_path)['pixel_size'][0])**2
-    pygeoprocessing.raster_map(
-        op=lambda w_bar, s_bar, flow_accum: (
-            w_bar * s_bar * numpy.sqrt(flow_accum * cell_area)),
-        rasters=[w_bar_path, s_bar_path, flow_accumulation_path],
-        target_path=out_d_up_path)
+        w_accumulation_path, s_accumulation_path, flow_accumulation_path,
+        out_w_bar_path, out_s_bar_path, out_d_up_path):
+    """Calculate W bar, S bar and d_up in one pass.
+
+    W bar and S bar are the accumulations of W and S divided by the flow
+    accumulation, and d_up is w_bar * s_bar * sqrt(flow accumulation *
+    cell area).
+
+    Args:
+        w_accumulation_path (string): path to the accumulation of the
+            thresholded W factor.
+        s_accumulation_path (string): path to the accumulation of the
+            thresholded slope.
+        flow_accumulation_path (string): path to flow accumulation raster
+        out_w_bar_path (string): path to W bar raster
+        out_s_bar_path (string): path to S bar raster
+        out_d_up_path (string): path to d_up raster
+
+    Returns:
+        None
+
+    """
+    flow_accum_info = pygeoprocessing.get_raster_info(flow_accumulation_path)
+    cell_area = abs(flow_accum_info['pixel_size'][0])**2
+    flow_accum_nodata = flow_accum_info['nodata'][0]
+    bar_info_list = []
+    for accumulation_path in [w_accumulation_path, s_accumulation_path]:
+        accumulation_info = pygeoprocessing.get_raster_info(accumulation_path)
+        bar_dtype = numpy.result_type(
+            accumulation_info['numpy_type'], flow_accum_info['numpy_type'])
+        bar_info_list.append((
+            accumulation_info['nodata'][0], bar_dtype,
+            pygeoprocessing.choose_nodata(bar_dtype)))
+    (w_accum_nodata, w_bar_dtype, w_bar_nodata), (
+        s_accum_nodata, s_bar_dtype, s_bar_nodata) = bar_info_list
+    d_up_dtype = numpy.result_type(
+        w_bar_dtype, s_bar_dtype, flow_accum_info['numpy_type'])
+    d_up_nodata = pygeoprocessing.choose_nodata(d_up_dtype)
+
+    def d_up_op(w_accum, s_accum, flow_accum):
+        """Calculate W bar, S bar and d_up."""
+        w_bar = _map_valid_pixels(
+            numpy.divide, [w_accum, flow_accum],
+            [w_accum_nodata, flow_accum_nodata], w_bar_dtype, w_bar_nodata)
+        s_bar = _map_valid_pixels(
+            numpy.divide, [s_accum, flow_accum],
+            [s_accum_nodata, flow_accum_nodata], s_bar_dtype, s_bar_nodata)
+        d_up = _map_valid_pixels(
+            lambda w_bar, s_bar, flow_accum: (
+                w_bar * s_bar * numpy.sqrt(flow_accum * cell_area)),
+            [w_bar, s_bar, flow_accum],
+            [w_bar_nodata, s_bar_nodata, flow_accum_nodata],
+            d_up_dtype, d_up_nodata)
+        return w_bar, s_bar, d_up
+
+    _fused_raster_calculator(
+        [w_accumulation_path, s_accumulation_path, flow_accumulation_path],
+        d_up_op, [out_w_bar_path, out_s_bar_path, out_d_up_path],
+        [w_bar_dtype, s_bar_dtype, d_up_dtype],
+        [w_bar_nodata, s_bar_nodata, d_up_nodata])
+
 
+def _calculate_sdr(
+        k_factor, ic_0, sdr_max, d_up_path, d_dn_path, stream_path,
+        usle_path, out_ic_factor_path, out_sdr_path, out_sed_export_path,
+        target_e_prime):
+    """Calculate IC, SDR, sediment export and E' in one pass.
+
+    IC is log10(d_up/d_dn). SDR is derived from k, ic0 and IC; 1 on the
+    stream and clamped to sdr_max. Sediment export is USLE * SDR and E' is
+    USLE * (1-SDR).
+
+    Args:
+        k_factor (float): k calibration parameter
+        ic_0 (float): ic_0 calibration parameter
+        sdr_max (float): max value of SDR
+        d_up_path (string): path to d_up raster
+        d_dn_path (string): path to d_dn raster
+        stream_path (string): path to drainage raster
+            (1 is drainage, 0 is not)
+        usle_path (string): path to USLE raster
+        out_ic_factor_path (string): path to IC raster
+        out_sdr_path (string): path to SDR raster
+        out_sed_export_path (string): path to sediment export raster
+        target_e_prime (string): path to E' raster
+
+    Returns:
+        None
 
-def _calculate_ic(d_up_path, d_dn_path, out_ic_factor_path):
-    """Calculate log10(d_up/d_dn)."""
+    """
     # ic can be positive or negative, so float.min is a reasonable nodata value
     d_dn_nodata = pygeoprocessing.get_raster_info(d_dn_path)['nodata'][0]
+    usle_info = pygeoprocessing.get_raster_info(usle_path)
+    usle_nodata = usle_info['nodata'][0]
+    sed_export_dtype = numpy.result_type(
+        usle_info['numpy_type'], numpy.float32)
+    sed_export_nodata = pygeoprocessing.choose_nodata(sed_export_dtype)
 
     def ic_op(d_up, d_dn):
         """Calculate IC factor."""
@@ -1488,14 +1582,6 @@ def _calculate_ic(d_up_path, d_dn_path, out_ic_factor_path):
             d_up[valid_mask] / d_dn[valid_mask])
         return ic_array
 
-    pygeoprocessing.raster_calculator(
-        [(d_up_path, 1), (d_dn_path, 1)], ic_op, out_ic_factor_path,
-        gdal.GDT_Float32, _IC_NODATA)
-
-
-def _calculate_sdr(
-        k_factor, ic_0, sdr_max, ic_path, stream_path, out_sdr_path):
-    """Derive SDR from k, ic0, ic; 0 on the stream and clamped to sdr_max."""
     def sdr_op(ic_factor, stream):
         """Calculate SDR factor."""
         valid_mask = (
@@ -1511,13 +1597,6 @@ def _calculate_sdr(
         result[stream == 1] = 1
         return result
 
-    pygeoprocessing.raster_calculator(
-        [(ic_path, 1), (stream_path, 1)], sdr_op, out_sdr_path,
-        gdal.GDT_Float32, _TARGET_NODATA)
-
-
-def _calculate_e_prime(usle_path, sdr_path, stream_path, target_e_prime):
-    """Calculate USLE * (1-SDR)."""
     def e_prime_op(usle, sdr, streams):
         """Wash that does not reach stream."""
         valid_mask = (
@@ -1533,9 +1612,21 @@ def _calculate_e_prime(usle_path, sdr_path, stream_path, target_e_prime):
         result[streams == 1] = 0
         return result
 
-    pygeoprocessing.raster_calculator(
-        [(usle_path, 1), (sdr_path, 1), (stream_path, 1)], e_prime_op,
-        target_e_prime, gdal.GDT_Float32, _TARGET_NODATA)
+    def sdr_chain_op(d_up, d_dn, stream, usle):
+        """Calculate IC, SDR, sediment export and E'."""
+        ic_factor = ic_op(d_up, d_dn)
+        sdr = sdr_op(ic_factor, stream)
+        sed_export = _map_valid_pixels(
+            numpy.multiply, [usle, sdr], [usle_nodata, _TARGET_NODATA],
+            sed_export_dtype, sed_export_nodata)
+        return ic_factor, sdr, sed_export, e_prime_op(usle, sdr, stream)
+
+    _fused_raster_calculator(
+        [d_up_path, d_dn_path, stream_path, usle_path], sdr_chain_op,
+        [out_ic_factor_path, out_sdr_path, out_sed_export_path,
+         target_e_prime],
+        [numpy.float32, numpy.float32, sed_export_dtype, numpy.float32],
+        [_IC_NODATA, _TARGET_NODATA, sed_export_nodata, _TARGET_NODATA])
 
 
 def _generate_report(
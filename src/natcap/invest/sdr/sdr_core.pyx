@@ -4,6 +4,7 @@ import pygeoprocessing
 cimport cython
 from osgeo import gdal
 
+from ..managed_raster import cache
 from ..managed_raster.managed_raster cimport D8
 from ..managed_raster.managed_raster cimport MFD
 from .sediment_deposition cimport run_sediment_deposition
@@ -13,7 +14,8 @@ LOGGER = logging.getLogger(__name__)
 
 def calculate_sediment_deposition(
         flow_direction_path, e_prime_path, f_path, sdr_path,
-        target_sediment_deposition_path, algorithm):
+        target_sediment_deposition_path, algorithm, cache_budget_bytes=None,
+        n_workers=-1):
     """Calculate sediment deposition layer.
 
     This algorithm outputs both sediment deposition (t_i) and flux (f_i)::
@@ -61,12 +63,20 @@ def calculate_sediment_deposition(
         target_sediment_deposition_path (string): path to created that
             shows where the E' sources end up across the landscape.
         algorithm (string): MFD or D8
+        cache_budget_bytes (int): if provided, the number of bytes of
+            memory to share among all ManagedRaster block caches. See
+            ``natcap.invest.managed_raster.cache.set_cache_budget``.
+        n_workers (int): the number of threads to route sediment with. If
+            more than 1, the raster is divided into tiles that are processed
+            in parallel, with results identical to those of a single thread.
 
     Returns:
         None.
 
     """
     LOGGER.info('Calculate sediment deposition')
+    if cache_budget_bytes:
+        cache.set_cache_budget(cache_budget_bytes)
     cdef float target_nodata = -1
     pygeoprocessing.new_raster_from_base(
         flow_direction_path, target_sediment_deposition_path,
@@ -79,9 +89,9 @@ def calculate_sediment_deposition(
         run_sediment_deposition[D8](
             flow_direction_path.encode('utf-8'), e_prime_path.encode('utf-8'),
             f_path.encode('utf-8'), sdr_path.encode('utf-8'),
-            target_sediment_deposition_path.encode('utf-8'))
+            target_sediment_deposition_path.encode('utf-8'), n_workers)
     else:
         run_sediment_deposition[MFD](
             flow_direction_path.encode('utf-8'), e_prime_path.encode('utf-8'),
             f_path.encode('utf-8'), sdr_path.encode('utf-8'),
-            target_sediment_deposition_path.encode('utf-8'))
+            target_sediment_deposition_path.encode('utf-8'), n_workers)
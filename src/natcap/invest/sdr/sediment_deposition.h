@@ -1,54 +1,63 @@
 #include "ManagedRaster.h"
+#include "TiledRouting.h"
 #include <ctime>
+#include <vector>
 
-// Calculate sediment deposition layer.
-//
-// This algorithm outputs both sediment deposition (t_i) and flux (f_i)::
-//
-//   t_i  = dt_i  * (sum over j ∈ J of f_j * p(j,i))
-//
-//   f_i  = (1 - dt_i) * (sum over j ∈ J of f_j * p(j,i)) + E'_i
-//
-//
-//           (sum over k ∈ K of SDR_k * p(i,k)) - SDR_i
-//   dt_i = --------------------------------------------
-//               (1 - SDR_i)
-//
-// where:
-//
-// - ``p(i,j)`` is the proportion of flow from pixel ``i`` into pixel ``j``
-// - ``J`` is the set of pixels that are immediate upslope neighbors of
-//   pixel ``i``
-// - ``K`` is the set of pixels that are immediate downslope neighbors of
-//   pixel ``i``
-// - ``E'`` is ``USLE * (1 - SDR)``, the amount of sediment loss from pixel
-//   ``i`` that doesn't reach a stream (``e_prime_path``)
-// - ``SDR`` is the sediment delivery ratio (``sdr_path``)
-//
-// ``f_i`` is recursively defined in terms of ``i``'s upslope neighbors.
-// The algorithm begins from seed pixels that are local high points and so
-// have no upslope neighbors. It works downslope from each seed pixel,
-// only adding a pixel to the stack when all its upslope neighbors are
-// already calculated.
-//
-// Note that this function is designed to be used in the context of the SDR
-// model. Because the algorithm is recursive upslope and downslope of each
-// pixel, nodata values in the SDR input would propagate along the flow path.
-// This case is not handled because we assume the SDR and flow dir inputs
-// will come from the SDR model and have nodata in the same places.
-//
-// Args:
-//   flow_direction_path: a path to a flow direction raster,
-//     in either MFD or D8 format. Specify with the ``algorithm`` arg.
-//   e_prime_path: path to a raster that shows sources of
-//     sediment that wash off a pixel but do not reach the stream.
-//   f_path: path to a raster that shows the sediment flux
-//     on a pixel for sediment that does not reach the stream.
-//   sdr_path: path to Sediment Delivery Ratio raster.
-//   target_sediment_deposition_path: path to created that
-//     shows where the E' sources end up across the landscape.
+// Calculates the deposition `t_i` and flux `f_i` of a pixel, given the
+// weighted sum of the flux from its upslope neighbors, the weighted sum of
+// its downslope neighbors' SDR and the sum of its flow weights, and its own
+// SDR and E'. Shared by the serial and tiled kernels so that they do the
+// same floating point operations in the same order.
+inline void deposition_and_flux(
+    double f_j_weighted_sum, double downslope_sdr_weighted_sum,
+    long flow_dir_sum, double sdr_i, double e_prime_i,
+    double& t_i, double& f_i) {
+  double dr_i;
+  if (flow_dir_sum) {
+    downslope_sdr_weighted_sum /= flow_dir_sum;
+  }
+
+  // # This condition reflects property A in the user's guide.
+  if (downslope_sdr_weighted_sum < sdr_i) {
+    // # i think this happens because of our low resolution
+    // # flow direction, it's okay to zero out.
+    downslope_sdr_weighted_sum = sdr_i;
+  }
+
+  // # these correspond to the full equations for
+  // # dr_i, t_i, and f_i given in the docstring
+  if (sdr_i == 1) {
+    // # This reflects property B in the user's guide and is
+    // # an edge case to avoid division-by-zero.
+    dr_i = 1;
+  } else {
+    dr_i = (downslope_sdr_weighted_sum - sdr_i) / (1 - sdr_i);
+  }
+
+  // # Lisa's modified equations
+  t_i = dr_i * f_j_weighted_sum;  // deposition, a.k.a trapped sediment
+  f_i = (1 - dr_i) * f_j_weighted_sum + e_prime_i; // flux
+
+  // # On large flow paths, it's possible for dr_i, f_i and t_i
+  // # to have very small negative values that are numerically
+  // # equivalent to 0. These negative values were raising
+  // # questions on the forums and it's easier to clamp the
+  // # values here than to explain IEEE 754.
+  if (dr_i < 0) {
+    dr_i = 0;
+  }
+  if (t_i < 0) {
+    t_i = 0;
+  }
+  if (f_i < 0) {
+    f_i = 0;
+  }
+}
+
+// Runs the sediment deposition kernel in the calling thread. See
+// run_sediment_deposition.
 template<class T>
-void run_sediment_deposition(
+void run_sediment_deposition_serial(
   char* flow_direction_path,
   char* e_prime_path,
   char* f_path,
@@ -79,7 +88,7 @@ void run_sediment_deposition(
   double f_j_weighted_sum;
   NeighborTuple neighbor;
   NeighborTuple neighbor_of_neighbor;
-  double dr_i, t_i, f_i;
+  double t_i, f_i;
   UpslopeNeighbors<T> up_neighbors;
   DownslopeNeighbors<T> dn_neighbors;
   float total_n_pixels = flow_dir_raster.raster_x_size * flow_dir_raster.raster_y_size;
@@ -104,6 +113,14 @@ void run_sediment_deposition(
         win_xsize = flow_dir_raster.block_xsize;
       }
 
+      // with async I/O, read the blocks around the next block of seed
+      // pixels in the background while this one is processed
+      flow_dir_raster.prefetch_next_seed_block(flow_dir_raster, xoff, yoff);
+      e_prime_raster.prefetch_next_seed_block(flow_dir_raster, xoff, yoff);
+      sdr_raster.prefetch_next_seed_block(flow_dir_raster, xoff, yoff);
+      f_raster.prefetch_next_seed_block(flow_dir_raster, xoff, yoff);
+      sediment_deposition_raster.prefetch_next_seed_block(flow_dir_raster, xoff, yoff);
+
       if (time(NULL) - last_log_time > 5) {
         last_log_time = time(NULL);
         log_msg(
@@ -144,8 +161,7 @@ void run_sediment_deposition(
             // # the weighted sum of flux flowing onto this pixel from
             // # all neighbors
             f_j_weighted_sum = 0;
-            up_neighbors = UpslopeNeighbors<T>(
-              Pixel<T>(flow_dir_raster, global_col, global_row));
+            up_neighbors = UpslopeNeighbors<T>(flow_dir_raster, global_col, global_row);
             for (auto neighbor: up_neighbors) {
               f_j = f_raster.get(neighbor.x, neighbor.y);
               if (is_close(f_j, target_nodata)) {
@@ -161,8 +177,7 @@ void run_sediment_deposition(
             // # neighbor
             // # (sum over k ∈ K of SDR_k * p(i,k) in the equation above)
             downslope_sdr_weighted_sum = 0;
-            dn_neighbors = DownslopeNeighbors<T>(
-              Pixel<T>(flow_dir_raster, global_col, global_row));
+            dn_neighbors = DownslopeNeighbors<T>(flow_dir_raster, global_col, global_row);
             flow_dir_sum = 0;
             for (auto neighbor: dn_neighbors) {
               flow_dir_sum += static_cast<long>(neighbor.flow_proportion);
@@ -186,8 +201,7 @@ void run_sediment_deposition(
               // # completed
               upslope_neighbors_processed = true;
               // # iterate over each neighbor-of-neighbor
-              up_neighbors = UpslopeNeighbors<T>(
-                Pixel<T>(flow_dir_raster, neighbor.x, neighbor.y));
+              up_neighbors = UpslopeNeighbors<T>(flow_dir_raster, neighbor.x, neighbor.y);
               for (auto neighbor_of_neighbor: up_neighbors) {
                 if (INFLOW_OFFSETS[neighbor_of_neighbor.direction] == neighbor.direction) {
                   continue;
@@ -217,45 +231,9 @@ void run_sediment_deposition(
               continue;
             }
 
-            if (flow_dir_sum) {
-              downslope_sdr_weighted_sum /= flow_dir_sum;
-            }
-
-            // # This condition reflects property A in the user's guide.
-            if (downslope_sdr_weighted_sum < sdr_i) {
-              // # i think this happens because of our low resolution
-              // # flow direction, it's okay to zero out.
-              downslope_sdr_weighted_sum = sdr_i;
-            }
-
-            // # these correspond to the full equations for
-            // # dr_i, t_i, and f_i given in the docstring
-            if (sdr_i == 1) {
-              // # This reflects property B in the user's guide and is
-              // # an edge case to avoid division-by-zero.
-              dr_i = 1;
-            } else {
-              dr_i = (downslope_sdr_weighted_sum - sdr_i) / (1 - sdr_i);
-            }
-
-            // # Lisa's modified equations
-            t_i = dr_i * f_j_weighted_sum;  // deposition, a.k.a trapped sediment
-            f_i = (1 - dr_i) * f_j_weighted_sum + e_prime_i; // flux
-
-            // # On large flow paths, it's possible for dr_i, f_i and t_i
-            // # to have very small negative values that are numerically
-            // # equivalent to 0. These negative values were raising
-            // # questions on the forums and it's easier to clamp the
-            // # values here than to explain IEEE 754.
-            if (dr_i < 0) {
-              dr_i = 0;
-            }
-            if (t_i < 0) {
-              t_i = 0;
-            }
-            if (f_i < 0) {
-              f_i = 0;
-            }
+            deposition_and_flux(
+              f_j_weighted_sum, downslope_sdr_weighted_sum, flow_dir_sum,
+              sdr_i, e_prime_i, t_i, f_i);
             sediment_deposition_raster.set(global_col, global_row, t_i);
             f_raster.set(global_col, global_row, f_i);
           }
@@ -271,3 +249,322 @@ void run_sediment_deposition(
   f_raster.close();
   log_msg(LogLevel::info, "Sediment deposition 100% complete");
 }
+
+
+// Runs a pass of the sediment deposition kernel over a tile, for
+// run_sediment_deposition_tiled.
+//
+// The pass works downslope from its seed pixels exactly as the serial
+// kernel does, but only within the tile, holding the tile's results in
+// memory until the pass ends and then writing them to the output rasters.
+// On the tile's first pass the seeds are its local high points. A computed
+// pixel that drains into another tile sends it a message of (pixel,
+// computed upslope pixel), and the pixel is a seed of that tile's next pass
+// if all of its other upslope neighbors are computed by then. Every pixel
+// is computed from the same upslope values, with the same arithmetic, as
+// in the serial kernel.
+//
+// Args:
+//   routing: the tiles and the output rasters' mutex
+//   tile: the tile to process
+//   first_pass: whether this is the first pass over the tile
+//   messages: the messages sent to the tile since its last pass
+//   flow_dir_raster, e_prime_raster, sdr_raster: this thread's inputs
+//   f_raster, sediment_deposition_raster: the shared outputs
+// Returns:
+//   the messages to send to other tiles
+template<class T>
+vector<TileMessage> process_sediment_deposition_tile(
+    TiledRouting& routing,
+    RoutingTile& tile,
+    bool first_pass,
+    vector<TileMessage>& messages,
+    ManagedFlowDirRaster<T>& flow_dir_raster,
+    ManagedRaster& e_prime_raster,
+    ManagedRaster& sdr_raster,
+    ManagedRaster& f_raster,
+    ManagedRaster& sediment_deposition_raster) {
+  float target_nodata = -1;
+  long raster_x_size = flow_dir_raster.raster_x_size;
+  vector<TileMessage> sent;
+  stack<long> processing_stack;
+
+  // the deposition and flux of the tile's pixels, as float32 like the
+  // output rasters, whether each has been read from the rasters yet, and
+  // the pixels computed during this pass. Nothing has been written to the
+  // tile before its first pass, so then its pixels are all nodata.
+  long n_tile_pixels = tile.win_xsize * tile.win_ysize;
+  vector<float> deposition_values(n_tile_pixels, target_nodata);
+  vector<float> f_values(n_tile_pixels, target_nodata);
+  vector<bool> loaded(n_tile_pixels, first_pass);
+  vector<long> computed;
+
+  // returns the index of a pixel of the tile in `deposition_values` and
+  // `f_values`, reading its values from the rasters if not read yet
+  auto load = [&](long x, long y) {
+    long i = tile.local_index(x, y);
+    if (not loaded[i]) {
+      loaded[i] = true;
+      std::lock_guard<std::mutex> store_lock(routing.store_mutex);
+      deposition_values[i] = static_cast<float>(
+        sediment_deposition_raster.get(x, y));
+      f_values[i] = static_cast<float>(f_raster.get(x, y));
+    }
+    return i;
+  };
+  auto deposition_at = [&](long x, long y) -> double {
+    if (tile.contains(x, y)) {
+      return deposition_values[load(x, y)];
+    }
+    std::lock_guard<std::mutex> store_lock(routing.store_mutex);
+    return sediment_deposition_raster.get(x, y);
+  };
+  auto f_at = [&](long x, long y) -> double {
+    if (tile.contains(x, y)) {
+      return f_values[load(x, y)];
+    }
+    std::lock_guard<std::mutex> store_lock(routing.store_mutex);
+    return f_raster.get(x, y);
+  };
+  // whether all upslope neighbors of the pixel at `x, y` other than
+  // `skip_index` are computed
+  auto upslope_neighbors_processed = [&](long x, long y, long skip_index) {
+    for (auto neighbor: UpslopeNeighborsNoDivide<T>(flow_dir_raster, x, y)) {
+      if (neighbor.y * raster_x_size + neighbor.x == skip_index) {
+        continue;
+      }
+      if (is_close(deposition_at(neighbor.x, neighbor.y), target_nodata)) {
+        return false;
+      }
+    }
+    return true;
+  };
+
+  auto process_stack = [&]() {
+    long flat_index, global_col, global_row, neighbor_index;
+    double f_j, f_j_weighted_sum, sdr_j, downslope_sdr_weighted_sum;
+    double sdr_i, e_prime_i, t_i, f_i;
+    long flow_dir_sum;
+    while (processing_stack.size() > 0) {
+      flat_index = processing_stack.top();
+      processing_stack.pop();
+      global_row = flat_index / raster_x_size;
+      global_col = flat_index % raster_x_size;
+
+      // the same sums, in the same order, as in the serial kernel
+      f_j_weighted_sum = 0;
+      for (auto neighbor: UpslopeNeighbors<T>(
+          flow_dir_raster, global_col, global_row)) {
+        f_j = f_at(neighbor.x, neighbor.y);
+        if (is_close(f_j, target_nodata)) {
+          continue;
+        }
+        f_j_weighted_sum += neighbor.flow_proportion * f_j;
+      }
+
+      downslope_sdr_weighted_sum = 0;
+      flow_dir_sum = 0;
+      for (auto neighbor: DownslopeNeighbors<T>(
+          flow_dir_raster, global_col, global_row)) {
+        flow_dir_sum += static_cast<long>(neighbor.flow_proportion);
+        sdr_j = sdr_raster.get(neighbor.x, neighbor.y);
+        if (is_close(sdr_j, sdr_raster.nodata)) {
+          continue;
+        }
+        if (sdr_j == 0) {
+          sdr_j = 1;
+        }
+        downslope_sdr_weighted_sum += (sdr_j * neighbor.flow_proportion);
+
+        neighbor_index = neighbor.y * raster_x_size + neighbor.x;
+        if (not tile.contains(neighbor.x, neighbor.y)) {
+          // the neighbor's tile checks its other upslope neighbors
+          // after this pass's results are written
+          sent.push_back(make_pair(neighbor_index, flat_index));
+        } else if (upslope_neighbors_processed(
+            neighbor.x, neighbor.y, flat_index)) {
+          processing_stack.push(neighbor_index);
+        }
+      }
+
+      sdr_i = sdr_raster.get(global_col, global_row);
+      if (is_close(sdr_i, sdr_raster.nodata)) {
+        continue;
+      }
+      e_prime_i = e_prime_raster.get(global_col, global_row);
+      if (is_close(e_prime_i, e_prime_raster.nodata)) {
+        continue;
+      }
+      deposition_and_flux(
+        f_j_weighted_sum, downslope_sdr_weighted_sum, flow_dir_sum,
+        sdr_i, e_prime_i, t_i, f_i);
+      long i = tile.local_index(global_col, global_row);
+      loaded[i] = true;
+      deposition_values[i] = static_cast<float>(t_i);
+      f_values[i] = static_cast<float>(f_i);
+      computed.push_back(i);
+    }
+  };
+
+  if (first_pass) {
+    for (long ys = tile.yoff; ys < tile.yoff + tile.win_ysize; ys++) {
+      for (long xs = tile.xoff; xs < tile.xoff + tile.win_xsize; xs++) {
+        if (flow_dir_raster.get(xs, ys) == flow_dir_raster.nodata) {
+          continue;
+        }
+        if (flow_dir_raster.is_local_high_point(xs, ys) and
+            is_close(deposition_values[load(xs, ys)], target_nodata)) {
+          processing_stack.push(ys * raster_x_size + xs);
+          process_stack();
+        }
+      }
+    }
+  }
+  for (auto message: messages) {
+    long xs = message.first % raster_x_size;
+    long ys = message.first / raster_x_size;
+    if (is_close(deposition_values[load(xs, ys)], target_nodata) and
+        upslope_neighbors_processed(xs, ys, message.second)) {
+      processing_stack.push(message.first);
+      process_stack();
+    }
+  }
+
+  {
+    std::lock_guard<std::mutex> store_lock(routing.store_mutex);
+    for (long i: computed) {
+      long xs = tile.xoff + i % tile.win_xsize;
+      long ys = tile.yoff + i / tile.win_xsize;
+      sediment_deposition_raster.set(xs, ys, deposition_values[i]);
+      f_raster.set(xs, ys, f_values[i]);
+    }
+  }
+  routing.n_pixels_processed += computed.size();
+  return sent;
+}
+
+// Runs the sediment deposition kernel on `n_workers` threads, each
+// processing one tile of the raster at a time. See TiledRouting and
+// run_sediment_deposition.
+template<class T>
+void run_sediment_deposition_tiled(
+  char* flow_direction_path,
+  char* e_prime_path,
+  char* f_path,
+  char* sdr_path,
+  char* sediment_deposition_path,
+  int n_workers) {
+
+  vector<ManagedFlowDirRaster<T>> flow_dir_rasters;
+  vector<ManagedRaster> e_prime_rasters;
+  vector<ManagedRaster> sdr_rasters;
+  for (int i = 0; i < n_workers; i++) {
+    flow_dir_rasters.push_back(
+      ManagedFlowDirRaster<T>(flow_direction_path, 1, false));
+    e_prime_rasters.push_back(ManagedRaster(e_prime_path, 1, false));
+    sdr_rasters.push_back(ManagedRaster(sdr_path, 1, false));
+  }
+  ManagedRaster f_raster = ManagedRaster(f_path, 1, true);
+  ManagedRaster sediment_deposition_raster = ManagedRaster(
+    sediment_deposition_path, 1, true);
+
+  TiledRouting routing(flow_dir_rasters[0]);
+  try {
+    routing.run(
+      n_workers,
+      [&](RoutingTile& tile, bool first_pass,
+          vector<TileMessage>& messages, int worker_index) {
+        return process_sediment_deposition_tile<T>(
+          routing, tile, first_pass, messages,
+          flow_dir_rasters[worker_index], e_prime_rasters[worker_index],
+          sdr_rasters[worker_index], f_raster, sediment_deposition_raster);
+      },
+      "Sediment deposition");
+  } catch (...) {
+    sediment_deposition_raster.close();
+    f_raster.close();
+    for (int i = 0; i < n_workers; i++) {
+      flow_dir_rasters[i].close();
+      e_prime_rasters[i].close();
+      sdr_rasters[i].close();
+    }
+    throw;
+  }
+
+  sediment_deposition_raster.close();
+  f_raster.close();
+  for (int i = 0; i < n_workers; i++) {
+    flow_dir_rasters[i].close();
+    e_prime_rasters[i].close();
+    sdr_rasters[i].close();
+  }
+  log_msg(LogLevel::info, "Sediment deposition 100% complete");
+}
+
+// Calculate sediment deposition layer.
+//
+// This algorithm outputs both sediment deposition (t_i) and flux (f_i)::
+//
+//   t_i  = dt_i  * (sum over j ∈ J of f_j * p(j,i))
+//
+//   f_i  = (1 - dt_i) * (sum over j ∈ J of f_j * p(j,i)) + E'_i
+//
+//
+//           (sum over k ∈ K of SDR_k * p(i,k)) - SDR_i
+//   dt_i = --------------------------------------------
+//               (1 - SDR_i)
+//
+// where:
+//
+// - ``p(i,j)`` is the proportion of flow from pixel ``i`` into pixel ``j``
+// - ``J`` is the set of pixels that are immediate upslope neighbors of
+//   pixel ``i``
+// - ``K`` is the set of pixels that are immediate downslope neighbors of
+//   pixel ``i``
+// - ``E'`` is ``USLE * (1 - SDR)``, the amount of sediment loss from pixel
+//   ``i`` that doesn't reach a stream (``e_prime_path``)
+// - ``SDR`` is the sediment delivery ratio (``sdr_path``)
+//
+// ``f_i`` is recursively defined in terms of ``i``'s upslope neighbors.
+// The algorithm begins from seed pixels that are local high points and so
+// have no upslope neighbors. It works downslope from each seed pixel,
+// only adding a pixel to the stack when all its upslope neighbors are
+// already calculated.
+//
+// Note that this function is designed to be used in the context of the SDR
+// model. Because the algorithm is recursive upslope and downslope of each
+// pixel, nodata values in the SDR input would propagate along the flow path.
+// This case is not handled because we assume the SDR and flow dir inputs
+// will come from the SDR model and have nodata in the same places.
+//
+// Args:
+//   flow_direction_path: a path to a flow direction raster,
+//     in either MFD or D8 format. Specify with the ``algorithm`` arg.
+//   e_prime_path: path to a raster that shows sources of
+//     sediment that wash off a pixel but do not reach the stream.
+//   f_path: path to a raster that shows the sediment flux
+//     on a pixel for sediment that does not reach the stream.
+//   sdr_path: path to Sediment Delivery Ratio raster.
+//   target_sediment_deposition_path: path to created that
+//     shows where the E' sources end up across the landscape.
+//   n_workers: the number of threads to run the kernel on. If more than 1,
+//     the raster is processed in tiles by run_sediment_deposition_tiled,
+//     with the same results as processing it in one thread.
+template<class T>
+void run_sediment_deposition(
+  char* flow_direction_path,
+  char* e_prime_path,
+  char* f_path,
+  char* sdr_path,
+  char* sediment_deposition_path,
+  int n_workers) {
+  if (n_workers > 1) {
+    run_sediment_deposition_tiled<T>(
+      flow_direction_path, e_prime_path, f_path, sdr_path,
+      sediment_deposition_path, n_workers);
+  } else {
+    run_sediment_deposition_serial<T>(
+      flow_direction_path, e_prime_path, f_path, sdr_path,
+      sediment_deposition_path);
+  }
+}
@@ -4,4 +4,5 @@ cdef extern from "sediment_deposition.h":
         char*,
         char*,
         char*,
-        char*) except +
+        char*,
+        int) except +
@@ -11,6 +11,7 @@ from osgeo import gdal
 from osgeo import ogr
 
 from natcap.invest import gettext
+from natcap.invest import hydrology
 from natcap.invest import spec
 from natcap.invest import utils
 from natcap.invest import validation
@@ -48,6 +49,9 @@ MODEL_SPEC = spec.ModelSpec(
         spec.WORKSPACE,
         spec.SUFFIX,
         spec.N_WORKERS,
+        spec.CACHE_BUDGET,
+        spec.INTERMEDIATE_CACHE,
+        spec.HYDROLOGY_DIR,
         spec.THRESHOLD_FLOW_ACCUMULATION,
         spec.CSVInput(
             id="et0_raster_table",
@@ -633,6 +637,14 @@ def execute(args):
             use a single process, 0 will be non-blocking scheduling but
             single process, and >= 1 will make additional processes for
             parallel execution.
+        args['cache_budget_bytes'] (int): (optional) the number of bytes of
+            memory shared by the block caches of the flow routing kernels.
+        args['intermediate_cache_dir'] (string): (optional) path to a
+            directory of intermediate results shared between workspaces.
+            See ``natcap.invest.intermediate_cache``.
+        args['hydrology_dir'] (string): (optional) path to a directory of
+            routing products shared between models. See
+            ``natcap.invest.hydrology``.
 
     Returns:
         File registry dictionary mapping MODEL_SPEC output ids to absolute paths
@@ -736,75 +748,23 @@ def execute(args):
         target_path_list=output_align_list,
         task_name='align rasters')
 
-    fill_pit_task = task_graph.add_task(
-        func=pygeoprocessing.routing.fill_pits,
-        args=(
-            (file_registry['dem_aligned'], 1),
-            file_registry['pit_filled_dem']),
-        kwargs={'working_dir': args['workspace_dir']},
-        target_path_list=[file_registry['pit_filled_dem']],
-        dependent_task_list=[align_task],
-        task_name='fill dem pits')
-
-    if args['flow_dir_algorithm'] == 'mfd':
-        flow_dir_task = task_graph.add_task(
-            func=pygeoprocessing.routing.flow_dir_mfd,
-            args=(
-                (file_registry['pit_filled_dem'], 1),
-                file_registry['flow_dir']),
-            kwargs={'working_dir': args['workspace_dir']},
-            target_path_list=[file_registry['flow_dir']],
-            dependent_task_list=[fill_pit_task],
-            task_name='flow direction - MFD')
-
-        flow_accum_task = task_graph.add_task(
-            func=pygeoprocessing.routing.flow_accumulation_mfd,
-            args=(
-                (file_registry['flow_dir'], 1),
-                file_registry['flow_accum']),
-            target_path_list=[file_registry['flow_accum']],
-            dependent_task_list=[flow_dir_task],
-            task_name='flow accumulation - MFD')
-
-        stream_threshold_task = task_graph.add_task(
-            func=pygeoprocessing.routing.extract_streams_mfd,
-            args=(
-                (file_registry['flow_accum'], 1),
-                (file_registry['flow_dir'], 1),
-                threshold_flow_accumulation,
-                file_registry['stream']),
-            target_path_list=[file_registry['stream']],
-            dependent_task_list=[flow_accum_task],
-            task_name='stream threshold - MFD')
-    else: # D8
-        flow_dir_task = task_graph.add_task(
-            func=pygeoprocessing.routing.flow_dir_d8,
-            args=(
-                (file_registry['pit_filled_dem'], 1),
-                file_registry['flow_dir']),
-            kwargs={'working_dir': args['workspace_dir']},
-            target_path_list=[file_registry['flow_dir']],
-            dependent_task_list=[fill_pit_task],
-            task_name='flow direction - D8')
-
-        flow_accum_task = task_graph.add_task(
-            func=pygeoprocessing.routing.flow_accumulation_d8,
-            args=(
-                (file_registry['flow_dir'], 1),
-                file_registry['flow_accum']),
-            target_path_list=[file_registry['flow_accum']],
-            dependent_task_list=[flow_dir_task],
-            task_name='flow accumulation - D8')
-
-        stream_threshold_task = task_graph.add_task(
-            func=pygeoprocessing.routing.extract_streams_d8,
-            kwargs=dict(
-                flow_accum_raster_path_band=(file_registry['flow_accum'], 1),
-                flow_threshold=threshold_flow_accumulation,
-                target_stream_raster_path=file_registry['stream']),
-            target_path_list=[file_registry['stream']],
-            dependent_task_list=[flow_accum_task],
-            task_name='stream threshold - D8')
+    routing_tasks = hydrology.add_routing_tasks(
+        task_graph, (file_registry['dem_aligned'], 1),
+        args['flow_dir_algorithm'],
+        target_paths={
+            'filled_dem': file_registry['pit_filled_dem'],
+            'flow_direction': file_registry['flow_dir'],
+            'flow_accumulation': file_registry['flow_accum'],
+            'stream': file_registry['stream'],
+        },
+        threshold_flow_accumulation=threshold_flow_accumulation,
+        working_dir=args['workspace_dir'],
+        hydrology_dir=args['hydrology_dir'],
+        cache_dir=args['intermediate_cache_dir'],
+        dependent_task_list=[align_task])
+    fill_pit_task = routing_tasks['filled_dem']
+    flow_dir_task = routing_tasks['flow_direction']
+    stream_threshold_task = routing_tasks['stream']
 
 
 
@@ -947,6 +907,7 @@ def execute(args):
                 file_registry['aet'],
                 file_registry['annual_precip'],
                 args['flow_dir_algorithm']),
+            kwargs={'cache_budget_bytes': args['cache_budget_bytes']},
             target_path_list=[
                 file_registry['l'],
                 file_registry['l_avail'],
@@ -956,7 +917,7 @@ def execute(args):
             ],
             dependent_task_list=[
                 align_task, flow_dir_task, stream_threshold_task,
-                fill_pit_task] + quick_flow_task_list,
+                fill_pit_task] + quick_flow_task_list + kc_task_list,
             task_name='calculate local recharge')
 
     # calculate Qb as the sum of local_recharge_avail over the AOI, Eq [9]
@@ -1022,6 +983,7 @@ def execute(args):
             file_registry['b'],
             file_registry['b_sum'],
             args['flow_dir_algorithm']),
+        kwargs={'cache_budget_bytes': args['cache_budget_bytes']},
         target_path_list=[
             file_registry['b_sum'], file_registry['b']],
         dependent_task_list=b_sum_dependent_task_list + [l_sum_task],
@@ -1,5 +1,6 @@
 import logging
 import os
+import tempfile
 import collections
 import sys
 import gc
@@ -9,21 +10,85 @@ import numpy
 cimport numpy
 cimport cython
 from osgeo import gdal
+from osgeo import gdal_array
 from osgeo import ogr
 from osgeo import osr
 
 from libcpp.vector cimport vector
 
+from ..managed_raster import cache
 from ..managed_raster.managed_raster cimport D8, MFD
 from .swy cimport run_route_baseflow_sum, run_calculate_local_recharge
 
 LOGGER = logging.getLogger(__name__)
 
+# width and height of the blocks of the stacked monthly input raster
+STACK_BLOCK_SIZE = 128
+# the value that GDAL reports as the nodata value of a band that has none,
+# which the local recharge kernel compares values against for such bands
+GDAL_UNDEFINED_NODATA = -1e10
+
+
+def _stack_rasters(base_path_list, target_path):
+    """Copy aligned single-band rasters into the bands of one raster.
+
+    The target is pixel-interleaved, so that a block holds every band's
+    values of its pixels, and its type can hold the values of every base
+    raster exactly. It has no nodata value.
+
+    Args:
+        base_path_list (list): paths to single-band rasters of the same
+            dimensions, in the order of the target's bands.
+        target_path (str): path to the GeoTIFF to create.
+
+    Returns:
+        list of the nodata value of each base raster, or
+        ``GDAL_UNDEFINED_NODATA`` if it has none.
+    """
+    raster_info_list = [
+        pygeoprocessing.get_raster_info(path) for path in base_path_list]
+    target_numpy_type = numpy.result_type(
+        *[info['numpy_type'] for info in raster_info_list])
+    n_cols, n_rows = raster_info_list[0]['raster_size']
+
+    target_raster = gdal.GetDriverByName('GTiff').Create(
+        target_path, n_cols, n_rows, len(base_path_list),
+        gdal_array.NumericTypeCodeToGDALTypeCode(target_numpy_type),
+        options=[
+            'TILED=YES', 'BIGTIFF=YES', 'COMPRESS=LZW', 'INTERLEAVE=PIXEL',
+            f'BLOCKXSIZE={STACK_BLOCK_SIZE}',
+            f'BLOCKYSIZE={STACK_BLOCK_SIZE}'])
+    target_raster.SetProjection(raster_info_list[0]['projection_wkt'])
+    target_raster.SetGeoTransform(raster_info_list[0]['geotransform'])
+    base_band_list = []
+    for path in base_path_list:
+        base_raster = gdal.OpenEx(path, gdal.OF_RASTER)
+        base_band_list.append((base_raster, base_raster.GetRasterBand(1)))
+
+    # copy one target block at a time so that each is compressed once
+    for yoff in range(0, n_rows, STACK_BLOCK_SIZE):
+        win_ysize = min(STACK_BLOCK_SIZE, n_rows - yoff)
+        for xoff in range(0, n_cols, STACK_BLOCK_SIZE):
+            win_xsize = min(STACK_BLOCK_SIZE, n_cols - xoff)
+            for band_index, (_, base_band) in enumerate(base_band_list):
+                target_raster.GetRasterBand(band_index + 1).WriteArray(
+                    base_band.ReadAsArray(
+                        xoff=xoff, yoff=yoff, win_xsize=win_xsize,
+                        win_ysize=win_ysize).astype(target_numpy_type),
+                    xoff=xoff, yoff=yoff)
+    base_band_list = None
+    target_raster = None
+
+    return [
+        GDAL_UNDEFINED_NODATA if info['nodata'][0] is None
+        else info['nodata'][0] for info in raster_info_list]
+
+
 cpdef calculate_local_recharge(
         precip_path_list, et0_path_list, qf_m_path_list, flow_dir_mfd_path,
         kc_path_list, alpha_month_map, float beta_i, float gamma, stream_path,
         target_li_path, target_li_avail_path, target_l_sum_avail_path,
-        target_aet_path, target_pi_path, algorithm):
+        target_aet_path, target_pi_path, algorithm, cache_budget_bytes=None):
     """
     Calculate the rasters defined by equations [3]-[7].
 
@@ -58,68 +123,78 @@ cpdef calculate_local_recharge(
             evapotranspiration.
         target_pi_path (str): created by this call, the annual precipitation on
             a pixel.
+        algorithm (str): MFD or D8
+        cache_budget_bytes (int): if provided, the number of bytes of
+            memory to share among all ManagedRaster block caches. See
+            ``natcap.invest.managed_raster.cache.set_cache_budget``.
 
         Returns:
             None.
 
     """
     cdef vector[float] alpha_values
-    cdef vector[char*] et0_paths
-    cdef vector[char*] precip_paths
-    cdef vector[char*] qf_paths
-    cdef vector[char*] kc_paths
-    encoded_et0_paths = [p.encode('utf-8') for p in et0_path_list]
-    encoded_precip_paths = [p.encode('utf-8') for p in precip_path_list]
-    encoded_qf_paths = [p.encode('utf-8') for p in qf_m_path_list]
-    encoded_kc_paths = [p.encode('utf-8') for p in kc_path_list]
+    cdef vector[double] monthly_nodata
     for i in range(12):
-        et0_paths.push_back(encoded_et0_paths[i])
-        precip_paths.push_back(encoded_precip_paths[i])
-        qf_paths.push_back(encoded_qf_paths[i])
-        kc_paths.push_back(encoded_kc_paths[i])
         alpha_values.push_back(alpha_month_map[i + 1])
 
-    target_nodata = -1e32
-    pygeoprocessing.new_raster_from_base(
-        flow_dir_mfd_path, target_li_path, gdal.GDT_Float32, [target_nodata],
-        fill_value_list=[target_nodata])
-    pygeoprocessing.new_raster_from_base(
-        flow_dir_mfd_path, target_li_avail_path, gdal.GDT_Float32,
-        [target_nodata], fill_value_list=[target_nodata])
-    pygeoprocessing.new_raster_from_base(
-        flow_dir_mfd_path, target_l_sum_avail_path, gdal.GDT_Float32,
-        [target_nodata], fill_value_list=[target_nodata])
-    pygeoprocessing.new_raster_from_base(
-        flow_dir_mfd_path, target_aet_path, gdal.GDT_Float32, [target_nodata],
-        fill_value_list=[target_nodata])
-    pygeoprocessing.new_raster_from_base(
-        flow_dir_mfd_path, target_pi_path, gdal.GDT_Float32, [target_nodata],
-        fill_value_list=[target_nodata])
-    args = [
-        precip_paths,
-        et0_paths,
-        qf_paths,
-        flow_dir_mfd_path.encode('utf-8'),
-        kc_paths,
-        alpha_values,
-        beta_i,
-        gamma,
-        stream_path.encode('utf-8'),
-        target_li_path.encode('utf-8'),
-        target_li_avail_path.encode('utf-8'),
-        target_l_sum_avail_path.encode('utf-8'),
-        target_aet_path.encode('utf-8'),
-        target_pi_path.encode('utf-8')]
+    # the kernel reads all 48 monthly values of a pixel from one raster,
+    # rather than from 48 rasters with a block cache each
+    fp, monthly_inputs_path = tempfile.mkstemp(
+        suffix='.tif', prefix='monthly_inputs',
+        dir=os.path.dirname(target_li_path))
+    os.close(fp)
+    try:
+        for nodata in _stack_rasters(
+                list(precip_path_list) + list(et0_path_list) +
+                list(qf_m_path_list) + list(kc_path_list),
+                monthly_inputs_path):
+            monthly_nodata.push_back(nodata)
+
+        if cache_budget_bytes:
+            cache.set_cache_budget(cache_budget_bytes)
+
+        target_nodata = -1e32
+        pygeoprocessing.new_raster_from_base(
+            flow_dir_mfd_path, target_li_path, gdal.GDT_Float32,
+            [target_nodata], fill_value_list=[target_nodata])
+        pygeoprocessing.new_raster_from_base(
+            flow_dir_mfd_path, target_li_avail_path, gdal.GDT_Float32,
+            [target_nodata], fill_value_list=[target_nodata])
+        pygeoprocessing.new_raster_from_base(
+            flow_dir_mfd_path, target_l_sum_avail_path, gdal.GDT_Float32,
+            [target_nodata], fill_value_list=[target_nodata])
+        pygeoprocessing.new_raster_from_base(
+            flow_dir_mfd_path, target_aet_path, gdal.GDT_Float32,
+            [target_nodata], fill_value_list=[target_nodata])
+        pygeoprocessing.new_raster_from_base(
+            flow_dir_mfd_path, target_pi_path, gdal.GDT_Float32,
+            [target_nodata], fill_value_list=[target_nodata])
+        args = [
+            monthly_inputs_path.encode('utf-8'),
+            monthly_nodata,
+            flow_dir_mfd_path.encode('utf-8'),
+            alpha_values,
+            beta_i,
+            gamma,
+            stream_path.encode('utf-8'),
+            target_li_path.encode('utf-8'),
+            target_li_avail_path.encode('utf-8'),
+            target_l_sum_avail_path.encode('utf-8'),
+            target_aet_path.encode('utf-8'),
+            target_pi_path.encode('utf-8')]
 
-    if algorithm.lower() == 'mfd':
-        run_calculate_local_recharge[MFD](*args)
-    else:  # D8
-        run_calculate_local_recharge[D8](*args)
+        if algorithm.lower() == 'mfd':
+            run_calculate_local_recharge[MFD](*args)
+        else:  # D8
+            run_calculate_local_recharge[D8](*args)
+    finally:
+        os.remove(monthly_inputs_path)
 
 
 def route_baseflow_sum(
         flow_dir_path, l_path, l_avail_path, l_sum_path,
-        stream_path, target_b_path, target_b_sum_path, algorithm):
+        stream_path, target_b_path, target_b_sum_path, algorithm,
+        cache_budget_bytes=None):
     """Route Baseflow through MFD as described in Equation 11.
 
     Args:
@@ -134,11 +209,17 @@ def route_baseflow_sum(
         target_b_path (string): path to created raster for per-pixel baseflow.
         target_b_sum_path (string): path to created raster for per-pixel
             upslope sum of baseflow.
+        algorithm (string): MFD or D8
+        cache_budget_bytes (int): if provided, the number of bytes of
+            memory to share among all ManagedRaster block caches. See
+            ``natcap.invest.managed_raster.cache.set_cache_budget``.
 
     Returns:
         None.
     """
     cdef float target_nodata = -1e32
+    if cache_budget_bytes:
+        cache.set_cache_budget(cache_budget_bytes)
 
     pygeoprocessing.new_raster_from_base(
         flow_dir_path, target_b_sum_path, gdal.GDT_Float32,
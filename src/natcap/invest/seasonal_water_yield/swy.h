@@ -5,19 +5,30 @@
 
 #include "ManagedRaster.h"
 
+// The monthly inputs to run_calculate_local_recharge are the bands of one
+// raster, in this order: 12 months each of precipitation, ET0, quickflow
+// and crop factor. These are the offsets of the first band of each.
+int PRECIP_BAND_OFFSET = 0;
+int ET0_BAND_OFFSET = 12;
+int QF_BAND_OFFSET = 24;
+int KC_BAND_OFFSET = 36;
+int N_MONTHLY_BANDS = 48;
+
 // Calculate the rasters defined by equations [3]-[7].
 //
 // Note all input rasters must be in the same coordinate system and
 // have the same dimensions.
 //
 // Args:
-//   precip_paths: paths to monthly precipitation rasters. (model input)
-//   et0_paths: paths to monthly ET0 rasters. (model input)
-//   qf_m_paths: paths to monthly quickflow rasters calculated by
-//     Equation [1].
+//   monthly_inputs_path: path to a raster of 48 bands, pixel-interleaved,
+//     holding the monthly precipitation (model input), ET0 (model input),
+//     quickflow (calculated by Equation [1]) and crop factor of each pixel.
+//     See PRECIP_BAND_OFFSET for the order of the bands.
+//   monthly_nodata: the nodata value of the raster each band of
+//     monthly_inputs_path was copied from, as GDAL reports it (-1e10 if
+//     that raster has none).
 //   flow_dir_path: path to a flow direction raster (MFD or D8). Indicate MFD
 //    or D8 with the template argument.
-//   kc_paths: list of rasters of the monthly crop factor for the pixel.
 //   alpha_values: list of monthly alpha values (fraction of upslope annual
 //     available recharge that is available in each month)
 //   beta_i:  fraction of the upgradient subsidy that is available
@@ -38,11 +49,9 @@
 //     a pixel.
 template<class T>
 void run_calculate_local_recharge(
-    vector<char*> precip_paths,
-    vector<char*> et0_paths,
-    vector<char*> qf_m_paths,
+    char* monthly_inputs_path,
+    vector<double> monthly_nodata,
     char* flow_dir_path,
-    vector<char*> kc_paths,
     vector<float> alpha_values,
     float beta_i,
     float gamma,
@@ -72,43 +81,10 @@ void run_calculate_local_recharge(
   unsigned long n_pixels_processed = 0;
   float total_n_pixels = flow_dir_raster.raster_x_size * flow_dir_raster.raster_y_size;
 
-  // make sure that user input nodata values are defined
-  // set to -1 if not defined
-  // precipitation and evapotranspiration data should
-  // always be non-negative
-  vector<ManagedRaster> et0_m_rasters;
-  vector<double> et0_m_nodata_list;
-  for (auto et0_m_path: et0_paths) {
-    ManagedRaster et0_raster = ManagedRaster(et0_m_path, 1, 0);
-    et0_m_rasters.push_back(et0_raster);
-    if (et0_raster.hasNodata) {
-      et0_m_nodata_list.push_back(et0_raster.nodata);
-    } else {
-      et0_m_nodata_list.push_back(-1);
-    }
-  }
-
-  vector<ManagedRaster> precip_m_rasters;
-  vector<double> precip_m_nodata_list;
-  for (auto precip_m_path: precip_paths) {
-    ManagedRaster precip_raster = ManagedRaster(precip_m_path, 1, 0);
-    precip_m_rasters.push_back(precip_raster);
-    if (precip_raster.hasNodata) {
-      precip_m_nodata_list.push_back(precip_raster.nodata);
-    } else {
-      precip_m_nodata_list.push_back(-1);
-    }
-  }
-
-  vector<ManagedRaster> qf_m_rasters;
-  for (auto qf_m_path: qf_m_paths) {
-    qf_m_rasters.push_back(ManagedRaster(qf_m_path, 1, 0));
-  }
-
-  vector<ManagedRaster> kc_m_rasters;
-  for (auto kc_m_path: kc_paths) {
-    kc_m_rasters.push_back(ManagedRaster(kc_m_path, 1, 0));
-  }
+  // all 48 monthly values of a pixel are read with one block lookup
+  ManagedRaster monthly_raster = ManagedRaster(
+    monthly_inputs_path, 1, 0, N_MONTHLY_BANDS);
+  vector<double> monthly_values(N_MONTHLY_BANDS);
 
   ManagedRaster target_li_raster = ManagedRaster(target_li_path, 1, 1);
   ManagedRaster target_li_avail_raster = ManagedRaster(target_li_avail_path, 1, 1);
@@ -138,6 +114,16 @@ void run_calculate_local_recharge(
         win_xsize = flow_dir_raster.block_xsize;
       }
 
+      // with async I/O, read the blocks around the next block of seed
+      // pixels in the background while this one is processed
+      flow_dir_raster.prefetch_next_seed_block(flow_dir_raster, xoff, yoff);
+      target_li_raster.prefetch_next_seed_block(flow_dir_raster, xoff, yoff);
+      target_li_avail_raster.prefetch_next_seed_block(flow_dir_raster, xoff, yoff);
+      target_l_sum_avail_raster.prefetch_next_seed_block(flow_dir_raster, xoff, yoff);
+      target_aet_raster.prefetch_next_seed_block(flow_dir_raster, xoff, yoff);
+      target_pi_raster.prefetch_next_seed_block(flow_dir_raster, xoff, yoff);
+      monthly_raster.prefetch_next_seed_block(flow_dir_raster, xoff, yoff);
+
       if (time(NULL) - last_log_time > 5) {
         last_log_time = time(NULL);
         log_msg(
@@ -179,7 +165,7 @@ void run_calculate_local_recharge(
             // mfd values yet
             l_sum_avail_i = 0.0;
             mfd_dir_sum = 0;
-            up_neighbors = UpslopeNeighborsNoDivide<T>(Pixel<T>(flow_dir_raster, xi, yi));
+            up_neighbors = UpslopeNeighborsNoDivide<T>(flow_dir_raster, xi, yi);
             for (auto neighbor: up_neighbors) {
               // pixel flows inward, check upslope
               l_sum_avail_j = target_l_sum_avail_raster.get(
@@ -213,27 +199,28 @@ void run_calculate_local_recharge(
             p_i = 0;
             qf_i = 0;
 
+            monthly_raster.get_bands(xi, yi, monthly_values.data());
             for (int m_index = 0; m_index < 12; m_index++) {
-              p_m = precip_m_rasters[m_index].get(xi, yi);
-              if (not is_close(p_m, precip_m_rasters[m_index].nodata)) {
+              p_m = monthly_values[PRECIP_BAND_OFFSET + m_index];
+              if (not is_close(p_m, monthly_nodata[PRECIP_BAND_OFFSET + m_index])) {
                 p_i += p_m;
               } else {
                 p_m = 0;
               }
 
-              qf_m = qf_m_rasters[m_index].get(xi, yi);
-              if (not is_close(qf_m, qf_m_rasters[m_index].nodata)) {
+              qf_m = monthly_values[QF_BAND_OFFSET + m_index];
+              if (not is_close(qf_m, monthly_nodata[QF_BAND_OFFSET + m_index])) {
                 qf_i += qf_m;
               } else {
                 qf_m = 0;
               }
 
-              kc_m = kc_m_rasters[m_index].get(xi, yi);
+              kc_m = monthly_values[KC_BAND_OFFSET + m_index];
               pet_m = 0;
-              et0_m = et0_m_rasters[m_index].get(xi, yi);
+              et0_m = monthly_values[ET0_BAND_OFFSET + m_index];
               if (not (
-                  is_close(kc_m, kc_m_rasters[m_index].nodata) or
-                  is_close(et0_m, et0_m_rasters[m_index].nodata))) {
+                  is_close(kc_m, monthly_nodata[KC_BAND_OFFSET + m_index]) or
+                  is_close(et0_m, monthly_nodata[ET0_BAND_OFFSET + m_index]))) {
                 // Equation 6
                 pet_m = kc_m * et0_m;
               }
@@ -252,7 +239,7 @@ void run_calculate_local_recharge(
             target_li_raster.set(xi, yi, l_i);
             target_li_avail_raster.set(xi, yi, l_avail_i);
 
-            dn_neighbors = DownslopeNeighbors<T>(Pixel<T>(flow_dir_raster, xi, yi));
+            dn_neighbors = DownslopeNeighbors<T>(flow_dir_raster, xi, yi);
             for (auto neighbor: dn_neighbors) {
               work_queue.push(pair<long, long>(neighbor.x, neighbor.y));
             }
@@ -268,12 +255,7 @@ void run_calculate_local_recharge(
   target_l_sum_avail_raster.close();
   target_aet_raster.close();
   target_pi_raster.close();
-  for (int i = 0; i < 12; i++) {
-    et0_m_rasters[i].close();
-    precip_m_rasters[i].close();
-    qf_m_rasters[i].close();
-    kc_m_rasters[i].close();
-  }
+  monthly_raster.close();
   log_msg(LogLevel::info, "Local recharge 100% complete");
 }
 
@@ -345,6 +327,16 @@ void run_route_baseflow_sum(
         win_xsize = flow_dir_raster.block_xsize;
       }
 
+      // with async I/O, read the blocks around the next block of seed
+      // pixels in the background while this one is processed
+      flow_dir_raster.prefetch_next_seed_block(flow_dir_raster, xoff, yoff);
+      stream_raster.prefetch_next_seed_block(flow_dir_raster, xoff, yoff);
+      l_raster.prefetch_next_seed_block(flow_dir_raster, xoff, yoff);
+      l_avail_raster.prefetch_next_seed_block(flow_dir_raster, xoff, yoff);
+      l_sum_raster.prefetch_next_seed_block(flow_dir_raster, xoff, yoff);
+      target_b_raster.prefetch_next_seed_block(flow_dir_raster, xoff, yoff);
+      target_b_sum_raster.prefetch_next_seed_block(flow_dir_raster, xoff, yoff);
+
       for (int row_index = 0; row_index < win_ysize; row_index++) {
         ys_root = yoff + row_index;
         for (int col_index = 0; col_index < win_xsize; col_index++) {
@@ -359,7 +351,7 @@ void run_route_baseflow_sum(
           // search for a pixel that has no downslope neighbors,
           // or whose downslope neighbors all have nodata in the stream raster (?)
           outlet = true;
-          dn_neighbors = DownslopeNeighbors<T>(Pixel<T>(flow_dir_raster, xs_root, ys_root));
+          dn_neighbors = DownslopeNeighbors<T>(flow_dir_raster, xs_root, ys_root);
           for (auto neighbor: dn_neighbors) {
             if (static_cast<int>(stream_raster.get(neighbor.x, neighbor.y)) !=
                 static_cast<int>(stream_raster.nodata)) {
@@ -393,7 +385,7 @@ void run_route_baseflow_sum(
 
             b_sum_i = 0;
             downslope_defined = true;
-            dn_neighbors_no_skip = DownslopeNeighborsNoSkip<T>(Pixel<T>(flow_dir_raster, xi, yi));
+            dn_neighbors_no_skip = DownslopeNeighborsNoSkip<T>(flow_dir_raster, xi, yi);
             flow_dir_sum = 0;
             for (auto neighbor: dn_neighbors_no_skip) {
               flow_dir_sum += static_cast<long>(neighbor.flow_proportion);
@@ -446,7 +438,7 @@ void run_route_baseflow_sum(
             target_b_sum_raster.set(xi, yi, b_sum_i);
 
             current_pixel += 1;
-            up_neighbors = UpslopeNeighbors<T>(Pixel<T>(flow_dir_raster, xi, yi));
+            up_neighbors = UpslopeNeighbors<T>(flow_dir_raster, xi, yi);
             for (auto neighbor: up_neighbors) {
               work_stack.push(pair<long, long>(neighbor.x, neighbor.y));
             }
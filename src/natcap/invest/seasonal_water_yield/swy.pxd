@@ -2,11 +2,9 @@ from libcpp.vector cimport vector
 
 cdef extern from "swy.h":
     void run_calculate_local_recharge[T](
-        vector[char*], # precip_path_list
-        vector[char*], # et0_path_list
-        vector[char*], # qf_m_path_list
+        char*, # monthly_inputs_path
+        vector[double], # monthly_nodata
         char*, # flow_dir_mfd_path
-        vector[char*], # kc_path_list
         vector[float], # alpha_values
         float, # beta_i
         float, # gamma
@@ -1,6 +1,7 @@
 import collections
+import concurrent.futures
 import contextlib
-import copy
+import contextvars
 import importlib
 import json
 import logging
@@ -18,6 +19,7 @@ from osgeo import ogr
 from osgeo import osr
 import geometamaker
 import natcap.invest
+import numpy
 import pandas
 import pint
 import pygeoprocessing
@@ -38,14 +40,43 @@ LOGGER = logging.getLogger(__name__)
 # accessing a file could take a long time if it's in a file streaming service
 # to prevent the UI from hanging due to slow validation,
 # set a timeout for these functions.
-def timeout(func, timeout=5):
+FILE_CHECK_TIMEOUT = 5
+# maximum number of threads to check the files in a CSV column on
+MAX_COLUMN_FILE_CHECK_WORKERS = 8
+# spec attributes whose text ``ModelSpec.to_json`` translates
+TRANSLATED_SPEC_KEYS = {'about', 'display_name', 'model_title', 'name'}
+
+# Marks threads that already run under a timeout: the file checking threads
+# started by `timeout`, and the threads that ``validation.validate`` checks
+# files on. Calls to a timed-out function from these threads, such as a
+# ``validate`` method calling ``super().validate``, run directly instead of
+# starting another thread.
+_timeout_state = threading.local()
+
+
+def warn_file_check_timed_out(filepath):
+    """Warn that checking a file did not complete in time.
+
+    Args:
+        filepath (string): path to the file that was being checked
+
+    Returns:
+        None
+    """
+    warnings.warn(
+        f'Validation of file {filepath} timed out. If this file '
+        'is stored in a file streaming service, it may be taking a long '
+        'time to download. Try storing it locally instead.')
+
+
+def timeout(func, timeout=FILE_CHECK_TIMEOUT):
     """Stop a function after a given amount of time.
 
     Args:
         func (function): function to apply the timeout to
         args: arguments to pass to the function
         timeout (number): how many seconds to allow the function to run.
-            Defaults to 5.
+            Defaults to ``FILE_CHECK_TIMEOUT``.
 
     Returns:
         A string warning message if the thread completed in time and returned
@@ -54,23 +85,29 @@ def timeout(func, timeout=5):
     Raises:
         ``RuntimeWarning`` if the thread does not complete in time.
     """
-    # use a queue to share the return value from the file checking thread
-    # the target function puts the return value from `func` into shared memory
-    message_queue = queue.Queue()
-
     def wrapper(*args, **kwargs):
+        if getattr(_timeout_state, 'active', False):
+            return func(*args, **kwargs)
+
+        # use a queue to share the return value from the file checking thread
+        # the target function puts the return value from `func` into shared
+        # memory. Each call gets its own queue so that concurrent calls
+        # don't receive each other's values.
+        message_queue = queue.Queue()
+
         def put_fn():
+            _timeout_state.active = True
             message_queue.put(func(*args, **kwargs))
-        thread = threading.Thread(target=put_fn)
+        # the thread runs in a copy of this context, so that messages are
+        # translated to the same locale
+        thread = threading.Thread(
+            target=contextvars.copy_context().run, args=(put_fn,))
         LOGGER.debug(f'Starting file checking thread with timeout={timeout}')
         thread.start()
         thread.join(timeout=timeout)
         if thread.is_alive():
             # first arg to `check_csv`, `check_raster`, `check_vector` is the path
-            warnings.warn(
-                f'Validation of file {args[0]} timed out. If this file '
-                'is stored in a file streaming service, it may be taking a long '
-                'time to download. Try storing it locally instead.')
+            warn_file_check_timed_out(args[0])
 
         else:
             LOGGER.debug('File checking thread completed.')
@@ -255,6 +292,27 @@ class Input(BaseModel):
         title = '/'.join([capitalize_word(word) for word in title.split('/')])
         return title
 
+    def validate_column(self, col: pandas.Series):
+        """Validate the values in a column of a CSV against this input.
+
+        Each distinct value is validated once, in order, until an invalid
+        value is found.
+
+        Args:
+            col: Column of a pandas dataframe, formatted with
+                ``format_column``, without NA values
+
+        Returns:
+            A tuple of the first invalid value in the column and its error
+            message, or ``None`` if all the values are valid.
+        """
+        messages = {}
+        for value in col:
+            if value not in messages:
+                messages[value] = self.validate(value)
+            if messages[value]:
+                return value, messages[value]
+
     def preprocess(self, value):
         """Base preprocessing function.
 
@@ -357,6 +415,46 @@ class FileInput(Input):
             if letter in self.permissions and not os.access(filepath, mode):
                 return validation_messages.NEED_PERMISSION_FILE.format(permission=descriptor)
 
+    def validate_column(self, col: pandas.Series):
+        """Validate the file paths in a column of a CSV against this input.
+
+        Each distinct path is validated once. Since opening a file may take a
+        while, the paths are validated concurrently.
+
+        Args:
+            col: Column of a pandas dataframe, formatted with
+                ``format_column``, without NA values
+
+        Returns:
+            A tuple of the first invalid path in the column and its error
+            message, or ``None`` if all the paths are valid.
+        """
+        paths = list(dict.fromkeys(col))
+        if len(paths) < 2:
+            return super().validate_column(col)
+
+        # if this is already running under a timeout, so are the checks of
+        # each path. Otherwise each check starts its own timeout thread.
+        timeout_active = getattr(_timeout_state, 'active', False)
+
+        def validate_path(path):
+            _timeout_state.active = timeout_active
+            return self.validate(path)
+
+        # each check runs in its own copy of this context, so that messages
+        # are translated to the same locale
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(
+                MAX_COLUMN_FILE_CHECK_WORKERS, len(paths))) as executor:
+            futures = [
+                executor.submit(
+                    contextvars.copy_context().run, validate_path, path)
+                for path in paths]
+            messages = {
+                path: future.result() for path, future in zip(paths, futures)}
+        for path in col:
+            if messages[path]:
+                return path, messages[path]
+
     @staticmethod
     def format_column(col: pandas.Series, base_path: str) -> pandas.Series:
         """Format a column of a pandas dataframe that contains FileInput values.
@@ -970,15 +1068,15 @@ class CSVInput(FileInput):
 
         # Evaluate any conditional requirement strings to booleans
         # This will raise an error if any can't be evaluated
-        columns = copy.deepcopy(self.columns)
-        for col_spec in columns:
-            if isinstance(col_spec.required, str):
-                col_spec.required = bool(utils.evaluate_expression(
-                    col_spec.required, args or {}))
+        required_list = [
+            bool(utils.evaluate_expression(col_spec.required, args or {}))
+            if isinstance(col_spec.required, str) else col_spec.required
+            for col_spec in self.columns]
 
-        for col_spec, pattern in zip(columns, patterns):
+        for col_spec, required, pattern in zip(
+                self.columns, required_list, patterns):
             matching_cols = [c for c in available_cols if re.fullmatch(pattern, c)]
-            if col_spec.required and not matching_cols:
+            if required and not matching_cols:
                 if '[' in col_spec.id:
                     raise ValueError(validation_messages.PATTERN_MATCHED_NONE.format(
                         header=self.orientation,
@@ -999,13 +1097,13 @@ class CSVInput(FileInput):
                     raise ValueError(f'Null value(s) found in column "{col}"')
 
                 # recursively validate the values within the column
-                def check_value(value):
-                    err_msg = col_spec.validate(value)
-                    if err_msg:
-                        raise ValueError(
-                            f'Error in {self.orientation} "{col}", '
-                            f'value "{value}": {err_msg}')
-                df[col][df[col].notna()].apply(check_value)
+                invalid_value = col_spec.validate_column(
+                    df[col][df[col].notna()])
+                if invalid_value:
+                    value, err_msg = invalid_value
+                    raise ValueError(
+                        f'Error in {self.orientation} "{col}", '
+                        f'value "{value}": {err_msg}')
 
         if any(df.columns.duplicated()):
             duplicated_columns = df.columns[df.columns.duplicated]
@@ -1225,6 +1323,52 @@ class NumberInput(Input):
             if not result:  # A python bool object is returned.
                 return validation_messages.INVALID_VALUE.format(condition=self.expression)
 
+    def check_values(self, values: numpy.ndarray):
+        """Check an array of numbers against the requirements for this input.
+
+        Args:
+            values: float array of the values to check
+
+        Returns:
+            boolean array that is True where the value is valid
+
+        Raises:
+            ValueError if ``expression`` can't be evaluated on an array,
+            like ``"0 <= value <= 1"`` or ``"value in {0, 1}"``.
+        """
+        if not self.expression:
+            return numpy.ones(values.shape, dtype=bool)
+        if 'value' not in self.expression:
+            raise ValueError(
+                f'The expression {self.expression} does not contain value')
+        valid = utils.evaluate_expression(self.expression, {'value': values})
+        if not (isinstance(valid, numpy.ndarray) and
+                valid.dtype == bool and valid.shape == values.shape):
+            raise ValueError(
+                f'The expression {self.expression} is not elementwise')
+        return valid
+
+    def validate_column(self, col: pandas.Series):
+        """Validate the numbers in a column of a CSV against this input.
+
+        The whole column is checked at once with ``check_values``. Only the
+        values that fail are validated one by one, to get their error
+        messages.
+
+        Args:
+            col: Column of a pandas dataframe, formatted with
+                ``format_column``, without NA values
+
+        Returns:
+            A tuple of the first invalid value in the column and its error
+            message, or ``None`` if all the values are valid.
+        """
+        try:
+            valid = self.check_values(col.to_numpy(dtype=float))
+        except Exception:
+            return super().validate_column(col)
+        return super().validate_column(col[~valid])
+
     @staticmethod
     def format_column(col, *args):
         """Format a column of a pandas dataframe that contains NumberInput values.
@@ -1317,6 +1461,17 @@ class IntegerInput(NumberInput):
         if not float(value).is_integer():
             return validation_messages.NOT_AN_INTEGER.format(value=value)
 
+    def check_values(self, values: numpy.ndarray):
+        """Check an array of numbers against the requirements for this input.
+
+        Args:
+            values: float array of the values to check
+
+        Returns:
+            boolean array that is True where the value is valid
+        """
+        return (super().check_values(values) & numpy.isfinite(values) &
+                (values == numpy.trunc(values)))
 
     @staticmethod
     def format_column(col, *args):
@@ -1390,6 +1545,17 @@ class RatioInput(NumberInput):
                 value=as_float,
                 range='[0, 1]')
 
+    def check_values(self, values: numpy.ndarray):
+        """Check an array of numbers against the requirements for this input.
+
+        Args:
+            values: float array of the values to check
+
+        Returns:
+            boolean array that is True where the value is valid
+        """
+        return super().check_values(values) & (values >= 0) & (values <= 1)
+
 
 class PercentInput(NumberInput):
     """A percent input, or parameter, of an invest model.
@@ -1530,6 +1696,22 @@ class StringInput(Input):
             if not matches:
                 return validation_messages.REGEXP_MISMATCH.format(regexp=self.regexp)
 
+    def validate_column(self, col: pandas.Series):
+        """Validate the text in a column of a CSV against this input.
+
+        Args:
+            col: Column of a pandas dataframe, formatted with
+                ``format_column``, without NA values
+
+        Returns:
+            A tuple of the first invalid value in the column and its error
+            message, or ``None`` if all the values are valid.
+        """
+        if not self.regexp:
+            return None
+        matches = col.astype(str).str.fullmatch(self.regexp)
+        return super().validate_column(col[~matches.to_numpy(dtype=bool)])
+
     @staticmethod
     def format_column(col, *args):
         """Format a column of a pandas dataframe that contains StringInput values.
@@ -1639,6 +1821,22 @@ class OptionStringInput(Input):
             if str(value).lower() not in option_keys:
                 return validation_messages.INVALID_OPTION.format(option_list=option_keys)
 
+    def validate_column(self, col: pandas.Series):
+        """Validate the options in a column of a CSV against this input.
+
+        Args:
+            col: Column of a pandas dataframe, formatted with
+                ``format_column``, without NA values
+
+        Returns:
+            A tuple of the first invalid value in the column and its error
+            message, or ``None`` if all the values are valid.
+        """
+        if not self.options:
+            return None
+        is_option = col.astype(str).str.lower().isin(self.list_options())
+        return super().validate_column(col[~is_option.to_numpy(dtype=bool)])
+
     @staticmethod
     def format_column(col, *args):
         """Format a pandas dataframe column that contains OptionStringInput values.
@@ -1890,6 +2088,19 @@ class OptionStringOutput(Output):
     """A list of the values that this input may take"""
 
 
+class PreprocessedArgs(dict):
+    """A dict of input values that were preprocessed by a ``ModelSpec``.
+
+    Args:
+        values (dict): maps input keys to preprocessed input values
+        model_spec (ModelSpec): the model spec that preprocessed the values
+    """
+
+    def __init__(self, values, model_spec):
+        super().__init__(values)
+        self.model_spec = model_spec
+
+
 class ModelSpec(BaseModel):
     """Specification of an invest model describing metadata, inputs, and outputs."""
 
@@ -2016,6 +2227,8 @@ class ModelSpec(BaseModel):
     def to_json(self):
         """Serialize an MODEL_SPEC dict to a JSON string.
 
+        Names and descriptions are translated to the current locale.
+
         Args:
             spec (dict): An invest model's MODEL_SPEC.
 
@@ -2043,18 +2256,36 @@ class ModelSpec(BaseModel):
             elif obj is float:
                 return 'number'
             elif isinstance(obj, BaseModel):
-                as_dict = obj.model_dump()
+                as_dict = translate_text(obj.model_dump())
                 # type is a ClassVar, so it won't be included in the default dump
                 if hasattr(obj, 'type'):
                     as_dict['type'] = obj.type
                 return as_dict
             raise TypeError(f'fallback serializer is missing for {type(obj)}')
 
+        def translate_text(obj):
+            """Translate the text attributes of a dumped spec object."""
+            if isinstance(obj, dict):
+                return {
+                    key: (gettext(value) if (key in TRANSLATED_SPEC_KEYS and
+                                             isinstance(value, str) and value)
+                          else translate_text(value))
+                    for key, value in obj.items()}
+            if isinstance(obj, list):
+                return [translate_text(item) for item in obj]
+            return obj
+
         spec_dict = self.__dict__.copy()
         # rename 'inputs' to 'args' to stay consistent with the old api
         spec_dict.pop('inputs')
         spec_dict['args'] = {_input.id: _input for _input in self.inputs}
         spec_dict['outputs'] = {_output.id: _output for _output in self.outputs}
+        # text is translated to the current locale here, rather than when the
+        # model is imported, so the spec can be rendered in any language
+        # without reloading the model
+        for key in TRANSLATED_SPEC_KEYS & spec_dict.keys():
+            if isinstance(spec_dict[key], str) and spec_dict[key]:
+                spec_dict[key] = gettext(spec_dict[key])
         return json.dumps(spec_dict, default=fallback_serializer, ensure_ascii=False)
 
     def preprocess_inputs(self, input_values):
@@ -2064,17 +2295,25 @@ class ModelSpec(BaseModel):
         Inputs which were not provided will have a value of None. Each provided
         input value is passed through the corresponding Input.preprocess method.
 
+        Values that were already preprocessed by this model spec are not
+        preprocessed again. A copy of them is returned, so that changes to the
+        copy don't affect the original.
+
         Args:
             input_values (dict): Dict mapping input keys to input values
 
         Returns:
-            dictionary mapping input keys to preprocessed input values
+            ``PreprocessedArgs`` mapping input keys to preprocessed input values
         """
+        if (isinstance(input_values, PreprocessedArgs) and
+                input_values.model_spec is self):
+            return PreprocessedArgs(input_values, self)
+
         values = {}
         for _input in self.inputs:
             values[_input.id] = _input.preprocess(
                 input_values.get(_input.id, None))
-        return values
+        return PreprocessedArgs(values, self)
 
     def generate_metadata_for_outputs(self, file_registry, args_dict):
         """Create metadata for all items in an invest model output workspace.
@@ -2229,11 +2468,15 @@ class ModelSpec(BaseModel):
                 'Starting model with parameters: \n' +
                 utils.format_args_dict(args, self.model_id))
 
-            model_module = importlib.import_module(self.module_name)
-            registry = model_module.execute(args)
-
+            # preprocess the inputs once, for both the model and the
+            # post-processing steps below. ``setup`` doesn't preprocess them
+            # again.
             preprocessed_args = self.preprocess_inputs(args)
 
+            model_module = importlib.import_module(self.module_name)
+            registry = model_module.execute(
+                self.preprocess_inputs(preprocessed_args))
+
             if check_outputs:
                 # evaluate which outputs we expect to be created, given the
                 # model spec and provided input values
@@ -2322,6 +2565,66 @@ N_WORKERS = NWorkersInput(
     units=u.none,
     expression="value >= -1"
 )
+CACHE_BUDGET = IntegerInput(
+    id="cache_budget_bytes",
+    name=gettext("raster block cache budget"),
+    about=gettext(
+        "The number of bytes of memory shared by the raster block caches of"
+        " the flow routing kernels. If not provided, the value of the"
+        " NATCAP_INVEST_CACHE_BUDGET_BYTES environment variable is used, or"
+        " 2 GiB if that is not set."
+    ),
+    required=False,
+    hidden=True,
+    units=u.byte,
+    expression="value > 0"
+)
+KERNEL_THREADS = IntegerInput(
+    id="kernel_threads",
+    name=gettext("kernel threads"),
+    about=gettext(
+        "The number of threads that multithreaded kernels, such as SDR"
+        " sediment deposition and the Scenic Quality viewshed sum, run on."
+        " These threads are separate from the taskgraph worker processes set"
+        " by n_workers. If not provided, the kernels run on a single"
+        " thread."
+    ),
+    required=False,
+    hidden=True,
+    units=u.none,
+    expression="value >= 1"
+)
+INTERMEDIATE_CACHE = DirectoryInput(
+    id="intermediate_cache_dir",
+    name=gettext("intermediate cache"),
+    about=gettext(
+        "A folder of intermediate results, such as flow direction, that is"
+        " shared between workspaces, so that runs on the same data don't"
+        " calculate them again. If not provided, the value of the"
+        " NATCAP_INVEST_INTERMEDIATE_CACHE_DIR environment variable is used,"
+        " or nothing is cached if that is not set."
+    ),
+    contents=[],
+    permissions="rwx",
+    must_exist=False,
+    required=False,
+    hidden=True
+)
+HYDROLOGY_DIR = DirectoryInput(
+    id="hydrology_dir",
+    name=gettext("hydrology directory"),
+    about=gettext(
+        "A folder of filled DEMs, flow direction and flow accumulation"
+        " rasters and streams that is shared between models, so that models"
+        " run on the same DEM route it once. If not provided, the hydrology"
+        " folder of the intermediate cache is used, if there is one."
+    ),
+    contents=[],
+    permissions="rwx",
+    must_exist=False,
+    required=False,
+    hidden=True
+)
 DEM = SingleBandRasterInput(
     id="dem_path",
     name=gettext("digital elevation model"),
@@ -1,7 +1,10 @@
 """A Flask app with HTTP endpoints used by the InVEST Workbench."""
+import collections
+import functools
 import importlib
 import json
 import logging
+import threading
 
 from osgeo import gdal
 from flask import Flask
@@ -11,7 +14,7 @@ import geometamaker
 import natcap.invest
 from natcap.invest import cli
 from natcap.invest import datastack
-from natcap.invest import set_locale
+from natcap.invest import use_locale
 from natcap.invest import models
 from natcap.invest import spec
 from natcap.invest import usage
@@ -20,6 +23,11 @@ from natcap.invest import validation
 LOGGER = logging.getLogger(__name__)
 
 PREFIX = 'api'
+# validation sessions of the /validate_session endpoint, by session id,
+# least recently used first
+MAX_VALIDATION_SESSIONS = 32
+_validation_sessions = collections.OrderedDict()
+_validation_sessions_lock = threading.Lock()
 app = Flask(__name__)
 CORS(app, resources={
     f'/{PREFIX}/*': {
@@ -62,13 +70,46 @@ def get_invest_getspec():
     Returns:
         A JSON string.
     """
-    set_locale(request.args.get('language', 'en'))
-    target_model = request.get_json()
-    target_module = models.model_id_to_pyname[target_model]
-    importlib.reload(natcap.invest.validation_messages)
-    model_module = importlib.reload(
-        importlib.import_module(name=target_module))
-    return model_module.MODEL_SPEC.to_json()
+    return _get_spec_json(
+        request.get_json(), request.args.get('language', 'en'))
+
+
+def _import_model(model_id):
+    """Import a model's module, keeping its spec text in English.
+
+    Model specs and validation messages are translated when they are
+    rendered, so the server doesn't reload a model to change its language.
+    For that to work, the text in the spec must be the English messages
+    that are looked up in the catalog, so models are imported in English.
+
+    Args:
+        model_id (str): id of the model to import
+
+    Returns:
+        the model's module
+    """
+    with use_locale('en'):
+        return importlib.import_module(
+            name=models.model_id_to_pyname[model_id])
+
+
+@functools.cache
+def _get_spec_json(model_id, language):
+    """Render a model's spec to JSON in a language.
+
+    Specs don't change while the server runs, so each is rendered once
+    per language.
+
+    Args:
+        model_id (str): id of the model
+        language (str): ISO 639-1 code of the language to render in
+
+    Returns:
+        JSON string of the model spec
+    """
+    model_module = _import_model(model_id)
+    with use_locale(language):
+        return model_module.MODEL_SPEC.to_json()
 
 
 @app.route(f'/{PREFIX}/dynamic_dropdowns', methods=['POST'])
@@ -85,8 +126,7 @@ def get_dynamic_dropdown_options():
     payload = request.get_json()
     LOGGER.debug(payload)
     results = {}
-    model_module = importlib.import_module(
-        name=models.model_id_to_pyname[payload['model_id']])
+    model_module = _import_model(payload['model_id'])
     for arg_spec in model_module.MODEL_SPEC.inputs:
         if (isinstance(arg_spec, spec.OptionStringInput) and
                 arg_spec.dropdown_function):
@@ -119,14 +159,54 @@ def get_invest_validate():
     except KeyError:
         limit_to = None
 
-    set_locale(request.args.get('language', 'en'))
-    importlib.reload(natcap.invest.validation_messages)
-    model_module = importlib.reload(
-        importlib.import_module(
-            name=models.model_id_to_pyname[payload['model_id']]))
+    model_module = _import_model(payload['model_id'])
+    with use_locale(request.args.get('language', 'en')):
+        results = model_module.validate(
+            json.loads(payload['args']), limit_to=limit_to)
+    LOGGER.debug(results)
+    return json.dumps(results)
+
+
+@app.route(f'/{PREFIX}/validate_session', methods=['POST'])
+def get_invest_validate_session():
+    """Validates an InVEST model's args as they change.
+
+    The server keeps the args of each session, so that a request only needs
+    to send the args that changed since the previous request of the session.
+    Inputs and spatial overlap are only re-checked if they are affected by
+    the change (see ``validation.ValidationSession``).
 
-    results = model_module.validate(
-        json.loads(payload['args']), limit_to=limit_to)
+    Body (JSON string):
+        session_id: string identifying the session, e.g. a Workbench tab
+        model_id: string (e.g. carbon)
+        args: JSON string of the InVEST model args keys and values that
+            changed since the previous request of the session. For a new
+            session, this must be all of the args.
+
+    Accepts a `language` query parameter which should be an ISO 639-1 language
+    code. Validation messages will be translated to the requested language if
+    translations are available, or fall back to English otherwise.
+
+    Returns:
+        A JSON string of all the validation warnings of the session's args,
+        in the format returned by the `/validate` endpoint.
+    """
+    payload = request.get_json()
+    LOGGER.debug(payload)
+    session_key = (payload['session_id'], payload['model_id'])
+    with _validation_sessions_lock:
+        if session_key not in _validation_sessions:
+            _validation_sessions[session_key] = validation.ValidationSession()
+            if len(_validation_sessions) > MAX_VALIDATION_SESSIONS:
+                _validation_sessions.popitem(last=False)
+        _validation_sessions.move_to_end(session_key)
+        session = _validation_sessions[session_key]
+
+    model_module = _import_model(payload['model_id'])
+    with use_locale(request.args.get('language', 'en')), \
+            session.activate():
+        results = model_module.validate(
+            session.update(json.loads(payload['args'])))
     LOGGER.debug(results)
     return json.dumps(results)
 
@@ -148,8 +228,7 @@ def get_args_enabled():
     """
     payload = request.get_json()
     LOGGER.debug(payload)
-    model_spec = importlib.import_module(
-        name=models.model_id_to_pyname[payload['model_id']]).MODEL_SPEC
+    model_spec = _import_model(payload['model_id']).MODEL_SPEC
     results = validation.args_enabled(json.loads(payload['args']), model_spec)
     LOGGER.debug(results)
     return json.dumps(results)
@@ -159,14 +238,16 @@ def get_args_enabled():
 def post_datastack_file():
     """Extracts InVEST model args from json, logfiles, or datastacks.
 
-    Body (JSON string): path to file
+    Body (JSON string): path to file, with optional keys ``extractPath``
+        and ``lazy``, to leave an archive's rasters and vectors in the archive
 
     Returns:
         A JSON string.
     """
     payload = request.get_json()
     stack_type, stack_info = datastack.get_datastack_info(
-        payload['filepath'], payload.get('extractPath', None))
+        payload['filepath'], payload.get('extractPath', None),
+        lazy=payload.get('lazy', False))
     result_dict = {
         'type': stack_type,
         'args': stack_info.args,
@@ -242,6 +323,10 @@ def build_datastack_archive():
         filepath: string - the target path to save the archive
         model_id: string (e.g. carbon) the model id
         args: JSON string of InVEST model args keys and values
+        n_workers: (optional) int - number of threads to compress on
+        previous_filepath: (optional) string - path to an archive made
+            earlier, to reuse data from (see
+            ``datastack.build_datastack_archive``)
 
     Returns:
         A dictionary with the following key/value pairs:
@@ -253,7 +338,9 @@ def build_datastack_archive():
         datastack.build_datastack_archive(
             json.loads(payload['args']),
             payload['model_id'],
-            payload['filepath'])
+            payload['filepath'],
+            n_workers=payload.get('n_workers', 1),
+            previous_datastack_path=payload.get('previous_filepath'))
     except Exception as message:
         LOGGER.error(str(message))
         return {
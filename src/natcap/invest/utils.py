@@ -2,7 +2,9 @@
 import ast
 import codecs
 import contextlib
+import csv
 import functools
+import itertools
 import json
 import logging
 import os
@@ -51,6 +53,20 @@ GDAL_ERROR_LEVELS = {
 # leaves Projected CRS alone
 DEFAULT_OSR_AXIS_MAPPING_STRATEGY = osr.OAMS_TRADITIONAL_GIS_ORDER
 
+# Number of lines at the start of a CSV that are checked to decide whether it
+# can be parsed with the fast 'c' engine of ``pandas.read_csv``.
+CSV_HEAD_SAMPLE_LINES = 100
+# ``read_csv_to_dataframe`` kwargs that change how the separator is detected
+# or aren't supported by the 'c' engine.
+_PYTHON_ENGINE_CSV_KWARGS = {
+    'comment', 'delimiter', 'engine', 'sep', 'skipfooter', 'skiprows'}
+
+# ``raster_band_percentiles`` histograms this many bits of the sort key of
+# each value per pass over a raster, and collects the values of a histogram
+# bin once there are at most ``_PERCENTILE_SELECT_SIZE`` of them.
+_PERCENTILE_RADIX_BITS = 16
+_PERCENTILE_SELECT_SIZE = 2**20
+
 
 def _log_gdal_errors(*args, **kwargs):
     """Log error messages to osgeo.
@@ -290,6 +306,40 @@ def expand_path(path, base_path):
     return os.path.abspath(os.path.join(os.path.dirname(base_path), path))
 
 
+def _sniff_csv_separator(path, encoding):
+    """Detect the separator of a CSV and check that its head is well-formed.
+
+    The separator is detected from the first line of the file, the same way
+    the 'python' engine of ``pandas.read_csv`` does when ``sep=None``.
+
+    Args:
+        path (str): path to a local CSV file
+        encoding (str): the encoding of the file
+
+    Returns:
+        The separator, if each of the first ``CSV_HEAD_SAMPLE_LINES`` lines
+        that isn't blank has the same number of fields. ``None`` if they
+        don't, or if the separator can't be detected.
+
+    Raises:
+        UnicodeDecodeError if the head of the file can't be decoded
+    """
+    with open(path, encoding=encoding, newline='') as csv_file:
+        head = list(itertools.islice(csv_file, CSV_HEAD_SAMPLE_LINES))
+    if not head:
+        return None
+    try:
+        separator = csv.Sniffer().sniff(head[0]).delimiter
+    except csv.Error:
+        return None
+
+    n_fields = set(len(row) for row in csv.reader(head, delimiter=separator)
+                   if row)
+    if len(n_fields) != 1:
+        return None
+    return separator
+
+
 def read_csv_to_dataframe(path, **kwargs):
     """Return a dataframe representation of the CSV.
 
@@ -304,6 +354,12 @@ def read_csv_to_dataframe(path, **kwargs):
     - index_col=False: force pandas not to index by any column, useful in
         case of trailing separators
 
+    The Python engine is slow on large tables. Unless ``sep`` or ``engine``
+    is given, a local CSV whose first lines all have the same number of
+    fields is parsed with the much faster 'c' engine instead, using the
+    separator that the Python engine would have inferred. If the 'c' engine
+    can't parse it, it falls back to the Python engine.
+
     Args:
         path (str): path to a CSV file
         **kwargs: additional kwargs will be passed to ``pandas.read_csv``
@@ -311,16 +367,29 @@ def read_csv_to_dataframe(path, **kwargs):
     Returns:
         pandas.DataFrame with the contents of the given CSV
     """
+    read_csv_kwargs = {
+        'index_col': False,
+        'sep': None,
+        'engine': 'python',
+        'encoding': 'utf-8-sig',
+        **kwargs
+    }
     try:
-        df = pandas.read_csv(
-            path,
-            **{
-                'index_col': False,
-                'sep': None,
-                'engine': 'python',
-                'encoding': 'utf-8-sig',
-                **kwargs
-            })
+        df = None
+        if (not _PYTHON_ENGINE_CSV_KWARGS.intersection(kwargs) and
+                isinstance(path, (str, os.PathLike)) and
+                os.path.isfile(path)):
+            separator = _sniff_csv_separator(
+                path, read_csv_kwargs['encoding'])
+            if separator is not None:
+                try:
+                    df = pandas.read_csv(path, **{
+                        **read_csv_kwargs, 'sep': separator, 'engine': 'c'})
+                except pandas.errors.ParserError as error:
+                    LOGGER.debug(
+                        f'Parsing {path} with the python engine: {error}')
+        if df is None:
+            df = pandas.read_csv(path, **read_csv_kwargs)
     except UnicodeDecodeError as error:
         raise ValueError(
             f'The file {path} must be encoded as UTF-8 or ASCII')
@@ -613,6 +682,206 @@ def reclassify_raster(
         raise ValueError(error_message)
 
 
+def raster_band_percentiles(raster_path_band, percentile_list,
+                            valid_op=None):
+    """Calculate percentiles of the values of a raster band.
+
+    Percentiles are selected the same way as with
+    ``pygeoprocessing.raster_band_percentile``: the value reported for a
+    percentile ``p`` of ``n`` values is the one of the lowest rank ``i``
+    where ``100 / n * i >= p``, and is never the same element as the value
+    of a lower percentile. Instead of sorting the band on disk, the ranks
+    are found with a histogram of the leading bits of each value, and then
+    with histograms of the next bits of the values in the bins that hold
+    them, until those are small enough to select from in memory. Only the
+    histograms and the values of those bins are kept in memory. This takes
+    two or three passes over the band for most rasters, and at most four.
+
+    Args:
+        raster_path_band (tuple): a tuple of the path to a raster and the
+            1-based index of the band to calculate percentiles of
+        percentile_list (list): sorted list of the percentiles to
+            calculate, each in the range [0, 100]
+        valid_op (callable): (optional) a function that is given a block of
+            the band and returns a boolean array of the values to include.
+            Nodata and non-finite values are always excluded.
+
+    Returns:
+        a list of the values at the percentiles in ``percentile_list``, as
+        float64. The list is shorter than ``percentile_list`` if there are
+        fewer values than percentiles, and is empty if there are no values.
+    """
+    nodata = pygeoprocessing.get_raster_info(
+        raster_path_band[0])['nodata'][raster_path_band[1] - 1]
+
+    def _iter_keys():
+        """Yield the sort keys of the valid values of each block."""
+        for _, block in pygeoprocessing.iterblocks(raster_path_band):
+            valid_mask = numpy.isfinite(block)
+            if nodata is not None:
+                valid_mask &= ~pygeoprocessing.array_equals_nodata(
+                    block, nodata)
+            if valid_op is not None:
+                valid_mask &= valid_op(block)
+            yield _float_to_sort_key(block[valid_mask])
+
+    n_bins = 2**_PERCENTILE_RADIX_BITS
+    shift = 64 - _PERCENTILE_RADIX_BITS
+    histogram = numpy.zeros(n_bins, dtype=numpy.int64)
+    for keys in _iter_keys():
+        histogram += numpy.bincount(
+            (keys >> numpy.uint64(shift)).astype(numpy.int64),
+            minlength=n_bins)
+    n_values = int(histogram.sum())
+    rank_list = _nearest_ranks(percentile_list, n_values)
+
+    # Each rank is looked up in the bin of keys that start with a prefix,
+    # the leading bits of the key shifted right by ``shift``. The rank is
+    # relative to the start of the bin.
+    pending = {}  # maps (prefix, shift) to [(rank index, rank in bin)]
+    bin_sizes = {}  # maps (prefix, shift) to the number of keys in the bin
+    _assign_to_bins(rank_list, range(len(rank_list)), histogram, 0, shift,
+                    pending, bin_sizes)
+    result_list = [None] * len(rank_list)
+    while pending:
+        # a bin of a single key needs no pass over the band
+        for bin_key in [bin_key for bin_key in pending if bin_key[1] == 0]:
+            for rank_index, _ in pending.pop(bin_key):
+                result_list[rank_index] = _sort_key_to_float(
+                    numpy.array([bin_key[0]], dtype=numpy.uint64))[0]
+        if not pending:
+            break
+
+        # Collect the keys of small bins, and histogram the next bits of
+        # the keys of the others. The range of the keys in a bin is also
+        # tracked, since a bin of many copies of one value is common.
+        selected_bins = {
+            bin_key: [] for bin_key in pending
+            if bin_sizes[bin_key] <= _PERCENTILE_SELECT_SIZE}
+        histogram_bins = {
+            bin_key: [numpy.zeros(n_bins, dtype=numpy.int64), None, None]
+            for bin_key in pending if bin_key not in selected_bins}
+        for keys in _iter_keys():
+            for (prefix, bin_shift), key_list in selected_bins.items():
+                key_list.append(keys[(keys >> numpy.uint64(bin_shift)) ==
+                                     numpy.uint64(prefix)])
+            for (prefix, bin_shift), bin_state in histogram_bins.items():
+                bin_keys = keys[(keys >> numpy.uint64(bin_shift)) ==
+                                numpy.uint64(prefix)]
+                if bin_keys.size == 0:
+                    continue
+                bin_state[0] += numpy.bincount(
+                    ((bin_keys >> numpy.uint64(
+                        bin_shift - _PERCENTILE_RADIX_BITS)) &
+                     numpy.uint64(n_bins - 1)).astype(numpy.int64),
+                    minlength=n_bins)
+                min_key, max_key = bin_keys.min(), bin_keys.max()
+                if bin_state[1] is None or min_key < bin_state[1]:
+                    bin_state[1] = min_key
+                if bin_state[2] is None or max_key > bin_state[2]:
+                    bin_state[2] = max_key
+
+        for bin_key, key_list in selected_bins.items():
+            rank_entries = pending.pop(bin_key)
+            bin_keys = numpy.partition(
+                numpy.concatenate(key_list),
+                [bin_rank for _, bin_rank in rank_entries])
+            for rank_index, bin_rank in rank_entries:
+                result_list[rank_index] = _sort_key_to_float(
+                    bin_keys[bin_rank:bin_rank + 1])[0]
+        for (prefix, bin_shift), (bin_histogram, min_key,
+                                  max_key) in histogram_bins.items():
+            rank_entries = pending.pop((prefix, bin_shift))
+            if min_key == max_key:
+                for rank_index, _ in rank_entries:
+                    result_list[rank_index] = _sort_key_to_float(
+                        numpy.array([min_key], dtype=numpy.uint64))[0]
+                continue
+            _assign_to_bins(
+                [bin_rank for _, bin_rank in rank_entries],
+                [rank_index for rank_index, _ in rank_entries],
+                bin_histogram, prefix << _PERCENTILE_RADIX_BITS,
+                bin_shift - _PERCENTILE_RADIX_BITS, pending, bin_sizes)
+
+    return [float(value) for value in result_list]
+
+
+def _nearest_ranks(percentile_list, n_values):
+    """Get the ranks of the values at percentiles of ``n_values`` values.
+
+    Args:
+        percentile_list (list): sorted list of percentiles in [0, 100]
+        n_values (int): the number of values
+
+    Returns:
+        a sorted list of distinct 0-based ranks, one for each percentile
+        until there are no more values
+    """
+    rank_list = []
+    if n_values == 0:
+        return rank_list
+    step_size = 100.0 / n_values
+    min_rank = 0
+    for percentile in percentile_list:
+        rank = max(min_rank, int(percentile / step_size) - 1)
+        while rank < n_values and step_size * rank < percentile:
+            rank += 1
+        if rank >= n_values:
+            # like raster_band_percentile, report the last value once
+            rank_list.append(n_values - 1)
+            break
+        rank_list.append(rank)
+        min_rank = rank + 1
+    return rank_list
+
+
+def _assign_to_bins(rank_list, rank_index_list, histogram, base_prefix,
+                    shift, pending, bin_sizes):
+    """Find the histogram bins that hold ranks.
+
+    Args:
+        rank_list (list): sorted ranks, relative to the start of the
+            histogram
+        rank_index_list (list): the index of each rank in the result list
+        histogram (numpy.ndarray): count of the keys in each bin
+        base_prefix (int): the prefix of the first bin of the histogram
+        shift (int): how far the keys are shifted right to get their prefix
+        pending (dict): maps ``(prefix, shift)`` to a list of
+            ``(rank index, rank in bin)`` tuples. Updated in place.
+        bin_sizes (dict): maps ``(prefix, shift)`` to the number of keys in
+            the bin. Updated in place.
+
+    Returns:
+        None
+    """
+    bin_ends = numpy.cumsum(histogram)
+    for rank, rank_index in zip(rank_list, rank_index_list):
+        bin_index = int(numpy.searchsorted(bin_ends, rank, side='right'))
+        bin_start = int(bin_ends[bin_index - 1]) if bin_index > 0 else 0
+        bin_key = (base_prefix + bin_index, shift)
+        pending.setdefault(bin_key, []).append((rank_index, rank - bin_start))
+        bin_sizes[bin_key] = int(histogram[bin_index])
+
+
+def _float_to_sort_key(array):
+    """Map values to uint64 keys that sort in the same order as the values.
+
+    The sign bit of positive values is set, and all of the bits of negative
+    values are flipped, so that the keys of larger values are larger.
+    """
+    bits = numpy.ascontiguousarray(array, dtype=numpy.float64).view(
+        numpy.uint64)
+    return numpy.where(
+        bits >> numpy.uint64(63), ~bits, bits | numpy.uint64(1 << 63))
+
+
+def _sort_key_to_float(keys):
+    """Map keys from ``_float_to_sort_key`` back to their values."""
+    bits = numpy.where(
+        keys >> numpy.uint64(63), keys & numpy.uint64(2**63 - 1), ~keys)
+    return bits.view(numpy.float64)
+
+
 def matches_format_string(test_string, format_string):
     """Assert that a given string matches a given format string.
 
@@ -817,8 +1086,13 @@ class _GDALPath:
 
     @property
     def is_local(self):
-        """Test if the path is a local URI"""
-        return not self.is_remote
+        """Test if the path is a local URI.
+
+        A file within an archive, such as ``tar://data.tar.gz!dem.tif``,
+        is not a local path: it can't be found on disk, although GDAL can
+        read it.
+        """
+        return not self.is_remote and not self.archive
 
 
 def evaluate_expression(expression, variable_map):
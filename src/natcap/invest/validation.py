@@ -1,12 +1,18 @@
 """Common validation utilities for InVEST models."""
-import copy
+import collections
+import concurrent.futures
+import contextlib
+import contextvars
 import functools
 import importlib
 import inspect
 import logging
 import os
 import pprint
+import threading
+import time
 
+import natcap.invest
 import numpy
 import pint
 import pygeoprocessing
@@ -15,6 +21,7 @@ from osgeo import ogr
 from osgeo import osr
 
 from . import gettext
+from . import spec
 from . import utils
 from . import validation_messages
 
@@ -23,6 +30,32 @@ from . import validation_messages
 CHECK_ALL_KEYS = None
 LOGGER = logging.getLogger(__name__)
 
+# Input types whose validation reads files. These are checked concurrently.
+FILE_INPUT_TYPES = {
+    'csv', 'directory', 'file', 'raster', 'raster_or_vector', 'vector'}
+# The files of all validations are checked on one pool of threads, so that
+# checks that hang, like ones reading from a slow network drive, can't pile
+# up as the Workbench validates again and again.
+MAX_VALIDATION_WORKERS = 8
+_validation_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=MAX_VALIDATION_WORKERS,
+    thread_name_prefix='invest-validation')
+
+# Results of checking files, keyed on the input spec and the path, size,
+# modification time and mode of the file and its sidecar files (like a
+# shapefile's .dbf or a raster's .aux.xml). Validation runs on every change
+# to a form in the workbench, so most files have not changed since the last
+# time they were checked.
+MAX_CACHED_FILE_RESULTS = 1024
+_file_result_cache = collections.OrderedDict()
+_file_result_cache_lock = threading.Lock()
+# A file modified more recently than this may be modified again without its
+# modification time changing, so results for it are not cached.
+_RECENTLY_MODIFIED_NS = 2 * 10**9
+# The validation session that ``validate`` reuses results from, if any, on
+# each thread. See ``ValidationSession``.
+_session_state = threading.local()
+
 
 def get_invalid_keys(validation_warnings):
     """Get the invalid keys from a validation warnings list.
@@ -159,11 +192,257 @@ def _format_bbox_list(file_list, bbox_list):
                 file_list, bbox_list)])
 
 
+def _resolve_nested_requirements(parameter_spec, expression_values):
+    """Evaluate the conditional requirements of an input's nested specs.
+
+    Args:
+        parameter_spec (spec.Input): the input spec
+        expression_values (dict): maps args keys to their values, for
+            evaluating ``required`` expressions
+
+    Returns:
+        A 2-tuple of the input spec to validate against and a tuple of the
+        evaluated requirements. The spec is ``parameter_spec`` itself unless
+        any of its columns, rows, fields or contents has a conditional
+        ``required`` value, in which case it is a shallow copy where those
+        nested specs are replaced with copies of them that have a boolean
+        ``required`` value.
+    """
+    updates = {}
+    required_values = []
+    for axis_key in ('columns', 'rows', 'fields', 'contents'):
+        nested_specs = getattr(parameter_spec, axis_key, None)
+        if not nested_specs or not any(
+                isinstance(nested_spec.required, str)
+                for nested_spec in nested_specs):
+            continue
+        updates[axis_key] = []
+        for nested_spec in nested_specs:
+            if isinstance(nested_spec.required, str):
+                required = bool(utils.evaluate_expression(
+                    nested_spec.required, expression_values))
+                required_values.append(required)
+                nested_spec = nested_spec.model_copy(
+                    update={'required': required})
+            updates[axis_key].append(nested_spec)
+
+    if not updates:
+        return parameter_spec, ()
+    resolved_spec = parameter_spec.model_copy(update=updates)
+    # rebuild the lookups of nested specs, like ``_columns_dict``, which
+    # still refer to the original nested specs
+    resolved_spec.model_post_init(None)
+    return resolved_spec, tuple(required_values)
+
+
+def _file_signature(filepath):
+    """Describe the state of a file and its sidecar files on disk.
+
+    Sidecar files share the file's name up to its extension, like a
+    shapefile's .dbf and .prj or a raster's .aux.xml, and can change whether
+    the file is valid.
+
+    Args:
+        filepath (string): path to a local file
+
+    Returns:
+        A sorted tuple of (name, size, modification time, mode) tuples, one
+        for the file and each sidecar file. ``None`` if the file does not
+        exist or any of them was modified too recently to be cached.
+    """
+    dirname, basename = os.path.split(os.path.abspath(filepath))
+    prefix = os.path.splitext(basename)[0] + '.'
+    now = time.time_ns()
+    signature = []
+    try:
+        with os.scandir(dirname) as entries:
+            for entry in entries:
+                if entry.name == basename or entry.name.startswith(prefix):
+                    stat_result = entry.stat()
+                    if now - stat_result.st_mtime_ns < _RECENTLY_MODIFIED_NS:
+                        return None
+                    signature.append((
+                        entry.name, stat_result.st_size,
+                        stat_result.st_mtime_ns, stat_result.st_mode))
+    except OSError:
+        return None
+    if basename not in (name for name, *_ in signature):
+        return None
+    return tuple(sorted(signature))
+
+
+def _check_file_input(parameter_spec, base_spec, required_values, filepath):
+    """Validate a file-based input on a validation thread.
+
+    The result of checking an unchanged file against the same spec is
+    reused. Results are only cached for local files that are valid or
+    invalid on their own: not for directories or for CSVs with columns of
+    paths to other files, since they depend on other files too.
+
+    Args:
+        parameter_spec (spec.Input): the input spec to validate against
+        base_spec (spec.Input): the input spec from the model spec that
+            ``parameter_spec`` was resolved from
+        required_values (tuple): the evaluated conditional requirements of
+            ``parameter_spec``'s nested specs
+        filepath (string): the path to validate
+
+    Returns:
+        A string error message if an error was found.  ``None`` otherwise.
+    """
+    # ``validate`` enforces the timeout on this thread, so the spec's
+    # ``validate`` method doesn't need to start another thread to do so
+    spec._timeout_state.active = True
+
+    cache_key = None
+    if (parameter_spec.type != 'directory' and
+            isinstance(filepath, str) and
+            utils._GDALPath.from_uri(filepath).is_local and
+            not any(column.type in FILE_INPUT_TYPES
+                    for column in (getattr(parameter_spec, 'columns', None)
+                                   or []))):
+        signature = _file_signature(filepath)
+        if signature is not None:
+            # the spec is kept in the cache along with the result, so its id
+            # can't be reused by another spec while the result is cached.
+            # Messages are translated, so they are cached per locale.
+            cache_key = (id(base_spec), required_values,
+                         os.path.abspath(filepath), signature,
+                         natcap.invest.get_locale())
+            with _file_result_cache_lock:
+                if cache_key in _file_result_cache:
+                    _file_result_cache.move_to_end(cache_key)
+                    return _file_result_cache[cache_key][1]
+
+    message = parameter_spec.validate(filepath)
+    if cache_key is not None:
+        with _file_result_cache_lock:
+            _file_result_cache[cache_key] = (base_spec, message)
+            if len(_file_result_cache) > MAX_CACHED_FILE_RESULTS:
+                _file_result_cache.popitem(last=False)
+    return message
+
+
+class ValidationSession:
+    """Validation results of a set of args, reused as the args change.
+
+    The workbench validates a model's args after every edit to its form,
+    and most edits change a single arg. While a session is active,
+    ``validate`` re-checks only the inputs that changed:
+
+        * an input that doesn't read files is re-checked if its value, or
+          the evaluated ``required`` expressions of its nested columns,
+          fields or contents, changed. Inputs that read files are checked
+          every time, with their results cached by ``validate`` as long as
+          the files don't change.
+        * spatial overlap is re-checked if the set of spatial inputs being
+          compared, their paths, or any of their files on disk changed.
+
+    Phase 1 checks of required and missing values are cheap and always run.
+
+    Example::
+
+        session = validation.ValidationSession()
+        session.update(args)
+        with session.activate():
+            warnings = model_module.validate(session.args)
+    """
+
+    def __init__(self):
+        self.args = {}
+        self._input_results = {}
+        self._overlap_result = None
+        self._lock = threading.Lock()
+
+    def update(self, args_delta):
+        """Update the args of the session.
+
+        Args:
+            args_delta (dict): args keys and their new values
+
+        Returns:
+            A copy of the updated args dict of the session.
+        """
+        self.args.update(args_delta)
+        return dict(self.args)
+
+    @contextlib.contextmanager
+    def activate(self):
+        """Use this session's results in ``validate`` on this thread.
+
+        Only one thread uses a session at a time.
+        """
+        with self._lock:
+            _session_state.session = self
+            try:
+                yield self
+            finally:
+                _session_state.session = None
+
+    def get_input_result(self, base_spec, fingerprint):
+        """Get the stored result of checking an input, if it is current.
+
+        Args:
+            base_spec (spec.Input): the input spec from the model spec
+            fingerprint (tuple): the value and dependencies of the input
+
+        Returns:
+            tuple of (found, message)
+        """
+        stored = self._input_results.get(base_spec.id)
+        if (stored is not None and stored[0] is base_spec and
+                stored[1] == fingerprint):
+            return True, stored[2]
+        return False, None
+
+    def set_input_result(self, base_spec, fingerprint, message):
+        """Store the result of checking an input."""
+        self._input_results[base_spec.id] = (base_spec, fingerprint, message)
+
+    def get_overlap_result(self, fingerprint):
+        """Get the stored spatial overlap message, if it is current.
+
+        Returns:
+            tuple of (found, message)
+        """
+        if (fingerprint is not None and self._overlap_result is not None and
+                self._overlap_result[0] == fingerprint):
+            return True, self._overlap_result[1]
+        return False, None
+
+    def set_overlap_result(self, fingerprint, message):
+        """Store the result of checking spatial overlap."""
+        if fingerprint is not None:
+            self._overlap_result = (fingerprint, message)
+
+
+def _overlap_fingerprint(checked_keys, spatial_files, different_projections_ok):
+    """Describe the inputs to a spatial overlap check.
+
+    Returns:
+        A tuple that changes whenever the result of the check may change, or
+        ``None`` if the files can't be described, because they are remote,
+        missing or were modified too recently.
+    """
+    signatures = []
+    for filepath in spatial_files:
+        if not (isinstance(filepath, str) and
+                utils._GDALPath.from_uri(filepath).is_local):
+            return None
+        signature = _file_signature(filepath)
+        if signature is None:
+            return None
+        signatures.append((os.path.abspath(filepath), signature))
+    return (tuple(checked_keys), tuple(signatures), different_projections_ok,
+            natcap.invest.get_locale())
+
+
 def validate(args, model_spec):
     """Validate an args dict against a model spec.
 
     Validates an arguments dictionary according to the rules laid out in
-    ``spec``.
+    ``spec``. Within ``ValidationSession.activate``, results that are still
+    current are reused from the session.
 
     Args:
         args (dict): The InVEST model args dict to validate.
@@ -177,6 +456,7 @@ def validate(args, model_spec):
 
     """
     validation_warnings = []
+    session = getattr(_session_state, 'session', None)
 
     # Phase 1: Check whether an input is required and has a value
     missing_keys = set()
@@ -213,40 +493,72 @@ def validate(args, model_spec):
             (sorted(required_keys_with_no_value), validation_messages.MISSING_VALUE))
 
     # Phase 2: Check whether any input with a value validates with its
-    # type-specific check function.
+    # type-specific check function. Inputs that are files are checked
+    # concurrently, since checking them may take a while.
     invalid_keys = set()
     insufficient_keys = (
         missing_keys | required_keys_with_no_value | keys_with_falsey_values)
-    for key in set(args.keys()) - insufficient_keys:
+    messages = {}
+    error_keys = set()
+    file_checks = {}
+    for key in sorted(set(args.keys()) - insufficient_keys):
         # Extra args that don't exist in the MODEL_SPEC are okay
         # we don't need to try to validate them
         try:
-            # Using deepcopy to make sure we don't modify the original spec
-            parameter_spec = copy.deepcopy(model_spec.get_input(key))
+            base_spec = model_spec.get_input(key)
         except KeyError:
             LOGGER.debug(f'Provided key {key} does not exist in MODEL_SPEC')
             continue
 
         # rewrite parameter_spec for any nested, conditional validity
-        axis_keys = set(dir(parameter_spec)).intersection({'columns', 'rows', 'fields', 'contents'})
-
-        if axis_keys:
-            for axis_key in axis_keys:
-                if getattr(parameter_spec, axis_key) is None:
-                    continue
-                for nested_spec in getattr(parameter_spec, axis_key):
-                    if (isinstance(nested_spec.required, str)):
-                        nested_spec.required = (
-                            bool(utils.evaluate_expression(
-                                nested_spec.required, expression_values)))
+        # without modifying the original spec
+        parameter_spec, required_values = _resolve_nested_requirements(
+            base_spec, expression_values)
         try:
-            warning_msg = parameter_spec.validate(args[key])
-            if warning_msg:
-                validation_warnings.append(([key], warning_msg))
-                invalid_keys.add(key)
+            if parameter_spec.type in FILE_INPUT_TYPES:
+                # run in a copy of this context, so that messages are
+                # translated to the locale of this call
+                file_checks[key] = _validation_executor.submit(
+                    contextvars.copy_context().run, _check_file_input,
+                    parameter_spec, base_spec, required_values, args[key])
+            elif session is not None:
+                fingerprint = (
+                    args[key], required_values, natcap.invest.get_locale())
+                found, messages[key] = session.get_input_result(
+                    base_spec, fingerprint)
+                if not found:
+                    messages[key] = parameter_spec.validate(args[key])
+                    session.set_input_result(
+                        base_spec, fingerprint, messages[key])
+            else:
+                messages[key] = parameter_spec.validate(args[key])
         except Exception:
             LOGGER.exception(f'Error when validating key {key} with value {args[key]}')
-            validation_warnings.append(([key], validation_messages.UNEXPECTED_ERROR))
+            error_keys.add(key)
+
+    # the file checks run at the same time, so they all share one timeout
+    concurrent.futures.wait(
+        file_checks.values(), timeout=spec.FILE_CHECK_TIMEOUT)
+    for key, future in file_checks.items():
+        if not future.done():
+            # a check that hasn't started yet, behind checks that hang, is
+            # dropped rather than left to start later
+            future.cancel()
+            spec.warn_file_check_timed_out(args[key])
+            continue
+        try:
+            messages[key] = future.result()
+        except Exception:
+            LOGGER.exception(
+                f'Error when validating key {key} with value {args[key]}')
+            error_keys.add(key)
+
+    for key, warning_msg in messages.items():
+        if warning_msg:
+            validation_warnings.append(([key], warning_msg))
+            invalid_keys.add(key)
+    for key in error_keys:
+        validation_warnings.append(([key], validation_messages.UNEXPECTED_ERROR))
 
     # Phase 3: Check spatial overlap if applicable
     if model_spec.validate_spatial_overlap:
@@ -269,13 +581,24 @@ def validate(args, model_spec):
         if len(valid_spatial_keys) >= 2:
             spatial_files = []
             checked_keys = []
-            for key in valid_spatial_keys:
+            for key in sorted(valid_spatial_keys):
                 if key in args and args[key] not in ('', None):
                     spatial_files.append(args[key])
                     checked_keys.append(key)
 
-            spatial_overlap_error = check_spatial_overlap(
-                spatial_files, model_spec.different_projections_ok)
+            found = False
+            if session is not None:
+                fingerprint = _overlap_fingerprint(
+                    checked_keys, spatial_files,
+                    model_spec.different_projections_ok)
+                found, spatial_overlap_error = session.get_overlap_result(
+                    fingerprint)
+            if not found:
+                spatial_overlap_error = check_spatial_overlap(
+                    spatial_files, model_spec.different_projections_ok)
+                if session is not None:
+                    session.set_overlap_result(
+                        fingerprint, spatial_overlap_error)
             if spatial_overlap_error:
                 validation_warnings.append(
                     (checked_keys, spatial_overlap_error))
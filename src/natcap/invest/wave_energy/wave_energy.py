@@ -942,7 +942,7 @@ def execute(args):
         func=_create_percentile_rasters,
         args=(file_registry['capwe_mwh'], file_registry['capwe_rc'],
               file_registry['capwe_rc_csv'], _CAPWE_UNITS_SHORT,
-              _CAPWE_UNITS_LONG, _PERCENTILES, args['workspace_dir']),
+              _CAPWE_UNITS_LONG, _PERCENTILES),
         kwargs={'start_value': _STARTING_PERC_RANGE},
         target_path_list=[file_registry['capwe_rc']],
         task_name='create_energy_percentile_raster',
@@ -952,7 +952,7 @@ def execute(args):
         func=_create_percentile_rasters,
         args=(file_registry['wp_kw'], file_registry['wp_rc'],
               file_registry['wp_rc_csv'], _WP_UNITS_SHORT,
-              _WP_UNITS_LONG, _PERCENTILES, args['workspace_dir']),
+              _WP_UNITS_LONG, _PERCENTILES),
         kwargs={'start_value': _STARTING_PERC_RANGE},
         target_path_list=[file_registry['wp_rc']],
         task_name='create_power_percentile_raster',
@@ -1016,7 +1016,7 @@ def execute(args):
         func=_create_percentile_rasters,
         args=(file_registry['npv_usd'], file_registry['npv_rc'],
               file_registry['npv_rc_csv'], _NPV_UNITS_SHORT,
-              _NPV_UNITS_LONG, _PERCENTILES, args['workspace_dir']),
+              _NPV_UNITS_LONG, _PERCENTILES),
         target_path_list=[file_registry['npv_rc']],
         task_name='create_npv_percentile_raster',
         dependent_task_list=[create_npv_raster_task])
@@ -1521,7 +1521,7 @@ def _get_vector_spatial_ref(base_vector_path):
 
 def _create_percentile_rasters(base_raster_path, target_raster_path,
                                target_csv_path, units_short, units_long,
-                               percentile_list, working_dir, start_value=None):
+                               percentile_list, start_value=None):
     """Create a percentile (quartile) raster based on the raster_dataset.
 
     An attribute table is also constructed for the raster_dataset that displays
@@ -1543,45 +1543,34 @@ def _create_percentile_rasters(base_raster_path, target_raster_path,
     Returns:
         None
 
+    Raises:
+        ValueError if the raster has no valid values (at or above
+        ``start_value``, if given) to calculate percentiles of.
+
     """
     LOGGER.info('Creating Percentile Rasters')
-    temp_dir = tempfile.mkdtemp(dir=working_dir)
 
     # If the target_raster_path is already a file, delete it
     if os.path.isfile(target_raster_path):
         os.remove(target_raster_path)
 
     target_nodata = 255
-    base_raster_info = pygeoprocessing.get_raster_info(base_raster_path)
-    base_nodata = base_raster_info['nodata'][0]
-    base_dtype = base_raster_info['datatype']
 
     def _mask_below_start_value(array):
-        valid_mask = (
-            ~pygeoprocessing.array_equals_nodata(array, base_nodata) &
-            (array >= float(start_value)))
-        result = numpy.empty_like(array)
-        result[:] = base_nodata
-        result[valid_mask] = array[valid_mask]
-        return result
-
-    if start_value is not None:
-        masked_raster_path = os.path.join(
-            temp_dir, os.path.basename(base_raster_path))
-        pygeoprocessing.raster_calculator(
-            [(base_raster_path, 1)], _mask_below_start_value,
-            masked_raster_path, base_dtype, base_nodata)
-        input_raster_path = masked_raster_path
-    else:
-        input_raster_path = base_raster_path
+        return array >= float(start_value)
 
     # Get the percentile values for each percentile
-    percentile_values = pygeoprocessing.raster_band_percentile(
-        (input_raster_path, 1),
-        os.path.join(temp_dir, 'percentile'),
-        percentile_list)
-
-    shutil.rmtree(temp_dir, ignore_errors=True)
+    percentile_values = utils.raster_band_percentiles(
+        (base_raster_path, 1), percentile_list,
+        valid_op=(_mask_below_start_value if start_value is not None
+                  else None))
+    if not percentile_values:
+        value_description = 'valid values'
+        if start_value is not None:
+            value_description += f' at or above {start_value}'
+        raise ValueError(
+            f'Found no {value_description} in {base_raster_path} to '
+            'calculate percentiles of.')
 
     # Get the percentile ranges as strings so that they can be added to the
     # output table. Also round them for readability.
@@ -279,8 +279,11 @@ class DatastackArchiveTests(unittest.TestCase):
 
         # test that custom description and keyword are not overwritten and new
         # keywords are added
-        raster_path = os.path.join(out_directory, "data",
-                                   "raster_raster", "landcover.tif")
+        with open(os.path.join(
+                out_directory,
+                datastack.DATASTACK_PARAMETER_FILENAME)) as datastack_file:
+            archived_params = json.load(datastack_file)['args']
+        raster_path = os.path.join(out_directory, archived_params['raster'])
         resource = geometamaker.describe(raster_path)
         self.assertEqual(resource.get_description(), "foo")
         self.assertCountEqual(resource.get_keywords(),
@@ -372,13 +375,91 @@ class DatastackArchiveTests(unittest.TestCase):
         # Assert we have the expected directory contents.
         self.assertEqual(
             sorted(os.listdir(out_directory)),
-            ['data', 'log.txt', 'parameters.invest.json'])
+            ['data', 'log.txt', 'manifest.json', 'parameters.invest.json'])
         self.assertTrue(os.path.isdir(os.path.join(out_directory, 'data')))
 
         # Assert we have the expected number of files in the data dir.
         self.assertEqual(
             len(os.listdir(os.path.join(out_directory, 'data'))), 1)
 
+    def test_incremental_archive(self):
+        """Datastack: reuse the compressed data of a previous archive."""
+        from natcap.invest import datastack
+        params = {
+            'foo': os.path.join(self.workspace, 'foo.txt'),
+            'bar': os.path.join(self.workspace, 'bar.txt'),
+        }
+        for key, path in params.items():
+            with open(path, 'w') as textfile:
+                textfile.write(key * 1000)
+
+        first_archive_path = os.path.join(self.workspace, 'first.tar.gz')
+        second_archive_path = os.path.join(self.workspace, 'second.tar.gz')
+        with patch('natcap.invest.datastack.models') as p:
+            p.model_id_to_pyname = MOCK_MODEL_ID_TO_PYNAME
+            datastack.build_datastack_archive(
+                params, 'duplicate_filepaths', first_archive_path,
+                n_workers=2)
+
+            # change one of the two files
+            with open(params['bar'], 'w') as textfile:
+                textfile.write('changed')
+            with patch.object(
+                    datastack._GzipMemberWriter, 'copy_members',
+                    autospec=True,
+                    side_effect=datastack._GzipMemberWriter.copy_members
+            ) as mock_copy:
+                datastack.build_datastack_archive(
+                    params, 'duplicate_filepaths', second_archive_path,
+                    previous_datastack_path=first_archive_path)
+            self.assertEqual(mock_copy.call_count, 1)
+
+        first_manifest = datastack._read_manifest(first_archive_path)
+        second_manifest = datastack._read_manifest(second_archive_path)
+        self.assertEqual(len(second_manifest['blobs']), 2)
+        self.assertEqual(
+            len(set(first_manifest['blobs']) & set(second_manifest['blobs'])),
+            1)
+        # sources are recorded relative to the archive
+        self.assertCountEqual(
+            [file_info['source']
+             for blob in second_manifest['blobs'].values()
+             for file_info in blob['files']],
+            ['foo.txt', 'bar.txt'])
+
+        out_directory = os.path.join(self.workspace, 'extracted_archive')
+        archive_params = datastack.extract_datastack_archive(
+            second_archive_path, out_directory)
+        for key in params:
+            self.assertTrue(filecmp.cmp(
+                archive_params[key], params[key], shallow=False))
+
+    def test_lazy_archive_extraction(self):
+        """Datastack: leave rasters in the archive when extracting lazily."""
+        from natcap.invest import datastack
+        from natcap.invest import utils
+        from test_datastack_modules import raster
+
+        params = {'raster': os.path.join(DATA_DIR, 'landcover.tif')}
+        archive_path = os.path.join(self.workspace, 'archive.invs.tar.gz')
+        out_directory = os.path.join(self.workspace, 'extracted_archive')
+        with patch('natcap.invest.datastack.models') as p:
+            p.model_id_to_pyname = MOCK_MODEL_ID_TO_PYNAME
+            p.model_id_to_spec = {'raster': raster.MODEL_SPEC}
+            datastack.build_datastack_archive(params, 'raster', archive_path)
+            archive_params = datastack.extract_datastack_archive(
+                archive_path, out_directory, lazy=True)
+
+        self.assertTrue(archive_params['raster'].startswith('tar://'))
+        gdal_path = utils._GDALPath.from_uri(archive_params['raster'])
+        self.assertFalse(gdal_path.is_local)
+        self.assertFalse(
+            os.path.exists(os.path.join(out_directory, gdal_path.path)))
+        numpy.testing.assert_allclose(
+            pygeoprocessing.raster_to_numpy_array(
+                gdal_path.to_normalized_path()),
+            pygeoprocessing.raster_to_numpy_array(params['raster']))
+
     def test_archive_extraction(self):
         """Datastack: test archive extraction."""
         from natcap.invest import datastack
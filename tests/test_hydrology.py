@@ -0,0 +1,132 @@
+"""Tests for the hydrological routing shared between models."""
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy
+import pygeoprocessing
+from osgeo import gdal
+from osgeo import osr
+
+gdal.UseExceptions()
+
+
+def _make_dem(target_path):
+    """Make a small DEM with a valley that drains to its first row."""
+    valley = numpy.concatenate((numpy.arange(5, 0, -1), numpy.arange(1, 5)))
+    dem_array = numpy.tile(valley, (9, 1)) + numpy.arange(
+        1.1, 2, step=0.1).reshape((9, 1))
+    dem_array[4, 4] = 0.5  # a pit
+
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(32731)
+
+    pygeoprocessing.numpy_array_to_raster(
+        dem_array.astype(numpy.float32), -1, (2, -2), (2, -2),
+        srs.ExportToWkt(), target_path)
+
+
+class HydrologyTests(unittest.TestCase):
+    """Tests for natcap.invest.hydrology."""
+
+    def setUp(self):
+        """Create a temporary workspace."""
+        self.workspace_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Remove the temporary workspace."""
+        shutil.rmtree(self.workspace_dir)
+
+    def _route(self, workspace, dem_path, algorithm, hydrology_dir):
+        """Route a DEM into a workspace and return the target paths."""
+        import taskgraph
+        from natcap.invest import hydrology
+
+        os.makedirs(workspace, exist_ok=True)
+        target_paths = {
+            product: os.path.join(workspace, f'{product}.tif')
+            for product in hydrology.PRODUCTS}
+        graph = taskgraph.TaskGraph(
+            os.path.join(workspace, 'taskgraph_cache'), n_workers=-1)
+        hydrology.add_routing_tasks(
+            graph, (dem_path, 1), algorithm, target_paths,
+            threshold_flow_accumulation=3, working_dir=workspace,
+            hydrology_dir=hydrology_dir)
+        graph.close()
+        graph.join()
+        return target_paths
+
+    def test_product_set_shared_between_workspaces(self):
+        """Hydrology: route a DEM once for two workspaces."""
+        from natcap.invest import hydrology
+
+        dem_path = os.path.join(self.workspace_dir, 'dem.tif')
+        _make_dem(dem_path)
+        hydrology_dir = os.path.join(self.workspace_dir, 'hydrology')
+
+        # routing without a hydrology directory is the reference
+        with patch.dict(os.environ, clear=True):
+            expected_paths = self._route(
+                os.path.join(self.workspace_dir, 'expected'), dem_path,
+                'mfd', None)
+        self.assertFalse(os.path.exists(hydrology_dir))
+
+        first_paths = self._route(
+            os.path.join(self.workspace_dir, 'a'), dem_path, 'mfd',
+            hydrology_dir)
+        (key,) = [name for name in os.listdir(hydrology_dir)
+                  if name != 'digests']
+        product_dir = os.path.join(hydrology_dir, key)
+        with open(os.path.join(
+                product_dir, hydrology.MANIFEST_FILENAME)) as file:
+            self.assertEqual(
+                json.load(file)['dem'], os.path.abspath(dem_path))
+        for path in ('filled_dem.tif',
+                     os.path.join('mfd', 'flow_direction.tif'),
+                     os.path.join('mfd', 'flow_accumulation.tif'),
+                     os.path.join('mfd', 'stream_3.0_1.0.tif')):
+            self.assertTrue(os.path.exists(os.path.join(product_dir, path)))
+
+        # a second workspace copies the products without making them again
+        with patch('pygeoprocessing.routing.fill_pits') as fill_pits:
+            second_paths = self._route(
+                os.path.join(self.workspace_dir, 'b'), dem_path, 'mfd',
+                hydrology_dir)
+        fill_pits.assert_not_called()
+
+        for product in hydrology.PRODUCTS:
+            expected_array = gdal.OpenEx(
+                expected_paths[product]).ReadAsArray()
+            for paths in (first_paths, second_paths):
+                numpy.testing.assert_array_equal(
+                    gdal.OpenEx(paths[product]).ReadAsArray(),
+                    expected_array)
+
+        # D8 products of the same DEM go in the same product set
+        self._route(
+            os.path.join(self.workspace_dir, 'c'), dem_path, 'd8',
+            hydrology_dir)
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(product_dir, 'd8'))),
+            ['flow_accumulation.tif', 'flow_direction.tif', 'stream_3.0.tif'])
+
+    def test_hydrology_dir_from_cache(self):
+        """Hydrology: default to the intermediate cache's hydrology folder."""
+        from natcap.invest import hydrology
+        from natcap.invest import intermediate_cache
+
+        with patch.dict(os.environ, clear=True):
+            self.assertIsNone(hydrology.get_hydrology_dir(None, None))
+            self.assertEqual(
+                hydrology.get_hydrology_dir(None, 'cache'),
+                os.path.join('cache', 'hydrology'))
+            self.assertEqual(
+                hydrology.get_hydrology_dir('other', 'cache'), 'other')
+        with patch.dict(os.environ, {
+                intermediate_cache.CACHE_DIR_ENV_VARIABLE: 'cache'}):
+            self.assertEqual(
+                hydrology.get_hydrology_dir(None, None),
+                os.path.join('cache', 'hydrology'))
@@ -0,0 +1,167 @@
+"""Tests for the intermediate cache shared between workspaces."""
+import glob
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# arguments of each call to _reverse_file, in this process
+CALLS = []
+
+
+def _reverse_file(source_path, target_path):
+    """Write the reversed contents of a file, and record the call."""
+    CALLS.append((source_path, target_path))
+    with open(source_path) as source, open(target_path, 'w') as target:
+        target.write(source.read()[::-1])
+
+
+class IntermediateCacheTests(unittest.TestCase):
+    """Tests for natcap.invest.intermediate_cache."""
+
+    def setUp(self):
+        """Create a temporary workspace and clear the record of calls."""
+        self.workspace_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.workspace_dir, 'cache')
+        CALLS.clear()
+
+    def tearDown(self):
+        """Remove the temporary workspace."""
+        shutil.rmtree(self.workspace_dir)
+
+    def _run(self, workspace, source_path, cache_dir):
+        """Reverse a file and reverse the result again in a workspace."""
+        import taskgraph
+        from natcap.invest import intermediate_cache
+
+        os.makedirs(workspace, exist_ok=True)
+        reversed_path = os.path.join(workspace, 'reversed.txt')
+        twice_reversed_path = os.path.join(workspace, 'twice_reversed.txt')
+        graph = taskgraph.TaskGraph(
+            os.path.join(workspace, 'taskgraph_cache'), n_workers=-1)
+        reverse_task = intermediate_cache.add_task(
+            graph, cache_dir, func=_reverse_file,
+            args=(source_path, reversed_path),
+            target_path_list=[reversed_path],
+            task_name='reverse')
+        intermediate_cache.add_task(
+            graph, cache_dir, func=_reverse_file,
+            args=(reversed_path, twice_reversed_path),
+            target_path_list=[twice_reversed_path],
+            dependent_task_list=[reverse_task],
+            task_name='reverse again')
+        graph.close()
+        graph.join()
+        with open(reversed_path) as file:
+            return file.read()
+
+    def test_results_shared_between_workspaces(self):
+        """Intermediate cache: copy results into a new workspace."""
+        source_path = os.path.join(self.workspace_dir, 'source.txt')
+        with open(source_path, 'w') as file:
+            file.write('abc')
+        self.assertEqual(self._run(
+            os.path.join(self.workspace_dir, 'a'), source_path,
+            self.cache_dir), 'cba')
+        self.assertEqual(len(CALLS), 2)
+
+        # the same contents at another path are found in the cache
+        other_source_path = os.path.join(self.workspace_dir, 'other.txt')
+        shutil.copyfile(source_path, other_source_path)
+        self.assertEqual(self._run(
+            os.path.join(self.workspace_dir, 'b'), other_source_path,
+            self.cache_dir), 'cba')
+        self.assertEqual(len(CALLS), 2)
+        with open(os.path.join(
+                self.workspace_dir, 'b', 'twice_reversed.txt')) as file:
+            self.assertEqual(file.read(), 'abc')
+
+        # different contents are not
+        with open(other_source_path, 'w') as file:
+            file.write('xyz')
+        self.assertEqual(self._run(
+            os.path.join(self.workspace_dir, 'c'), other_source_path,
+            self.cache_dir), 'zyx')
+        self.assertEqual(len(CALLS), 4)
+
+    def test_chained_targets_identified_by_call(self):
+        """Intermediate cache: a target is identified by its call's key."""
+        from natcap.invest import intermediate_cache
+
+        source_path = os.path.join(self.workspace_dir, 'source.txt')
+        with open(source_path, 'w') as file:
+            file.write('abc')
+        workspace = os.path.join(self.workspace_dir, 'a')
+        self._run(workspace, source_path, self.cache_dir)
+        self.assertEqual(len(CALLS), 2)
+
+        # the second task described its input, the target of the first
+        # task, by the key of the first call rather than by its contents
+        reversed_path = os.path.join(workspace, 'reversed.txt')
+        content_digest = hashlib.sha256(b'.txt' + b'cba').hexdigest()
+        target_digest = intermediate_cache.file_digest(
+            reversed_path, self.cache_dir)
+        self.assertNotEqual(target_digest, content_digest)
+        described_files = []
+        for description_path in glob.glob(os.path.join(
+                self.cache_dir, 'entries', '*', '*', 'description.json')):
+            with open(description_path) as file:
+                described_files.append(json.load(file)['args'][0])
+        self.assertIn(['file', target_digest], described_files)
+
+    def test_no_cache_dir(self):
+        """Intermediate cache: run tasks as usual without a cache."""
+        source_path = os.path.join(self.workspace_dir, 'source.txt')
+        with open(source_path, 'w') as file:
+            file.write('abc')
+        with patch.dict(os.environ, clear=True):
+            for name in ('a', 'b'):
+                self.assertEqual(self._run(
+                    os.path.join(self.workspace_dir, name), source_path,
+                    None), 'cba')
+        self.assertEqual(len(CALLS), 4)
+        self.assertFalse(os.path.exists(self.cache_dir))
+
+    def test_cache_dir_from_environment(self):
+        """Intermediate cache: use the cache set in the environment."""
+        from natcap.invest import intermediate_cache
+
+        with patch.dict(os.environ, {
+                intermediate_cache.CACHE_DIR_ENV_VARIABLE: self.cache_dir}):
+            self.assertEqual(
+                intermediate_cache.get_cache_dir(None), self.cache_dir)
+            self.assertEqual(
+                intermediate_cache.get_cache_dir('other'), 'other')
+
+    def test_recently_modified_digest_not_recorded(self):
+        """Intermediate cache: don't record digests of new files."""
+        from natcap.invest import intermediate_cache
+
+        source_path = os.path.join(self.workspace_dir, 'source.txt')
+        with open(source_path, 'w') as file:
+            file.write('abc')
+        abc_digest = intermediate_cache.file_digest(
+            source_path, self.cache_dir)
+
+        # modified again within the resolution of the modification time
+        stat_result = os.stat(source_path)
+        with open(source_path, 'w') as file:
+            file.write('xyz')
+        os.utime(source_path, ns=(
+            stat_result.st_atime_ns, stat_result.st_mtime_ns))
+        self.assertNotEqual(intermediate_cache.file_digest(
+            source_path, self.cache_dir), abc_digest)
+
+        # the digest of a file that was modified a while ago is recorded
+        old_mtime_ns = stat_result.st_mtime_ns - 10 * 10**9
+        os.utime(source_path, ns=(old_mtime_ns, old_mtime_ns))
+        xyz_digest = intermediate_cache.file_digest(
+            source_path, self.cache_dir)
+        with open(source_path, 'w') as file:
+            file.write('abc')
+        os.utime(source_path, ns=(old_mtime_ns, old_mtime_ns))
+        self.assertEqual(intermediate_cache.file_digest(
+            source_path, self.cache_dir), xyz_digest)
@@ -0,0 +1,159 @@
+"""Tests for the ManagedRaster block cache."""
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+import pygeoprocessing
+from osgeo import gdal
+
+from .utils import SMALL_BLOCK_CREATION_TUPLE
+from .utils import make_sediment_deposition_inputs
+
+gdal.UseExceptions()
+
+
+class ManagedRasterCacheTests(unittest.TestCase):
+    """Tests for natcap.invest.managed_raster.cache."""
+
+    def setUp(self):
+        """Create a temporary workspace and remember the cache settings."""
+        from natcap.invest.managed_raster import cache
+        self.workspace_dir = tempfile.mkdtemp()
+        self.original_budget = cache.get_cache_budget()
+        self.original_async_io = cache.get_async_io()
+
+    def tearDown(self):
+        """Remove the workspace and restore the cache settings."""
+        from natcap.invest.managed_raster import cache
+        shutil.rmtree(self.workspace_dir)
+        cache.set_cache_budget(self.original_budget)
+        cache.set_async_io(self.original_async_io)
+
+    def test_set_cache_budget(self):
+        """ManagedRaster cache: the budget can be read back once set."""
+        from natcap.invest.managed_raster import cache
+        cache.set_cache_budget(2**20)
+        self.assertEqual(cache.get_cache_budget(), 2**20)
+        self.assertEqual(cache.get_cache_stats()['budget_bytes'], 2**20)
+
+    def test_set_cache_budget_invalid(self):
+        """ManagedRaster cache: a non-positive budget is rejected."""
+        from natcap.invest.managed_raster import cache
+        for value in (0, -10):
+            with self.assertRaises(ValueError):
+                cache.set_cache_budget(value)
+
+    def test_stats_and_budget_do_not_change_results(self):
+        """ManagedRaster cache: a tiny budget evicts but matches results."""
+        from natcap.invest.managed_raster import cache
+        from natcap.invest.sdr import sdr_core
+
+        flow_dir_path, e_prime_path, sdr_path = (
+            make_sediment_deposition_inputs(self.workspace_dir))
+
+        results = {}
+        evictions = {}
+        for label, budget in [('large', 2**30), ('tiny', 1)]:
+            cache.reset_cache_stats()
+            f_path = os.path.join(self.workspace_dir, f'f_{label}.tif')
+            deposition_path = os.path.join(
+                self.workspace_dir, f'deposition_{label}.tif')
+            sdr_core.calculate_sediment_deposition(
+                flow_dir_path, e_prime_path, f_path, sdr_path,
+                deposition_path, 'mfd', cache_budget_bytes=budget)
+
+            stats = cache.get_cache_stats()
+            self.assertEqual(stats['budget_bytes'], budget)
+            self.assertEqual(stats['open_rasters'], 0)
+            self.assertGreater(stats['hits'], 0)
+            self.assertGreater(stats['misses'], 0)
+            evictions[label] = stats['evictions']
+            results[label] = (
+                pygeoprocessing.raster_to_numpy_array(f_path),
+                pygeoprocessing.raster_to_numpy_array(deposition_path))
+
+        # with a tiny budget each raster is held to the minimum number of
+        # blocks, which is smaller than the flow direction raster.
+        self.assertEqual(evictions['large'], 0)
+        self.assertGreater(evictions['tiny'], 0)
+        # values written to a float32 raster may be read back from the cache
+        # at a higher precision until their block is evicted, so the results
+        # only match to within float32 rounding
+        for large_array, tiny_array in zip(results['large'], results['tiny']):
+            numpy.testing.assert_allclose(large_array, tiny_array, rtol=1e-4)
+
+    def test_native_block_types(self):
+        """ManagedRaster cache: native-type blocks match float64 blocks."""
+        from natcap.invest.managed_raster import cache
+        from natcap.invest.sdr import sdr_core
+
+        # D8 flow direction rasters are byte and MFD are int32; both are
+        # cached in their own type and must route the same sediment as a
+        # float64 copy of the same flow directions.
+        for algorithm in ('mfd', 'd8'):
+            workspace_dir = os.path.join(self.workspace_dir, algorithm)
+            os.makedirs(workspace_dir)
+            flow_dir_path, e_prime_path, sdr_path = (
+                make_sediment_deposition_inputs(
+                    workspace_dir, algorithm=algorithm))
+            float_flow_dir_path = os.path.join(
+                workspace_dir, 'flow_dir_float64.tif')
+            pygeoprocessing.raster_calculator(
+                [(flow_dir_path, 1)], lambda array: array.astype(
+                    numpy.float64),
+                float_flow_dir_path, gdal.GDT_Float64,
+                pygeoprocessing.get_raster_info(
+                    flow_dir_path)['nodata'][0],
+                raster_driver_creation_tuple=SMALL_BLOCK_CREATION_TUPLE)
+
+            results = []
+            for label, path in [('native', flow_dir_path),
+                                ('float64', float_flow_dir_path)]:
+                f_path = os.path.join(workspace_dir, f'f_{label}.tif')
+                deposition_path = os.path.join(
+                    workspace_dir, f'deposition_{label}.tif')
+                sdr_core.calculate_sediment_deposition(
+                    path, e_prime_path, f_path, sdr_path,
+                    deposition_path, algorithm, cache_budget_bytes=2**20)
+                results.append((
+                    pygeoprocessing.raster_to_numpy_array(f_path),
+                    pygeoprocessing.raster_to_numpy_array(deposition_path)))
+            for native_array, float_array in zip(*results):
+                numpy.testing.assert_array_equal(native_array, float_array)
+            self.assertEqual(cache.get_cache_stats()['open_rasters'], 0)
+
+    def test_async_io_matches_sync(self):
+        """ManagedRaster cache: background I/O doesn't change results."""
+        from natcap.invest.managed_raster import cache
+        from natcap.invest.sdr import sdr_core
+
+        flow_dir_path, e_prime_path, sdr_path = (
+            make_sediment_deposition_inputs(self.workspace_dir))
+
+        results = {}
+        for async_io in (False, True):
+            cache.set_async_io(async_io)
+            cache.reset_cache_stats()
+            f_path = os.path.join(self.workspace_dir, f'f_{async_io}.tif')
+            deposition_path = os.path.join(
+                self.workspace_dir, f'deposition_{async_io}.tif')
+            # a tiny budget evicts dirty blocks, which are written behind
+            sdr_core.calculate_sediment_deposition(
+                flow_dir_path, e_prime_path, f_path, sdr_path,
+                deposition_path, 'mfd', cache_budget_bytes=1)
+
+            stats = cache.get_cache_stats()
+            self.assertEqual(stats['open_rasters'], 0)
+            if async_io:
+                self.assertGreater(stats['prefetch_hits'], 0)
+            else:
+                self.assertEqual(stats['prefetch_hits'], 0)
+                self.assertEqual(stats['deferred_writes'], 0)
+            results[async_io] = (
+                pygeoprocessing.raster_to_numpy_array(f_path),
+                pygeoprocessing.raster_to_numpy_array(deposition_path))
+
+        for sync_array, async_array in zip(results[False], results[True]):
+            numpy.testing.assert_array_equal(sync_array, async_array)
@@ -0,0 +1,72 @@
+"""Tests for the natcap.invest.models registry."""
+import importlib
+import pkgutil
+import subprocess
+import sys
+import textwrap
+import unittest
+
+
+class ModelRegistryTests(unittest.TestCase):
+    """Tests for the lazy registry of invest models."""
+
+    def test_core_models_match_model_specs(self):
+        """Models: the static manifest matches every core MODEL_SPEC."""
+        import natcap.invest
+        from natcap.invest import models
+
+        # discover the core models the way the registry used to, by
+        # importing every submodule of every package
+        discovered_pynames = set()
+        for _, name, ispkg in pkgutil.iter_modules(natcap.invest.__path__):
+            if ispkg:
+                package = importlib.import_module(f'natcap.invest.{name}')
+                for _, sub_name, _ in pkgutil.iter_modules(package.__path__):
+                    pyname = f'natcap.invest.{name}.{sub_name}'
+                    if models.is_invest_compliant_model(
+                            importlib.import_module(pyname)):
+                        discovered_pynames.add(pyname)
+        self.assertEqual(
+            discovered_pynames,
+            set(info.pyname for info in models.CORE_MODELS))
+
+        for info in models.CORE_MODELS:
+            model_spec = importlib.import_module(info.pyname).MODEL_SPEC
+            self.assertEqual(info.model_id, model_spec.model_id)
+            self.assertEqual(info.model_title, model_spec.model_title)
+            self.assertEqual(info.aliases, tuple(model_spec.aliases))
+            self.assertIs(models.model_id_to_spec[info.model_id], model_spec)
+            self.assertEqual(
+                models.pyname_to_model_id[info.pyname], info.model_id)
+            for alias in info.aliases:
+                self.assertEqual(
+                    models.model_alias_to_id[alias], info.model_id)
+
+    def test_unknown_model_id(self):
+        """Models: looking up an unknown model id raises KeyError."""
+        from natcap.invest import models
+
+        self.assertNotIn('not_a_model', models.model_id_to_spec)
+        with self.assertRaises(KeyError):
+            models.model_id_to_pyname['not_a_model']
+
+    def test_cli_startup_imports_no_models(self):
+        """Models: listing models from the CLI imports none of them.
+
+        This is a guard on CLI startup time: importing every model takes
+        seconds. Run ``scripts/benchmarks/cli_startup_benchmark.py`` to
+        measure it.
+        """
+        script = textwrap.dedent("""
+            import sys
+            from natcap.invest import cli, models
+            cli.build_model_list_table('en')
+            cli.build_model_list_json('en')
+            print('\\n'.join(
+                info.pyname for info in models.CORE_MODELS
+                if info.pyname in sys.modules))
+        """)
+        imported_models = subprocess.run(
+            [sys.executable, '-c', script], check=True, capture_output=True,
+            text=True).stdout.split()
+        self.assertEqual(imported_models, [])
@@ -12,7 +12,9 @@ from osgeo import gdal
 from osgeo import ogr
 from osgeo import osr
 
+from .utils import SMALL_BLOCK_CREATION_TUPLE
 from .utils import assert_complete_execute
+from .utils import make_sediment_deposition_inputs
 
 
 gdal.UseExceptions()
@@ -623,3 +625,63 @@ class NDRTests(unittest.TestCase):
         with self.assertRaises(ValueError) as cm:
             ndr.execute(args)
         self.assertIn('Error in column "load_type_n", value "cheese"', str(cm.exception))
+
+    def test_effective_retention_fused(self):
+        """NDR test that fused retention matches separate runs."""
+        from natcap.invest.ndr import ndr_core
+
+        # 16 x 16 blocks, so the raster is seeded block by block with flow
+        # paths crossing between blocks
+        n_rows, n_cols = 100, 100
+        yy, xx = numpy.mgrid[0:n_rows, 0:n_cols]
+        for algorithm in ('mfd', 'd8'):
+            workspace_dir = os.path.join(self.workspace_dir, algorithm)
+            os.makedirs(workspace_dir)
+            flow_dir_path, _, _ = make_sediment_deposition_inputs(
+                workspace_dir, n_rows=n_rows, n_cols=n_cols,
+                algorithm=algorithm)
+            info = pygeoprocessing.get_raster_info(flow_dir_path)
+            origin = (info['geotransform'][0], info['geotransform'][3])
+
+            stream_path = os.path.join(workspace_dir, 'stream.tif')
+            stream_array = (
+                ((xx * 31 + yy * 17) % 97 == 0) | (xx == 0) | (yy == 0))
+            pygeoprocessing.numpy_array_to_raster(
+                stream_array.astype(numpy.uint8), 255, info['pixel_size'],
+                origin, info['projection_wkt'], stream_path,
+                raster_driver_creation_tuple=SMALL_BLOCK_CREATION_TUPLE)
+
+            eff_path_list = []
+            crit_len_path_list = []
+            for nutrient, eff_array, crit_len_array in [
+                    ('n', 0.1 + ((xx + 2 * yy) % 13) / 20, 30 + (xx * yy) % 90),
+                    ('p', 0.05 + ((3 * xx + yy) % 17) / 25, (xx + yy) % 50)]:
+                for array, path_list, prefix in [
+                        (eff_array, eff_path_list, 'eff'),
+                        (crit_len_array, crit_len_path_list, 'crit_len')]:
+                    path = os.path.join(
+                        workspace_dir, f'{prefix}_{nutrient}.tif')
+                    pygeoprocessing.numpy_array_to_raster(
+                        array.astype(numpy.float32), -1, info['pixel_size'],
+                        origin, info['projection_wkt'], path,
+                        raster_driver_creation_tuple=(
+                            SMALL_BLOCK_CREATION_TUPLE))
+                    path_list.append(path)
+
+            retention_path_list = [
+                os.path.join(workspace_dir, f'ret_{nutrient}_fused.tif')
+                for nutrient in ('n', 'p')]
+            ndr_core.ndr_eff_calculation(
+                flow_dir_path, stream_path, eff_path_list,
+                crit_len_path_list, retention_path_list, algorithm)
+
+            for index, nutrient in enumerate(('n', 'p')):
+                retention_path = os.path.join(
+                    workspace_dir, f'ret_{nutrient}_separate.tif')
+                ndr_core.ndr_eff_calculation(
+                    flow_dir_path, stream_path, [eff_path_list[index]],
+                    [crit_len_path_list[index]], [retention_path], algorithm)
+                numpy.testing.assert_array_equal(
+                    pygeoprocessing.raster_to_numpy_array(retention_path),
+                    pygeoprocessing.raster_to_numpy_array(
+                        retention_path_list[index]))
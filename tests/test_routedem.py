@@ -351,6 +351,47 @@ class RouteDEMTests(unittest.TestCase):
         self.assertFalse(os.path.exists(os.path.join(
             args['workspace_dir'], 'subwatersheds_foo.gpkg')))
 
+    def test_routedem_intermediate_cache(self):
+        """RouteDEM: reuse cached results in another workspace."""
+        from natcap.invest import routedem
+        cache_dir = os.path.join(self.workspace_dir, 'cache')
+        args = {
+            'algorithm': 'mfd',
+            'dem_path': os.path.join(self.workspace_dir, 'dem.tif'),
+            'dem_band_index': 2,
+            'calculate_flow_direction': True,
+            'calculate_flow_accumulation': True,
+            'calculate_slope': True,
+            'intermediate_cache_dir': cache_dir,
+        }
+        RouteDEMTests._make_dem(args['dem_path'])
+
+        cached_files = []
+        for suffix in ('a', 'b'):
+            routedem.execute(dict(
+                args, workspace_dir=os.path.join(self.workspace_dir, suffix),
+                results_suffix=suffix))
+            cached_files.append(sorted(
+                os.path.relpath(os.path.join(dirpath, filename), cache_dir)
+                for dirpath, _, filenames in os.walk(cache_dir)
+                for filename in filenames
+                if os.path.basename(dirpath) != 'digests'))
+        # slope is cached on its own, and the filled DEM, flow direction
+        # and flow accumulation in the cache's hydrology directory
+        self.assertEqual(len(cached_files[0]), 2 + 4)
+        self.assertEqual(cached_files[0], cached_files[1])
+        self.assertEqual(
+            len([path for path in cached_files[0]
+                 if path.startswith('hydrology')]), 4)
+
+        for filename in ('filled', 'flow_accumulation', 'flow_direction',
+                         'slope'):
+            numpy.testing.assert_array_equal(
+                gdal.OpenEx(os.path.join(
+                    self.workspace_dir, 'a', f'{filename}_a.tif')).ReadAsArray(),
+                gdal.OpenEx(os.path.join(
+                    self.workspace_dir, 'b', f'{filename}_b.tif')).ReadAsArray())
+
     def test_validation_required_args(self):
         """RouteDEM: test required args in validation."""
         from natcap.invest import routedem
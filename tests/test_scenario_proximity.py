@@ -1,13 +1,20 @@
 """Module for Regression Testing Scenario Proximity Generator."""
+import collections
+import glob
 import unittest
 import tempfile
 import shutil
 import os
+from unittest.mock import patch
 
+import numpy
 import pandas
+import pygeoprocessing
 from osgeo import gdal
+from osgeo import osr
 
 from .utils import assert_complete_execute
+from .utils import SMALL_BLOCK_CREATION_TUPLE
 
 gdal.UseExceptions()
 TEST_DATA_DIR = os.path.join(
@@ -113,6 +120,92 @@ class ScenarioProximityTests(unittest.TestCase):
         with self.assertRaises(ValueError):
             scenario_gen_proximity.execute(args)
 
+    def test_convert_by_score(self):
+        """Scenario Gen Proximity: convert the best pixels by score."""
+        from natcap.invest.scenario_gen_proximity import scenario_gen_proximity
+
+        srs = osr.SpatialReference()
+        srs.ImportFromEPSG(32731)
+        rng = numpy.random.default_rng(seed=1)
+        # integer scores, so that many pixels tie
+        score_array = rng.integers(0, 10, size=(48, 64)).astype(numpy.float32)
+        score_array[rng.random(score_array.shape) < 0.2] = -1  # nodata
+        lulc_array = rng.integers(1, 4, size=score_array.shape).astype(
+            numpy.int32)
+        score_path = os.path.join(self.workspace_dir, 'score.tif')
+        # many small blocks, so that the cutoff is lowered many times and
+        # many runs are merged
+        pygeoprocessing.numpy_array_to_raster(
+            score_array, -1, (1, -1), (0, 0), srs.ExportToWkt(), score_path,
+            raster_driver_creation_tuple=SMALL_BLOCK_CREATION_TUPLE)
+
+        valid_mask = score_array != -1
+        flat_indexes = numpy.flatnonzero(valid_mask)
+        # select the pixels in memory, or merge sorted runs from disk
+        for max_select_pixels in (1000, 0):
+            for score_weight in (1.0, -1.0):
+                lulc_path = os.path.join(
+                    self.workspace_dir,
+                    f'lulc_{max_select_pixels}_{score_weight}.tif')
+                pygeoprocessing.numpy_array_to_raster(
+                    lulc_array, -1, (1, -1), (0, 0), srs.ExportToWkt(),
+                    lulc_path)
+
+                stats_cache = collections.defaultdict(int)
+                with patch.multiple(
+                        scenario_gen_proximity, _BLOCK_SIZE=64,
+                        _MIN_MERGE_CHUNK_SIZE=4,
+                        _MAX_SELECT_PIXELS=max_select_pixels):
+                    scenario_gen_proximity._convert_by_score(
+                        score_path, 100.5, lulc_path, 12, stats_cache,
+                        score_weight, self.workspace_dir)
+
+                # 101 pixels are converted, in order of score and flat index
+                sort_index = numpy.lexsort((
+                    flat_indexes, score_array.flatten()[flat_indexes] *
+                    score_weight))
+                converted_indexes = flat_indexes[sort_index][:101]
+                expected_array = lulc_array.copy()
+                expected_array.flat[converted_indexes] = 12
+                numpy.testing.assert_array_equal(
+                    pygeoprocessing.raster_to_numpy_array(lulc_path),
+                    expected_array)
+                unique_ids, id_counts = numpy.unique(
+                    lulc_array.flat[converted_indexes], return_counts=True)
+                self.assertEqual(
+                    dict(stats_cache), dict(zip(unique_ids, id_counts)))
+                # the sorted runs are deleted
+                self.assertEqual(
+                    glob.glob(os.path.join(self.workspace_dir, '*.dat')), [])
+
+    def test_select_best_pixels(self):
+        """Scenario Gen Proximity: select the best pixels in memory."""
+        from natcap.invest.scenario_gen_proximity import scenario_gen_proximity
+
+        srs = osr.SpatialReference()
+        srs.ImportFromEPSG(32731)
+        rng = numpy.random.default_rng(seed=2)
+        score_array = rng.integers(0, 10, size=(48, 64)).astype(numpy.float32)
+        score_array[rng.random(score_array.shape) < 0.2] = -1  # nodata
+        score_path = os.path.join(self.workspace_dir, 'score.tif')
+        pygeoprocessing.numpy_array_to_raster(
+            score_array, -1, (1, -1), (0, 0), srs.ExportToWkt(), score_path,
+            raster_driver_creation_tuple=SMALL_BLOCK_CREATION_TUPLE)
+
+        flat_indexes = numpy.flatnonzero(score_array != -1)
+        # fewer pixels than a block, more than a block, and all of them
+        for n_pixels in (0, 10, 300, flat_indexes.size, score_array.size):
+            for score_weight in (1.0, -1.0):
+                # blocks larger than _BLOCK_SIZE grow the buffers
+                with patch.object(scenario_gen_proximity, '_BLOCK_SIZE', 64):
+                    selected = scenario_gen_proximity._select_best_pixels(
+                        score_path, n_pixels, score_weight=score_weight)
+                sort_index = numpy.lexsort((
+                    flat_indexes, score_array.flatten()[flat_indexes] *
+                    score_weight))
+                numpy.testing.assert_array_equal(
+                    selected, flat_indexes[sort_index][:n_pixels])
+
     @staticmethod
     def _test_same_files(base_list_path, directory_path):
         """Assert files in `base_list_path` are in `directory_path`.
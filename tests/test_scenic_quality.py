@@ -4,6 +4,7 @@ import os
 import shutil
 import tempfile
 import unittest
+from unittest.mock import patch
 
 import numpy
 import pygeoprocessing
@@ -458,6 +459,136 @@ class ScenicQualityTests(unittest.TestCase):
                                       quality_matrix,
                                       rtol=0, atol=1e-6)
 
+    def test_windowed_viewsheds(self):
+        """SQ: viewsheds cover only the DEM within their radius."""
+        from natcap.invest.scenic_quality import scenic_quality
+        from natcap.invest.scenic_quality.viewshed import viewshed
+
+        dem_path = os.path.join(self.workspace_dir, 'dem.tif')
+        ScenicQualityTests.create_dem(dem_path)
+
+        viewpoints_path = os.path.join(self.workspace_dir,
+                                       'viewpoints.geojson')
+        ScenicQualityTests.create_viewpoints(
+            viewpoints_path,
+            fields={'RADIUS': ogr.OFTReal, 'WEIGHT': ogr.OFTReal},
+            attributes=[
+                {'RADIUS': 2.0, 'WEIGHT': 1.0},
+                {'RADIUS': 2.0, 'WEIGHT': 1.0},
+                {'RADIUS': 2.0, 'WEIGHT': 2.5},
+                {'RADIUS': 2.0, 'WEIGHT': 1.5}])
+
+        aoi_path = os.path.join(self.workspace_dir, 'aoi.geojson')
+        ScenicQualityTests.create_aoi(aoi_path)
+
+        args = {
+            'workspace_dir': os.path.join(self.workspace_dir, 'workspace'),
+            'aoi_path': aoi_path,
+            'structure_path': viewpoints_path,
+            'dem_path': dem_path,
+            'refraction': 0.13,
+            'valuation_function': 'linear',
+            'a_coef': 1,
+            'b_coef': 0,
+            'max_valuation_radius': 10.0,
+            'do_valuation': True,
+            'n_workers': -1,
+        }
+        scenic_quality.execute(args)
+
+        # A 2m radius is 1 pixel, so each window reaches 2 pixels from its
+        # viewpoint, clipped to the edges of the DEM. Viewpoints are sorted.
+        intermediate_dir = os.path.join(args['workspace_dir'], 'intermediate')
+        expected_windows = [
+            # viewpoint, weight, window origin, window size
+            ((7.0, -11.0), 2.5, (2.0, -6.0), (5, 3)),
+            ((7.0, -3.0), 1.0, (2.0, -2.0), (5, 3)),
+            ((11.0, -7.0), 1.5, (6.0, -2.0), (3, 5)),
+        ]
+        dem_clipped_path = os.path.join(intermediate_dir, 'dem_clipped.tif')
+        expected_vshed = numpy.zeros((5, 5), dtype=numpy.float32)
+        for feature_index, (viewpoint, weight, origin, size) in enumerate(
+                expected_windows):
+            raster_info = pygeoprocessing.get_raster_info(os.path.join(
+                intermediate_dir, f'visibility_{feature_index}.tif'))
+            self.assertEqual(raster_info['raster_size'], size)
+            self.assertEqual(raster_info['geotransform'][0], origin[0])
+            self.assertEqual(raster_info['geotransform'][3], origin[1])
+
+            # the windowed viewshed matches the one of the whole DEM
+            full_visibility_path = os.path.join(
+                self.workspace_dir, f'full_visibility_{feature_index}.tif')
+            viewshed((dem_clipped_path, 1), viewpoint, full_visibility_path,
+                     curved_earth=True, refraction_coeff=0.13,
+                     max_distance=2.0)
+            full_visibility = pygeoprocessing.raster_to_numpy_array(
+                full_visibility_path)
+            xoff = int(origin[0] - 2) // 2
+            yoff = int(-2 - origin[1]) // 2
+            windowed_visibility = pygeoprocessing.raster_to_numpy_array(
+                os.path.join(
+                    intermediate_dir, f'visibility_{feature_index}.tif'))
+            full_window = full_visibility[
+                yoff:yoff + size[1], xoff:xoff + size[0]]
+            numpy.testing.assert_equal(
+                windowed_visibility == 1, full_window == 1)
+            self.assertEqual(
+                numpy.count_nonzero(full_visibility == 1),
+                numpy.count_nonzero(windowed_visibility == 1))
+            expected_vshed += (full_visibility == 1) * weight
+
+        vshed_matrix = pygeoprocessing.raster_to_numpy_array(
+            os.path.join(args['workspace_dir'], 'output', 'vshed.tif'))
+        numpy.testing.assert_allclose(
+            expected_vshed, vshed_matrix, rtol=0, atol=1e-6)
+
+    def test_vshed_summed_from_disk(self):
+        """SQ: viewsheds of a large DEM are summed from disk the same."""
+        from natcap.invest.scenic_quality import scenic_quality
+
+        dem_path = os.path.join(self.workspace_dir, 'dem.tif')
+        ScenicQualityTests.create_dem(dem_path)
+
+        viewpoints_path = os.path.join(self.workspace_dir,
+                                       'viewpoints.geojson')
+        ScenicQualityTests.create_viewpoints(
+            viewpoints_path,
+            fields={'RADIUS': ogr.OFTReal, 'WEIGHT': ogr.OFTReal},
+            attributes=[
+                {'RADIUS': 6.0, 'WEIGHT': 1.0},
+                {'RADIUS': 6.0, 'WEIGHT': 1.0},
+                {'RADIUS': 6.0, 'WEIGHT': 2.5},
+                {'RADIUS': 6.0, 'WEIGHT': 1.5}])
+
+        aoi_path = os.path.join(self.workspace_dir, 'aoi.geojson')
+        ScenicQualityTests.create_aoi(aoi_path)
+
+        vshed_matrices = {}
+        for label, max_pixels in [('memory', 2**26), ('disk', 0)]:
+            args = {
+                'workspace_dir': os.path.join(self.workspace_dir, label),
+                'aoi_path': aoi_path,
+                'structure_path': viewpoints_path,
+                'dem_path': dem_path,
+                'refraction': 0.13,
+                'do_valuation': False,
+                'n_workers': -1,
+            }
+            with patch.object(scenic_quality, '_MAX_IN_MEMORY_SUM_PIXELS',
+                              max_pixels):
+                scenic_quality.execute(args)
+            vshed_matrices[label] = pygeoprocessing.raster_to_numpy_array(
+                os.path.join(args['workspace_dir'], 'output', 'vshed.tif'))
+            # without valuation, no visibility rasters are left either way
+            self.assertEqual(glob.glob(os.path.join(
+                args['workspace_dir'], 'intermediate', 'visibility_*.tif')),
+                [])
+            self.assertEqual(glob.glob(os.path.join(
+                args['workspace_dir'], 'visibility*')), [])
+
+        numpy.testing.assert_equal(
+            vshed_matrices['memory'], vshed_matrices['disk'])
+
     def test_exponential_valuation(self):
         """SQ: verify values on exponential valuation."""
         from natcap.invest.scenic_quality import scenic_quality
@@ -567,7 +698,6 @@ class ScenicQualityTests(unittest.TestCase):
         raster = None
 
         scenic_quality._calculate_visual_quality(n_visible,
-                                                 self.workspace_dir,
                                                  visual_quality_raster)
 
         expected_visual_quality = numpy.tile(
@@ -604,7 +734,6 @@ class ScenicQualityTests(unittest.TestCase):
         raster = None
 
         scenic_quality._calculate_visual_quality(n_visible,
-                                                 self.workspace_dir,
                                                  visual_quality_raster)
 
         expected_visual_quality = numpy.concatenate(
@@ -634,7 +763,6 @@ class ScenicQualityTests(unittest.TestCase):
         raster = None
 
         scenic_quality._calculate_visual_quality(n_visible,
-                                                 self.workspace_dir,
                                                  visual_quality_raster)
 
         expected_visual_quality = numpy.array(
@@ -664,7 +792,6 @@ class ScenicQualityTests(unittest.TestCase):
         raster = None
 
         scenic_quality._calculate_visual_quality(n_visible,
-                                                 self.workspace_dir,
                                                  visual_quality_raster)
 
         expected_visual_quality = numpy.array(
@@ -1238,3 +1365,49 @@ class ViewshedTests(unittest.TestCase):
         visibility_matrix = pygeoprocessing.raster_to_numpy_array(
             visibility_filepath)
         numpy.testing.assert_equal(visibility_matrix, expected_visibility)
+
+    def test_weighted_viewshed_sum(self):
+        """SQ Viewshed: batched viewsheds sum to the weighted viewsheds."""
+        from natcap.invest.scenic_quality.viewshed import viewshed
+        from natcap.invest.scenic_quality.viewshed import weighted_viewshed_sum
+
+        matrix = numpy.random.default_rng(seed=1).uniform(
+            0, 10, size=(30, 40))
+        matrix[0:3, 20:25] = -1  # nodata
+        dem_filepath = os.path.join(self.workspace_dir, 'dem.tif')
+        ViewshedTests.create_dem(matrix, dem_filepath)
+
+        viewpoints = [
+            # viewpoint, max distance, weight, viewpoint height
+            ((5.5, 5.5), None, 1.0, 0.0),
+            ((30.5, 20.5), 8.0, 2.5, 1.0),
+            ((12.5, 25.5), 15.0, 0.5, 5.0),
+            ((38.5, 1.5), None, 3.0, 2.0),
+        ]
+        expected_sum = numpy.zeros(matrix.shape, dtype=numpy.float32)
+        for index, (viewpoint, max_distance, weight,
+                    viewpoint_height) in enumerate(viewpoints):
+            visibility_filepath = os.path.join(
+                self.workspace_dir, f'visibility_{index}.tif')
+            viewshed((dem_filepath, 1), viewpoint, visibility_filepath,
+                     viewpoint_height=viewpoint_height,
+                     max_distance=max_distance, refraction_coeff=0.13)
+            visibility_matrix = pygeoprocessing.raster_to_numpy_array(
+                visibility_filepath)
+            expected_sum += (visibility_matrix == 1) * numpy.float32(weight)
+        expected_sum[matrix == -1] = -1
+
+        for n_workers in (1, 4):
+            sum_filepath = os.path.join(
+                self.workspace_dir, f'sum_{n_workers}.tif')
+            weighted_viewshed_sum(
+                (dem_filepath, 1), viewpoints, sum_filepath,
+                refraction_coeff=0.13, n_workers=n_workers)
+            numpy.testing.assert_equal(
+                pygeoprocessing.raster_to_numpy_array(sum_filepath),
+                expected_sum)
+
+        with self.assertRaises(LookupError):
+            weighted_viewshed_sum(
+                (dem_filepath, 1), [((21.5, 1.5), None, 1.0, 0.0)],
+                os.path.join(self.workspace_dir, 'nodata_sum.tif'))
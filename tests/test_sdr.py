@@ -10,6 +10,7 @@ from osgeo import gdal
 from osgeo import osr
 
 from .utils import assert_complete_execute
+from .utils import make_sediment_deposition_inputs
 
 gdal.UseExceptions()
 REGRESSION_DATA = os.path.join(
@@ -507,3 +508,76 @@ class SDRTests(unittest.TestCase):
             [[0.253996, 0.657229, 1.345856, 1.776729, 49.802994, nodata]],
             dtype=numpy.float32)
         numpy.testing.assert_allclose(ls, expected_ls, rtol=1e-6)
+
+    def test_calculate_usle(self):
+        """SDR test that RKLS, USLE and avoided erosion share one pass."""
+        from natcap.invest.sdr import sdr
+
+        srs = osr.SpatialReference()
+        srs.ImportFromEPSG(26910)  # NAD83 / UTM zone 11N
+        srs_wkt = srs.ExportToWkt()
+        origin = (463250, 4929700)
+        pixel_size = (30, -30)
+
+        input_paths = []
+        for name, array, nodata in [
+                ('ls', numpy.array([[1, 2, 3, 4, 5]], dtype=numpy.float32),
+                 -1),
+                ('erosivity',
+                 numpy.array([[10, 10, -1, 10, 10]], dtype=numpy.float32),
+                 -1),
+                ('erodibility', numpy.full((1, 5), 0.5, dtype=numpy.float32),
+                 -1),
+                ('stream', numpy.array([[0, 0, 0, 1, 0]], dtype=numpy.uint8),
+                 255),
+                ('cp',
+                 numpy.array([[0.2, 0.5, 0.5, 0.5, -1]], dtype=numpy.float32),
+                 -1)]:
+            path = os.path.join(self.workspace_dir, f'{name}.tif')
+            pygeoprocessing.numpy_array_to_raster(
+                array, nodata, pixel_size, origin, srs_wkt, path)
+            input_paths.append(path)
+
+        target_paths = [
+            os.path.join(self.workspace_dir, f'{name}.tif')
+            for name in ['rkls', 'usle', 'avoided_erosion']]
+        sdr._calculate_usle(*input_paths, *target_paths)
+
+        # USLE and avoided erosion get raster_map's nodata value
+        nodata = float(numpy.finfo(numpy.float32).max)
+        for path, expected in zip(target_paths, [
+                [[5, 10, -1, -1, 25]],
+                [[1, 5, nodata, nodata, nodata]],
+                [[4, 5, nodata, nodata, nodata]]]):
+            numpy.testing.assert_allclose(
+                pygeoprocessing.raster_to_numpy_array(path),
+                numpy.array(expected, dtype=numpy.float32), rtol=1e-6)
+
+    def test_sediment_deposition_parallel(self):
+        """SDR test that tiled sediment deposition matches serial."""
+        from natcap.invest.sdr import sdr_core
+
+        # 16 x 16 blocks make 256 x 256 pixel tiles, so a 600 x 600 raster
+        # is processed as 3 x 3 tiles with flow paths crossing between them
+        for algorithm in ('mfd', 'd8'):
+            workspace_dir = os.path.join(self.workspace_dir, algorithm)
+            os.makedirs(workspace_dir)
+            flow_dir_path, e_prime_path, sdr_path = (
+                make_sediment_deposition_inputs(
+                    workspace_dir, n_rows=600, n_cols=600,
+                    algorithm=algorithm))
+
+            results = {}
+            for n_workers in (-1, 4):
+                f_path = os.path.join(workspace_dir, f'f_{n_workers}.tif')
+                deposition_path = os.path.join(
+                    workspace_dir, f'deposition_{n_workers}.tif')
+                sdr_core.calculate_sediment_deposition(
+                    flow_dir_path, e_prime_path, f_path, sdr_path,
+                    deposition_path, algorithm, n_workers=n_workers)
+                results[n_workers] = (
+                    pygeoprocessing.raster_to_numpy_array(f_path),
+                    pygeoprocessing.raster_to_numpy_array(deposition_path))
+
+            for serial_array, tiled_array in zip(results[-1], results[4]):
+                numpy.testing.assert_array_equal(serial_array, tiled_array)
@@ -1298,6 +1298,76 @@ class SeasonalWaterYieldRegressionTests(unittest.TestCase):
         numpy.testing.assert_allclose(actual_aet, expected_aet, equal_nan=True,
                                       err_msg="aet raster values do not match.")
 
+    def test_local_recharge_monthly_values(self):
+        """Test `calculate_local_recharge` reads each month's own values."""
+        from natcap.invest.seasonal_water_yield import \
+            seasonal_water_yield_core
+
+        # every pixel drains off the top of the raster, so none has an
+        # upslope contribution and L_sum_avail is 0 everywhere
+        flow_dir_array = numpy.full((1, 4), 15 << 8, dtype=numpy.int32)
+        stream_mask = numpy.zeros((1, 4), dtype=numpy.int8)
+        months = numpy.arange(12).reshape(12, 1, 1)
+        cols = numpy.arange(4).reshape(1, 1, 4)
+        precip_arrays = (20 + 3 * months + cols).astype(numpy.int16)
+        et0_arrays = (5 + 2 * months * cols).astype(numpy.float32)
+        quickflow_arrays = (months / 4 + cols).astype(numpy.float32)
+        kc_arrays = numpy.full((12, 1, 4), 0.8, dtype=numpy.float32)
+        precip_arrays[3, 0, 1] = -1
+        kc_arrays[7, 0, 2] = -999
+
+        srs = osr.SpatialReference()
+        srs.ImportFromEPSG(26910)  # UTM Zone 10N
+        project_wkt = srs.ExportToWkt()
+        flow_dir_path = os.path.join(self.workspace_dir, 'flow_dir.tif')
+        stream_path = os.path.join(self.workspace_dir, 'stream.tif')
+        for array, path in [(flow_dir_array, flow_dir_path),
+                            (stream_mask, stream_path)]:
+            pygeoprocessing.numpy_array_to_raster(
+                array, -1, (1, -1), (1180000, 690000), project_wkt, path)
+        path_lists = []
+        for prefix, arrays, nodata in [
+                ('precip', precip_arrays, -1), ('et0', et0_arrays, -1),
+                ('quickflow', quickflow_arrays, -1), ('kc', kc_arrays, -999)]:
+            path_list = []
+            for month_index, array in enumerate(arrays):
+                path = os.path.join(
+                    self.workspace_dir, f'{prefix}_{month_index}.tif')
+                pygeoprocessing.numpy_array_to_raster(
+                    array, nodata, (1, -1), (1180000, 690000), project_wkt,
+                    path)
+                path_list.append(path)
+            path_lists.append(path_list)
+
+        target_dir = os.path.join(self.workspace_dir, 'targets')
+        os.makedirs(target_dir)
+        target_names = ['li', 'li_avail', 'l_sum_avail', 'aet', 'pi']
+        target_paths = [
+            os.path.join(target_dir, f'{name}.tif') for name in target_names]
+        seasonal_water_yield_core.calculate_local_recharge(
+            path_lists[0], path_lists[1], path_lists[2], flow_dir_path,
+            path_lists[3], {i: 1 / 12 for i in range(1, 13)}, 1, 0.5,
+            stream_path, *target_paths, algorithm='MFD')
+
+        precip = numpy.where(precip_arrays == -1, 0, precip_arrays)
+        pet = numpy.where(kc_arrays == -999, 0, kc_arrays * et0_arrays)
+        expected_pi = precip.sum(axis=0)
+        expected_aet = numpy.minimum(
+            pet, precip - quickflow_arrays).sum(axis=0)
+        expected_li = expected_pi - quickflow_arrays.sum(axis=0) - expected_aet
+        for name, expected in [
+                ('pi', expected_pi), ('aet', expected_aet),
+                ('li', expected_li), ('li_avail', expected_li / 2),
+                ('l_sum_avail', numpy.zeros((1, 4)))]:
+            numpy.testing.assert_allclose(
+                pygeoprocessing.raster_to_numpy_array(
+                    os.path.join(target_dir, f'{name}.tif')),
+                expected, rtol=1e-5, err_msg=f'{name} values do not match.')
+        # the stacked monthly inputs are removed
+        self.assertEqual(
+            sorted(os.listdir(target_dir)),
+            sorted(f'{name}.tif' for name in target_names))
+
     def test_route_baseflow_sum(self):
         """Test `route_baseflow_sum`"""
         from natcap.invest.seasonal_water_yield import \
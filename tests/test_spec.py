@@ -515,3 +515,46 @@ class ModelSpecTests(unittest.TestCase):
         with self.assertRaises(ValidationError):
             # This module is importable, but has no 'report' attribute
             spec.ModelSpec(**data, reporter='natcap.invest')
+
+    def test_execute_preprocesses_inputs_once(self):
+        """Test that ModelSpec.execute preprocesses each input once."""
+        import sys
+        import types
+        from unittest import mock
+
+        model_spec = spec.ModelSpec(
+            model_id='foo',
+            model_title='Foo',
+            userguide='',
+            input_field_order=[
+                ['workspace_dir', 'results_suffix', 'n_workers', 'number']],
+            inputs=[
+                spec.WORKSPACE, spec.SUFFIX, spec.N_WORKERS,
+                spec.NumberInput(id='number', units=u.none)],
+            outputs=[spec.TASKGRAPH_CACHE],
+            module_name='fake_model')
+        model_args = []
+
+        def execute(args):
+            args, file_registry, graph = model_spec.setup(args)
+            model_args.append(args)
+            graph.join()
+            graph.close()
+            return file_registry.registry
+
+        fake_model = types.ModuleType('fake_model')
+        fake_model.execute = execute
+
+        workspace_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, workspace_dir)
+        with mock.patch.dict(sys.modules, {'fake_model': fake_model}), \
+                mock.patch.object(
+                    spec.NumberInput, 'preprocess', autospec=True,
+                    side_effect=lambda self, value: float(value)) as mock_preprocess:
+            model_spec.execute({
+                'workspace_dir': workspace_dir,
+                'n_workers': -1,
+                'number': '2.5'})
+
+        mock_preprocess.assert_called_once()
+        self.assertEqual(model_args[0]['number'], 2.5)
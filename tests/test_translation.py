@@ -4,6 +4,7 @@ import json
 import os
 import shutil
 import tempfile
+import threading
 import unittest
 from unittest.mock import patch
 
@@ -165,3 +166,47 @@ class TranslationTests(unittest.TestCase):
         self.assertIn(
             TEST_MESSAGES[not_a_number_msg].format(value=args['n_workers']),
             str(msgs))
+
+    def test_validation_messages_follow_locale(self):
+        """Translation: validation messages are translated when accessed."""
+        from natcap.invest import set_locale
+        set_locale(TEST_LANG)
+        self.assertEqual(
+            validation_messages.MISSING_KEY, TEST_MESSAGES[missing_key_msg])
+        set_locale('en')
+        self.assertEqual(validation_messages.MISSING_KEY, missing_key_msg)
+
+    def test_server_getspec_concurrent_languages(self):
+        """Translation: specs rendered at once are each in their language."""
+        import concurrent.futures
+        from natcap.invest import ui_server
+        ui_server._get_spec_json.cache_clear()
+        expected_json = {}
+        for language in ['en', TEST_LANG]:
+            expected_json[language] = ui_server._get_spec_json(
+                'carbon', language)
+            ui_server._get_spec_json.cache_clear()
+        self.assertIn(
+            TEST_MESSAGES['baseline LULC'], expected_json[TEST_LANG])
+
+        languages = ['en', TEST_LANG] * 4
+        with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+            for _ in range(5):
+                ui_server._get_spec_json.cache_clear()
+                for language, spec_json in zip(languages, executor.map(
+                        ui_server._get_spec_json,
+                        ['carbon'] * len(languages), languages)):
+                    self.assertEqual(spec_json, expected_json[language])
+
+    def test_use_locale_in_current_thread_only(self):
+        """Translation: use_locale doesn't change other threads' locale."""
+        msg = 'baseline LULC'
+        other_thread_messages = []
+        with natcap.invest.use_locale(TEST_LANG):
+            self.assertEqual(natcap.invest.gettext(msg), TEST_MESSAGES[msg])
+            thread = threading.Thread(target=lambda: (
+                other_thread_messages.append(natcap.invest.gettext(msg))))
+            thread.start()
+            thread.join()
+        self.assertEqual(other_thread_messages, [msg])
+        self.assertEqual(natcap.invest.gettext(msg), msg)
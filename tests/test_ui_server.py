@@ -48,6 +48,26 @@ class EndpointFunctionTests(unittest.TestCase):
              'about', 'input_field_order', 'different_projections_ok',
              'validate_spatial_overlap', 'args', 'outputs', 'module_name'})
 
+    def test_get_invest_spec_cached_without_reload(self):
+        """UI server: getspec renders each spec once and reloads nothing."""
+        test_client = ui_server.app.test_client()
+        ui_server._get_spec_json.cache_clear()
+        with patch('importlib.reload') as mock_reload:
+            for _ in range(2):
+                for language in ['en', 'es']:
+                    response = test_client.post(
+                        f'{ROUTE_PREFIX}/getspec', json='carbon',
+                        query_string={'language': language})
+                    self.assertEqual(response.status_code, 200)
+                validate_response = test_client.post(
+                    f'{ROUTE_PREFIX}/validate', json={
+                        'model_id': 'carbon', 'args': json.dumps({})})
+                self.assertEqual(validate_response.status_code, 200)
+        mock_reload.assert_not_called()
+        cache_info = ui_server._get_spec_json.cache_info()
+        self.assertEqual(cache_info.misses, 2)
+        self.assertEqual(cache_info.hits, 2)
+
     def test_get_invest_validate(self):
         """UI server: get_invest_validate endpoint."""
         from natcap.invest import carbon
@@ -67,6 +87,27 @@ class EndpointFunctionTests(unittest.TestCase):
         # the json (de)serializing, so do the same with expected data
         self.assertEqual(results, json.loads(json.dumps(expected)))
 
+    def test_get_invest_validate_session(self):
+        """UI server: validate_session endpoint merges args into a session."""
+        from natcap.invest import carbon
+        test_client = ui_server.app.test_client()
+        args = {
+            'workspace_dir': 'foo',
+            'n_workers': 'not a number'
+        }
+        for args_delta in [{'workspace_dir': 'foo'},
+                           {'n_workers': 'not a number'}]:
+            response = test_client.post(
+                f'{ROUTE_PREFIX}/validate_session', json={
+                    'session_id': 'test',
+                    'model_id': carbon.MODEL_SPEC.model_id,
+                    'args': json.dumps(args_delta)
+                })
+            self.assertEqual(response.status_code, 200)
+        results = json.loads(response.get_data(as_text=True))
+        self.assertEqual(
+            results, json.loads(json.dumps(carbon.validate(args))))
+
     def test_post_datastack_file(self):
         """UI server: post_datastack_file endpoint."""
         test_client = ui_server.app.test_client()
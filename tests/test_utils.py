@@ -438,6 +438,35 @@ class ReadCSVToDataframeTests(unittest.TestCase):
         self.assertEqual(df['header3'][1], 'bar')
         self.assertEqual(df['header1'][0], 1)
 
+    def test_fast_path_matches_python_engine(self):
+        """utils: CSVs read with the 'c' engine match the 'python' engine."""
+        from natcap.invest import utils
+
+        tables = {
+            # well-formed tables are read with the 'c' engine
+            'comma.csv': ('lucode,desc,val\n'
+                          '1,"corn, sweet",0.1\n'
+                          '2,bread,1e-3\n'),
+            'tab.csv': 'lucode\tdesc\tval\n1\tcorn\t0.3\n',
+            'semicolon.csv': 'lucode;desc;val;\n1;corn;0.7;\n2;;8;\n',
+            # a trailing separator on a data line isn't
+            'ragged.csv': 'lucode,desc,val\n1,corn,0.5,\n2,bread,1\n',
+        }
+        for filename, csv_text in tables.items():
+            table_path = os.path.join(self.workspace_dir, filename)
+            with open(table_path, 'w') as table_file:
+                table_file.write(csv_text)
+
+            with unittest.mock.patch(
+                    'natcap.invest.utils.pandas.read_csv',
+                    wraps=pd.read_csv) as mock_read_csv:
+                df = utils.read_csv_to_dataframe(table_path)
+            expected_engine = 'python' if filename == 'ragged.csv' else 'c'
+            self.assertEqual(
+                mock_read_csv.call_args.kwargs['engine'], expected_engine)
+            pd.testing.assert_frame_equal(
+                df, utils.read_csv_to_dataframe(table_path, engine='python'))
+
 
 
 
@@ -960,6 +989,57 @@ class ReclassifyRasterOpTests(unittest.TestCase):
             expected_message in str(context.exception), str(context.exception))
 
 
+class RasterBandPercentilesTests(unittest.TestCase):
+    """Tests for natcap.invest.utils.raster_band_percentiles."""
+
+    def setUp(self):
+        """Setup workspace."""
+        self.workspace_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Delete workspace."""
+        shutil.rmtree(self.workspace_dir)
+
+    def test_matches_raster_band_percentile(self):
+        """Utils: percentiles match pygeoprocessing's external sort."""
+        from natcap.invest import utils
+
+        srs = osr.SpatialReference()
+        srs.ImportFromEPSG(26910)  # UTM Zone 10N
+        array = numpy.random.default_rng(seed=1).normal(
+            0, 100, size=(300, 400)).astype(numpy.float32)
+        array[:, :20] = numpy.round(array[:, :20] / 50)  # repeated values
+        array[0, :] = -1
+        array[1, 100:103] = [1000, 2000, 3000]
+        raster_path = os.path.join(self.workspace_dir, 'raster.tif')
+        pygeoprocessing.numpy_array_to_raster(
+            array, -1, (1, -1), (1180000, 690000), srs.ExportToWkt(),
+            raster_path)
+
+        percentile_list = [0, 10, 25, 33.3, 50, 75, 90, 99.99, 100]
+        expected_values = pygeoprocessing.raster_band_percentile(
+            (raster_path, 1), os.path.join(self.workspace_dir, 'sort'),
+            percentile_list)
+        self.assertEqual(
+            utils.raster_band_percentiles((raster_path, 1), percentile_list),
+            expected_values)
+        # refine every bin with histograms down to single values
+        with unittest.mock.patch(
+                'natcap.invest.utils._PERCENTILE_SELECT_SIZE', 0):
+            self.assertEqual(
+                utils.raster_band_percentiles(
+                    (raster_path, 1), percentile_list),
+                expected_values)
+
+        # with fewer values than percentiles, the last value is reported
+        # once for the rest of the percentiles
+        self.assertEqual(
+            utils.raster_band_percentiles(
+                (raster_path, 1), percentile_list,
+                valid_op=lambda block: block >= 1000),
+            [1000, 2000, 3000, 3000])
+
+
 class ExpandPathTests(unittest.TestCase):
     def setUp(self):
         self.workspace_dir = tempfile.mkdtemp()
@@ -1035,6 +1115,15 @@ class _GDALPathTests(unittest.TestCase):
         self.assertEqual(gdal_path.to_normalized_path(),
                          '/vsizip/vsicurl/https://example.com/foo.zip/foo/bar.tif')
 
+    def test_tar_archive_path(self):
+        from natcap.invest import utils
+        gdal_path = utils._GDALPath.from_uri(
+            'tar:///foo/archive.tar.gz!data/bar.tif')
+        self.assertFalse(gdal_path.is_remote)
+        self.assertFalse(gdal_path.is_local)
+        self.assertEqual(gdal_path.to_normalized_path(),
+                         '/vsitar//foo/archive.tar.gz/data/bar.tif')
+
 
 class FormatArgsTest(unittest.TestCase):
     """Args format tests."""
@@ -7,6 +7,7 @@ import string
 import sys
 import tempfile
 import textwrap
+import threading
 import time
 import unittest
 import warnings
@@ -1511,6 +1512,54 @@ class TestGetValidatedDataframe(unittest.TestCase):
             'Value(s) in the "col1" column could not be interpreted as NumberInputs',
             str(cm.exception))
 
+    def test_csv_column_values_validation(self):
+        """validation: report the first invalid value in a csv column."""
+        csv_path = os.path.join(self.workspace_dir, 'csv.csv')
+        with open(csv_path, 'w') as file_obj:
+            file_obj.write('percent,ratio,option\n')
+            file_obj.write('10,0.5,a\n')
+            file_obj.write('20,1.5,b\n')
+            file_obj.write('30,2,c\n')
+
+        for column, expected_message in [
+                # this expression can't be evaluated on an array
+                (NumberInput(id='percent', units=None,
+                             expression='0 <= value <= 15'),
+                 'Error in column "percent", value "20.0": ' +
+                 validation_messages.INVALID_VALUE.format(
+                     condition='0 <= value <= 15')),
+                (RatioInput(id='ratio'),
+                 'Error in column "ratio", value "1.5": ' +
+                 validation_messages.NOT_WITHIN_RANGE.format(
+                     value=1.5, range='[0, 1]')),
+                (OptionStringInput(id='option', options=[
+                    Option(key='a'), Option(key='c')]),
+                 'Error in column "option", value "b": ' +
+                 validation_messages.INVALID_OPTION.format(
+                     option_list=['a', 'c']))]:
+            input_spec = CSVInput(id='foo', columns=[column])
+            with self.assertRaises(ValueError) as cm:
+                input_spec.get_validated_dataframe(csv_path)
+            self.assertEqual(str(cm.exception), expected_message)
+
+    def test_csv_path_column_validated_once_per_path(self):
+        """validation: each distinct path in a csv column is checked once."""
+        csv_path = os.path.join(self.workspace_dir, 'csv.csv')
+        with open(csv_path, 'w') as file_obj:
+            file_obj.write('path\n')
+            for name in ['a.txt', 'b.txt', 'a.txt', 'b.txt', 'c.txt']:
+                file_obj.write(f'{name}\n')
+
+        input_spec = CSVInput(id='foo', columns=[FileInput(id='path')])
+        mock_validate = Mock(return_value=None)
+        with unittest.mock.patch(
+                'natcap.invest.spec.FileInput.validate', mock_validate):
+            input_spec.get_validated_dataframe(csv_path)
+        self.assertEqual(
+            sorted(call.args[0] for call in mock_validate.call_args_list),
+            [os.path.join(self.workspace_dir, name)
+             for name in ['a.txt', 'b.txt', 'c.txt']])
+
 
 class TestValidationFromSpec(unittest.TestCase):
     """Test Validation From Spec."""
@@ -2172,6 +2221,131 @@ class TestValidationFromSpec(unittest.TestCase):
             self.assertTrue(warning in expected_warnings)
 
 
+    def test_conditional_requirement_does_not_modify_spec(self):
+        """Validation: nested conditional requirements are not overwritten."""
+        csv_spec = CSVInput(id='csv', columns=[
+            NumberInput(id='a', units=u.none),
+            NumberInput(id='b', units=u.none, required='flag')])
+        model_spec = model_spec_with_defaults(inputs=[
+            BooleanInput(id='flag', required=False), csv_spec])
+
+        csv_path = os.path.join(self.workspace_dir, 'table.csv')
+        with open(csv_path, 'w') as csv_file:
+            csv_file.write('a\n1\n')
+
+        self.assertEqual(
+            validation.validate({'flag': False, 'csv': csv_path}, model_spec),
+            [])
+        self.assertEqual(csv_spec.get_column('b').required, 'flag')
+        self.assertEqual(
+            validation.validate({'flag': True, 'csv': csv_path}, model_spec),
+            [(['csv'], validation_messages.MATCHED_NO_HEADERS.format(
+                header='column', header_name='b'))])
+        self.assertEqual(csv_spec.get_column('b').required, 'flag')
+
+    def test_file_results_cached(self):
+        """Validation: unchanged files are not checked again."""
+        model_spec = model_spec_with_defaults(inputs=[FileInput(id='file')])
+        filepath = os.path.join(self.workspace_dir, 'file.txt')
+        with open(filepath, 'w') as file:
+            file.write('foo')
+        # results aren't cached for files that were just modified
+        os.utime(filepath, (1000, 1000))
+        args = {'file': filepath}
+        self.assertEqual(validation.validate(args, model_spec), [])
+
+        mock_validate = Mock(return_value='changed')
+        with unittest.mock.patch(
+                'natcap.invest.spec.FileInput.validate', mock_validate):
+            self.assertEqual(validation.validate(args, model_spec), [])
+            mock_validate.assert_not_called()
+
+            os.utime(filepath, (2000, 2000))
+            self.assertEqual(
+                validation.validate(args, model_spec),
+                [(['file'], 'changed')])
+            mock_validate.assert_called_once_with(filepath)
+
+    def test_file_checks_bounded(self):
+        """Validation: files are checked on a bounded pool of threads."""
+        n_inputs = 2 * validation.MAX_VALIDATION_WORKERS
+        model_spec = model_spec_with_defaults(inputs=[
+            FileInput(id=f'file_{index}') for index in range(n_inputs)])
+        args = {}
+        for index in range(n_inputs):
+            args[f'file_{index}'] = os.path.join(
+                self.workspace_dir, f'file_{index}.txt')
+            with open(args[f'file_{index}'], 'w') as file:
+                file.write('foo')
+
+        lock = threading.Lock()
+        n_running = 0
+        max_running = 0
+
+        def check(filepath):
+            nonlocal n_running, max_running
+            with lock:
+                n_running += 1
+                max_running = max(max_running, n_running)
+            time.sleep(0.05)
+            with lock:
+                n_running -= 1
+
+        mock_validate = Mock(side_effect=check)
+        with unittest.mock.patch(
+                'natcap.invest.spec.FileInput.validate', mock_validate):
+            self.assertEqual(validation.validate(args, model_spec), [])
+        self.assertEqual(mock_validate.call_count, n_inputs)
+        self.assertGreater(max_running, 1)
+        self.assertLessEqual(max_running, validation.MAX_VALIDATION_WORKERS)
+
+    def test_session_rechecks_changed_inputs(self):
+        """Validation: a session re-checks only inputs that changed."""
+        inputs = [
+            FileInput(id='file_a'),
+            FileInput(id='file_b'),
+            number_input_spec_with_defaults(id='number')]
+        model_spec = ModelSpec(
+            model_id='', model_title='', userguide='', aliases=set(),
+            inputs=inputs, outputs=[], module_name='',
+            input_field_order=[[i.id for i in inputs]],
+            validate_spatial_overlap=['file_a', 'file_b'])
+        args = {'number': 1}
+        for key in ['file_a', 'file_b']:
+            args[key] = os.path.join(self.workspace_dir, f'{key}.txt')
+            with open(args[key], 'w') as file:
+                file.write('foo')
+            os.utime(args[key], (1000, 1000))
+
+        session = validation.ValidationSession()
+        mock_overlap = Mock(return_value='no overlap')
+        mock_validate = Mock(return_value=None)
+        with unittest.mock.patch(
+                'natcap.invest.validation.check_spatial_overlap',
+                mock_overlap), unittest.mock.patch(
+                'natcap.invest.spec.NumberInput.validate', mock_validate):
+            for args_delta in [args, {}, {'number': 2}]:
+                with session.activate():
+                    self.assertEqual(
+                        validation.validate(
+                            session.update(args_delta), model_spec),
+                        [(['file_a', 'file_b'], 'no overlap')])
+            self.assertEqual(mock_overlap.call_count, 1)
+            self.assertEqual(
+                mock_validate.call_args_list,
+                [unittest.mock.call(1), unittest.mock.call(2)])
+
+            os.utime(args['file_b'], (2000, 2000))
+            with session.activate():
+                validation.validate(session.args, model_spec)
+            self.assertEqual(mock_overlap.call_count, 2)
+
+            # without a session, everything is checked again
+            validation.validate(args, model_spec)
+            self.assertEqual(mock_overlap.call_count, 3)
+            self.assertEqual(mock_validate.call_count, 3)
+
+
 class TestArgsEnabled(unittest.TestCase):
 
     def test_args_enabled(self):
@@ -147,6 +147,33 @@ class WaveEnergyUnitTests(unittest.TestCase):
         for res, exp_res in zip(results, expected_results):
             self.assertAlmostEqual(res, exp_res, places=6)
 
+    def test_create_percentile_rasters_no_values(self):
+        """WaveEnergy: testing '_create_percentile_rasters' w/o values."""
+        from natcap.invest.wave_energy import wave_energy
+
+        srs = osr.SpatialReference()
+        srs.ImportFromEPSG(3157)
+        projection_wkt = srs.ExportToWkt()
+        origin = (443723.127327877911739, 4956546.905980412848294)
+
+        matrix = numpy.array(
+            [[1, 3, -1, 9], [3, 7, 1, 5], [2, 4, 5, -1]], dtype=numpy.float32)
+        raster_path = os.path.join(self.workspace_dir, 'values.tif')
+        pygeoprocessing.numpy_array_to_raster(
+            matrix, -1, (100, -100), origin, projection_wkt, raster_path)
+
+        # no values are at or above the start value
+        with self.assertRaises(ValueError) as cm:
+            wave_energy._create_percentile_rasters(
+                raster_path,
+                os.path.join(self.workspace_dir, 'percentile.tif'),
+                os.path.join(self.workspace_dir, 'percentile.csv'),
+                'kW/m', 'wave power per unit width of wave crest length',
+                [25, 50, 75, 90], start_value='10')
+        self.assertIn(
+            'Found no valid values at or above 10 in %s' % raster_path,
+            str(cm.exception))
+
     def test_calculate_min_distances(self):
         """WaveEnergy: testing '_calculate_min_distances' function."""
         from natcap.invest.wave_energy import wave_energy
@@ -1,7 +1,11 @@
 import os
 
+import numpy
+import pygeoprocessing
+import pygeoprocessing.routing
 from osgeo import gdal
 from osgeo import ogr
+from osgeo import osr
 from natcap.invest import spec
 from natcap.invest.file_registry import FileRegistry
 from natcap.invest.unit_registry import u
@@ -65,6 +69,58 @@ SAMPLE_MODEL_SPEC = spec.ModelSpec(
     outputs=output_spec
 )
 
+# small tiles so that the test rasters span many blocks
+SMALL_BLOCK_CREATION_TUPLE = (
+    'GTIFF', ['TILED=YES', 'BLOCKXSIZE=16', 'BLOCKYSIZE=16'])
+
+
+def make_sediment_deposition_inputs(workspace_dir, n_rows=200, n_cols=200,
+                                    algorithm='mfd'):
+    """Create the inputs to ``sdr_core.calculate_sediment_deposition``.
+
+    Args:
+        workspace_dir (str): directory in which to create the rasters.
+        n_rows (int): number of rows in each raster.
+        n_cols (int): number of columns in each raster.
+        algorithm (str): flow direction algorithm, 'mfd' or 'd8'.
+
+    Returns:
+        tuple of (flow_dir_path, e_prime_path, sdr_path)
+    """
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(26910)  # UTM Zone 10N
+    srs_wkt = srs.ExportToWkt()
+    origin = (463250, 4929700)
+    pixel_size = (30, -30)
+
+    # a bumpy surface gives many local high points and long flow paths
+    yy, xx = numpy.mgrid[0:n_rows, 0:n_cols]
+    dem_array = (
+        numpy.sin(xx / 7) * numpy.cos(yy / 11) * 10 + (xx + yy) / 5
+    ).astype(numpy.float32)
+    e_prime_array = numpy.full((n_rows, n_cols), 0.5, dtype=numpy.float32)
+    sdr_array = (
+        0.1 + 0.6 * (xx + yy) / (n_rows + n_cols)).astype(numpy.float32)
+
+    dem_path = os.path.join(workspace_dir, 'dem.tif')
+    e_prime_path = os.path.join(workspace_dir, 'e_prime.tif')
+    sdr_path = os.path.join(workspace_dir, 'sdr.tif')
+    flow_dir_path = os.path.join(workspace_dir, 'flow_dir.tif')
+    for array, path in [(dem_array, dem_path),
+                        (e_prime_array, e_prime_path),
+                        (sdr_array, sdr_path)]:
+        pygeoprocessing.numpy_array_to_raster(
+            array, -1, pixel_size, origin, srs_wkt, path,
+            raster_driver_creation_tuple=SMALL_BLOCK_CREATION_TUPLE)
+    if algorithm == 'mfd':
+        flow_dir_func = pygeoprocessing.routing.flow_dir_mfd
+    else:
+        flow_dir_func = pygeoprocessing.routing.flow_dir_d8
+    flow_dir_func(
+        (dem_path, 1), flow_dir_path,
+        raster_driver_creation_tuple=SMALL_BLOCK_CREATION_TUPLE)
+    return flow_dir_path, e_prime_path, sdr_path
+
 
 def assert_complete_execute(raw_args, model_spec, **kwargs):
     """Assert that post-processing functions completed.